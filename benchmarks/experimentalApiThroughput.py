@@ -0,0 +1,87 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measure the throughput of concurrent get_probabilities calls in the experimental API.
+
+Compares building a new pipeline for every call (parsing the project each time)
+to serving all calls from a PipelinePool, for a range of client thread counts.
+Input images are random, with the dimensionality and number of channels of the project.
+
+Example:
+    python benchmarks/experimentalApiThroughput.py MyProject.ilp --shape 512 512 --clients 1 2 4 8
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+import numpy as np
+import xarray
+
+from ilastik.experimental.api import AutocontextPipeline, PipelinePool, PixelClassificationPipeline
+from lazyflow.utility import Timer
+
+
+def make_images(project, shape, count):
+    axes = project.input_data.axis_order
+    spatial_shape = iter(shape)
+    full_shape = [project.input_data.num_channels if axis == "c" else next(spatial_shape) for axis in axes]
+    rng = np.random.default_rng(0)
+    return [xarray.DataArray(rng.integers(0, 255, full_shape, dtype=np.uint8), dims=tuple(axes)) for _ in range(count)]
+
+
+def run(executor, get_probabilities, images):
+    with Timer() as timer:
+        for _ in executor.map(get_probabilities, images):
+            pass
+    return timer.seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("project", help="trained pixel classification or autocontext project")
+    parser.add_argument("--autocontext", action="store_true", help="project is an autocontext project")
+    parser.add_argument("--shape", type=int, nargs="+", default=(256, 256), help="spatial shape of the images")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--images", type=int, default=32, help="number of images per run")
+    args = parser.parse_args()
+
+    pipeline_type = AutocontextPipeline if args.autocontext else PixelClassificationPipeline
+    with h5py.File(args.project, "r") as f:
+        project = pipeline_type.project_type.model_validate(f)
+    if len(args.shape) != len(project.input_data.spatial_axes):
+        parser.error(f"--shape must have {len(project.input_data.spatial_axes)} dimensions for this project")
+
+    images = make_images(project, args.shape, args.images)
+
+    def get_probabilities_fresh(img):
+        return pipeline_type.from_ilp_file(args.project).get_probabilities(img)
+
+    print(f"{'clients':>8} {'fresh [img/s]':>14} {'pooled [img/s]':>15} {'speedup':>8}")
+    for num_clients in args.clients:
+        pool = PipelinePool(pipeline_type, project, size=num_clients)
+        with ThreadPoolExecutor(max_workers=num_clients) as executor:
+            fresh = run(executor, get_probabilities_fresh, images)
+            pooled = run(executor, pool.get_probabilities, images)
+        print(f"{num_clients:>8} {len(images) / fresh:>14.2f} {len(images) / pooled:>15.2f} {fresh / pooled:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
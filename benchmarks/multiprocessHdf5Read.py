@@ -0,0 +1,100 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Throughput of reading a gzip-compressed hdf5 dataset with h5py vs. MultiProcessHdf5File.
+
+Lazyflow requests blocks from several threads at once, which h5py serializes.
+Each configuration reads the whole dataset in blocks, from a thread pool, and
+reports the throughput of (decompressed) data.
+
+Example:
+    python benchmarks/multiprocessHdf5Read.py --processes 1 2 4 8 --threads 8
+"""
+import argparse
+import concurrent.futures
+import itertools
+import os
+import tempfile
+
+import h5py
+import numpy
+
+from lazyflow.utility import Timer
+from lazyflow.utility.io_util.multiprocessHdf5File import MultiProcessHdf5File
+
+
+def make_file(path, shape, chunks):
+    rng = numpy.random.default_rng(0)
+    # smooth-ish data compresses like real images, rather than like noise
+    data = numpy.cumsum(rng.integers(-2, 3, shape, dtype=numpy.int16), axis=-1).astype(numpy.uint16)
+    with h5py.File(path, "w") as f:
+        f.create_dataset("data", data=data, chunks=chunks, compression="gzip", compression_opts=4)
+    return data.nbytes
+
+
+def block_slicings(shape, block_shape):
+    ranges = [range(0, s, b) for s, b in zip(shape, block_shape)]
+    return [
+        tuple(slice(start, min(start + b, s)) for start, b, s in zip(starts, block_shape, shape))
+        for starts in itertools.product(*ranges)
+    ]
+
+
+def read_all(f, slicings, num_threads):
+    dataset = f["data"]
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        for _ in executor.map(lambda slicing: dataset[slicing], slicings):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", type=int, nargs=3, default=(256, 1024, 1024))
+    parser.add_argument("--chunks", type=int, nargs=3, default=(64, 64, 64))
+    parser.add_argument("--block-shape", type=int, nargs=3, default=(64, 256, 256))
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "benchmark.h5")
+        nbytes = make_file(path, tuple(args.shape), tuple(args.chunks))
+        slicings = block_slicings(args.shape, args.block_shape)
+
+        def report(name, open_file):
+            with open_file() as f:
+                read_all(f, slicings, args.threads)  # warm up (page cache, process start)
+                with Timer() as timer:
+                    for _ in range(args.repeat):
+                        read_all(f, slicings, args.threads)
+            throughput = args.repeat * nbytes / timer.seconds() / 1024**2
+            print(f"{name:>16} {throughput:>12.1f}")
+
+        print(f"{'reader':>16} {'MiB/s':>12}")
+        report("h5py", lambda: h5py.File(path, "r"))
+        for num_processes in args.processes:
+            report(f"{num_processes} processes", lambda: MultiProcessHdf5File(path, "r", num_processes=num_processes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Prediction throughput of ParallelVigraRfLazyflowClassifier with vigra vs. the compiled FlatForest.
+
+Pixel classification predicts blocks of pixels from several threads at once;
+each configuration predicts all blocks from a thread pool and reports pixels
+per second. The results of both paths are checked to be bitwise identical.
+
+Example:
+    python benchmarks/randomForestPrediction.py --trees 100 --features 37 --threads 8
+"""
+import argparse
+import concurrent.futures
+
+import numpy
+
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifier, ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.utility import Timer
+
+
+def make_training_data(num_samples, num_features, num_classes):
+    rng = numpy.random.default_rng(0)
+    X = rng.normal(size=(num_samples, num_features)).astype(numpy.float32)
+    # labels depend on (noisy) combinations of a few features
+    scores = (
+        X[:, :num_classes] + 0.5 * X[:, num_classes : 2 * num_classes] + rng.normal(size=(num_samples, num_classes))
+    )
+    y = numpy.argmax(scores, axis=1).astype(numpy.uint32) + 1
+    return X, y
+
+
+def predict_all(classifier, blocks, num_threads):
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        return list(executor.map(classifier.predict_probabilities, blocks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--forests", type=int, default=None)
+    parser.add_argument("--features", type=int, default=37)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--training-samples", type=int, default=20000)
+    parser.add_argument("--block-pixels", type=int, default=256 * 256)
+    parser.add_argument("--blocks", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    X, y = make_training_data(args.training_samples, args.features, args.classes)
+    factory = ParallelVigraRfLazyflowClassifierFactory(args.trees, num_forests=args.forests)
+    trained = factory.create_and_train(X, y)
+
+    rng = numpy.random.default_rng(1)
+    blocks = [rng.normal(size=(args.block_pixels, args.features)).astype(numpy.float32) for _ in range(args.blocks)]
+    num_pixels = args.block_pixels * args.blocks
+
+    results = {}
+    print(f"{'engine':>12} {'Mpx/s':>10}")
+    for name, use_flat_forest in (("vigra", False), ("flat forest", True)):
+        classifier = ParallelVigraRfLazyflowClassifier(
+            trained._forests, trained.oobs, trained.known_classes, use_flat_forest=use_flat_forest
+        )
+        classifier.predict_probabilities(blocks[0])  # warm up (compiles the flat forest)
+        with Timer() as timer:
+            results[name] = predict_all(classifier, blocks, args.threads)
+        print(f"{name:>12} {num_pixels / timer.seconds() / 1e6:>10.3f}")
+
+    if len(trained._forests) > 2:
+        # The vigra path adds the forests' results in the order they finish
+        print("(more than two forests: results may differ in the last bits)")
+    identical = all(numpy.array_equal(a, b) for a, b in zip(results["vigra"], results["flat forest"]))
+    print(f"bitwise identical: {identical}")
+
+
+if __name__ == "__main__":
+    main()
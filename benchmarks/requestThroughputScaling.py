@@ -0,0 +1,91 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Measure how blockwise request throughput scales with the number of lazyflow workers.
+
+Every block is smoothed with a gaussian filter in its own request, which is representative
+for the feature computation in pixel classification.
+
+Example:
+    python benchmarks/requestThroughputScaling.py --workers 1 2 4 8 16 32 64 --scheduler work-stealing --affinity numa
+"""
+import argparse
+import multiprocessing
+
+import numpy as np
+import vigra
+
+from lazyflow.request import Request, RequestPool
+from lazyflow.request import topology
+from lazyflow.utility import Timer
+
+
+def _smooth_block(data, block_start, block_shape, sigma):
+    slicing = tuple(slice(s, s + b) for s, b in zip(block_start, block_shape))
+    return vigra.filters.gaussianSmoothing(data[slicing], sigma)
+
+
+def run(num_workers, data, block_shape, sigma, scheduler, affinity):
+    Request.reset_thread_pool(num_workers, scheduler=scheduler, affinity=affinity)
+
+    pool = RequestPool()
+    for block_start in np.ndindex(*(s // b for s, b in zip(data.shape, block_shape))):
+        block_start = tuple(i * b for i, b in zip(block_start, block_shape))
+        req = Request(lambda start=block_start: _smooth_block(data, start, block_shape, sigma))
+        pool.add(req.route_to_block(block_start))
+
+    with Timer() as timer:
+        pool.wait()
+    return timer.seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    default_workers = [2**i for i in range(multiprocessing.cpu_count().bit_length())]
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--scheduler", default="global-queue")
+    parser.add_argument("--affinity", default="none", choices=topology.AFFINITY_MODES)
+    parser.add_argument("--shape", type=int, nargs=3, default=(256, 512, 512))
+    parser.add_argument("--block-shape", type=int, nargs=3, default=(64, 128, 128))
+    parser.add_argument("--sigma", type=float, default=3.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    data = np.random.default_rng(0).random(args.shape, dtype=np.float32)
+    num_blocks = np.prod([s // b for s, b in zip(args.shape, args.block_shape)])
+    topo = topology.get_topology()
+    print(f"{len(topo.cpus)} usable cpus on {topo.num_nodes} NUMA node(s), {num_blocks} blocks per run")
+    print(f"probed worker count: {topology.probe_worker_count()}")
+
+    print(f"{'workers':>8} {'seconds':>10} {'blocks/s':>10} {'speedup':>8}")
+    baseline = None
+    for num_workers in args.workers:
+        seconds = min(
+            run(num_workers, data, args.block_shape, args.sigma, args.scheduler, args.affinity)
+            for _ in range(args.repeats)
+        )
+        baseline = baseline or seconds
+        print(f"{num_workers:>8} {seconds:>10.3f} {num_blocks / seconds:>10.1f} {baseline / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Microbenchmark for looking up cached blocks, as done by OpUnblockedArrayCache.
+
+Compares the linear scan with lazyflow.roi.containing_rois (used before) to the RoiDict spatial index,
+for finding the block containing a request, inserting blocks and finding the blocks hit by a dirty roi.
+
+Example:
+    python benchmarks/roiIndexLookup.py --blocks 1000 10000 100000
+"""
+import argparse
+import itertools
+import random
+
+import numpy
+
+from lazyflow.roi import containing_rois, getIntersection
+from lazyflow.utility import Timer
+from lazyflow.utility.roiIndex import RoiDict
+
+
+def make_block_rois(num_blocks, block_shape):
+    """Blocks of a 3d volume, tiled roughly cubically"""
+    blocks_per_axis = int(numpy.ceil(num_blocks ** (1 / 3)))
+    starts = itertools.islice(itertools.product(range(blocks_per_axis), repeat=3), num_blocks)
+    return [
+        (tuple(i * b for i, b in zip(start, block_shape)), tuple((i + 1) * b for i, b in zip(start, block_shape)))
+        for start in starts
+    ]
+
+
+def random_requests(block_rois, num_requests, rng):
+    """Requests that fall within a random cached block, like viewer tiles"""
+    requests = []
+    for _ in range(num_requests):
+        start, stop = rng.choice(block_rois)
+        request_start = tuple(rng.randrange(a, b) for a, b in zip(start, stop))
+        request_stop = tuple(rng.randrange(a + 1, b + 1) for a, b in zip(request_start, stop))
+        requests.append((request_start, request_stop))
+    return requests
+
+
+def per_op_us(seconds, count):
+    return 1e6 * seconds / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--block-shape", type=int, nargs=3, default=(64, 64, 64))
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print(f"{'blocks':>8} {'method':>8} {'insert [us]':>12} {'lookup [us]':>12} {'dirty [us]':>12}")
+    for num_blocks in args.blocks:
+        block_rois = make_block_rois(num_blocks, args.block_shape)
+        requests = random_requests(block_rois, args.requests, rng)
+        dirty_rois = random_requests(block_rois, args.requests, rng)
+
+        # Linear scan over a plain dict, as OpUnblockedArrayCache did before
+        plain = {}
+        with Timer() as timer:
+            for roi in block_rois:
+                plain[roi] = None
+        insert = timer.seconds()
+        with Timer() as timer:
+            for request in requests:
+                assert len(containing_rois(list(plain.keys()), request)) > 0
+        lookup = timer.seconds()
+        with Timer() as timer:
+            for dirty_roi in dirty_rois:
+                [roi for roi in plain if getIntersection(roi, dirty_roi, assertIntersect=False)]
+        dirty = timer.seconds()
+        print(
+            f"{num_blocks:>8} {'linear':>8} {per_op_us(insert, num_blocks):>12.2f} "
+            f"{per_op_us(lookup, len(requests)):>12.2f} {per_op_us(dirty, len(dirty_rois)):>12.2f}"
+        )
+
+        indexed = RoiDict()
+        with Timer() as timer:
+            for roi in block_rois:
+                indexed[roi] = None
+        insert = timer.seconds()
+        with Timer() as timer:
+            for request in requests:
+                assert indexed.find_containing(request) is not None
+        lookup = timer.seconds()
+        with Timer() as timer:
+            for dirty_roi in dirty_rois:
+                indexed.find_intersecting(dirty_roi)
+        dirty = timer.seconds()
+        print(
+            f"{num_blocks:>8} {'indexed':>8} {per_op_us(insert, num_blocks):>12.2f} "
+            f"{per_op_us(lookup, len(requests)):>12.2f} {per_op_us(dirty, len(dirty_rois)):>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
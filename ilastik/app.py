@@ -334,37 +334,70 @@ def _prepare_lazyflow_config(parsed_args):
     # Check environment variable settings.
     n_threads = os.getenv("LAZYFLOW_THREADS", None)
     total_ram_mb = os.getenv("LAZYFLOW_TOTAL_RAM_MB", None)
+    scheduler = os.getenv("LAZYFLOW_SCHEDULER", None)
+    affinity = os.getenv("LAZYFLOW_AFFINITY", None)
+    cache_eviction = os.getenv("LAZYFLOW_CACHE_EVICTION", None)
+    spill_capacity_mb = os.getenv("LAZYFLOW_SPILL_CAPACITY_MB", None)
+    spill_directory = os.getenv("LAZYFLOW_SPILL_DIRECTORY", None)
     status_interval_secs = int(os.getenv("LAZYFLOW_STATUS_MONITOR_SECONDS", "0"))
 
-    # Convert str -> int
-    if n_threads is not None:
-        n_threads = int(n_threads)
-    total_ram_mb = total_ram_mb and int(total_ram_mb)
-
     # If not in env, check config file.
     if n_threads is None:
-        n_threads = ilastik_config.getint("lazyflow", "threads")
-        if n_threads == -1:
-            n_threads = None
+        n_threads = ilastik_config.get("lazyflow", "threads")
+
+    # Convert str -> int, "auto" lets the request system probe for a good number of threads
+    n_threads = n_threads if n_threads == "auto" else int(n_threads)
+    if n_threads == -1:
+        n_threads = None
+    total_ram_mb = total_ram_mb and int(total_ram_mb)
+
     total_ram_mb = total_ram_mb or ilastik_config.getint("lazyflow", "total_ram_mb")
+    scheduler = scheduler or ilastik_config.get("lazyflow", "scheduler")
+    affinity = affinity or ilastik_config.get("lazyflow", "affinity")
+    cache_eviction = cache_eviction or ilastik_config.get("lazyflow", "cache_eviction")
+    spill_capacity_mb = spill_capacity_mb and int(spill_capacity_mb)
+    spill_capacity_mb = spill_capacity_mb or ilastik_config.getint("lazyflow", "spill_capacity_mb")
+    spill_directory = spill_directory or ilastik_config.get("lazyflow", "spill_directory") or None
 
     # Note that n_threads == 0 is valid and useful for debugging.
-    if (n_threads is not None) or total_ram_mb or status_interval_secs:
+    if (
+        (n_threads is not None)
+        or total_ram_mb
+        or status_interval_secs
+        or scheduler != "global-queue"
+        or affinity != "none"
+        or cache_eviction != "lru"
+        or spill_capacity_mb
+    ):
 
         def _configure_lazyflow_settings():
             import lazyflow
             import lazyflow.request
             from lazyflow.utility import Memory
-            from lazyflow.operators import cacheMemoryManager
+            from lazyflow.operators import cacheMemoryManager, cacheSpillStore
 
             if status_interval_secs:
                 memory_logger = logging.getLogger("lazyflow.operators.cacheMemoryManager")
                 memory_logger.setLevel(logging.DEBUG)
                 cacheMemoryManager.setRefreshInterval(status_interval_secs)
 
+            if cache_eviction != cacheMemoryManager.getEvictionPolicy():
+                logger.info(f"Using {cache_eviction} cache eviction policy.")
+                cacheMemoryManager.setEvictionPolicy(cache_eviction)
+
+            if spill_capacity_mb > 0:
+                cacheSpillStore.configure(spill_capacity_mb * 1024**2, spill_directory)
+
+            Request = lazyflow.request.Request
             if n_threads is not None:
-                logger.info(f"Resetting lazyflow thread pool with {n_threads} threads.")
-                lazyflow.request.Request.reset_thread_pool(n_threads)
+                logger.info(
+                    f"Resetting lazyflow thread pool with {n_threads} threads "
+                    f"({scheduler} scheduler, {affinity} affinity)."
+                )
+                Request.reset_thread_pool(n_threads, scheduler=scheduler, affinity=affinity)
+            elif scheduler != Request.thread_pool_scheduler or affinity != Request.thread_pool_affinity:
+                logger.info(f"Resetting lazyflow thread pool with {scheduler} scheduler, {affinity} affinity.")
+                Request.reset_thread_pool(scheduler=scheduler, affinity=affinity)
             if total_ram_mb > 0:
                 if total_ram_mb < 500:
                     raise Exception(
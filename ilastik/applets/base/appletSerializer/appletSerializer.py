@@ -86,6 +86,7 @@ class AppletSerializer(ABC):
         self.serialSlots = maybe(slots, [])
         self.operator = operator
         self._ignoreDirty = False
+        self._lazyLoad = False
 
     def isDirty(self):
         """Returns true if the current state of this item (in memory)
@@ -121,6 +122,17 @@ class AppletSerializer(ABC):
         for ss in self.serialSlots:
             ss.ignoreDirty = value
 
+    @property
+    def lazyLoad(self):
+        """Whether slots that support it only read their data when it is needed."""
+        return self._lazyLoad
+
+    @lazyLoad.setter
+    def lazyLoad(self, value):
+        self._lazyLoad = value
+        for ss in self.serialSlots:
+            ss.lazyLoad = value
+
     def progressIncrement(self, group=None):
         """Get the percentage progress for each slot.
 
@@ -18,11 +18,22 @@
 # on the ilastik web site at:
 #          http://ilastik.org/license.html
 ###############################################################################
+import logging
+import zlib
 from typing import Sequence, Tuple, Union
 
 import h5py
 import numpy
 
+try:
+    # Registers the Blosc filter with HDF5, so that blosc-compressed project data can be read
+    import hdf5plugin
+    from numcodecs import Blosc
+except ImportError:
+    hdf5plugin = None
+
+logger = logging.getLogger(__name__)
+
 
 def deleteIfPresent(parentGroup: h5py.Group, name: str) -> None:
     """Deletes parentGroup[name], if it exists."""
@@ -92,3 +103,69 @@ def deserialize_string_from_h5(ds: h5py.Dataset):
         data = data.tobytes()
 
     return data.decode()
+
+
+class BlockCompression:
+    """
+    Compresses blocks of project data before they are written, so that compression can run in parallel.
+
+    h5py only compresses in the (single) thread that writes. Instead, the blocks are compressed
+    here with the same codec as the dataset's HDF5 filter, and written as a single chunk via
+    write_direct_chunk. HDF5 decompresses them transparently when they are read.
+
+    :param name: "gzip", "blosc" (blosc with lz4, needs hdf5plugin) or "" for no compression
+    :param level: compression level (gzip: 1-9, blosc: 0-9)
+    """
+
+    # HDF5 chunks can't exceed 4 GiB; bigger blocks are written (and compressed) by h5py
+    MAX_CHUNK_BYTES = 2**32 - 1
+
+    def __init__(self, name: str = "", level: int = 1):
+        if name == "blosc" and hdf5plugin is None:
+            logger.warning("Blosc compression needs the hdf5plugin package, using gzip instead.")
+            name = "gzip"
+        if name not in ("", "gzip", "blosc"):
+            raise ValueError(f"Unknown compression: {name}")
+        self.name = name
+        self.level = level
+
+    @property
+    def dataset_options(self) -> dict:
+        if self.name == "gzip":
+            return {"compression": "gzip", "compression_opts": self.level}
+        if self.name == "blosc":
+            return dict(hdf5plugin.Blosc(cname="lz4", clevel=self.level, shuffle=hdf5plugin.Blosc.SHUFFLE))
+        return {}
+
+    def compress(self, data: numpy.ndarray):
+        """
+        Prepare data for `write` (thread-safe).
+        Returns the compressed chunk, or the data itself if h5py needs to compress it.
+        """
+        data = numpy.asarray(data)
+        if not self.name or data.ndim == 0 or data.size == 0 or data.nbytes > self.MAX_CHUNK_BYTES:
+            return data
+        data = numpy.ascontiguousarray(data)
+        if self.name == "gzip":
+            chunk = zlib.compress(data, self.level)
+        else:
+            chunk = Blosc(cname="lz4", clevel=self.level, shuffle=Blosc.SHUFFLE).encode(data)
+        return _CompressedChunk(chunk, data.shape, data.dtype)
+
+    def write(self, group: h5py.Group, name: str, data) -> h5py.Dataset:
+        """Create dataset `name` in `group` from the result of `compress`."""
+        if not isinstance(data, _CompressedChunk):
+            options = self.dataset_options if data.ndim and data.size else {}
+            return group.create_dataset(name, data=data, **options)
+        dataset = group.create_dataset(
+            name, shape=data.shape, dtype=data.dtype, chunks=data.shape, **self.dataset_options
+        )
+        dataset.id.write_direct_chunk((0,) * len(data.shape), data.chunk)
+        return dataset
+
+
+class _CompressedChunk:
+    def __init__(self, chunk: bytes, shape: Tuple[int, ...], dtype: numpy.dtype):
+        self.chunk = chunk
+        self.shape = shape
+        self.dtype = dtype
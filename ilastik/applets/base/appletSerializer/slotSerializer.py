@@ -18,6 +18,7 @@
 # on the ilastik web site at:
 #          http://ilastik.org/license.html
 ###############################################################################
+import itertools
 import json
 import logging
 import os
@@ -25,15 +26,20 @@ import pickle
 import re
 import tempfile
 import warnings
+from functools import partial
 from typing import Any, List, Optional, Tuple
 
 import h5py
 import numpy
 
 from ilastik import Project
+from ilastik.config import cfg as ilastik_config
 from ilastik.utility.maybe import maybe
+from lazyflow.operators.opCompressedCache import OpUnmanagedCompressedCache
 from lazyflow.operators.valueProviders import OpValueCache
+from lazyflow.request import Request
 from lazyflow.roi import roiToSlice, sliceToRoi
+from lazyflow.rtype import SubRegion
 from lazyflow.slot import InputSlot, OutputSlot, Slot
 from lazyflow.utility import timeLogged
 
@@ -43,6 +49,7 @@ from .legacyClassifiers import (
     deserialize_classifier_factory,
 )
 from .serializerUtils import (
+    BlockCompression,
     deleteIfPresent,
     slicingToString,
     stringToSlicing,
@@ -107,6 +114,8 @@ class SerialSlot:
         self._dirty: bool = False
         self._bind()
         self.ignoreDirty: bool = False
+        # Slots that support it only read their data when it is needed (see SerialBlockSlot)
+        self.lazyLoad: bool = False
 
     @property
     def dirty(self):
@@ -352,7 +361,24 @@ class SerialListSlot(SerialSlot):
 
 
 class SerialBlockSlot(SerialSlot):
-    """A slot which only saves nonzero blocks."""
+    """A slot which only saves nonzero blocks.
+
+    Saving is incremental: the parts of the slot that became dirty since the project file was last
+    saved (or loaded) are tracked, and only the blocks intersecting them are written again. Blocks
+    that aren't nonzero anymore are deleted. The blocks to write are fetched and compressed in
+    parallel, then written to the file one by one.
+
+    With lazyLoad, the blocks are only registered with the cache that receives them on
+    deserialization, and that cache reads each block from the project file when it is first
+    accessed (see OpUnmanagedCompressedCache.setLazyInputs).
+    """
+
+    #: Attribute of each saved block: the slicing of the nonzero block it belongs to
+    #: (the saved data may be shrunk to its bounding box, see shrink_to_bb)
+    SOURCE_SLICE_ATTR = "sourceBlockSlice"
+
+    #: More changed rois per lane are merged into their bounding box
+    MAX_CHANGED_ROIS = 1000
 
     def __init__(
         self,
@@ -371,15 +397,78 @@ class SerialBlockSlot(SerialSlot):
         :param blockslot: provides non-zero blocks.
         :param shrink_to_bb: If true, reduce each block of data from the slot to
                              its nonzero bounding box before feeding saving it.
+        :param compression_level: gzip level of the saved blocks (0: no compression).
+                                  Overridden by the "project_compression" setting of the ilastik config.
 
         """
         assert isinstance(slot, OutputSlot), "slot is of wrong type: '{}' is not an OutputSlot".format(slot.name)
+        # Changes since the last save (or load): rois per subslot, or everything
+        self._changed_rois = {}
+        self._rewrite_all = False
+        # The file that the saved blocks were last synchronized with
+        self._synced_file = None
         super().__init__(slot, inslot, name, subname, default, depends, selfdepends)
         self.blockslot = blockslot
         self._bind(slot)
         self._shrink_to_bb = shrink_to_bb
         self.compression_level = compression_level
 
+    @property
+    def dirty(self):
+        return self._dirty
+
+    @dirty.setter
+    def dirty(self, isDirty: bool):
+        # Unless we know which parts changed (see setDirty), all blocks have to be written again
+        if isDirty and not self.ignoreDirty:
+            self._rewrite_all = True
+        SerialSlot.dirty.fset(self, isDirty)
+
+    def setDirty(self, *args, **kwargs):
+        if self.ignoreDirty:
+            return
+        if len(args) == 2 and isinstance(args[1], SubRegion):
+            subslot, roi = args
+            rois = self._changed_rois.setdefault(subslot, [])
+            rois.append((tuple(map(int, roi.start)), tuple(map(int, roi.stop))))
+            if len(rois) > self.MAX_CHANGED_ROIS:
+                starts, stops = zip(*rois)
+                rois[:] = [(tuple(numpy.min(starts, axis=0)), tuple(numpy.max(stops, axis=0)))]
+            self._dirty = True
+        else:
+            self.dirty = True
+
+    def _forget_changes(self):
+        self._changed_rois = {}
+        self._rewrite_all = False
+
+    def _in_sync_with(self, group):
+        """Whether group holds the blocks of the last save, so that only the changes need to be written."""
+        return not self._rewrite_all and self.name in group and self._synced_file == group.file.filename
+
+    @staticmethod
+    def _block_slicing(block):
+        if not isinstance(block[0], slice):
+            return roiToSlice(*block)
+        return block
+
+    @staticmethod
+    def _block_key(slicing) -> str:
+        return slicingToString(slicing).decode("utf-8")
+
+    def _saved_blocks(self, subgroup):
+        """
+        The saved blocks as {block key: name}, or None if the blocks were saved without
+        their source slicing (by an older version).
+        """
+        saved = {}
+        for blockName, node in subgroup.items():
+            key = node.attrs.get(self.SOURCE_SLICE_ATTR)
+            if key is None:
+                return None
+            saved[key.decode("utf-8") if isinstance(key, bytes) else str(key)] = blockName
+        return saved
+
     def shouldSerialize(self, group):
         # Should this be a docstring?
         #
@@ -439,22 +528,21 @@ class SerialBlockSlot(SerialSlot):
             subgroup = mygroup[subname]
 
             nonZeroBlocks = self.blockslot[index].value
-            for blockIndex in range(len(nonZeroBlocks)):
-                blockName = "block{:04d}".format(blockIndex)
-
-                if blockName not in subgroup:
-                    logger.debug('Missing "' + blockName + '" from "' + repr(subgroup) + '". Should serialize.')
-                    return True
-                else:
-                    logger.debug(
-                        'Found "'
-                        + blockName
-                        + '" from "'
-                        + repr(subgroup)
-                        + '" belonging to BlockSlot "'
-                        + self.name
-                        + '".'
-                    )
+            saved = self._saved_blocks(subgroup)
+            if saved is None:
+                # Saved by an older version: blocks are named by their index
+                missing = [
+                    "block{:04d}".format(blockIndex)
+                    for blockIndex in range(len(nonZeroBlocks))
+                    if "block{:04d}".format(blockIndex) not in subgroup
+                ]
+            else:
+                missing = [
+                    key for key in map(self._block_key, map(self._block_slicing, nonZeroBlocks)) if key not in saved
+                ]
+            if missing:
+                logger.debug('Missing "' + str(missing[0]) + '" from "' + repr(subgroup) + '". Should serialize.')
+                return True
 
         logger.debug(
             'Everything belonging to BlockSlot "' + self.name + '" appears to be in order. Should not serialize.'
@@ -462,57 +550,138 @@ class SerialBlockSlot(SerialSlot):
 
         return False
 
+    def serialize(self, group):
+        if not self.shouldSerialize(group):
+            return
+        if not self.slot.ready() or not self._in_sync_with(group):
+            deleteIfPresent(group, self.name)
+        if self.slot.ready():
+            self._serialize(group, self.name, self.slot)
+        self._synced_file = group.file.filename
+        self._forget_changes()
+        self.dirty = False
+
+    def deserialize(self, group):
+        super().deserialize(group)
+        self._forget_changes()
+        self._synced_file = group.file.filename if self.name in group else None
+
+    def _compression(self, level):
+        name = ilastik_config.get("ilastik", "project_compression", fallback="")
+        if name == "blosc":
+            return BlockCompression("blosc", 5)
+        if name == "gzip":
+            return BlockCompression("gzip", level or 1)
+        return BlockCompression("gzip", level) if level else BlockCompression()
+
     @timeLogged(logger, logging.DEBUG)
     def _serialize(self, group, name, slot):
         logger.debug("Serializing BlockSlot: {}".format(self.name))
-        mygroup = group.create_group(name)
+        mygroup = group.require_group(name)
         num = len(self.blockslot)
-        compression_options = {}
-        if self.compression_level:
-            compression_options = {"compression_opts": self.compression_level, "compression": "gzip"}
-        for index in range(num):
-            subname = self.subname.format(index)
-            subgroup = mygroup.create_group(subname)
-            nonZeroBlocks = self.blockslot[index].value
-            for blockIndex, slicing in enumerate(nonZeroBlocks):
-                if not isinstance(slicing[0], slice):
-                    slicing = roiToSlice(*slicing)
-
-                block = self.slot[index][slicing].wait()
-                block_tags = self.slot[index].meta.axistags
-                blockName = "block{:04d}".format(blockIndex)
-
-                if self._shrink_to_bb:
-                    nonzero_coords = numpy.nonzero(block)
-                    if len(nonzero_coords[0]) > 0:
-                        block_start = sliceToRoi(slicing, [sl.stop for sl in slicing])[0]
-                        block_bounding_box_start = numpy.array(list(map(numpy.min, nonzero_coords)))
-                        block_bounding_box_stop = 1 + numpy.array(list(map(numpy.max, nonzero_coords)))
-                        block_slicing = roiToSlice(block_bounding_box_start, block_bounding_box_stop)
-                        bounding_box_roi = numpy.array([block_bounding_box_start, block_bounding_box_stop])
-                        bounding_box_roi += block_start
-
-                        # Overwrite the vars that are written to the file
-                        slicing = roiToSlice(*bounding_box_roi)
-                        block = block[block_slicing]
-
-                # If we have a masked array, convert it to a structured array so that h5py can handle it.
-                if slot[index].meta.has_mask:
-                    mygroup.attrs["meta.has_mask"] = True
-
-                    block_group = subgroup.create_group(blockName)
+        compression = self._compression(self.compression_level)
+        mask_compression = self._compression(2)
+
+        subnames = [self.subname.format(index) for index in range(num)]
+        for removed in set(mygroup.keys()) - set(subnames):
+            del mygroup[removed]
+
+        for index, subname in enumerate(subnames):
+            subgroup = mygroup.require_group(subname)
+            if slot[index].meta.has_mask:
+                mygroup.attrs["meta.has_mask"] = True
+
+            saved = self._saved_blocks(subgroup)
+            if saved is None:
+                for blockName in list(subgroup.keys()):
+                    del subgroup[blockName]
+                saved = {}
+
+            changed_rois = self._changed_rois.get(slot[index], [])
+            blocks = {}
+            for slicing in map(self._block_slicing, self.blockslot[index].value):
+                blocks[self._block_key(slicing)] = slicing
+            to_write = {
+                key: slicing
+                for key, slicing in blocks.items()
+                if key not in saved or self._intersects_any(slicing, changed_rois)
+            }
+            for key, blockName in saved.items():
+                if key not in blocks or key in to_write:
+                    del subgroup[blockName]
+            logger.debug(
+                "{}: writing {} of {} blocks, {} removed".format(
+                    subname, len(to_write), len(blocks), len(set(saved) - set(blocks))
+                )
+            )
 
-                    block_group.create_dataset("data", data=block.data, **compression_options)
+            existing = set(subgroup.keys())
+            blockNames = (n for n in map("block{:04d}".format, itertools.count()) if n not in existing)
+            self._write_blocks(
+                subgroup, slot[index], list(zip(blockNames, to_write.values())), compression, mask_compression
+            )
 
-                    block_group.create_dataset("mask", data=block.mask, compression="gzip", compression_opts=2)
-                    block_group.create_dataset("fill_value", data=block.fill_value)
+    @staticmethod
+    def _intersects_any(slicing, rois):
+        start = numpy.array([s.start for s in slicing])
+        stop = numpy.array([s.stop for s in slicing])
+        return any(numpy.all(start < roi_stop) and numpy.all(roi_start < stop) for roi_start, roi_stop in rois)
 
-                    block_group.attrs["blockSlice"] = slicingToString(slicing)
-                    block_group.attrs["axistags"] = block_tags.toJSON()
+    def _write_blocks(self, subgroup, slot, blocks, compression, mask_compression):
+        """
+        Fetch and compress the blocks in parallel, then write them.
+        Done in batches, so that only a few uncompressed blocks are held at a time.
+        """
+        block_tags = slot.meta.axistags.toJSON()
+        batch_size = max(1, 2 * Request.global_thread_pool.num_workers)
+        for batch_start in range(0, len(blocks), batch_size):
+            batch = blocks[batch_start : batch_start + batch_size]
+            requests = [
+                Request(partial(self._prepare_block, slot, sourceSlicing, compression, mask_compression))
+                for _, sourceSlicing in batch
+            ]
+            for request in requests:
+                request.submit()
+
+            # HDF5 can only be written from one thread
+            for (blockName, sourceSlicing), request in zip(batch, requests):
+                slicing, block = request.wait()
+                if slot.meta.has_mask:
+                    node = subgroup.create_group(blockName)
+                    compression.write(node, "data", block["data"])
+                    mask_compression.write(node, "mask", block["mask"])
+                    node.create_dataset("fill_value", data=block["fill_value"])
                 else:
-                    subgroup.create_dataset(blockName, data=block, **compression_options)
-                    subgroup[blockName].attrs["blockSlice"] = slicingToString(slicing)
-                    subgroup[blockName].attrs["axistags"] = block_tags.toJSON()
+                    node = compression.write(subgroup, blockName, block)
+                node.attrs["blockSlice"] = slicingToString(slicing)
+                node.attrs["axistags"] = block_tags
+                node.attrs[self.SOURCE_SLICE_ATTR] = slicingToString(sourceSlicing)
+
+    def _prepare_block(self, slot, slicing, compression, mask_compression):
+        block = slot[slicing].wait()
+
+        if self._shrink_to_bb:
+            nonzero_coords = numpy.nonzero(block)
+            if len(nonzero_coords[0]) > 0:
+                block_start = sliceToRoi(slicing, [sl.stop for sl in slicing])[0]
+                block_bounding_box_start = numpy.array(list(map(numpy.min, nonzero_coords)))
+                block_bounding_box_stop = 1 + numpy.array(list(map(numpy.max, nonzero_coords)))
+                block_slicing = roiToSlice(block_bounding_box_start, block_bounding_box_stop)
+                bounding_box_roi = numpy.array([block_bounding_box_start, block_bounding_box_stop])
+                bounding_box_roi += block_start
+
+                # Overwrite the vars that are written to the file
+                slicing = roiToSlice(*bounding_box_roi)
+                block = block[block_slicing]
+
+        # If we have a masked array, save its pieces separately so that h5py can handle it.
+        if slot.meta.has_mask:
+            return slicing, {
+                "data": compression.compress(block.data),
+                "mask": mask_compression.compress(block.mask),
+                "fill_value": block.fill_value,
+            }
+        return slicing, compression.compress(block)
 
     def reshape_datablock_and_slicing_for_input(
         self, block: numpy.ndarray, slicing: List[slice], slot: Slot, project: Project
@@ -521,6 +690,39 @@ class SerialBlockSlot(SerialSlot):
         adequate for deserialization (in), i.e., the shape expected by the slot being deserialized"""
         return block, slicing
 
+    def _lazy_load_supported(self, project: Project) -> bool:
+        """Whether the saved blocks can be loaded as they are, without reshape_datablock_and_slicing_for_input"""
+        return True
+
+    def _lazy_target(self, slot: Slot, project: Project) -> Optional[OpUnmanagedCompressedCache]:
+        """The cache that receives the data written to slot, if it can take the blocks lazily."""
+        if not self.lazyLoad or not self._lazy_load_supported(project):
+            return None
+        targets = []
+        pending = [slot]
+        while pending:
+            s = pending.pop()
+            if isinstance(s.operator, OpUnmanagedCompressedCache) and s.top_level_slot is s.operator.Input:
+                targets.append(s.operator)
+            else:
+                pending.extend(s.downstream_slots)
+        if len(targets) != 1 or not targets[0].Output.ready():
+            return None
+        return targets[0]
+
+    @staticmethod
+    def _read_block(blockData, has_mask: bool):
+        # If it is suppose to be a masked array,
+        # deserialize the pieces and rebuild the masked array.
+        if has_mask:
+            return numpy.ma.masked_array(
+                blockData["data"][()],
+                mask=blockData["mask"][()],
+                fill_value=blockData["fill_value"][()],
+                shrink=False,
+            )
+        return blockData[...]
+
     @timeLogged(logger, logging.DEBUG)
     def _deserialize(self, mygroup, slot):
         logger.debug("Deserializing BlockSlot: {}".format(self.name))
@@ -537,11 +739,11 @@ class SerialBlockSlot(SerialSlot):
 
         for index, t in enumerate(sorted(list(mygroup.items()), key=lambda k_v: extract_index(k_v[0]))):
             groupName, labelGroup = t
+            target = self._lazy_target(self.inslot[index], Project(mygroup.file))
+            lazy_inputs = {}
             for blockData in list(labelGroup.values()):
                 slicing = stringToSlicing(blockData.attrs["blockSlice"])
 
-                # If it is suppose to be a masked array,
-                # deserialize the pieces and rebuild the masked array.
                 assert slot[index].meta.has_mask == mygroup.attrs.get("meta.has_mask"), (
                     "The slot and stored data have different values for"
                     + " `has_mask`. They are"
@@ -552,21 +754,23 @@ class SerialBlockSlot(SerialSlot):
                     + repr(mygroup.attrs.get("meta.has_mask", False))
                     + ". Please fix this to proceed with deserialization."
                 )
-                if slot[index].meta.has_mask:
-                    blockArray = numpy.ma.masked_array(
-                        blockData["data"][()],
-                        mask=blockData["mask"][()],
-                        fill_value=blockData["fill_value"][()],
-                        shrink=False,
+                if target is not None:
+                    start, stop = sliceToRoi(slicing, target.Input.meta.shape)
+                    lazy_inputs[(tuple(start), tuple(stop))] = partial(
+                        self._read_block, blockData, slot[index].meta.has_mask
                     )
-                else:
-                    blockArray = blockData[...]
+                    continue
 
+                blockArray = self._read_block(blockData, slot[index].meta.has_mask)
                 blockArray, slicing = self.reshape_datablock_and_slicing_for_input(
                     blockArray, slicing, self.inslot[index], Project(mygroup.file)
                 )
                 self.inslot[index][slicing] = blockArray
 
+            if target is not None:
+                logger.debug("{}: {} blocks will be loaded on demand".format(groupName, len(lazy_inputs)))
+                target.setLazyInputs(lazy_inputs)
+
 
 class SerialClassifierSlot(SerialSlot):
     """For saving a classifier.  Here we assume the classifier is stored in the ."""
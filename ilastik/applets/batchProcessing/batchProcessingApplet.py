@@ -56,6 +56,23 @@ class BatchProcessingApplet(Applet):
             help="Distributed mode. Used for running ilastik on HPCs via SLURM/srun/mpirun",
             action="store_true",
         )
+        parser.add_argument(
+            "--distributed_backend",
+            "--distributed-backend",
+            help=(
+                "How the processes of distributed mode are started: 'mpi' if ilastik was launched via mpirun/srun, "
+                "'local' to have ilastik launch worker processes on this machine by itself"
+            ),
+            choices=["mpi", "local"],
+            default="mpi",
+        )
+        parser.add_argument(
+            "--distributed_workers",
+            "--distributed-workers",
+            help="Number of worker processes for --distributed-backend=local (default: one per CPU core)",
+            type=int,
+            default=None,
+        )
 
         default_block_roi = Slice5D.all(x=slice(0, 256), y=slice(0, 256), z=slice(0, 256), t=slice(0, 1))
 
@@ -100,7 +117,12 @@ class BatchProcessingApplet(Applet):
     def run_export_from_parsed_args(self, parsed_args: argparse.Namespace):
         "Run the export for each dataset listed in parsed_args as interpreted by DataSelectionApplet."
         if parsed_args.distributed:
-            export_function = partial(self.do_distributed_export, block_roi=parsed_args.distributed_block_roi)
+            export_function = partial(
+                self.do_distributed_export,
+                block_roi=parsed_args.distributed_block_roi,
+                backend=parsed_args.distributed_backend,
+                num_workers=parsed_args.distributed_workers,
+            )
         else:
             export_function = self.do_normal_export
 
@@ -181,9 +203,11 @@ class BatchProcessingApplet(Applet):
         logger.info("Exporting to in-memory array.")
         return opDataExport.run_export_to_array()
 
-    def do_distributed_export(self, opDataExport, *, block_roi: Slice5D):
-        logger.info("Running ilastik distributed...")
-        return opDataExport.run_distributed_export(block_roi=block_roi)
+    def do_distributed_export(
+        self, opDataExport, *, block_roi: Slice5D, backend: str = "mpi", num_workers: Optional[int] = None
+    ):
+        logger.info(f"Running ilastik distributed ({backend})...")
+        return opDataExport.run_distributed_export(block_roi=block_roi, backend=backend, num_workers=num_workers)
 
     def export_dataset(
         self,
@@ -27,6 +27,8 @@ from typing import Union
 
 import numpy
 
+from lazyflow.utility.io_util.exportManifest import EXPORT_MODES
+
 from ilastik.applets.base.applet import Applet
 from ilastik.utility import OpMultiLaneWrapper
 from ilastik.utility.commandLineProcessing import ParseListFromString
@@ -166,6 +168,17 @@ class DataExportApplet(Applet):
         )
 
         arg_parser.add_argument("--table_only", help="Export only csv/HDF5 table.", action="store_true", default=False)
+        arg_parser.add_argument(
+            "--export_mode",
+            help=(
+                "What to do if the export target exists already (hdf5, n5 and OME-Zarr only): "
+                "new: replace it (hdf5, n5) or abort (OME-Zarr); "
+                "resume: continue an interrupted export, skipping data that was written completely; "
+                "append time/append channels: add the exported image to the existing data along t/c."
+            ),
+            choices=EXPORT_MODES,
+            required=False,
+        )
 
         return arg_parser
 
@@ -322,5 +335,8 @@ class DataExportApplet(Applet):
         if parsed_args.table_only:
             opDataExport.TableOnly.setValue(True)
 
+        if parsed_args.export_mode:
+            opDataExport.ExportMode.setValue(parsed_args.export_mode)
+
         # Re-connect the 'transaction' slot to apply all settings at once.
         opDataExport.TransactionSlot.setValue(True)
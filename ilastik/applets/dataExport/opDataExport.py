@@ -21,6 +21,7 @@
 import os
 import collections
 import numpy
+from typing import Optional
 from ndstructs import Slice5D
 
 from ilastik.config import cfg
@@ -94,6 +95,7 @@ class OpDataExport(Operator):
     )  # A format string allowing {dataset_dir} {nickname}, {roi}, {x_start}, {x_stop}, etc.
     OutputInternalPath = InputSlot(value="exported_data")
     OutputFormat = InputSlot(value=cfg["ilastik"]["output_format"])
+    ExportMode = InputSlot(value="new")  # Replace, resume or append to existing exports (see OpExportSlot.ExportMode)
 
     # Only export csv/HDF5 table (don't export volume)
     TableOnlyName = InputSlot(value="Table-Only")
@@ -148,6 +150,7 @@ class OpDataExport(Operator):
         opFormattedExport.ExportDtype.connect(self.ExportDtype)
         opFormattedExport.OutputAxisOrder.connect(self.OutputAxisOrder)
         opFormattedExport.OutputFormat.connect(self.OutputFormat)
+        opFormattedExport.ExportMode.connect(self.ExportMode)
 
         self.ConvertedImage.connect(opFormattedExport.ConvertedImage)
         self.ImageToExport.connect(opFormattedExport.ImageToExport)
@@ -253,8 +256,8 @@ class OpDataExport(Operator):
         # (Typically used from pure-python clients in batch mode.)
         return self._opFormattedExport.run_export_to_array()
 
-    def run_distributed_export(self, block_roi: Slice5D):
-        return self._opFormattedExport.run_distributed_export(block_roi)
+    def run_distributed_export(self, block_roi: Slice5D, backend: str = "mpi", num_workers: Optional[int] = None):
+        return self._opFormattedExport.run_distributed_export(block_roi, backend, num_workers)
 
 
 class OpRawSubRegionHelper(Operator):
@@ -31,6 +31,7 @@ from lazyflow.operators import OpPixelFeaturesPresmoothed
 from lazyflow.operators import OpReorderAxes
 from lazyflow.operatorWrapper import OperatorWrapper
 
+from ilastik.config import cfg as ilastik_config
 from ilastik.applets.featureSelection import FeatureSelectionConstraintError
 
 logger = logging.getLogger(__name__)
@@ -110,6 +111,10 @@ class OpFeatureSelectionNoCache(Operator):
         self.opPixelFeatures.FeatureIds.connect(self.FeatureIds)
         self.opPixelFeatures.SelectionMatrix.connect(self.SelectionMatrix)
         self.opPixelFeatures.ComputeIn2d.connect(self.ComputeIn2d)
+        self.opPixelFeatures.CascadedPresmoothing.setValue(
+            ilastik_config.getboolean("lazyflow", "cascaded_presmoothing")
+        )
+        self.opPixelFeatures.CachePresmoothing.setValue(ilastik_config.getboolean("lazyflow", "cache_presmoothing"))
         self.opReorderIn = OpReorderAxes(parent=self)
         self.opReorderIn.AxisOrder.setValue("tczyx")
         self.opReorderIn.Input.connect(self.InputImage)
@@ -48,7 +48,7 @@ from lazyflow.utility.data_semantics import ImageTypes
 import ilastik_feature_selection
 import numpy as np
 
-from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory, IncrementalTrainingSettings
 
 # ilastik
 from ilastik.applets.base.applet import DatasetConstraintError
@@ -84,6 +84,8 @@ class OpPixelClassification(Operator):
 
     FreezePredictions = InputSlot(stype="bool")
     ClassifierFactory = InputSlot(value=ParallelVigraRfLazyflowClassifierFactory(100))
+    # dtype of the probability maps (and their caches and exports), one of classifierOperators.PMAPS_DTYPES
+    PMapsDtype = InputSlot(value="float32")
 
     PredictionsFromDisk = InputSlot(optional=True, level=1)
 
@@ -133,6 +135,14 @@ class OpPixelClassification(Operator):
         self.PmapColors.meta.dtype = object
         self.PmapColors.meta.shape = (1,)
 
+        # In live update mode, keep most of the forest when only a few labels were added (e.g. a stroke).
+        # Otherwise every training starts from scratch.
+        live_update = not self.FreezePredictions.value
+        if live_update and not self.opTrain.IncrementalTraining.ready():
+            self.opTrain.IncrementalTraining.setValue(IncrementalTrainingSettings())
+        elif not live_update and self.opTrain.IncrementalTraining.ready():
+            self.opTrain.IncrementalTraining.disconnect()
+
     def __init__(self, *args, **kwargs):
         """
         Instantiate all internal operators and connect them together.
@@ -163,6 +173,7 @@ class OpPixelClassification(Operator):
         self.opTrain.Labels.connect(self.opLabelPipeline.Output)
         self.opTrain.Images.connect(self.FeatureImages)
         self.opTrain.nonzeroLabelBlocks.connect(self.opLabelPipeline.nonzeroBlocks)
+        # IncrementalTraining is only given in live update mode (see setupOutputs)
 
         # Hook up the Classifier Cache
         # The classifier is cached here to allow serializers to force in
@@ -180,6 +191,7 @@ class OpPixelClassification(Operator):
         self.opPredictionPipeline.CachedFeatureImages.connect(self.CachedFeatureImages)
         self.opPredictionPipeline.Classifier.connect(self.classifier_cache.Output)
         self.opPredictionPipeline.FreezePredictions.connect(self.FreezePredictions)
+        self.opPredictionPipeline.PMapsDtype.connect(self.PMapsDtype)
         self.opPredictionPipeline.PredictionsFromDisk.connect(self.PredictionsFromDisk)
         self.opPredictionPipeline.PredictionMask.connect(self.PredictionMasks)
 
@@ -456,6 +468,16 @@ class OpLabelPipeline(Operator):
         pass
 
 
+def probabilities_as_uint8(probabilities):
+    """
+    Probabilities (0.0 to 1.0) as 0 to 255 uint8.
+    Integer input is taken to be quantized already (as with a uint8 PMapsDtype) and only cast.
+    """
+    if numpy.issubdtype(probabilities.dtype, numpy.integer):
+        return probabilities.astype(numpy.uint8)
+    return (255 * probabilities).astype(numpy.uint8)
+
+
 class OpPredictionPipelineNoCache(Operator):
     """
     This contains only the cacheless parts of the prediction pipeline, for easy use in headless workflows.
@@ -466,8 +488,9 @@ class OpPredictionPipelineNoCache(Operator):
     Classifier = InputSlot()
     PredictionsFromDisk = InputSlot(optional=True)
     NumClasses = InputSlot()
+    PMapsDtype = InputSlot(value="float32")
 
-    HeadlessPredictionProbabilities = OutputSlot()  # drange is 0.0 to 1.0
+    HeadlessPredictionProbabilities = OutputSlot()  # drange is 0.0 to 1.0 (0 to 255 for uint8 PMapsDtype)
     HeadlessUint8PredictionProbabilities = OutputSlot()  # drange 0 to 255
     SimpleSegmentation = OutputSlot()
     HeadlessUncertaintyEstimate = OutputSlot()
@@ -484,13 +507,14 @@ class OpPredictionPipelineNoCache(Operator):
         self.cacheless_predict.Image.connect(self.FeatureImages)  # <--- Not from cache
         self.cacheless_predict.LabelsCount.connect(self.NumClasses)
         self.cacheless_predict.PredictionMask.connect(self.PredictionMask)
+        self.cacheless_predict.PMapsDtype.connect(self.PMapsDtype)
         self.HeadlessPredictionProbabilities.connect(self.cacheless_predict.PMaps)
 
         # Alternate headless output: uint8 instead of float.
         # Note that drange is automatically updated.
         self.opConvertToUint8 = OpPixelOperator(parent=self)
         self.opConvertToUint8.Input.connect(self.cacheless_predict.PMaps)
-        self.opConvertToUint8.Function.setValue(lambda a: (255 * a).astype(numpy.uint8))
+        self.opConvertToUint8.Function.setValue(probabilities_as_uint8)
         self.HeadlessUint8PredictionProbabilities.connect(self.opConvertToUint8.Output)
 
         self.opArgmaxChannel = OpArgmaxChannel(parent=self)
@@ -576,6 +600,7 @@ class OpPredictionPipeline(OpPredictionPipelineNoCache):
         self.predict.Classifier.connect(self.Classifier)
         self.predict.Image.connect(self.CachedFeatureImages)
         self.predict.PredictionMask.connect(self.PredictionMask)
+        self.predict.PMapsDtype.connect(self.PMapsDtype)
         self.predict.LabelsCount.connect(self.NumClasses)
         self.PredictionProbabilities.connect(self.predict.PMaps)
 
@@ -621,7 +646,9 @@ class OpPredictionPipeline(OpPredictionPipelineNoCache):
     def setupOutputs(self):
         input_dtype = self.InputImage.meta.dtype
 
-        fun_convert = DtypeConvertFunction(input_dtype)
+        # quantized (uint8) probabilities range from 0 to 255
+        pmaps_max = 255 if numpy.dtype(self.PMapsDtype.value) == numpy.uint8 else 1.0
+        fun_convert = DtypeConvertFunction(input_dtype, source_max=pmaps_max)
 
         self.opConvertPMapsToInputPixelType.Function.setValue(fun_convert)
         # Set the blockshapes for each input image separately, depending on which axistags it has.
@@ -683,7 +710,11 @@ class OpEnsembleMargin(Operator):
         # Subtract from 1 to make this an "uncertainty" measure, not a "certainty" measure
         # e.g. predictions of .99 and .01 -> low uncertainty (0.98)
         # e.g. predictions of .51 and .49 -> high uncertainty (0.02)
-        result[...] = 1 - res
+        # (for quantized predictions, 255 takes the role of 1)
+        if numpy.issubdtype(self.Input.meta.dtype, numpy.integer):
+            result[...] = numpy.iinfo(self.Input.meta.dtype).max - res
+        else:
+            result[...] = 1 - res
         return result
 
     def propagateDirty(self, inputSlot, subindex, roi):
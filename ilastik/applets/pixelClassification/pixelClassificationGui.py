@@ -667,7 +667,9 @@ class PixelClassificationGui(LabelingGui):
         uncertaintySlot = self.topLevelOperatorView.UncertaintyEstimate
         if uncertaintySlot.ready():
             uncertaintySrc = createDataSource(uncertaintySlot)
-            uncertaintyLayer = AlphaModulatedLayer(uncertaintySrc, tintColor=QColor(Qt.cyan), normalize=(0.0, 1.0))
+            uncertaintyLayer = AlphaModulatedLayer(
+                uncertaintySrc, tintColor=QColor(Qt.cyan), normalize=uncertaintySlot.meta.drange or (0.0, 1.0)
+            )
             uncertaintyLayer.name = "Uncertainty"
             uncertaintyLayer.visible = False
             uncertaintyLayer.opacity = 1.0
@@ -738,7 +740,10 @@ class PixelClassificationGui(LabelingGui):
             if predictionSlot.ready() and channel < len(labels):
                 ref_label = labels[channel]
                 predictsrc = createDataSource(predictionSlot)
-                predictLayer = AlphaModulatedLayer(predictsrc, tintColor=ref_label.pmapColor(), normalize=(0.0, 1.0))
+                # (0, 255) for quantized probabilities
+                predictLayer = AlphaModulatedLayer(
+                    predictsrc, tintColor=ref_label.pmapColor(), normalize=predictionSlot.meta.drange or (0.0, 1.0)
+                )
                 predictLayer.opacity = 0.25
                 predictLayer.visible = self.labelingDrawerUi.liveUpdateButton.isChecked()
                 predictLayer.visibleChanged.connect(self.updateShowPredictionCheckbox)
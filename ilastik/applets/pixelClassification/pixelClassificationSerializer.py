@@ -30,6 +30,7 @@ from ilastik.applets.base.appletSerializer import (
     SerialListSlot,
     SerialClassifierFactorySlot,
     SerialPickleableSlot,
+    SerialSlot,
 )
 from lazyflow.slot import OutputSlot
 from typing import List, Tuple
@@ -94,6 +95,9 @@ class BackwardsCompatibleLabelSerialBlockSlot(SerialBlockSlot):
 
         return fixed_block, fixed_slicing
 
+    def _lazy_load_supported(self, project: Project) -> bool:
+        return not self.deserialization_requires_data_conversion(project)
+
     def deserialize(self, group):
         super().deserialize(group)
         if self.deserialization_requires_data_conversion(Project(group.file)):
@@ -128,6 +132,7 @@ class PixelClassificationSerializer(AppletSerializer):
             ),
             SerialClassifierFactorySlot(operator.ClassifierFactory),
             self._serialClassifierSlot,
+            SerialSlot(operator.PMapsDtype),
         ]
 
         super(PixelClassificationSerializer, self).__init__(projectFileGroupName, slots, operator)
@@ -42,6 +42,12 @@ Example:
 debug: false
 plugin_directories: ~/.ilastik/plugins,
 logging_config: ~/custom_ilastik_logging_config.json
+# compression of label (and other block) data in project files:
+# empty (as chosen per applet), gzip, or blosc (fast, needs hdf5plugin)
+project_compression: blosc
+# read label (and other block) data from project files only when it is needed:
+# headless (only in headless mode), true, or false
+lazy_project_loading: true
 """
 
 default_config = """
@@ -50,10 +56,19 @@ debug: false
 plugin_directories: ~/.ilastik/plugins,
 output_filename_format: {dataset_dir}/{nickname}_{result_type}
 output_format: compressed hdf5
+project_compression:
+lazy_project_loading: headless
 
 [lazyflow]
 threads: -1
 total_ram_mb: 0
+scheduler: global-queue
+affinity: none
+cascaded_presmoothing: false
+cache_presmoothing: false
+cache_eviction: lru
+spill_capacity_mb: 0
+spill_directory:
 """
 
 
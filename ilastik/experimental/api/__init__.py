@@ -21,3 +21,4 @@
 from ._pipelines import AutocontextPipeline as AutocontextPipeline
 from ._pipelines import PixelClassificationPipeline as PixelClassificationPipeline
 from ._pipelines import from_project_file as from_project_file
+from ._pool import PipelinePool as PipelinePool
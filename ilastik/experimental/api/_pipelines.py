@@ -19,20 +19,30 @@
 #          http://ilastik.org/license.html
 ###############################################################################
 # pyright: strict
+import collections
 import warnings
-from typing import Literal, Union
+from typing import Any, Deque, Dict, Iterator, Literal, Optional, Sequence, Tuple, Union
 
 import h5py
+import numpy
 import vigra
 import xarray
 
 from ilastik.applets.featureSelection.opFeatureSelection import OpFeatureSelection
 from ilastik.experimental import parser
 from ilastik.utility.slottools import DtypeConvertFunction
-from lazyflow.graph import Graph
+from lazyflow.graph import Graph, InputSlot, Operator, OutputSlot
 from lazyflow.operators import OpReorderAxes
 from lazyflow.operators.classifierOperators import OpClassifierPredict
 from lazyflow.operators.generic import OpMultiArrayStacker, OpPixelOperator
+from lazyflow.request import Request
+from lazyflow.roi import getBlockBounds, getIntersectingBlocks, roiToSlice
+from lazyflow.utility.bigRequestStreamer import determine_request_blockshape
+
+ArrayLike = Any
+"""Anything with ``shape``, ``dtype`` and numpy-style ``__getitem__``, e.g. zarr, h5py or dask arrays"""
+
+Block = Tuple[Tuple[slice, ...], xarray.DataArray]
 
 
 class PixelClassificationPipeline:
@@ -67,8 +77,25 @@ class PixelClassificationPipeline:
 
     prob_maps = pipeline.get_probabilities(img)
     ```
+
+    Example processing a large dataset block by block, without loading it into memory:
+    ```Python
+    import h5py
+    import zarr
+    from ilastik.experimental.api import PixelClassificationPipeline
+
+    pipeline = PixelClassificationPipeline.from_ilp_file("<path/to/project.ilp>")
+
+    with h5py.File("<path/to/image-file.h5>", "r") as f:
+        img = f["<dataset>"]
+        shape = pipeline.get_probabilities_shape(img, axes="zyx")
+        out = zarr.open("<path/to/output.zarr>", mode="w", shape=tuple(shape.values()), dtype="float32")
+        pipeline.write_probabilities(img, out, axes="zyx")
+    ```
     """
 
+    project_type = parser.PixelClassificationProject
+
     @classmethod
     def from_ilp_file(cls, path: str) -> "PixelClassificationPipeline":
         """
@@ -81,7 +108,7 @@ class PixelClassificationPipeline:
             PixelClassificationPipeline instance configured with trained classifier
         """
         with h5py.File(path, "r") as f:
-            project = parser.PixelClassificationProject.model_validate(f)
+            project = cls.project_type.model_validate(f)
 
         return cls(project)
 
@@ -90,7 +117,9 @@ class PixelClassificationPipeline:
         self._num_channels = project.input_data.num_channels
 
         graph = Graph()
+        self._source_op = _OpArrayLikeSource(graph=graph)
         self._reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
+        self._reorder_op.Input.connect(self._source_op.Output)
 
         self._feature_sel_op = OpFeatureSelection(graph=graph)
         self._feature_sel_op.InputImage.connect(self._reorder_op.Output)
@@ -120,24 +149,73 @@ class PixelClassificationPipeline:
             raw_data: image with same dimensionality as in the trained project file
         """
         raw_data = as_vigra_array(raw_data)
-        num_channels_in_data = raw_data.channels
-        if num_channels_in_data != self._num_channels:
-            raise ValueError(
-                f"Number of channels mismatch. Classifier trained for {self._num_channels} but input has {num_channels_in_data}"
-            )
-
-        num_spatial_in_data = sum(a.isSpatial() for a in raw_data.axistags)
-        if num_spatial_in_data != self._num_spatial_dims:
-            raise ValueError(
-                "Number of spatial dims doesn't match. "
-                f"Classifier trained for {self._num_spatial_dims} but input has {num_spatial_in_data}"
-            )
-
-        self._reorder_op.Input.setValue(raw_data)
+        self._set_input(raw_data, "".join(raw_data.axistags.keys()))
 
         probabilities = self._predict_op.PMaps.value[...]
         return xarray.DataArray(probabilities, dims=tuple(self._predict_op.PMaps.meta.axistags.keys()))
 
+    def get_probabilities_shape(self, raw_data: ArrayLike, axes: Optional[str] = None) -> Dict[str, int]:
+        """
+        Get the shape of the probability map for the given input, without computing it.
+
+        Args:
+            raw_data: image or lazy array with same dimensionality as in the trained project file
+            axes: axis keys of raw_data, required unless raw_data is a VigraArray or xarray.DataArray
+
+        Returns:
+            mapping from axis key to size, in the axis order of the probability map
+        """
+        self._set_input(*as_lazy_array(raw_data, axes))
+        return dict(self._predict_op.PMaps.meta.getTaggedShape())
+
+    def iter_probabilities(
+        self,
+        raw_data: ArrayLike,
+        axes: Optional[str] = None,
+        block_shape: Optional[Sequence[int]] = None,
+    ) -> Iterator[Block]:
+        """
+        Compute the pixel probability map block by block.
+
+        Only the input needed for the blocks currently being computed is read from raw_data,
+        so this works for datasets that don't fit into memory.
+        Blocks are computed in parallel and yielded in order.
+
+        Args:
+            raw_data: image or lazy array with same dimensionality as in the trained project file
+            axes: axis keys of raw_data, required unless raw_data is a VigraArray or xarray.DataArray
+            block_shape: shape of the computed blocks in the axis order of the probability map.
+              By default, the block shape is chosen based on the estimated RAM usage of the pipeline.
+
+        Yields:
+            (slicing, block) tuples, where slicing is the position of block in the full probability map
+        """
+        self._set_input(*as_lazy_array(raw_data, axes))
+        return _iter_blocks(self._predict_op.PMaps, block_shape)
+
+    def write_probabilities(
+        self,
+        raw_data: ArrayLike,
+        out: ArrayLike,
+        axes: Optional[str] = None,
+        block_shape: Optional[Sequence[int]] = None,
+    ) -> None:
+        """
+        Compute the pixel probability map block by block and write it to out.
+
+        Args:
+            raw_data: image or lazy array with same dimensionality as in the trained project file
+            out: array supporting numpy-style assignment (e.g. zarr or h5py dataset),
+              with the shape returned by `get_probabilities_shape`
+            axes: axis keys of raw_data, required unless raw_data is a VigraArray or xarray.DataArray
+            block_shape: see `iter_probabilities`
+        """
+        _write_blocks(self.iter_probabilities(raw_data, axes, block_shape), out, self._predict_op.PMaps)
+
+    def _set_input(self, raw_data: ArrayLike, axes: str):
+        _check_input(axes, raw_data.shape, self._num_channels, self._num_spatial_dims)
+        self._source_op.set_array(raw_data, axes)
+
 
 class AutocontextPipeline:
     """
@@ -156,8 +234,12 @@ class AutocontextPipeline:
     prob_maps = pipeline.get_probabilities_stage_2(img)
     ```
 
+    Large datasets can be processed block by block with `iter_probabilities` and `write_probabilities`,
+    see `PixelClassificationPipeline`.
     """
 
+    project_type = parser.AutocontextProject
+
     @classmethod
     def from_ilp_file(cls, path: str) -> "AutocontextPipeline":
         """
@@ -170,7 +252,7 @@ class AutocontextPipeline:
             AutocontextPipeline instance configured with trained classifier
         """
         with h5py.File(path, "r") as f:
-            project = parser.AutocontextProject.model_validate(f)
+            project = cls.project_type.model_validate(f)
 
         return cls(project)
 
@@ -179,7 +261,9 @@ class AutocontextPipeline:
         self._num_channels = project.input_data.num_channels
 
         graph = Graph()
+        self._source_op = _OpArrayLikeSource(graph=graph)
         self._reorder_op = OpReorderAxes(graph=graph, AxisOrder=ensure_channel_axis(project.input_data.axis_order))
+        self._reorder_op.Input.connect(self._source_op.Output)
 
         self._feature_sel_op_stage1 = OpFeatureSelection(graph=graph)
         self._feature_sel_op_stage1.InputImage.connect(self._reorder_op.Output)
@@ -218,39 +302,42 @@ class AutocontextPipeline:
         self._predict_op_stage2.Image.connect(self._feature_sel_op_stage2.OutputImage)
         self._predict_op_stage2.LabelsCount.setValue(project.classifier_stage2.label_count)
 
-    def _get_probabilities(self, raw_data: Union[vigra.VigraArray, xarray.DataArray], stage: Literal[1, 2]):
-        raw_data = as_vigra_array(raw_data)
-        num_channels_in_data = raw_data.channels
-
+    def _set_input(self, raw_data: ArrayLike, axes: str):
         fun_convert = DtypeConvertFunction(raw_data.dtype)
 
         if self._opConvertPMapsToInputPixelType.Function.value != fun_convert:
             self._opConvertPMapsToInputPixelType.Function.setValue(fun_convert)
 
-        if num_channels_in_data != self._num_channels:
-            raise ValueError(
-                f"Number of channels mismatch. Classifier trained for {self._num_channels} but input has {num_channels_in_data}"
-            )
-
-        num_spatial_in_data = sum(a.isSpatial() for a in raw_data.axistags)
-        if num_spatial_in_data != self._num_spatial_dims:
-            raise ValueError(
-                "Number of spatial dims doesn't match. "
-                f"Classifier trained for {self._num_spatial_dims} but input has {num_spatial_in_data}"
-            )
-
-        self._reorder_op.Input.setValue(raw_data)
+        _check_input(axes, raw_data.shape, self._num_channels, self._num_spatial_dims)
+        self._source_op.set_array(raw_data, axes)
 
+    def _get_predict_op(self, stage: Literal[1, 2]) -> OpClassifierPredict:
         if stage == 1:
-            predict_op = self._predict_op_stage1
+            return self._predict_op_stage1
         elif stage == 2:
-            predict_op = self._predict_op_stage2
+            return self._predict_op_stage2
         else:
             raise ValueError(f"Invalid argument {stage=}. There are only stage 1 and 2.")
 
+    def _get_probabilities(self, raw_data: Union[vigra.VigraArray, xarray.DataArray], stage: Literal[1, 2]):
+        raw_data = as_vigra_array(raw_data)
+        self._set_input(raw_data, "".join(raw_data.axistags.keys()))
+        predict_op = self._get_predict_op(stage)
+
         probabilities = predict_op.PMaps.value[...]
         return xarray.DataArray(probabilities, dims=tuple(predict_op.PMaps.meta.axistags.keys()))
 
+    def get_probabilities(
+        self, raw_data: Union[vigra.VigraArray, xarray.DataArray], stage: Literal[1, 2] = 2
+    ) -> xarray.DataArray:
+        """
+        Get pixel probability map of the given stage from pipeline.
+
+        Args:
+            raw_data: image with same dimensionality as in the trained project file
+        """
+        return self._get_probabilities(raw_data, stage=stage)
+
     def get_probabilities_stage_1(self, raw_data: Union[vigra.VigraArray, xarray.DataArray]) -> xarray.DataArray:
         """
         Get pixel probability map from pipeline.
@@ -269,6 +356,142 @@ class AutocontextPipeline:
         """
         return self._get_probabilities(raw_data, stage=2)
 
+    def get_probabilities_shape(
+        self, raw_data: ArrayLike, axes: Optional[str] = None, stage: Literal[1, 2] = 2
+    ) -> Dict[str, int]:
+        """
+        Get the shape of the probability map of the given stage, without computing it.
+
+        See `PixelClassificationPipeline.get_probabilities_shape`.
+        """
+        self._set_input(*as_lazy_array(raw_data, axes))
+        return dict(self._get_predict_op(stage).PMaps.meta.getTaggedShape())
+
+    def iter_probabilities(
+        self,
+        raw_data: ArrayLike,
+        axes: Optional[str] = None,
+        block_shape: Optional[Sequence[int]] = None,
+        stage: Literal[1, 2] = 2,
+    ) -> Iterator[Block]:
+        """
+        Compute the pixel probability map of the given stage block by block.
+
+        See `PixelClassificationPipeline.iter_probabilities`.
+        """
+        self._set_input(*as_lazy_array(raw_data, axes))
+        return _iter_blocks(self._get_predict_op(stage).PMaps, block_shape)
+
+    def write_probabilities(
+        self,
+        raw_data: ArrayLike,
+        out: ArrayLike,
+        axes: Optional[str] = None,
+        block_shape: Optional[Sequence[int]] = None,
+        stage: Literal[1, 2] = 2,
+    ) -> None:
+        """
+        Compute the pixel probability map of the given stage block by block and write it to out.
+
+        See `PixelClassificationPipeline.write_probabilities`.
+        """
+        blocks = self.iter_probabilities(raw_data, axes, block_shape, stage)
+        _write_blocks(blocks, out, self._get_predict_op(stage).PMaps)
+
+
+class _OpArrayLikeSource(Operator):
+    """
+    Provides an array-like object (e.g. a zarr, h5py or dask array) as output,
+    reading only the requested region.
+    """
+
+    Array = InputSlot(stype="object")
+    AxisOrder = InputSlot()
+
+    Output = OutputSlot()
+
+    def set_array(self, array: ArrayLike, axes: str):
+        # Disconnect first, so that the new axes are never combined with the old array in setupOutputs
+        self.Array.disconnect()
+        self.AxisOrder.setValue(axes)
+        self.Array.setValue(array)
+
+    def setupOutputs(self):
+        array = self.Array.value
+        self.Output.meta.shape = tuple(array.shape)
+        self.Output.meta.dtype = numpy.dtype(array.dtype).type
+        self.Output.meta.axistags = vigra.defaultAxistags(self.AxisOrder.value)
+
+    def execute(self, slot, subindex, roi, result):
+        result[...] = numpy.asarray(self.Array.value[roi.toSlice()])
+
+    def propagateDirty(self, slot, subindex, roi):
+        self.Output.setDirty()
+
+
+def _check_input(axes: str, shape: Sequence[int], num_channels: int, num_spatial_dims: int):
+    if len(axes) != len(shape):
+        raise ValueError(f"Axes {axes!r} don't match the shape {tuple(shape)} of the input.")
+
+    num_channels_in_data = shape[axes.index("c")] if "c" in axes else 1
+    if num_channels_in_data != num_channels:
+        raise ValueError(
+            f"Number of channels mismatch. Classifier trained for {num_channels} but input has {num_channels_in_data}"
+        )
+
+    num_spatial_in_data = sum(a in "zyx" for a in axes)
+    if num_spatial_in_data != num_spatial_dims:
+        raise ValueError(
+            "Number of spatial dims doesn't match. "
+            f"Classifier trained for {num_spatial_dims} but input has {num_spatial_in_data}"
+        )
+
+
+def _iter_blocks(pmaps_slot: OutputSlot, block_shape: Optional[Sequence[int]]) -> Iterator[Block]:
+    """
+    Request the blocks of pmaps_slot, keeping as many requests in flight as there are worker threads.
+
+    Requests are created lazily, so that data is only read and computed once the first block is requested.
+    """
+    num_threads = max(1, Request.global_thread_pool.num_workers)
+    shape = pmaps_slot.meta.shape
+    dims = tuple(pmaps_slot.meta.getAxisKeys())
+
+    if block_shape is None:
+        block_shape = determine_request_blockshape(pmaps_slot, num_threads)
+    if len(block_shape) != len(shape):
+        raise ValueError(f"Block shape {tuple(block_shape)} doesn't match the output axes {dims}.")
+    block_shape = tuple(numpy.minimum(block_shape, shape))
+
+    block_starts = getIntersectingBlocks(block_shape, ([0] * len(shape), shape))
+    rois = (getBlockBounds(shape, block_shape, block_start) for block_start in block_starts)
+
+    pending: Deque[Tuple[Tuple[slice, ...], Request]] = collections.deque()
+    try:
+        for roi in rois:
+            pending.append((roiToSlice(*roi), pmaps_slot(*roi).submit()))
+            if len(pending) >= num_threads:
+                slicing, request = pending.popleft()
+                yield slicing, xarray.DataArray(request.wait(), dims=dims)
+
+        while pending:
+            slicing, request = pending.popleft()
+            yield slicing, xarray.DataArray(request.wait(), dims=dims)
+    finally:
+        # The caller stopped iterating early (or a request failed)
+        for _, request in pending:
+            request.cancel()
+
+
+def _write_blocks(blocks: Iterator[Block], out: ArrayLike, pmaps_slot: OutputSlot):
+    if tuple(out.shape) != tuple(pmaps_slot.meta.shape):
+        raise ValueError(
+            f"Output has shape {tuple(out.shape)}, "
+            f"expected {dict(pmaps_slot.meta.getTaggedShape())} (see get_probabilities_shape)."
+        )
+    for slicing, block in blocks:
+        out[slicing] = block.data
+
 
 def ensure_channel_axis(axis_order):
     if "c" not in axis_order:
@@ -298,3 +521,20 @@ def as_vigra_array(data: Union[vigra.VigraArray, xarray.DataArray]) -> vigra.Vig
         return vigra.taggedView(data.values, data.dims)
 
     raise NotImplementedError(f"Data type '{type(data)}' not supported, use `vigra.VigraArray` or `xarray.DataArray`.")
+
+
+def as_lazy_array(data: ArrayLike, axes: Optional[str] = None) -> Tuple[ArrayLike, str]:
+    """
+    Split data into an array-like object and its axis keys, without loading it into memory.
+    """
+    if isinstance(data, vigra.VigraArray):
+        return data, "".join(data.axistags.keys())
+
+    if isinstance(data, xarray.DataArray):
+        # .data keeps lazy (e.g. dask) arrays lazy, .values would load them
+        return data.data, "".join(map(str, data.dims))
+
+    if axes is None:
+        raise ValueError(f"Data type '{type(data)}' has no axis information, please pass `axes`.")
+
+    return data, axes
@@ -0,0 +1,111 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#          http://ilastik.org/license.html
+###############################################################################
+# pyright: strict
+import queue
+from contextlib import contextmanager
+from typing import Any, Generic, Iterator, List, Type, TypeVar, Union
+
+import h5py
+import vigra
+import xarray
+
+from ._pipelines import AutocontextPipeline, PixelClassificationPipeline
+
+Pipeline = TypeVar("Pipeline", PixelClassificationPipeline, AutocontextPipeline)
+
+
+class PipelinePool(Generic[Pipeline]):
+    """
+    Thread-safe pool of identical pipelines, for serving concurrent requests
+
+    A single pipeline holds one lazyflow graph, whose input is replaced on every call,
+    so it can only process one image at a time.
+    The pool parses the project file once and builds `size` pipelines from it,
+    which all share the same (read-only) classifier instances.
+    Every call borrows one pipeline for its duration, blocking while all pipelines are in use.
+
+    Example usage:
+
+    ```Python
+    from concurrent.futures import ThreadPoolExecutor
+    from ilastik.experimental.api import PipelinePool, PixelClassificationPipeline
+
+    pool = PipelinePool.from_ilp_file(PixelClassificationPipeline, "<path/to/project.ilp>", size=4)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        prob_maps = list(executor.map(pool.get_probabilities, images))
+
+    # Any other pipeline method can be used on a borrowed pipeline
+    with pool.acquire() as pipeline:
+        for slicing, block in pipeline.iter_probabilities(img):
+            ...
+    ```
+    """
+
+    @classmethod
+    def from_ilp_file(cls, pipeline_type: Type[Pipeline], path: str, size: int = 4) -> "PipelinePool[Pipeline]":
+        """
+        Create a pool of pipelines from a trained project.ilp file
+
+        Args:
+            pipeline_type: PixelClassificationPipeline or AutocontextPipeline
+            path: Path to the ilp file
+            size: Number of pipelines, i.e. the maximum number of concurrent calls
+        """
+        with h5py.File(path, "r") as f:
+            project = pipeline_type.project_type.model_validate(f)
+
+        return cls(pipeline_type, project, size)
+
+    def __init__(self, pipeline_type: Type[Pipeline], project: Any, size: int = 4):
+        if size < 1:
+            raise ValueError(f"Pool size must be at least 1, got {size}.")
+
+        self._pipelines: List[Pipeline] = [pipeline_type(project) for _ in range(size)]
+        self._available: "queue.Queue[Pipeline]" = queue.Queue()
+        for pipeline in self._pipelines:
+            self._available.put(pipeline)
+
+    @property
+    def size(self) -> int:
+        return len(self._pipelines)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Pipeline]:
+        """
+        Borrow a pipeline for exclusive use within the context, waiting until one is available.
+        """
+        pipeline = self._available.get()
+        try:
+            yield pipeline
+        finally:
+            self._available.put(pipeline)
+
+    def get_probabilities(self, raw_data: Union[vigra.VigraArray, xarray.DataArray], **kwargs: Any) -> xarray.DataArray:
+        """
+        Get pixel probability map from one of the pipelines. Safe to call from multiple threads.
+
+        Args:
+            raw_data: image with same dimensionality as in the trained project file
+            kwargs: passed on to the pipeline's get_probabilities, e.g. `stage` for autocontext
+        """
+        with self.acquire() as pipeline:
+            return pipeline.get_probabilities(raw_data, **kwargs)
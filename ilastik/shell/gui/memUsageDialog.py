@@ -102,7 +102,12 @@ class TreeNode(QTreeWidgetItem):
         t = t[len("<type '") + 1 : -len("'>")]
         t = t.split(".")[-1]
         l.append(t)
-        l.append(report.info)
+        info = report.info or ""
+        if report.recomputeCost:
+            info = f"{info}\nrecompute cost: {report.recomputeCost:.2f} s".strip()
+        if report.evictions:
+            info = f"{info}\nevictions: {report.evictions}".strip()
+        l.append(info)
         l.append(report.id)
         return l
 
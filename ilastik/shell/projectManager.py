@@ -34,6 +34,7 @@ logger = logging.getLogger(__name__)
 import ilastik
 from ilastik import Project
 from ilastik import isVersionCompatible
+from ilastik.config import cfg as ilastik_config
 from ilastik.utility import log_exception
 from ilastik.workflow import getWorkflowFromName, Workflow
 from lazyflow.utility.timer import Timer, timeLogged
@@ -445,6 +446,7 @@ class ProjectManager(object):
         self.currentProjectFile = hdf5File
         self.currentProjectPath = projectFilePath
         self.currentProjectIsReadOnly = readOnly
+        lazyLoad = self._loadLazily()
         try:
             # Applet serializable items are given the whole file (root group)
             for aplt in self._applets:
@@ -454,9 +456,11 @@ class ProjectManager(object):
                             serializer.base_initialized
                         ), "AppletSerializer subclasses must call AppletSerializer.__init__ upon construction."
                         serializer.ignoreDirty = True
+                        serializer.lazyLoad = lazyLoad
 
                         serializer.deserializeFromHdf5(self.currentProjectFile, projectFilePath, self._headless)
 
+                        serializer.lazyLoad = False
                         serializer.ignoreDirty = False
                 logger.debug('Deserializing applet "{}" took {} seconds'.format(aplt.name, timer.seconds()))
 
@@ -476,6 +480,17 @@ class ProjectManager(object):
             for aplt in self._applets:
                 aplt.progressSignal(100)
 
+    def _loadLazily(self) -> bool:
+        """
+        Whether heavy data (e.g. labels) is only read from the project file when it is needed,
+        as configured by the "lazy_project_loading" setting (by default, only in headless mode).
+        The project file stays open while the project is loaded, so the data can be read later on.
+        """
+        setting = ilastik_config.get("ilastik", "lazy_project_loading", fallback="headless")
+        if setting == "headless":
+            return self._headless
+        return ilastik_config.getboolean("ilastik", "lazy_project_loading")
+
     def _takeSnapshotAndLoadIt(self, newPath):
         """
         This is effectively a "save as", but is slower because the operators are totally re-loaded.
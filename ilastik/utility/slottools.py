@@ -27,7 +27,7 @@ class DtypeConvertFunction:
 
     Simple callable class that converts between dtypes.
 
-    Assumption for floats (as inputs): range [0.0 .. 1.0]
+    Assumption for inputs: range [0.0 .. source_max], i.e. [0.0 .. 1.0] for floats
 
     This class was needed in order to be able to check functions for equality.
     When using this function as an input for OpPixelOperator.Function, changing
@@ -35,20 +35,25 @@ class DtypeConvertFunction:
     dirtyness.
     """
 
-    def __init__(self, dtype: numpy.typing.DTypeLike):
+    def __init__(self, dtype: numpy.typing.DTypeLike, source_max: float = 1.0):
         """
         Args:
             dtype (numpy.dtype): dtype to which this functions __call__ will
               convert.
+            source_max (float): upper end of the input range, e.g. 255 for
+              probabilities quantized to uint8.
         """
         self._dtype = numpy.dtype(dtype)
+        self._source_max = source_max
 
         if self._dtype.char in numpy.typecodes["AllInteger"]:
             # For integer dtype scale according to dtype min and max to maximize precision
             dtype_info = numpy.iinfo(dtype)
             min_val = dtype_info.min
             max_val = dtype_info.max
-            self._fun = lambda x: ((max_val - min_val) * x - min_val).astype(dtype)
+            self._fun = lambda x: ((max_val - min_val) * (x / source_max) - min_val).astype(dtype)
+        elif source_max != 1.0:
+            self._fun = lambda x: (x / source_max).astype(dtype)
         else:
             # For floating points, just coerce it to the new floating point dtype.
             self._fun = lambda x: x.astype(dtype)
@@ -58,7 +63,7 @@ class DtypeConvertFunction:
             return False
         if not isinstance(other, DtypeConvertFunction):
             return False
-        if self._dtype == other._dtype:
+        if self._dtype == other._dtype and self._source_max == other._source_max:
             return True
         return False
 
@@ -40,6 +40,7 @@ from ilastik.applets.batchProcessing import BatchProcessingApplet
 from ilastik.utility import SlotNameEnum
 
 from lazyflow.graph import Graph
+from lazyflow.operators.classifierOperators import PMAPS_DTYPES
 from lazyflow.roi import TinyVector, fullSlicing
 
 
@@ -113,6 +114,12 @@ class PixelClassificationWorkflow(Workflow):
         parser.add_argument(
             "--label-proportion", help="Proportion of feature-pixels used to train the classifier.", type=float
         )
+        parser.add_argument(
+            "--pmaps-dtype",
+            help="Data type of the probability maps (and their caches and exports). "
+            "uint8 probabilities are quantized to 0-255. Saved with the project.",
+            choices=PMAPS_DTYPES,
+        )
 
         # Parse the creation args: These were saved to the project file when this project was first created.
         parsed_creation_args, unused_args = parser.parse_known_args(project_creation_args)
@@ -128,6 +135,7 @@ class PixelClassificationWorkflow(Workflow):
         self.tree_count = parsed_args.tree_count
         self.variable_importance_path = parsed_args.variable_importance_path
         self.label_proportion = parsed_args.label_proportion
+        self.pmaps_dtype = parsed_args.pmaps_dtype
 
         data_instructions = (
             "Select your input data using the 'Raw Data' tab shown on the right.\n\n"
@@ -142,6 +150,9 @@ class PixelClassificationWorkflow(Workflow):
 
         self.pcApplet = self.createPixelClassificationApplet()
         opClassify = self.pcApplet.topLevelOperator
+        if parsed_creation_args.pmaps_dtype:
+            # Overwritten by the project file's setting, once it has been saved
+            opClassify.PMapsDtype.setValue(parsed_creation_args.pmaps_dtype)
 
         self.dataExportApplet = PixelClassificationDataExportApplet(self, "Prediction Export")
         opDataExport = self.dataExportApplet.topLevelOperator
@@ -367,6 +378,9 @@ class PixelClassificationWorkflow(Workflow):
         if self.tree_count or self.label_proportion:
             self.pcApplet.topLevelOperator.ClassifierFactory.setDirty()
 
+        if self.pmaps_dtype:
+            self.pcApplet.topLevelOperator.PMapsDtype.setValue(self.pmaps_dtype)
+
         if self.retrain:
             self._force_retrain_classifier(projectManager)
 
@@ -0,0 +1,290 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Random forest inference on flat node arrays.
+
+vigra's RandomForest.predictProbabilities walks every tree once per sample.
+FlatForest holds the trees of one or more vigra forests as flat arrays
+(split feature, threshold, children, leaf distributions) and advances all
+samples through all trees together, one tree level per numpy operation.
+
+The trees are read from vigra's HDF5 representation of the forests (the one
+ParallelVigraRfLazyflowClassifier.serialize_hdf5 stores in project files):
+each tree is a group with a "topology" (int32) and "parameters" (float64)
+array. Within topology, a node at index i is
+    [type, parameter address, left child, right child, split feature]
+(leaves only have the first two entries), the root is at index 2. A split
+node's parameters are [weight, threshold], a leaf's are [weight, p_0, ..., p_n].
+
+Predictions are bitwise identical to vigra's: the per-class votes are
+accumulated in float32 and the total vote in float64, in the same order as
+vigra does.
+"""
+import logging
+import os
+import tempfile
+
+import h5py
+import numpy
+
+from lazyflow.request import Request, RequestPool
+
+logger = logging.getLogger(__name__)
+
+# See vigra/random_forest/rf_common.hxx (NodeTags)
+LEAF_NODE_TAG = 0x40000000
+THRESHOLD_NODE = 0
+CONST_PROB_NODE = 0 | LEAF_NODE_TAG
+ROOT_INDEX = 2
+
+
+class UnsupportedForestError(Exception):
+    pass
+
+
+class FlatForest:
+    """
+    One or more vigra random forests, compiled to flat node arrays.
+
+    Node arrays (indexed by node id, the nodes of all trees are concatenated):
+    - feature: split feature, -1 for leaves
+    - threshold: samples with feature value < threshold go to the left child
+    - children: ids of the (left, right) children
+    - leaf: index into the vote tables for leaves, -1 for splits
+
+    The vote tables hold each leaf's per-class votes (float64 and float32).
+    """
+
+    #: maximum number of (sample, tree) pairs traversed at once
+    MAX_BATCH_ITEMS = 2**20
+
+    def __init__(self, feature, threshold, children, leaf, votes, roots, forest_tree_counts, feature_count):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf = leaf
+        self.votes = votes
+        self.votes32 = votes.astype(numpy.float32)
+        self.roots = roots
+        self.forest_tree_counts = tuple(forest_tree_counts)
+        self.feature_count = feature_count
+
+    @property
+    def class_count(self):
+        return self.votes.shape[1]
+
+    @property
+    def tree_count(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_vigra_forests(cls, forests):
+        """
+        Compile vigra.learning.RandomForest objects (via their HDF5 export).
+        """
+        tmpDir = tempfile.mkdtemp()
+        cachePath = os.path.join(tmpDir, "tmp_classifier_cache.h5").replace("\\", "/")
+        try:
+            for i, forest in enumerate(forests):
+                forest.writeHDF5(cachePath, "Forest{:04d}".format(i))
+            with h5py.File(cachePath, "r") as cacheFile:
+                return cls.from_hdf5([cacheFile["Forest{:04d}".format(i)] for i in range(len(forests))])
+        finally:
+            if os.path.exists(cachePath):
+                os.remove(cachePath)
+            os.rmdir(tmpDir)
+
+    @classmethod
+    def from_hdf5(cls, forest_groups):
+        """
+        Compile forests stored by vigra's RandomForest.writeHDF5 (one h5py group per forest).
+        """
+        trees = []
+        forest_tree_counts = []
+        for forest_group in forest_groups:
+            try:
+                predict_weighted = int(forest_group["_options"]["predict_weighted_"][0])
+            except KeyError:
+                predict_weighted = 0
+            tree_names = sorted(
+                (name for name in forest_group.keys() if name.startswith("Tree_")), key=lambda name: int(name[5:])
+            )
+            if not tree_names:
+                raise UnsupportedForestError(f"No trees found in {forest_group.name}")
+            for tree_name in tree_names:
+                tree_group = forest_group[tree_name]
+                trees.append(
+                    _compile_tree(
+                        tree_group["topology"][:].astype(numpy.int64),
+                        tree_group["parameters"][:].astype(numpy.float64),
+                        predict_weighted,
+                    )
+                )
+            forest_tree_counts.append(len(tree_names))
+
+        feature_counts = {tree["feature_count"] for tree in trees}
+        class_counts = {tree["votes"].shape[1] for tree in trees}
+        if len(feature_counts) != 1 or len(class_counts) != 1:
+            raise UnsupportedForestError(
+                f"Trees differ in feature count ({feature_counts}) or class count ({class_counts})"
+            )
+
+        node_offsets = numpy.cumsum([0] + [len(tree["feature"]) for tree in trees])
+        leaf_offsets = numpy.cumsum([0] + [len(tree["votes"]) for tree in trees])
+        feature = numpy.concatenate([tree["feature"] for tree in trees]).astype(numpy.int32)
+        threshold = numpy.concatenate([tree["threshold"] for tree in trees])
+        children = numpy.concatenate([tree["children"] + offset for tree, offset in zip(trees, node_offsets)]).astype(
+            numpy.int32
+        )
+        leaf = numpy.concatenate(
+            [numpy.where(tree["leaf"] >= 0, tree["leaf"] + offset, -1) for tree, offset in zip(trees, leaf_offsets)]
+        ).astype(numpy.int32)
+        votes = numpy.concatenate([tree["votes"] for tree in trees])
+        roots = node_offsets[:-1].astype(numpy.int32)
+        return cls(feature, threshold, children, leaf, votes, roots, forest_tree_counts, feature_counts.pop())
+
+    def predict_probabilities(self, X):
+        """
+        Like ParallelVigraRfLazyflowClassifier.predict_probabilities:
+        the tree-count-weighted average of each forest's predictProbabilities.
+        """
+        X = numpy.ascontiguousarray(X, dtype=numpy.float32)
+        assert X.ndim == 2
+        if X.shape[1] < self.feature_count:
+            raise ValueError(f"Expected {self.feature_count} features, got {X.shape[1]}")
+
+        result = numpy.zeros((len(X), self.class_count), dtype=numpy.float32)
+        batch_size = max(1, self.MAX_BATCH_ITEMS // self.tree_count)
+        batches = [slice(start, start + batch_size) for start in range(0, len(X), batch_size)]
+        if len(batches) <= 1:
+            self._predict_batch(X, result)
+        else:
+            pool = RequestPool()
+            for batch in batches:
+                pool.add(Request(lambda batch=batch: self._predict_batch(X[batch], result[batch])))
+            pool.wait()
+        return result
+
+    def _predict_batch(self, X, out):
+        num_samples = len(X)
+        leaves = self._find_leaves(X)
+        has_nan = numpy.isnan(X).any(axis=1)
+
+        forest_probabilities = numpy.empty_like(out)
+        total_votes = numpy.empty(num_samples, dtype=numpy.float64)
+        total_votes32 = numpy.empty(num_samples, dtype=numpy.float32)
+        tree_votes = numpy.empty((num_samples, self.class_count), dtype=numpy.float64)
+        tree_votes32 = numpy.empty_like(out)
+
+        first_tree = 0
+        for tree_count in self.forest_tree_counts:
+            # vigra's RandomForest.predictProbabilities (see vigra/random_forest.hxx)
+            forest_probabilities[...] = 0
+            total_votes[...] = 0
+            for tree in range(first_tree, first_tree + tree_count):
+                numpy.take(self.votes, leaves[tree], axis=0, out=tree_votes)
+                numpy.take(self.votes32, leaves[tree], axis=0, out=tree_votes32)
+                forest_probabilities += tree_votes32
+                for class_index in range(self.class_count):
+                    total_votes += tree_votes[:, class_index]
+            total_votes32[...] = total_votes
+            forest_probabilities /= total_votes32[:, numpy.newaxis]
+            forest_probabilities[has_nan] = 0
+            first_tree += tree_count
+
+            # ParallelVigraRfLazyflowClassifier.predict_probabilities
+            forest_probabilities *= tree_count
+            out += forest_probabilities
+        out /= self.tree_count
+
+    def _find_leaves(self, X):
+        """
+        Returns the leaf index each sample reaches, for every tree: shape (tree count, sample count)
+        """
+        num_samples, num_features = X.shape
+        # (tree, sample) pairs, flattened; unfinished ones are advanced by one level per iteration
+        nodes = numpy.repeat(self.roots, num_samples)
+        pending = numpy.flatnonzero(self.feature[nodes] >= 0)
+        flat_X = X.ravel()
+        while len(pending) > 0:
+            current = nodes[pending]
+            values = flat_X[(pending % num_samples) * num_features + self.feature[current]]
+            goes_right = ~(values < self.threshold[current])
+            current = self.children[current, goes_right.view(numpy.uint8)]
+            nodes[pending] = current
+            pending = pending[self.feature[current] >= 0]
+        return self.leaf[nodes].reshape(self.tree_count, num_samples)
+
+
+def _compile_tree(topology, parameters, predict_weighted):
+    """
+    Convert a vigra DecisionTree (topology and parameters arrays) to node arrays,
+    numbering the nodes in breadth-first order.
+    """
+    feature_count, class_count = int(topology[0]), int(topology[1])
+    level = numpy.array([ROOT_INDEX])
+    feature, threshold, children, leaf, votes = [], [], [], [], []
+    num_nodes = 0
+    num_leaves = 0
+    while len(level) > 0:
+        node_types = topology[level]
+        is_leaf = (node_types & LEAF_NODE_TAG) != 0
+        unsupported = numpy.where(is_leaf, node_types != CONST_PROB_NODE, node_types != THRESHOLD_NODE)
+        if unsupported.any():
+            raise UnsupportedForestError(f"Unsupported node type: {node_types[unsupported][0]:#x}")
+        parameter_addresses = topology[level + 1]
+        splits = level[~is_leaf]
+        leaves = level[is_leaf]
+
+        level_feature = numpy.full(len(level), -1, dtype=numpy.int64)
+        level_feature[~is_leaf] = topology[splits + 4]
+        level_threshold = numpy.zeros(len(level))
+        level_threshold[~is_leaf] = parameters[parameter_addresses[~is_leaf] + 1]
+
+        # children of this level's splits make up the next level, in (left, right) order
+        level_children = numpy.zeros((len(level), 2), dtype=numpy.int64)
+        level_children[~is_leaf] = num_nodes + len(level) + numpy.arange(2 * len(splits)).reshape(-1, 2)
+        level_leaf = numpy.full(len(level), -1, dtype=numpy.int64)
+        level_leaf[is_leaf] = num_leaves + numpy.arange(len(leaves))
+
+        # votes: p_i * (predict_weighted * weight + (1 - predict_weighted)), as computed by vigra
+        leaf_addresses = parameter_addresses[is_leaf]
+        leaf_weights = parameters[leaf_addresses]
+        leaf_probabilities = parameters[leaf_addresses[:, numpy.newaxis] + 1 + numpy.arange(class_count)]
+        votes.append(leaf_probabilities * (predict_weighted * leaf_weights + (1 - predict_weighted))[:, numpy.newaxis])
+
+        feature.append(level_feature)
+        threshold.append(level_threshold)
+        children.append(level_children)
+        leaf.append(level_leaf)
+        num_nodes += len(level)
+        num_leaves += len(leaves)
+        level = numpy.stack([topology[splits + 2], topology[splits + 3]], axis=-1).ravel()
+
+    return {
+        "feature_count": feature_count,
+        "feature": numpy.concatenate(feature),
+        "threshold": numpy.concatenate(threshold),
+        "children": numpy.concatenate(children),
+        "leaf": numpy.concatenate(leaf),
+        "votes": numpy.concatenate(votes),
+    }
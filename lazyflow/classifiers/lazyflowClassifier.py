@@ -19,6 +19,7 @@
 #          http://ilastik.org/license.html
 ###############################################################################
 import abc
+from dataclasses import dataclass
 
 from typing import Type, TypeVar
 
@@ -36,6 +37,25 @@ def _has_attributes(cls, attrs):
     return all(_has_attribute(cls, a) for a in attrs)
 
 
+@dataclass(frozen=True)
+class IncrementalTrainingSettings:
+    """
+    When a trained classifier may be updated with new training data instead of
+    being retrained from scratch, see LazyflowVectorwiseClassifierFactoryABC.update_and_train.
+    """
+
+    #: Retrain from scratch if more than this fraction of the training samples
+    #: was added, removed or relabeled since the last training.
+    max_changed_fraction: float = 0.05
+
+    #: Fraction of the classifier (e.g. of the trees of a forest) retrained by each update.
+    replaced_fraction: float = 0.2
+
+    #: Retrain from scratch before any part of the classifier would be kept that was trained
+    #: when more than this fraction of the (current) training samples was different.
+    max_staleness: float = 0.2
+
+
 class LazyflowVectorwiseClassifierFactoryABC(abc.ABC):
     """
     Defines an interface for vector-wise classifier 'factory' objects,
@@ -72,6 +92,18 @@ class LazyflowVectorwiseClassifierFactoryABC(abc.ABC):
         """
         return 0
 
+    def update_and_train(self, classifier, X, y, num_changed_samples, settings, feature_names=None):
+        """
+        Update a classifier this factory trained before to the feature matrix X and label vector y,
+        which differ from the classifier's training data in num_changed_samples samples
+        (added, removed or relabeled).
+
+        settings: an IncrementalTrainingSettings
+
+        Returns the updated classifier, or None if a new classifier must be trained with create_and_train.
+        """
+        return None
+
     @classmethod
     def __subclasshook__(cls, C):
         """
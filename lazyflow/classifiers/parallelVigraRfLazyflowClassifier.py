@@ -33,6 +33,7 @@ import random
 from lazyflow import USER_LOGLEVEL
 from lazyflow.utility import Timer
 from lazyflow.request import Request, RequestPool, RequestLock
+from .flatForest import FlatForest, UnsupportedForestError
 from .lazyflowClassifier import LazyflowVectorwiseClassifierABC, LazyflowVectorwiseClassifierFactoryABC
 
 import logging
@@ -99,34 +100,12 @@ class ParallelVigraRfLazyflowClassifierFactory(LazyflowVectorwiseClassifierFacto
         logger.debug("Training parallel vigra RF")
 
         # Distribute trees as evenly as possible
-        tree_counts = numpy.array([self._num_trees // self._num_forests] * self._num_forests)
-        tree_counts[: self._num_trees % self._num_forests] += 1
-        assert tree_counts.sum() == self._num_trees
-        tree_counts = list(map(int, tree_counts))
-        tree_counts[:] = (tree_count for tree_count in tree_counts if tree_count != 0)
+        tree_counts = self._distribute_trees(self._num_trees, self._num_forests)
 
         # Save for future reference
         known_labels, label_counts = numpy.unique(y, return_counts=True)
 
-        X = numpy.asarray(X, numpy.float32)
-        y = numpy.asarray(y, numpy.uint32)
-        if y.ndim == 1:
-            y = y[:, numpy.newaxis]
-
-        assert X.ndim == 2
-        assert len(X) == len(y)
-
-        # Sample X and y
-        if self._label_proportion:
-            proportion = self._label_proportion
-            row_num = int(proportion * X.shape[0])
-            idx = random.sample(list(range(X.shape[0])), row_num)
-            X = X[idx, :]
-            y = y[idx]
-            assert (numpy.unique(y) == known_labels).all(), (
-                "Sampled labels are not representative of the complete set: some label values are missing!\n"
-                "Sampled labels include {}, but complete set has {}".format(numpy.unique(y), known_labels)
-            )
+        X, y = self._prepare_training_data(X, y, known_labels)
 
         # Create N forests to train
         # (treecount of each might differ)
@@ -158,6 +137,90 @@ class ParallelVigraRfLazyflowClassifierFactory(LazyflowVectorwiseClassifierFacto
         )
         return ParallelVigraRfLazyflowClassifier(forests, oobs, known_labels, feature_names, named_importances)
 
+    def update_and_train(self, classifier, X, y, num_changed_samples, settings, feature_names=None):
+        """
+        Retrain the forests that were trained longest ago (a settings.replaced_fraction of the trees),
+        keep the others.
+        """
+        if not isinstance(classifier, ParallelVigraRfLazyflowClassifier) or self._variable_importance_enabled:
+            return None
+
+        known_labels = numpy.unique(y)
+        if (
+            list(known_labels) != list(classifier.known_classes)
+            or X.shape[1] != classifier.feature_count
+            or feature_names != classifier.feature_names
+        ):
+            return None
+
+        if num_changed_samples == 0:
+            return classifier
+        if num_changed_samples > settings.max_changed_fraction * len(X):
+            return None
+
+        # Replace the stalest forests (ties: the first ones), until enough trees are replaced
+        staleness = [s + num_changed_samples for s in classifier.forest_staleness]
+        num_trees_to_replace = max(1, int(round(settings.replaced_fraction * self._num_trees)))
+        replaced = set()
+        for i in sorted(range(len(staleness)), key=lambda i: -staleness[i]):
+            if sum(classifier.forests[j].treeCount() for j in replaced) >= num_trees_to_replace:
+                break
+            replaced.add(i)
+        kept = [i for i in range(len(staleness)) if i not in replaced]
+        if not kept or any(staleness[i] > settings.max_staleness * len(X) for i in kept):
+            return None
+
+        num_new_trees = sum(classifier.forests[i].treeCount() for i in replaced)
+        tree_counts = self._distribute_trees(num_new_trees, self._num_forests)
+        X, y = self._prepare_training_data(X, y, known_labels)
+        new_forests = [vigra.learning.RandomForest(tree_count, **self._kwargs) for tree_count in tree_counts]
+        new_oobs = self._train_forests(new_forests, X, y)
+
+        logger.log(
+            USER_LOGLEVEL,
+            f"Retrained {num_new_trees} of {classifier.tree_count} trees "
+            f"({num_changed_samples} of {len(X)} samples changed). Average OOB: {numpy.average(new_oobs):.3f}",
+        )
+        return ParallelVigraRfLazyflowClassifier(
+            [classifier.forests[i] for i in kept] + new_forests,
+            [classifier.oobs[i] for i in kept] + new_oobs,
+            classifier.known_classes,
+            feature_names,
+            forest_staleness=[staleness[i] for i in kept] + [0] * len(new_forests),
+        )
+
+    @staticmethod
+    def _distribute_trees(num_trees, num_forests):
+        """
+        Tree counts of at most num_forests forests, as equal as possible.
+        """
+        tree_counts = numpy.array([num_trees // num_forests] * num_forests)
+        tree_counts[: num_trees % num_forests] += 1
+        assert tree_counts.sum() == num_trees
+        return [int(tree_count) for tree_count in tree_counts if tree_count != 0]
+
+    def _prepare_training_data(self, X, y, known_labels):
+        X = numpy.asarray(X, numpy.float32)
+        y = numpy.asarray(y, numpy.uint32)
+        if y.ndim == 1:
+            y = y[:, numpy.newaxis]
+
+        assert X.ndim == 2
+        assert len(X) == len(y)
+
+        # Sample X and y
+        if self._label_proportion:
+            proportion = self._label_proportion
+            row_num = int(proportion * X.shape[0])
+            idx = random.sample(list(range(X.shape[0])), row_num)
+            X = X[idx, :]
+            y = y[idx]
+            assert (numpy.unique(y) == known_labels).all(), (
+                "Sampled labels are not representative of the complete set: some label values are missing!\n"
+                "Sampled labels include {}, but complete set has {}".format(numpy.unique(y), known_labels)
+            )
+        return X, y
+
     @staticmethod
     def _train_forests(forests, X, y):
         """
@@ -303,9 +366,27 @@ def generate_importance_table(named_importances_dict, sort=None, export_path=Non
 class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
     """
     Adapt the vigra RandomForest class to the interface lazyflow expects.
+
+    Unless use_flat_forest is False, predictions are computed by a FlatForest
+    (compiled from the forests on first use), which gives the same results as vigra.
+
+    forest_staleness: for each forest, the number of training samples that changed
+                      since it was trained (see ParallelVigraRfLazyflowClassifierFactory.update_and_train)
     """
 
-    def __init__(self, forests, oobs, known_labels, feature_names=None, named_importances=None):
+    #: number of samples checked against vigra's predictions after compiling the FlatForest
+    NUM_FLAT_FOREST_CHECK_SAMPLES = 256
+
+    def __init__(
+        self,
+        forests,
+        oobs,
+        known_labels,
+        feature_names=None,
+        named_importances=None,
+        use_flat_forest=True,
+        forest_staleness=None,
+    ):
         self._known_labels = known_labels
         self._forests = forests
         self._feature_names = feature_names
@@ -318,6 +399,13 @@ class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
         # Named importances for the variable importance table
         self._named_importances = named_importances
 
+        self._forest_staleness = list(forest_staleness or [0] * len(forests))
+        assert len(self._forest_staleness) == len(forests)
+
+        # None: not compiled yet, False: not available
+        self._flat_forest = None if use_flat_forest else False
+        self._flat_forest_lock = RequestLock()
+
     def predict_probabilities(self, X):
         logger.debug("Predicting with parallel vigra RF")
         X = numpy.asarray(X, dtype=numpy.float32)
@@ -331,6 +419,12 @@ class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
                 X.shape[1], len(self._feature_names), self._feature_names
             )
 
+        flat_forest = self._get_flat_forest()
+        if flat_forest:
+            return flat_forest.predict_probabilities(X)
+        return self._predict_probabilities_vigra(X)
+
+    def _predict_probabilities_vigra(self, X):
         # As each forest completes, aggregate results in a shared array.
         # (Must put in a list so we can update it in this closure.)
         total_predictions = [None]
@@ -356,10 +450,55 @@ class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
         total_predictions[0] /= self._num_trees
         return total_predictions[0]
 
+    def _get_flat_forest(self):
+        with self._flat_forest_lock:
+            if self._flat_forest is None:
+                self._flat_forest = self._compile_flat_forest()
+            return self._flat_forest
+
+    def _compile_flat_forest(self):
+        with Timer() as timer:
+            try:
+                flat_forest = FlatForest.from_vigra_forests(self._forests)
+            except UnsupportedForestError as e:
+                logger.info(f"Predicting with vigra: {e}")
+                return False
+
+        # Make sure the compiled forest agrees with vigra, in particular at the split thresholds
+        thresholds = flat_forest.threshold[flat_forest.feature >= 0]
+        if len(thresholds) == 0:
+            thresholds = numpy.zeros(1)
+        rng = numpy.random.default_rng(0)
+        check_samples = rng.choice(
+            thresholds, size=(self.NUM_FLAT_FOREST_CHECK_SAMPLES, flat_forest.feature_count)
+        ).astype(numpy.float32)
+        expected = numpy.zeros((len(check_samples), flat_forest.class_count), dtype=numpy.float32)
+        for forest in self._forests:
+            expected += forest.predictProbabilities(check_samples) * forest.treeCount()
+        expected /= self._num_trees
+        if not numpy.array_equal(flat_forest.predict_probabilities(check_samples), expected):
+            logger.warning("Compiled random forest doesn't reproduce vigra's predictions, predicting with vigra.")
+            return False
+
+        logger.debug(f"Compiled {flat_forest.tree_count} trees in {timer.seconds():.3f} seconds")
+        return flat_forest
+
     @property
     def oobs(self):
         return self._oobs
 
+    @property
+    def forests(self):
+        return self._forests
+
+    @property
+    def forest_staleness(self):
+        return self._forest_staleness
+
+    @property
+    def tree_count(self):
+        return self._num_trees
+
     @property
     def known_classes(self):
         return self._known_labels
@@ -0,0 +1,344 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import atexit
+import collections
+import enum
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener, wait
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+UNIT_OF_WORK = TypeVar("UNIT_OF_WORK")
+
+# Environment variables through which the orchestrating process tells the processes it launched that they are workers
+ENV_ADDRESS = "LAZYFLOW_ORCHESTRATOR_ADDRESS"
+ENV_AUTHKEY = "LAZYFLOW_ORCHESTRATOR_AUTHKEY"
+ENV_RANK = "LAZYFLOW_ORCHESTRATOR_RANK"
+
+# How often (in seconds) the orchestrator checks for newly connected and for dead workers while waiting
+POLL_INTERVAL = 1.0
+# How often (in seconds) the orchestrator logs the throughput so far
+PROGRESS_LOG_INTERVAL = 30.0
+# A unit of work is handed to another worker when its worker dies, but not indefinitely
+MAX_ATTEMPTS_PER_UNIT = 3
+# How long (in seconds) to wait for workers to exit on their own when the orchestrating process exits
+WORKER_EXIT_TIMEOUT = 60.0
+
+
+@enum.unique
+class Tags(enum.IntEnum):
+    """Tags identify the type/purpose of a message sent from the orchestrator to a worker"""
+
+    WORK = 1  # a unit of work to be processed
+    STOP = enum.auto()  # the worker should stop waiting for work
+
+
+class _Worker(Generic[UNIT_OF_WORK]):
+    """A representation of a connected worker process"""
+
+    def __init__(self, conn: Connection, rank: int):
+        self.conn = conn
+        self.rank = rank
+
+    def send(self, unit_of_work: UNIT_OF_WORK):
+        logger.debug(f"Sending unit_of_work {unit_of_work} to worker {self.rank}...")
+        self.conn.send((Tags.WORK, unit_of_work))
+
+    def stop(self):
+        try:
+            self.conn.send((Tags.STOP, None))
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class _LocalWorkerPool:
+    """The worker processes, launched once and reused by every orchestration in the orchestrating process.
+
+    Workers connect anew for every orchestration they take part in, telling their rank and how many orchestrations
+    they took part in so far (their session). This keeps a worker that moved on to the next orchestration (e.g. the
+    next lane of a batch export) from receiving work of the previous one, which other workers are still finishing.
+    """
+
+    def __init__(self, num_workers: int, command: Sequence[str]):
+        self.authkey = os.urandom(16)
+        self.listener = Listener(("127.0.0.1", 0), authkey=self.authkey)
+        self.session = 0
+        self._finished_session = 0
+        self._connected: Dict[int, List[_Worker]] = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+        host, port = self.listener.address
+        env = {**os.environ, ENV_ADDRESS: f"{host}:{port}", ENV_AUTHKEY: self.authkey.hex()}
+        env.update(self._get_resource_limits(num_workers))
+        logger.info(f"ORCHESTRATOR: Launching {num_workers} local workers: {' '.join(command)}")
+        self.processes = {
+            rank: subprocess.Popen(list(command), env={**env, ENV_RANK: str(rank)})
+            for rank in range(1, num_workers + 1)
+        }
+        threading.Thread(target=self._accept_connections, name="LocalWorkerPool-accept", daemon=True).start()
+
+    @staticmethod
+    def _get_resource_limits(num_workers: int) -> Dict[str, str]:
+        """Split threads and RAM between the workers, unless the user configured them explicitly"""
+        limits = {}
+        if "LAZYFLOW_THREADS" not in os.environ:
+            limits["LAZYFLOW_THREADS"] = str(max(1, (os.cpu_count() or 1) // num_workers))
+        if "LAZYFLOW_TOTAL_RAM_MB" not in os.environ:
+            from lazyflow.utility.memory import Memory
+
+            limits["LAZYFLOW_TOTAL_RAM_MB"] = str(max(1, Memory.getAvailableRam() // num_workers // 2**20))
+        return limits
+
+    def _accept_connections(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+                rank, session = conn.recv()
+            except AuthenticationError:
+                continue
+            except (OSError, EOFError):
+                return  # listener was closed
+            logger.debug(f"ORCHESTRATOR: Worker {rank} connected for session {session}")
+            worker = _Worker(conn, rank)
+            with self._lock:
+                late = session <= self._finished_session
+                if not late:
+                    self._connected[session].append(worker)
+            if late:
+                worker.stop()
+
+    def take_connected_workers(self, session: int) -> List[_Worker]:
+        with self._lock:
+            return self._connected.pop(session, [])
+
+    def finish_session(self, session: int):
+        """Stops workers that connect for this session from now on, e.g. because they took long to load"""
+        with self._lock:
+            self._finished_session = session
+            late = self._connected.pop(session, [])
+        for worker in late:
+            worker.stop()
+
+    def any_alive(self) -> bool:
+        return any(process.poll() is None for process in self.processes.values())
+
+    def shutdown(self, timeout: float = WORKER_EXIT_TIMEOUT):
+        for rank, process in self.processes.items():
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"ORCHESTRATOR: Worker {rank} did not exit within {timeout}s. Killing it.")
+                process.kill()
+                process.wait()
+        self.listener.close()
+
+
+_pool: Optional[_LocalWorkerPool] = None
+_worker_session = 0
+
+
+def _default_worker_command() -> List[str]:
+    """The command line of the current process, e.g. a headless ilastik run"""
+    orig_argv = getattr(sys, "orig_argv", None)  # includes interpreter options such as "-m ilastik"
+    if orig_argv:
+        return [sys.executable] + orig_argv[1:]
+    return [sys.executable] + sys.argv
+
+
+def _shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+class LocalTaskOrchestrator(Generic[UNIT_OF_WORK]):
+    """Coordinates work amongst processes on the local machine. A drop-in replacement for TaskOrchestrator
+    that needs neither MPI nor mpirun.
+
+    The orchestrating process (rank 0) launches num_workers copies of itself, by re-running its own command line
+    (or worker_command). In these copies, which find the address of the orchestrator in their environment,
+    the same code path creates a LocalTaskOrchestrator in worker mode (rank > 0) and calls start_as_worker.
+    So, just like under mpirun, every worker loads the project once and then processes the units of work
+    sent to it, until the orchestrator tells it to stop.
+
+    Units of work are sent to workers over local sockets as the workers become free. If a worker dies,
+    the unit of work it was processing is handed to another worker.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, worker_command: Optional[Sequence[str]] = None):
+        global _pool
+        if ENV_ADDRESS in os.environ:
+            host, port = os.environ[ENV_ADDRESS].rsplit(":", 1)
+            self.address = (host, int(port))
+            self.authkey = bytes.fromhex(os.environ[ENV_AUTHKEY])
+            self.rank = int(os.environ[ENV_RANK])
+            return
+
+        self.rank = 0
+        num_workers = num_workers or os.cpu_count() or 1
+        if num_workers <= 0:
+            raise ValueError(f"Trying to orchestrate tasks with {num_workers} workers")
+        if _pool is None:
+            _pool = _LocalWorkerPool(num_workers, worker_command or _default_worker_command())
+            atexit.register(_shutdown_pool)
+        self.pool = _pool
+
+    def orchestrate(self, work_units: Iterable[UNIT_OF_WORK]):
+        """Sends work units from work_units to workers as they become free. Ran in the process with rank 0
+
+        Blocks until all work units have been consumed and processed by the workers.
+        Automatically stops all workers when all work units have been consumed."""
+
+        pool = self.pool
+        pool.session += 1
+        work_units = iter(work_units)
+        retries = collections.deque()  # (unit_of_work, attempt) of units whose worker died
+        idle: List[_Worker] = []
+        busy: Dict[Connection, tuple] = {}  # connection -> (worker, unit_of_work, attempt)
+        exhausted = False
+        stats = _Throughput()
+
+        def next_unit():
+            nonlocal exhausted
+            if retries:
+                return retries.popleft()
+            if not exhausted:
+                try:
+                    return next(work_units), 1
+                except StopIteration:
+                    exhausted = True
+            return None
+
+        logger.info(f"ORCHESTRATOR: Starting orchestration of {len(pool.processes)} local workers...")
+        try:
+            while True:
+                idle += pool.take_connected_workers(pool.session)
+                while idle:
+                    unit = next_unit()
+                    if unit is None:
+                        break
+                    worker = idle.pop()
+                    try:
+                        worker.send(unit[0])
+                    except OSError:
+                        logger.warning(f"ORCHESTRATOR: Worker {worker.rank} died while idle")
+                        worker.conn.close()
+                        retries.appendleft(unit)
+                        continue
+                    busy[worker.conn] = (worker, *unit)
+
+                if not busy:
+                    if exhausted and not retries:
+                        break
+                    if not idle and not pool.any_alive():
+                        raise RuntimeError("All local workers died before the work was done")
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                for conn in wait(list(busy), timeout=POLL_INTERVAL):
+                    worker, unit_of_work, attempt = busy.pop(conn)
+                    try:
+                        conn.recv()
+                    except (EOFError, OSError):
+                        conn.close()
+                        if attempt >= MAX_ATTEMPTS_PER_UNIT:
+                            raise RuntimeError(f"Giving up on {unit_of_work}: {attempt} workers died processing it")
+                        logger.warning(f"ORCHESTRATOR: Worker {worker.rank} died. Requeuing {unit_of_work}")
+                        retries.append((unit_of_work, attempt + 1))
+                        continue
+                    stats.add(worker.rank, unit_of_work)
+                    idle.append(worker)
+                stats.log_progress()
+        finally:
+            for worker in idle + [worker for worker, *_ in busy.values()]:
+                worker.stop()
+            pool.finish_session(pool.session)
+        stats.log_summary()
+
+    def start_as_worker(self, target: Callable[[UNIT_OF_WORK, int], None]):
+        """Synchronously runs 'target' on every work unit passed in by the orchestrating instance of this class
+        (the process with rank 0, which should be executing the 'orchestrate' method)
+
+        Blocks until the orchestrator tells this worker to stop, or goes away
+        """
+        global _worker_session
+        _worker_session += 1
+        logger.info(f"WORKER {self.rank}: Started")
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send((self.rank, _worker_session))
+            while True:
+                try:
+                    tag, unit_of_work = conn.recv()
+                except EOFError:
+                    logger.warning(f"WORKER {self.rank}: Lost connection to the orchestrator")
+                    break
+                if tag == Tags.STOP:
+                    break
+                conn.send(target(unit_of_work, self.rank))
+        logger.info(f"WORKER {self.rank}: Terminated")
+
+    def shutdown(self):
+        """Wait for the workers to exit. Happens automatically when the orchestrating process exits"""
+        if self.rank == 0:
+            _shutdown_pool()
+
+
+class _Throughput:
+    """Aggregate throughput of the workers, in units of work (and pixels, for units of work that have a shape)"""
+
+    def __init__(self):
+        self.start = self.last_log = time.perf_counter()
+        self.units = 0
+        self.pixels = 0
+        self.units_per_worker = collections.Counter()
+
+    def add(self, rank: int, unit_of_work):
+        self.units += 1
+        self.units_per_worker[rank] += 1
+        volume = getattr(getattr(unit_of_work, "shape", None), "volume", None)
+        if volume is not None:
+            self.pixels += int(volume)
+
+    def _format(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        text = f"{self.units} units of work in {elapsed:.1f}s ({self.units / elapsed:.2f}/s"
+        if self.pixels:
+            text += f", {self.pixels / elapsed / 1e6:.2f} Mpx/s"
+        return text + ")"
+
+    def log_progress(self):
+        if time.perf_counter() - self.last_log >= PROGRESS_LOG_INTERVAL:
+            self.last_log = time.perf_counter()
+            logger.info(f"ORCHESTRATOR: {self._format()}")
+
+    def log_summary(self):
+        per_worker = ", ".join(f"{rank}: {count}" for rank, count in sorted(self.units_per_worker.items()))
+        logger.info(f"ORCHESTRATOR: Done. {self._format()}. Per worker: {per_worker}")
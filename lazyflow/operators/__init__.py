@@ -68,6 +68,7 @@ from .opInterpMissingData import OpInterpMissingData
 from .opLabelVolume import OpLabelVolume
 from .opObjectFeatures import OpObjectFeatures
 from .opPixelFeaturesPresmoothed import OpPixelFeaturesPresmoothed
+from .opPresmoothedTileCache import OpPresmoothedTileCache
 from .opRelabelConsecutive import OpRelabelConsecutive
 from .opReorderAxes import OpReorderAxes
 from .opSimpleBlockedArrayCache import OpSimpleBlockedArrayCache
@@ -23,8 +23,10 @@ from __future__ import division
 ###############################################################################
 
 # Python
-import gc
+import heapq
+import itertools
 import threading
+import time
 import weakref
 import functools
 import atexit
@@ -43,6 +45,32 @@ logger = logging.getLogger(__name__)
 
 default_refresh_interval = 10
 
+#: evict the least recently used blocks first
+LRU = "lru"
+#: GreedyDual-Size: evict blocks with the lowest recompute cost per byte first, aging blocks that are not accessed
+COST_AWARE = "cost-aware"
+eviction_policies = (LRU, COST_AWARE)
+
+
+class _BlockRecord(object):
+    """
+    eviction bookkeeping for a block tracked by the memory manager
+    """
+
+    __slots__ = ("priority", "access_time", "size", "cost")
+
+    def __init__(self):
+        self.priority = 0.0
+        self.access_time = 0.0
+        # size in bytes and recompute cost in seconds, 0 if unknown
+        self.size = 0
+        self.cost = 0.0
+
+    def costPerByte(self):
+        if self.size <= 0:
+            return 0.0
+        return self.cost / self.size
+
 
 class _CacheMemoryManager(threading.Thread):
     """
@@ -72,6 +100,25 @@ class _CacheMemoryManager(threading.Thread):
 
     the interval is measured in seconds. Each change of refresh interval
     triggers cleanup.
+
+    Eviction:
+    Blocks of caches that report their block accesses (see
+    `ManagedBlockedCache.reportsBlockAccess`) are kept in a global heap
+    ordered by access time, which is updated on every access. All other
+    caches are polled for their (block) access times during cleanup.
+    Cleanup evicts the entries with the lowest priority from both until the
+    cache memory usage is below the target, popping only as many entries as needed.
+
+    With the default "lru" eviction policy, the priority of a block is its
+    last access time. With the "cost-aware" policy (GreedyDual-Size), caches
+    report how long a block took to compute and how large it is, and its
+    priority is set to `L + cost / size` on every access, where the inflation
+    value L is the priority of the last evicted block. Blocks that are cheap to
+    recompute per byte are evicted first, expensive ones age until they have
+    not been accessed for a while. Blocks of unknown cost, and polled caches,
+    get a priority of L, i.e. they are considered cheap::
+
+        cacheMemoryManager.setEvictionPolicy("cost-aware")
     """
 
     totalCacheMemory = OrderedSignal()
@@ -92,6 +139,22 @@ class _CacheMemoryManager(threading.Thread):
         self._refresh_interval = default_refresh_interval
         self._first_class_caches_lock = threading.Lock()
 
+        # Priority heap of blocks reported by caches via blockAccessed().
+        # Entries are (priority, sequence_number, cache_ref, block_id), outdated
+        # entries are not removed from the heap but skipped when popped.
+        self._block_heap = []
+        self._block_heap_seq = itertools.count()
+        # cache -> {block_id: _BlockRecord} for the currently valid heap entries
+        self._block_records = weakref.WeakKeyDictionary()
+        self._num_tracked_blocks = 0
+        self._block_heap_lock = threading.Lock()
+
+        self._eviction_policy = LRU
+        # GreedyDual-Size inflation value, the priority of the last evicted block
+        self._inflation = 0.0
+        # cache -> number of blocks evicted by the manager
+        self._evictions = weakref.WeakKeyDictionary()
+
         # maximum fraction of *allowed memory* used
         self._max_usage = 1.0
         # target usage fraction
@@ -153,6 +216,156 @@ class _CacheMemoryManager(threading.Thread):
         elif isinstance(cache, ManagedCache):
             self._managed_caches.add(cache)
 
+    def setEvictionPolicy(self, policy):
+        """
+        select how blocks are prioritized for eviction, one of `eviction_policies`
+        """
+        if policy not in eviction_policies:
+            raise ValueError(f"Unknown cache eviction policy {policy!r}, expected one of {eviction_policies}")
+        with self._block_heap_lock:
+            self._eviction_policy = policy
+            self._inflation = 0.0
+            # priorities of the two policies are not comparable
+            for records in self._block_records.values():
+                for record in records.values():
+                    record.priority = self._priority(record)
+            self._rebuildBlockHeap()
+
+    def getEvictionPolicy(self):
+        return self._eviction_policy
+
+    def _priority(self, record):
+        """
+        eviction priority of a block, lowest is evicted first (call with _block_heap_lock held)
+        """
+        if self._eviction_policy == LRU:
+            return record.access_time
+        return self._inflation + record.costPerByte()
+
+    def blockAccessed(self, cache, block_id, size=None, cost=None):
+        """
+        record that a block of a cache was accessed or (re-)inserted
+
+        Only called by caches with `reportsBlockAccess`, see `ManagedBlockedCache.notifyBlockAccess`.
+        `size` (bytes) and `cost` (seconds it took to compute the block) are remembered
+        for later accesses, and are used by the cost-aware eviction policy.
+        """
+        now = time.time()
+        with self._block_heap_lock:
+            records = self._block_records.get(cache)
+            if records is None:
+                records = self._block_records[cache] = {}
+            record = records.get(block_id)
+            if record is None:
+                record = records[block_id] = _BlockRecord()
+                self._num_tracked_blocks += 1
+            record.access_time = now
+            if size is not None:
+                record.size = size
+            if cost is not None:
+                record.cost = cost
+            record.priority = self._priority(record)
+            heapq.heappush(
+                self._block_heap, (record.priority, next(self._block_heap_seq), weakref.ref(cache), block_id)
+            )
+
+            # Every access leaves an outdated entry behind, don't let them pile up
+            if len(self._block_heap) > 2 * self._num_tracked_blocks + 1024:
+                self._rebuildBlockHeap()
+
+    def blockFreed(self, cache, block_id):
+        """
+        record that a block of a cache was removed
+        """
+        with self._block_heap_lock:
+            records = self._block_records.get(cache)
+            if records is not None and records.pop(block_id, None) is not None:
+                self._num_tracked_blocks -= 1
+
+    def allBlocksFreed(self, cache):
+        """
+        record that all blocks of a cache were removed
+        """
+        with self._block_heap_lock:
+            records = self._block_records.pop(cache, None)
+            if records is not None:
+                self._num_tracked_blocks -= len(records)
+
+    def getCacheStatistics(self, cache):
+        """
+        get eviction statistics of a cache
+
+        @return dict with the summed up recompute cost (seconds) of the tracked
+                blocks in the cache and the number of evictions from the cache
+        """
+        with self._block_heap_lock:
+            records = list(self._block_records.get(cache, {}).values())
+            evictions = self._evictions.get(cache, 0)
+        return {"recomputeCost": sum(record.cost for record in records), "evictions": evictions}
+
+    def _rebuildBlockHeap(self):
+        """
+        drop all outdated heap entries (call with _block_heap_lock held)
+        """
+        self._block_heap = [
+            (record.priority, next(self._block_heap_seq), weakref.ref(cache), block_id)
+            for cache, records in self._block_records.items()
+            for block_id, record in records.items()
+        ]
+        heapq.heapify(self._block_heap)
+        self._num_tracked_blocks = len(self._block_heap)
+
+    def _peekTrackedBlock(self):
+        """
+        get the valid heap entry with the lowest priority and its cache, or None (call with _block_heap_lock held)
+
+        The cache is returned so that it stays alive until the entry is popped.
+        """
+        heap = self._block_heap
+        while heap:
+            priority, _, cache_ref, block_id = heap[0]
+            cache = cache_ref()
+            if cache is not None:
+                record = self._block_records.get(cache, {}).get(block_id)
+                if record is not None and record.priority == priority:
+                    return heap[0], cache
+            heapq.heappop(heap)
+        return None
+
+    def _popNextEviction(self, polled_entries):
+        """
+        remove and return the entry with the lowest priority from the heap of tracked blocks
+        and the heap of polled entries, as (cache, info, cleanup function), or None if both are empty
+
+        Polled entries are ordered by their access time, with the cost-aware policy
+        they have the current inflation value as priority, i.e. they are evicted
+        before any tracked block that is more expensive to recompute.
+        """
+        with self._block_heap_lock:
+            peeked = self._peekTrackedBlock()
+            if peeked is not None:
+                tracked, cache = peeked
+                if not polled_entries:
+                    evict_tracked = True
+                elif self._eviction_policy == LRU:
+                    evict_tracked = tracked[0] <= polled_entries[0][0]
+                else:
+                    evict_tracked = tracked[0] <= self._inflation
+
+                if evict_tracked:
+                    heapq.heappop(self._block_heap)
+                    priority, _, _, block_id = tracked
+                    del self._block_records[cache][block_id]
+                    self._num_tracked_blocks -= 1
+                    if self._eviction_policy == COST_AWARE:
+                        self._inflation = priority
+                    return cache, f"{cache.name}: {block_id}", functools.partial(cache.evictBlock, block_id)
+
+        if polled_entries:
+            _, _, cache, info, cleanupFun = heapq.heappop(polled_entries)
+            return cache, info, cleanupFun
+        return None
+
     def run(self):
         """
         main loop
@@ -204,29 +417,38 @@ class _CacheMemoryManager(threading.Thread):
             if total <= self._max_usage * cache_memory:
                 return
 
-            cache_entries = []
-            cache_entries += [
-                (cache.lastAccessTime(), cache.name, cache.freeMemory) for cache in list(self._managed_caches)
+            # Caches that don't report their block accesses have to be polled.
+            # The sequence number keeps entries with equal times from being compared further.
+            seq = itertools.count()
+            polled_entries = [
+                (cache.lastAccessTime(), next(seq), cache, cache.name, cache.freeMemory)
+                for cache in list(self._managed_caches)
             ]
-            cache_entries += [
-                (lastAccessTime, f"{cache.name}: {blockKey}", functools.partial(cache.freeBlock, blockKey))
+            polled_entries += [
+                (
+                    lastAccessTime,
+                    next(seq),
+                    cache,
+                    f"{cache.name}: {blockKey}",
+                    functools.partial(cache.evictBlock, blockKey),
+                )
                 for cache in list(self._managed_blocked_caches)
+                if not cache.reportsBlockAccess
                 for blockKey, lastAccessTime in cache.getBlockAccessTimes()
             ]
-            cache_entries.sort(key=lambda entry: entry[0])
+            heapq.heapify(polled_entries)
 
-            for lastAccessTime, info, cleanupFun in cache_entries:
-                if total <= self._target_usage * cache_memory:
+            while total > self._target_usage * cache_memory:
+                entry = self._popNextEviction(polled_entries)
+                if entry is None:
                     break
+                cache, info, cleanupFun = entry
                 mem = cleanupFun()
+                with self._block_heap_lock:
+                    self._evictions[cache] = self._evictions.get(cache, 0) + 1
                 logger.debug(f"Cleaned up {info} ({Memory.format(mem)})")
                 total -= mem
 
-            # Remove references to cache entries before triggering garbage collection.
-            cleanupFun = None
-            cache_entries = None
-            gc.collect()
-
             msg = "Done cleaning up, cache memory usage is now at {}".format(Memory.format(total))
             if cache_memory > 0:
                 msg += " ({:.1f}% of allowed)".format(total * 100.0 / cache_memory)
@@ -300,3 +522,27 @@ def addFirstClassCache(cache):
 
 def setRefreshInterval(seconds):
     _cache_memory_manager.setRefreshInterval(seconds)
+
+
+def setEvictionPolicy(policy):
+    _cache_memory_manager.setEvictionPolicy(policy)
+
+
+def getEvictionPolicy():
+    return _cache_memory_manager.getEvictionPolicy()
+
+
+def getCacheStatistics(cache):
+    return _cache_memory_manager.getCacheStatistics(cache)
+
+
+def blockAccessed(cache, block_id, size=None, cost=None):
+    _cache_memory_manager.blockAccessed(cache, block_id, size=size, cost=cost)
+
+
+def blockFreed(cache, block_id):
+    _cache_memory_manager.blockFreed(cache, block_id)
+
+
+def allBlocksFreed(cache):
+    _cache_memory_manager.allBlocksFreed(cache)
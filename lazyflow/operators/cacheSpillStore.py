@@ -0,0 +1,306 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import atexit
+import collections
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+
+import numpy
+
+try:
+    from numcodecs import Blosc
+
+    _codec = Blosc(cname="lz4", clevel=5, shuffle=Blosc.SHUFFLE)
+except ImportError:
+    _codec = None
+
+from lazyflow.utility import Memory
+
+logger = logging.getLogger(__name__)
+
+
+def _compress(data):
+    if _codec is not None:
+        return _codec.encode(data)
+    return zlib.compress(data, 1)
+
+
+def _decompress(buf):
+    if _codec is not None:
+        return _codec.decode(buf)
+    return zlib.decompress(buf)
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_SpilledBlock = collections.namedtuple("_SpilledBlock", ["path", "nbytes", "shape", "dtype"])
+
+
+class _CacheSpillStore(object):
+    """
+    second cache tier on (fast, local) disk
+
+    When the cache memory manager evicts a block from a cache that supports
+    spilling (see `ManagedBlockedCache.evictBlock`), the block is written
+    compressed to a scratch directory instead of being dropped. On a miss,
+    caches look for the block here before recomputing it. Blocks are moved
+    between the tiers, i.e. a block that is read back is removed from disk.
+
+    The store is disabled until a capacity is set::
+
+        cacheSpillStore.configure(capacity=50 * 1024**3, directory="/scratch")
+
+    When the (compressed) blocks on disk exceed the capacity, the least
+    recently spilled blocks are deleted. Every cache uses its own namespace
+    (see `newNamespace`), and must discard its spilled blocks when they
+    become dirty.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._base_directory = None
+        self._directory = None
+        # (namespace, key) -> _SpilledBlock, in order of spilling
+        self._blocks = collections.OrderedDict()
+        self._used_space = 0
+        self._namespace_counter = itertools.count()
+        self._file_counter = itertools.count()
+        self._hits = 0
+        self._misses = 0
+        atexit.register(self._removeDirectory)
+
+    def configure(self, capacity, directory=None):
+        """
+        set the disk space (in bytes) available for spilled blocks, 0 disables spilling
+
+        Spilled blocks are stored in a temporary directory inside the given
+        directory, or the system's temporary directory. All blocks that have
+        been spilled before are discarded.
+        """
+        with self._lock:
+            self._clearAll()
+            self._removeDirectory()
+            self._capacity = max(0, int(capacity))
+            self._base_directory = directory or None
+        if self._capacity:
+            logger.info(f"Spilling evicted cache blocks to disk, up to {Memory.format(self._capacity)}")
+
+    def isEnabled(self):
+        return self._capacity > 0
+
+    def capacity(self):
+        return self._capacity
+
+    def usedSpace(self):
+        """
+        get the disk space in bytes used by spilled blocks
+        """
+        return self._used_space
+
+    def newNamespace(self):
+        """
+        get a unique namespace for the blocks of one cache
+        """
+        return next(self._namespace_counter)
+
+    def put(self, namespace, key, data):
+        """
+        spill a block to disk
+
+        @param data plain numpy array (masked and object arrays are not supported)
+        @return True if the block was stored
+        """
+        if not self._capacity or isinstance(data, numpy.ma.MaskedArray) or data.dtype.hasobject:
+            return False
+
+        data = numpy.ascontiguousarray(data)
+        buf = _compress(data)
+        nbytes = len(buf)
+        if nbytes > self._capacity:
+            return False
+
+        with self._lock:
+            if not self._capacity:
+                return False
+            self._discard((namespace, key))
+            while self._blocks and self._used_space + nbytes > self._capacity:
+                _, oldest = self._blocks.popitem(last=False)
+                self._removeFile(oldest)
+            path = os.path.join(self._getDirectory(), f"{namespace}-{next(self._file_counter)}.blk")
+            self._blocks[(namespace, key)] = block = _SpilledBlock(path, nbytes, data.shape, data.dtype)
+            self._used_space += nbytes
+            # Write while holding the lock, so that reads never see a partial file and blocks
+            # that are discarded (because they became dirty) in the meantime are not stored.
+            # Only the memory manager thread spills blocks, so writes don't compete with each other.
+            try:
+                with open(path, "wb") as f:
+                    f.write(buf)
+            except OSError:
+                logger.warning(f"Could not spill cache block to {path}", exc_info=True)
+                self._discard((namespace, key))
+                return False
+        logger.debug(f"Spilled block {key} ({Memory.format(data.nbytes)} -> {Memory.format(block.nbytes)})")
+        return True
+
+    def get(self, namespace, key):
+        """
+        read back a spilled block and remove it from disk
+
+        @return the block's data, or None if it is not on disk
+        """
+        with self._lock:
+            block = self._blocks.pop((namespace, key), None)
+            if block is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            # Release the space right away, blocks spilled while reading may use it
+            self._used_space -= block.nbytes
+
+        # The block is no longer listed, nobody else touches its file
+        try:
+            with open(block.path, "rb") as f:
+                buf = f.read()
+        except OSError:
+            logger.warning(f"Could not read spilled cache block from {block.path}", exc_info=True)
+            return None
+        finally:
+            _unlink(block.path)
+
+        return numpy.frombuffer(_decompress(buf), dtype=block.dtype).reshape(block.shape).copy()
+
+    def keys(self, namespace):
+        """
+        get the keys of all spilled blocks of a namespace
+        """
+        with self._lock:
+            return [key for ns, key in self._blocks if ns == namespace]
+
+    def discard(self, namespace, key):
+        """
+        remove a spilled block (e.g. because it became dirty)
+        """
+        with self._lock:
+            self._discard((namespace, key))
+
+    def clear(self, namespace):
+        """
+        remove all spilled blocks of a namespace
+        """
+        with self._lock:
+            for ns_key in [ns_key for ns_key in self._blocks if ns_key[0] == namespace]:
+                self._discard(ns_key)
+
+    def statistics(self):
+        with self._lock:
+            return {
+                "blocks": len(self._blocks),
+                "usedSpace": self._used_space,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def _discard(self, ns_key):
+        """
+        (call with _lock held)
+        """
+        block = self._blocks.pop(ns_key, None)
+        if block is not None:
+            self._removeFile(block)
+
+    def _clearAll(self):
+        """
+        (call with _lock held)
+        """
+        while self._blocks:
+            _, block = self._blocks.popitem()
+            self._removeFile(block)
+
+    def _removeFile(self, block):
+        """
+        (call with _lock held)
+        """
+        self._used_space -= block.nbytes
+        _unlink(block.path)
+
+    def _getDirectory(self):
+        """
+        (call with _lock held)
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="lazyflow-spill-", dir=self._base_directory)
+        return self._directory
+
+    def _removeDirectory(self):
+        directory, self._directory = self._directory, None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+_cache_spill_store = _CacheSpillStore()
+
+
+def configure(capacity, directory=None):
+    _cache_spill_store.configure(capacity, directory)
+
+
+def isEnabled():
+    return _cache_spill_store.isEnabled()
+
+
+def newNamespace():
+    return _cache_spill_store.newNamespace()
+
+
+def put(namespace, key, data):
+    return _cache_spill_store.put(namespace, key, data)
+
+
+def get(namespace, key):
+    return _cache_spill_store.get(namespace, key)
+
+
+def keys(namespace):
+    return _cache_spill_store.keys(namespace)
+
+
+def discard(namespace, key):
+    _cache_spill_store.discard(namespace, key)
+
+
+def clear(namespace):
+    _cache_spill_store.clear(namespace)
+
+
+def statistics():
+    return _cache_spill_store.statistics()
@@ -24,6 +24,7 @@ from __future__ import absolute_import
 # Python
 from abc import abstractmethod
 import copy
+from functools import partial
 import logging
 
 # SciPy
@@ -31,7 +32,16 @@ import numpy
 
 # lazyflow
 from lazyflow.graph import Operator, InputSlot, OutputSlot, OrderedSignal, OperatorWrapper
-from lazyflow.roi import sliceToRoi, roiToSlice, getIntersection, roiFromShape, nonzero_bounding_box, enlargeRoiForHalo
+from lazyflow.roi import (
+    sliceToRoi,
+    roiToSlice,
+    getIntersection,
+    getIntersectingRois,
+    roiFromShape,
+    nonzero_bounding_box,
+    enlargeRoiForHalo,
+)
+from lazyflow.request import RequestPool
 from lazyflow.utility import Timer
 from lazyflow.classifiers import (
     LazyflowVectorwiseClassifierABC,
@@ -42,11 +52,14 @@ from lazyflow.classifiers import (
 
 from lazyflow.utility.helpers import bigintprod
 
-from .opFeatureMatrixCache import OpFeatureMatrixCache
+from .opFeatureMatrixCache import OpFeatureMatrixCache, unmatched_rows
 from .opConcatenateFeatureMatrices import OpConcatenateFeatureMatrices
 
 logger = logging.getLogger(__name__)
 
+#: dtypes the prediction operators can produce probabilities in (see OpBaseClassifierPredict.PMapsDtype)
+PMAPS_DTYPES = ("float32", "float16", "uint8")
+
 
 class OpTrainClassifierBlocked(Operator):
     """
@@ -59,6 +72,7 @@ class OpTrainClassifierBlocked(Operator):
     ClassifierFactory = InputSlot()
     nonzeroLabelBlocks = InputSlot(level=1)  # Used only in the pixelwise case.
     MaxLabel = InputSlot()
+    IncrementalTraining = InputSlot(optional=True)  # Used only in the vectorwise case.
 
     Classifier = OutputSlot()
 
@@ -73,6 +87,7 @@ class OpTrainClassifierBlocked(Operator):
         self._opVectorwiseTrain.Labels.connect(self.Labels)
         self._opVectorwiseTrain.ClassifierFactory.connect(self.ClassifierFactory)
         self._opVectorwiseTrain.MaxLabel.connect(self.MaxLabel)
+        self._opVectorwiseTrain.IncrementalTraining.connect(self.IncrementalTraining)
         self._opVectorwiseTrain.progressSignal.subscribe(self.progressSignal)
 
         # Fully connect the pixelwise training operator
@@ -246,6 +261,7 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
     Labels = InputSlot(level=1)
     ClassifierFactory = InputSlot()
     MaxLabel = InputSlot()
+    IncrementalTraining = InputSlot(optional=True)
 
     Classifier = OutputSlot()
 
@@ -269,6 +285,7 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
         self._opTrainFromFeatures.ClassifierFactory.connect(self.ClassifierFactory)
         self._opTrainFromFeatures.LabelAndFeatureMatrix.connect(self._opConcatenateFeatureMatrices.ConcatenatedOutput)
         self._opTrainFromFeatures.MaxLabel.connect(self.MaxLabel)
+        self._opTrainFromFeatures.IncrementalTraining.connect(self.IncrementalTraining)
 
         self.Classifier.connect(self._opTrainFromFeatures.Classifier)
 
@@ -303,16 +320,28 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
 
 
 class OpTrainClassifierFromFeatureVectors(Operator):
+    """
+    Trains a classifier with the LabelAndFeatureMatrix.
+
+    If IncrementalTraining is given (an IncrementalTrainingSettings), the factory
+    may update the previous classifier instead of training a new one, if the
+    training data changed only a little (see LazyflowVectorwiseClassifierFactoryABC.update_and_train).
+    """
+
     ClassifierFactory = InputSlot()
     LabelAndFeatureMatrix = InputSlot()
 
     MaxLabel = InputSlot()
+    IncrementalTraining = InputSlot(optional=True)
     Classifier = OutputSlot()
 
     def __init__(self, *args, **kwargs):
         super(OpTrainClassifierFromFeatureVectors, self).__init__(*args, **kwargs)
         self.trainingCompleteSignal = OrderedSignal()
 
+        # The last trained classifier and its label&feature matrix (for incremental training)
+        self._previous_training = None
+
         # TODO: Progress...
         # self.progressSignal = OrderedSignal()
 
@@ -333,6 +362,7 @@ class OpTrainClassifierFromFeatureVectors(Operator):
 
         if featMatrix.shape[0] < maxLabel:
             # If there isn't enough data for the random forest to train with, return None
+            self._previous_training = None
             result[:] = None
             self.trainingCompleteSignal()
             return
@@ -343,8 +373,23 @@ class OpTrainClassifierFromFeatureVectors(Operator):
             "".format(type(classifier_factory))
         )
 
-        logger.debug("Training new classifier: {}".format(classifier_factory.description))
-        classifier = classifier_factory.create_and_train(featMatrix, labelsMatrix[:, 0], channel_names)
+        classifier = None
+        incremental_training = self.IncrementalTraining.value if self.IncrementalTraining.ready() else None
+        if incremental_training is not None and self._previous_training is not None:
+            previous_classifier, previous_labels_and_features = self._previous_training
+            num_changed = _count_changed_rows(previous_labels_and_features, labels_and_features)
+            classifier = classifier_factory.update_and_train(
+                previous_classifier, featMatrix, labelsMatrix[:, 0], num_changed, incremental_training, channel_names
+            )
+        if classifier is None:
+            logger.debug("Training new classifier: {}".format(classifier_factory.description))
+            classifier = classifier_factory.create_and_train(featMatrix, labelsMatrix[:, 0], channel_names)
+
+        if incremental_training is not None and classifier is not None:
+            self._previous_training = (classifier, labels_and_features)
+        else:
+            self._previous_training = None
+
         result[0] = classifier
         if classifier is not None:
             assert issubclass(type(classifier), LazyflowVectorwiseClassifierABC), (
@@ -356,18 +401,44 @@ class OpTrainClassifierFromFeatureVectors(Operator):
         return result
 
     def propagateDirty(self, slot, subindex, roi):
+        if slot is not self.LabelAndFeatureMatrix:
+            # Only a change of the training data can be handled incrementally
+            self._previous_training = None
+        if slot is self.IncrementalTraining:
+            # The current classifier stays valid, only the next training is affected
+            return
         self.Classifier.setDirty()
 
 
+def _count_changed_rows(old_matrix, new_matrix):
+    """
+    Number of rows that were added to or removed from old_matrix to get new_matrix.
+    """
+    if (
+        len(new_matrix) >= len(old_matrix)
+        and old_matrix.shape[1:] == new_matrix.shape[1:]
+        and old_matrix.strides == new_matrix.strides
+        and old_matrix.__array_interface__["data"][0] == new_matrix.__array_interface__["data"][0]
+    ):
+        # Rows were only appended (see OpFeatureMatrixCache)
+        return len(new_matrix) - len(old_matrix)
+    return int(unmatched_rows(old_matrix, new_matrix).sum() + unmatched_rows(new_matrix, old_matrix).sum())
+
+
 class OpClassifierPredict(Operator):
     Image = InputSlot()
     LabelsCount = InputSlot()
     Classifier = InputSlot()
 
     # An entire prediction request is skipped if the mask is all zeros for the requested roi.
-    # Otherwise, the request is serviced as usual and the mask is ignored.
+    # Otherwise, masked out pixels are zero in the output; vectorwise classifiers only
+    # compute features for and predict the masked pixels (see OpVectorwiseClassifierPredict).
     PredictionMask = InputSlot(optional=True)
 
+    # Probabilities are produced in this dtype (one of PMAPS_DTYPES), so that caches and exports
+    # downstream hold them at that width. uint8 probabilities are quantized to 0..255 (drange (0, 255)).
+    PMapsDtype = InputSlot(value="float32")
+
     PMaps = OutputSlot()
 
     def __init__(self, *args, **kwargs):
@@ -406,6 +477,7 @@ class OpClassifierPredict(Operator):
             self._prediction_op = OpPixelwiseClassifierPredict(parent=self)
 
         self._prediction_op.PredictionMask.connect(self.PredictionMask)
+        self._prediction_op.PMapsDtype.connect(self.PMapsDtype)
         self._prediction_op.Image.connect(self.Image)
         self._prediction_op.LabelsCount.connect(self.LabelsCount)
         self._prediction_op.Classifier.connect(self.Classifier)
@@ -425,9 +497,14 @@ class OpBaseClassifierPredict(Operator):
     Classifier = InputSlot()
 
     # An entire prediction request is skipped if the mask is all zeros for the requested roi.
-    # Otherwise, the request is serviced as usual and the mask is ignored.
+    # Otherwise, masked out pixels are zero in the output; vectorwise classifiers only
+    # compute features for and predict the masked pixels (see OpVectorwiseClassifierPredict).
     PredictionMask = InputSlot(optional=True)
 
+    # Probabilities are produced in this dtype (one of PMAPS_DTYPES), so that caches and exports
+    # downstream hold them at that width. uint8 probabilities are quantized to 0..255 (drange (0, 255)).
+    PMapsDtype = InputSlot(value="float32")
+
     PMaps = OutputSlot()
 
     logger = logging.getLogger(__name__ + ".OpBaseClassifierPredict")
@@ -447,11 +524,18 @@ class OpBaseClassifierPredict(Operator):
         # (live prediction doesn't work when only two labels are present)
 
         self.PMaps.meta.assignFrom(self.Image.meta)
-        self.PMaps.meta.dtype = numpy.float32
         self.PMaps.meta.shape = self.Image.meta.shape[:-1] + (
             nlabels,
         )  # FIXME: This assumes that channel is the last axis
-        self.PMaps.meta.drange = (0.0, 1.0)
+
+        dtype = numpy.dtype(self.PMapsDtype.value)
+        if dtype.name not in PMAPS_DTYPES:
+            raise ValueError(f"Unsupported probability map dtype {dtype.name}, expected one of {PMAPS_DTYPES}")
+        self.PMaps.meta.dtype = dtype.type
+        if dtype == numpy.uint8:
+            self.PMaps.meta.drange = (0, 255)
+        else:
+            self.PMaps.meta.drange = (0.0, 1.0)
 
     def execute(self, slot, subindex, roi, result):
         classifier = self.Classifier.value
@@ -480,7 +564,7 @@ class OpBaseClassifierPredict(Operator):
                 result[:] = 0.0
                 return result
 
-        probabilities = self._calculate_probabilities(roi)
+        probabilities = self._calculate_probabilities(roi, mask)
 
         # We're expecting a channel for each label class.
         # If we didn't provide at least one sample for each label,
@@ -502,12 +586,19 @@ class OpBaseClassifierPredict(Operator):
             probabilities *= mask
 
         # Copy only the prediction channels the client requested.
-        result[...] = probabilities[..., roi.start[-1] : roi.stop[-1]]
+        probabilities = probabilities[..., roi.start[-1] : roi.stop[-1]]
+        if self.PMaps.meta.dtype == numpy.uint8:
+            probabilities = numpy.rint(probabilities * 255)
+        result[...] = probabilities
         return result
 
     @abstractmethod
-    def _calculate_probabilities(roi):
-        """Returns the channel-wise probability maps calculated on roi"""
+    def _calculate_probabilities(self, roi, mask=None):
+        """
+        Returns the channel-wise probability maps calculated on roi.
+        If given, mask (roi-shaped, single channel) is nonzero for the pixels that are needed,
+        the probabilities of all other pixels may be left zero.
+        """
         pass
 
     def propagateDirty(self, slot, subindex, roi):
@@ -518,10 +609,12 @@ class OpBaseClassifierPredict(Operator):
             self.PMaps.setDirty()
         elif slot == self.PredictionMask:
             self.PMaps.setDirty()
+        elif slot == self.PMapsDtype:
+            self.PMaps.setDirty()
 
 
 class OpPixelwiseClassifierPredict(OpBaseClassifierPredict):
-    def _calculate_probabilities(self, roi):
+    def _calculate_probabilities(self, roi, mask=None):
         classifier = self.Classifier.value
 
         assert isinstance(
@@ -557,6 +650,14 @@ class OpPixelwiseClassifierPredict(OpBaseClassifierPredict):
 
 
 class OpVectorwiseClassifierPredict(OpBaseClassifierPredict):
+    # Partially masked blocks are split into sub-blocks (of at most this length along each axis),
+    # features are only requested for the sub-blocks that contain masked pixels.
+    SPARSE_SUBBLOCK_LENGTH = 64
+    # If the masked sub-blocks make up more than this fraction of the block,
+    # the features of the mask's bounding box are requested at once instead.
+    # Volumes include the halo upstream reads around each request (if it publishes meta.halo).
+    MAX_SPARSE_VOLUME_FRACTION = 0.5
+
     def setupOutputs(self):
         super().setupOutputs()
         nlabels = max(self.LabelsCount.value, 1)
@@ -580,13 +681,16 @@ class OpVectorwiseClassifierPredict(OpBaseClassifierPredict):
         feature_ram_per_pixel = max(self.Image.meta.dtype().nbytes, 4) * input_channels
         self.PMaps.meta.ram_usage_per_requested_pixel = classifier_ram_per_pixel + feature_ram_per_pixel
 
-    def _calculate_probabilities(self, roi):
+    def _calculate_probabilities(self, roi, mask=None):
         classifier = self.Classifier.value
 
         assert isinstance(
             classifier, LazyflowVectorwiseClassifierABC
         ), f"Classifier {classifier} must be sublcass of {LazyflowVectorwiseClassifierABC}"
 
+        if mask is not None and not mask.all():
+            return self._calculate_sparse_probabilities(classifier, roi, mask[..., 0])
+
         key = roi.toSlice()
         newKey = key[:-1]
         newKey += (slice(0, self.Image.meta.shape[-1], None),)
@@ -609,3 +713,116 @@ class OpVectorwiseClassifierPredict(OpBaseClassifierPredict):
 
         probabilities.shape = shape[:-1] + (probabilities.shape[-1],)
         return probabilities
+
+    def _calculate_sparse_probabilities(self, classifier, roi, mask):
+        """
+        Predict only the pixels where mask (the roi's shape without channels) is nonzero.
+        Features are requested for the masked sub-blocks only, the feature vectors
+        of the masked pixels are gathered, classified at once and scattered into the result.
+        """
+        block_shape = mask.shape
+        block_start = list(roi.start[:-1])
+        sub_rois = self._get_masked_subblock_rois(mask, block_start)
+
+        input_channels = self.Image.meta.shape[-1]
+        masked_features = [None] * len(sub_rois)
+
+        def read_masked_features(index, sub_roi):
+            start = [a + b for a, b in zip(block_start, sub_roi[0])] + [0]
+            stop = [a + b for a, b in zip(block_start, sub_roi[1])] + [input_channels]
+            features = numpy.asarray(self.Image(start, stop).wait(), numpy.float32)
+            masked_features[index] = features[mask[roiToSlice(*sub_roi)]]
+
+        with Timer() as features_timer:
+            pool = RequestPool()
+            for index, sub_roi in enumerate(sub_rois):
+                pool.request(partial(read_masked_features, index, sub_roi))
+            pool.wait()
+            pool.clean()
+
+        with Timer() as prediction_timer:
+            predictions = classifier.predict_probabilities(numpy.concatenate(masked_features))
+
+        logger.debug(
+            f"Features of {len(predictions)} masked pixels in {len(sub_rois)} sub-blocks took"
+            f" {features_timer.seconds()} seconds. Prediction took {prediction_timer.seconds()} seconds. {roi}"
+        )
+
+        probabilities = numpy.zeros(block_shape + (predictions.shape[-1],), dtype=numpy.float32)
+        offset = 0
+        for sub_roi, features in zip(sub_rois, masked_features):
+            sub_slicing = roiToSlice(*sub_roi)
+            probabilities[sub_slicing][mask[sub_slicing]] = predictions[offset : offset + len(features)]
+            offset += len(features)
+        return probabilities
+
+    def _get_masked_subblock_rois(self, mask, block_start):
+        """
+        Rois (relative to the block at block_start) that contain all nonzero pixels of mask:
+        the masked sub-blocks, merged with their neighbours where a single request reads no more
+        than separate ones (upstream computes its halo around each request), or the bounding box
+        of the mask if the sub-blocks would cost (almost) as much as the dense block.
+        """
+        block_shape = mask.shape
+        subblock_shape = tuple(min(length, self.SPARSE_SUBBLOCK_LENGTH) for length in block_shape)
+        sub_rois = [
+            sub_roi
+            for sub_roi in getIntersectingRois(block_shape, subblock_shape, roiFromShape(block_shape))
+            if mask[roiToSlice(*sub_roi)].any()
+        ]
+
+        halo = self._get_upstream_halo()
+        image_shape = self.Image.meta.shape[:-1]
+
+        def upstream_volume(sub_roi):
+            start = numpy.maximum(numpy.add(block_start, sub_roi[0]) - halo, 0)
+            stop = numpy.minimum(numpy.add(block_start, sub_roi[1]) + halo, image_shape)
+            return bigintprod(stop - start)
+
+        sub_rois = _merge_adjacent_rois(sub_rois, upstream_volume)
+        sparse_volume = sum(map(upstream_volume, sub_rois))
+        if sparse_volume > self.MAX_SPARSE_VOLUME_FRACTION * upstream_volume(roiFromShape(block_shape)):
+            bounding_box = nonzero_bounding_box(mask)
+            sub_rois = [(tuple(bounding_box[0]), tuple(bounding_box[1]))]
+        return sub_rois
+
+    def _get_upstream_halo(self):
+        """
+        Number of pixels (per axis, without channels) that upstream reads around each requested roi,
+        as published in Image.meta.halo (a dict by axis key, e.g. by OpPixelFeaturesPresmoothed).
+        """
+        halo = self.Image.meta.halo or {}
+        return numpy.array([halo.get(key, 0) for key in self.Image.meta.getAxisKeys()[:-1]], dtype=numpy.int64)
+
+
+def _merge_adjacent_rois(rois, cost):
+    """
+    Merge runs of rois that are adjacent along one axis and have the same extent along all others,
+    as long as the merged roi costs no more than its parts (cost: function of a roi).
+    """
+    rois = [(tuple(start), tuple(stop)) for start, stop in rois]
+    if not rois:
+        return rois
+    ndim = len(rois[0][0])
+    for axis in range(ndim):
+
+        def sort_key(roi, axis=axis):
+            start, stop = roi
+            others = [(start[i], stop[i]) for i in range(ndim) if i != axis]
+            return (others, start[axis])
+
+        merged = []
+        for start, stop in sorted(rois, key=sort_key):
+            if merged:
+                last_start, last_stop = merged[-1]
+                adjacent = last_stop[axis] == start[axis] and all(
+                    (last_start[i], last_stop[i]) == (start[i], stop[i]) for i in range(ndim) if i != axis
+                )
+                if adjacent:
+                    joined = (last_start, last_stop[:axis] + (stop[axis],) + last_stop[axis + 1 :])
+                    if cost(joined) <= cost(merged[-1]) + cost((start, stop)):
+                        merged[-1] = joined
+                        continue
+            merged.append((start, stop))
+        rois = merged
+    return rois
@@ -40,8 +40,16 @@ import vigra
 
 from lazyflow.graph import OrderedSignal, Operator, OutputSlot, InputSlot
 from lazyflow.roi import roiToSlice, roiFromShape, determineBlockShape
-from lazyflow.utility.bigRequestStreamer import BigRequestStreamer
+from lazyflow.request import Request
+from lazyflow.utility.bigRequestStreamer import BigRequestStreamer, determine_request_blockshape
 from lazyflow.utility.helpers import bigintprod
+from lazyflow.utility.readAhead import find_prefetch_slot
+from lazyflow.utility.io_util.exportManifest import (
+    APPEND_AXES,
+    EXPORT_MODES,
+    ExportManifest,
+    write_blocks_resumable,
+)
 
 
 class OpImageReader(Operator):
@@ -344,7 +352,13 @@ class OpStackWriter(Operator):
             if parallel_requests < 1:
                 raise MemoryError("Not enough RAM to export to the selected format. Consider exporting to hdf5 (h5).")
 
-        streamer = BigRequestStreamer(self.Input, roiFromShape(self.Input.meta.shape), slice_shape, parallel_requests)
+        streamer = BigRequestStreamer(
+            self.Input,
+            roiFromShape(self.Input.meta.shape),
+            slice_shape,
+            parallel_requests,
+            prefetchSlot=find_prefetch_slot(self.Input),
+        )
 
         # Write the slices as they come in (possibly out-of-order, but probably not)
         streamer.resultSignal.subscribe(self._write_slice)
@@ -538,6 +552,10 @@ class OpH5N5WriterBigDataset(Operator):
     # h5py uses single-threaded gzip comression, which really slows down export.
     CompressionEnabled = InputSlot(value=False)
     BatchSize = InputSlot(optional=True)
+    # How to treat an existing dataset at h5N5Path, one of exportManifest.EXPORT_MODES.
+    ExportMode = InputSlot(value="new")
+    # File to record the export's progress in, so that it can be resumed. Required for ExportMode other than "new".
+    ManifestPath = InputSlot(optional=True)
 
     WriteImage = OutputSlot()
 
@@ -560,6 +578,10 @@ class OpH5N5WriterBigDataset(Operator):
         self.progressSignal = OrderedSignal()
         self.d = None
         self.f = None
+        self.manifest = None
+        self.offset = None  # Position of Image within the dataset (non-zero when appending)
+        self._resuming = False
+        self._complete = False
 
         self.h5N5File.setOrConnectIfAvailable(h5N5File)
         self.h5N5Path.setOrConnectIfAvailable(h5N5Path)
@@ -572,6 +594,9 @@ class OpH5N5WriterBigDataset(Operator):
         # Discard the reference to the dataset, to ensure that the file can be closed.
         self.d = None
         self.f = None
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
         self.progressSignal.clean()
 
     def setupOutputs(self):
@@ -615,9 +640,48 @@ class OpH5N5WriterBigDataset(Operator):
 
         self.chunkShape = determineBlockShape(list(tagged_maxshape.values()), 512_000.0 / dtypeBytes)
 
+        export_mode = self.ExportMode.value
+        assert export_mode in EXPORT_MODES, f"Unknown export mode: {export_mode}"
+        assert export_mode == "new" or self.ManifestPath.ready(), f"Export mode {export_mode} requires a ManifestPath"
+        if self.manifest is not None:
+            self.manifest.close()
+        self.manifest = ExportManifest(self.ManifestPath.value) if self.ManifestPath.ready() else None
+        self.offset = (0,) * len(dataShape)
+        self._resuming = False
+        self._complete = False
+        # The target is only modified once the export runs, see _prepare_target
+        self._group = g
+        self._datasetName = datasetName
+        self._dtype = dtype
+        self.d = None
+        if export_mode != "new" and datasetName in list(g.keys()):
+            self.d = g[datasetName]
+            self._setup_existing_dataset(export_mode, dataShape, dtype)
+
+    def _prepare_target(self):
+        """
+        Create the manifest and then the dataset, or resize the existing one, right before writing.
+        So configuring the operator leaves the target untouched, and no manifest is left behind if it isn't executed.
+        """
+        dataShape = self.Image.meta.shape
+        if self.manifest is not None and not self._resuming:
+            self.manifest.create(self._get_manifest_header(dataShape, self._dtype))
+        if self.d is not None:
+            self._resize_to_fit(numpy.add(self.offset, dataShape))
+            return
+
+        g = self._group
+        datasetName = self._datasetName
+        dtype = self._dtype
         if datasetName in list(g.keys()):
             del g[datasetName]
         kwargs = {"shape": dataShape, "dtype": dtype, "chunks": self.chunkShape}
+        if isinstance(self.f, h5py.File):
+            # Allow appending time points and channels later on
+            kwargs["maxshape"] = tuple(
+                None if key in APPEND_AXES.values() else size
+                for key, size in zip(self.Image.meta.getAxisKeys(), dataShape)
+            )
         if self.CompressionEnabled.value:
             kwargs["compression"] = "gzip"  # <-- Would be nice to use lzf compression here, but that is h5py-specific.
             if isinstance(self.f, h5py.File):
@@ -635,8 +699,64 @@ class OpH5N5WriterBigDataset(Operator):
         if self.Image.meta.display_mode is not None:
             self.d.attrs["display_mode"] = self.Image.meta.display_mode
 
+    def _get_manifest_header(self, dataShape, dtype):
+        num_threads = max(1, Request.global_thread_pool.num_workers)
+        return {
+            "shape": [int(size) for size in dataShape],
+            "dtype": numpy.dtype(dtype).name,
+            "offset": [int(o) for o in self.offset],
+            "blockshape": [int(size) for size in determine_request_blockshape(self.Image, num_threads)],
+        }
+
+    def _setup_existing_dataset(self, export_mode, dataShape, dtype):
+        """Prepare resuming an unfinished export, or appending to the existing dataset."""
+        manifest_exists = self.manifest.exists()
+        header = self.manifest.load() if manifest_exists else None
+        if header is not None and export_mode != "resume":
+            raise ValueError(
+                f"Cannot {export_mode}: the export to {self.h5N5Path.value} recorded in {self.manifest.path} "
+                'was interrupted. Finish it with export mode "resume" first, or delete the manifest to discard it.'
+            )
+        if header is not None:
+            # Interrupted export (possibly an append), continue where it stopped
+            self.manifest.check_header(shape=dataShape, dtype=numpy.dtype(dtype).name)
+            self.offset = tuple(header["offset"])
+            self._resuming = True
+        elif export_mode == "resume" and manifest_exists:
+            # The export was interrupted before writing anything, start it afresh
+            self.d = None
+        elif export_mode == "resume":
+            self.logger.info(f"Export to {self.h5N5Path.value} is complete already, nothing to resume.")
+            self.manifest = None
+            self._complete = True
+        else:
+            axis = APPEND_AXES[export_mode]
+            axiskeys = self.Image.meta.getAxisKeys()
+            if axis not in axiskeys:
+                raise ValueError(f"Cannot {export_mode}: the exported image has no '{axis}' axis.")
+            axis_index = axiskeys.index(axis)
+            existing_shape = self.d.shape
+            if len(existing_shape) != len(dataShape) or any(
+                existing != size for i, (existing, size) in enumerate(zip(existing_shape, dataShape)) if i != axis_index
+            ):
+                raise ValueError(
+                    f"Cannot {export_mode}: the existing dataset {self.h5N5Path.value} has shape {existing_shape}, "
+                    f"which doesn't match the exported image's shape {dataShape} apart from the '{axis}' axis."
+                )
+            if not isinstance(self.d, h5py.Dataset) or self.d.maxshape[axis_index] is not None:
+                raise ValueError(f"Cannot {export_mode}: the existing dataset {self.h5N5Path.value} cannot be resized.")
+            offset = [0] * len(dataShape)
+            offset[axis_index] = existing_shape[axis_index]
+            self.offset = tuple(offset)
+
+    def _resize_to_fit(self, shape):
+        if any(numpy.greater(shape, self.d.shape)):
+            self.d.resize(tuple(int(size) for size in numpy.maximum(shape, self.d.shape)))
+
     def execute(self, slot, subindex, rroi, result):
         self.progressSignal(0)
+        if not self._complete:
+            self._prepare_target()
 
         # Save the axistags as a dataset attribute
         self.d.attrs["axistags"] = self.Image.meta.axistags.toJSON()
@@ -650,7 +770,7 @@ class OpH5N5WriterBigDataset(Operator):
             self.d.attrs["drange"] = drange
 
         def handle_block_result(roi, data):
-            slicing = roiToSlice(*roi)
+            slicing = roiToSlice(*numpy.add(roi, self.offset))
             if data.flags.c_contiguous:
                 self.d.write_direct(data.view(numpy.ndarray), dest_sel=slicing)
             else:
@@ -659,14 +779,35 @@ class OpH5N5WriterBigDataset(Operator):
         batch_size = None
         if self.BatchSize.ready():
             batch_size = self.BatchSize.value
-        requester = BigRequestStreamer(self.Image, roiFromShape(self.Image.meta.shape), batchSize=batch_size)
-        requester.resultSignal.subscribe(handle_block_result)
-        requester.progressSignal.subscribe(self.progressSignal)
-        requester.execute()
+        if self.manifest is None and not self._complete:
+            requester = BigRequestStreamer(
+                self.Image,
+                roiFromShape(self.Image.meta.shape),
+                batchSize=batch_size,
+                prefetchSlot=find_prefetch_slot(self.Image),
+            )
+            requester.resultSignal.subscribe(handle_block_result)
+            requester.progressSignal.subscribe(self.progressSignal)
+            requester.execute()
+        elif self.manifest is not None:
+            if self._resuming:
+                self.manifest.verify(lambda part, roi, key: self.d[roiToSlice(*numpy.add(roi, self.offset))])
+            write_blocks_resumable(
+                self.Image,
+                handle_block_result,
+                self.manifest,
+                "data",
+                self.manifest.header["blockshape"],
+                self.progressSignal,
+                batch_size,
+            )
 
         # Be paranoid: Flush right now.
         if isinstance(self.f, h5py.File):
             self.f.file.flush()  # not available in z5py
+        if self.manifest is not None:
+            self.manifest.finish()
+            self.manifest = None
 
         # We're finished.
         result[0] = True
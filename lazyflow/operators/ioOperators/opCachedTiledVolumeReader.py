@@ -17,6 +17,10 @@ class OpCachedTiledVolumeReader(Operator):
     SpecifiedOutput = OutputSlot()  # specified as either Cached or Uncached in the
     # volume description file, depending on the 'cache_tiles' setting.
 
+    # Export streamers may read ahead of cached outputs only (see find_prefetch_slot).
+    # Tiles read ahead of the uncached output would be fetched again when processing the block.
+    prefetchOutputs = ("CachedOutput",)
+
     def __init__(self, *args, **kwargs):
         super(OpCachedTiledVolumeReader, self).__init__(*args, **kwargs)
         self._opReader = OpTiledVolumeReader(parent=self)
@@ -43,8 +47,10 @@ class OpCachedTiledVolumeReader(Operator):
 
         if self._opReader.tiled_volume.description.cache_tiles:
             self.SpecifiedOutput.connect(self._opCache.Output)
+            self.prefetchOutputs = ("CachedOutput", "SpecifiedOutput")
         else:
             self.SpecifiedOutput.connect(self._opReader.Output)
+            self.prefetchOutputs = ("CachedOutput",)
 
     def execute(self, slot, subindex, roi, result):
         assert False, "Shouldn't get here."
@@ -40,6 +40,7 @@ from lazyflow.operators.ioOperators import (
 )
 from lazyflow.roi import roiFromShape
 from lazyflow.utility import OrderedSignal, format_known_keys, PathComponents, mkdir_p, isUrl
+from lazyflow.utility.io_util.exportManifest import EXPORT_MODES, get_manifest_path
 from lazyflow.utility.io_util.write_ome_zarr import (
     write_ome_zarr,
     generate_default_target_scales,
@@ -77,6 +78,10 @@ class OpExportSlot(Operator):
         optional=True
     )  # Add an offset to the roi coordinates in the export path (useful if Input is a subregion of a larger dataset)
 
+    # How to treat existing data at the export path: replace it, resume an interrupted export,
+    # or append time points/channels (see exportManifest.EXPORT_MODES). Only for hdf5, n5 and OME-Zarr formats.
+    ExportMode = InputSlot(value="new")
+
     ExportPath = OutputSlot()
     TargetScales = OutputSlot()  # Target scales for multi-scale OME-Zarr export
     FormatSelectionErrorMsg = OutputSlot()
@@ -102,6 +107,14 @@ class OpExportSlot(Operator):
         FormatInfo("blockwise hdf5", "json", 0, 5),
     ]
     ALL_FORMATS = _2d_formats + _3d_sequence_formats + _3d_volume_formats + _4d_sequence_formats + nd_format_formats
+    RESUMABLE_FORMATS = (
+        "hdf5",
+        "compressed hdf5",
+        "n5",
+        "compressed n5",
+        "single-scale OME-Zarr",
+        "multi-scale OME-Zarr",
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -295,6 +308,11 @@ class OpExportSlot(Operator):
             export_func = self._export_impls[output_format][1]
         except KeyError as e:
             raise NotImplementedError(f"Unknown export format: {output_format}") from e
+        export_mode = self.ExportMode.value
+        if export_mode not in EXPORT_MODES:
+            raise ValueError(f"Unknown export mode: {export_mode}")
+        if export_mode != "new" and output_format not in self.RESUMABLE_FORMATS:
+            raise NotImplementedError(f'Export mode "{export_mode}" is not supported for format {output_format}')
         if not isUrl(self._get_export_path()):
             mkdir_p(PathComponents(self._get_export_path()).externalDirectory)
         export_func()
@@ -304,13 +322,19 @@ class OpExportSlot(Operator):
 
         # Create and open the hdf5/n5 file
         export_components = PathComponents(self._get_export_path())
+        export_mode = self.ExportMode.value
         try:
             with OpStreamingH5N5Reader.get_h5_n5_file(export_components.externalPath, mode="a") as h5N5File:
                 # Create a temporary operator to do the work for us
                 opH5N5Writer = OpH5N5WriterBigDataset(parent=self)
-                with contextlib.suppress(KeyError):
-                    del h5N5File[export_components.internalPath]
+                if export_mode == "new":
+                    with contextlib.suppress(KeyError):
+                        del h5N5File[export_components.internalPath]
                 try:
+                    opH5N5Writer.ExportMode.setValue(export_mode)
+                    opH5N5Writer.ManifestPath.setValue(
+                        get_manifest_path(export_components.externalPath, export_components.internalPath)
+                    )
                     opH5N5Writer.CompressionEnabled.setValue(compress)
                     opH5N5Writer.h5N5File.setValue(h5N5File)
                     opH5N5Writer.h5N5Path.setValue(export_components.internalPath)
@@ -445,7 +469,13 @@ class OpExportSlot(Operator):
         self.progressSignal(0)
         offset_meta = self.CoordinateOffset.value if self.CoordinateOffset.ready() else None
         try:
-            write_ome_zarr(self._get_export_path(), self.Input, self.progressSignal, offset_meta)
+            write_ome_zarr(
+                self._get_export_path(),
+                self.Input,
+                self.progressSignal,
+                offset_meta,
+                export_mode=self.ExportMode.value,
+            )
         finally:
             self.progressSignal(100)
 
@@ -455,7 +485,14 @@ class OpExportSlot(Operator):
         target_scales = self._get_target_scales()
         offset_meta = self.CoordinateOffset.value if self.CoordinateOffset.ready() else None
         try:
-            write_ome_zarr(self._get_export_path(), self.Input, self.progressSignal, offset_meta, target_scales)
+            write_ome_zarr(
+                self._get_export_path(),
+                self.Input,
+                self.progressSignal,
+                offset_meta,
+                target_scales,
+                export_mode=self.ExportMode.value,
+            )
         finally:
             self.progressSignal(100)
 
@@ -477,6 +514,8 @@ class FormatValidity(object):
         np.float32,
         np.float64,
     )
+    # Formats that can also store half-precision floats (e.g. float16 probability maps)
+    ALL_DTYPES_HALF_FLOAT = ALL_DTYPES + (np.float16,)
 
     # { extension : [permitted formats] }
     dtypes = {
@@ -498,13 +537,13 @@ class FormatValidity(object):
         "ppm": (np.uint8, np.uint16),
         "pgm": (np.uint8, np.uint16),
         "pbm": (np.uint8, np.uint16),  # vigra outputs p[gn]m
-        "numpy": ALL_DTYPES,
-        "hdf5": ALL_DTYPES,
-        "compressed hdf5": ALL_DTYPES,
+        "numpy": ALL_DTYPES_HALF_FLOAT,
+        "hdf5": ALL_DTYPES_HALF_FLOAT,
+        "compressed hdf5": ALL_DTYPES_HALF_FLOAT,
         "n5": ALL_DTYPES,
         "compressed n5": ALL_DTYPES,
-        "single-scale OME-Zarr": ALL_DTYPES,
-        "multi-scale OME-Zarr": ALL_DTYPES,
+        "single-scale OME-Zarr": ALL_DTYPES_HALF_FLOAT,
+        "multi-scale OME-Zarr": ALL_DTYPES_HALF_FLOAT,
     }
 
     # { extension : (min_ndim, max_ndim) }
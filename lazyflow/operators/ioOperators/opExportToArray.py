@@ -1,6 +1,6 @@
 import numpy
 from lazyflow.graph import Operator, InputSlot
-from lazyflow.utility import BigRequestStreamer, OrderedSignal
+from lazyflow.utility import BigRequestStreamer, OrderedSignal, find_prefetch_slot
 from lazyflow.roi import roiFromShape, roiToSlice
 
 
@@ -25,7 +25,12 @@ class OpExportToArray(Operator):
         final_result = numpy.ndarray(dtype=self.Input.meta.dtype, shape=self.Input.meta.shape)
 
         # Prepare streamer
-        streamer = BigRequestStreamer(self.Input, roiFromShape(self.Input.meta.shape), allowParallelResults=True)
+        streamer = BigRequestStreamer(
+            self.Input,
+            roiFromShape(self.Input.meta.shape),
+            allowParallelResults=True,
+            prefetchSlot=find_prefetch_slot(self.Input),
+        )
 
         def handle_block_result(roi, block_result):
             final_result[roiToSlice(*roi)] = block_result
@@ -29,7 +29,7 @@ import warnings
 from functools import partial
 
 import numpy
-from typing import Tuple, TypeVar, Type
+from typing import Optional, Tuple, TypeVar, Type
 from pathlib import Path
 
 import z5py
@@ -109,6 +109,7 @@ class OpFormattedDataExport(Operator):
     )  # A format string allowing {roi}, {x_start}, {x_stop}, etc.
     OutputInternalPath = InputSlot(value="exported_data")
     OutputFormat = InputSlot(value="hdf5")
+    ExportMode = InputSlot(value="new")  # See OpExportSlot.ExportMode
 
     ConvertedImage = OutputSlot()  # Not yet re-ordered
     ImageToExport = OutputSlot()  # Preview of the pre-processed image that will be exported
@@ -156,6 +157,7 @@ class OpFormattedDataExport(Operator):
         self._opExportSlot = OpExportSlot(parent=self)
         self._opExportSlot.Input.connect(opReorderAxes.Output)
         self._opExportSlot.OutputFormat.connect(self.OutputFormat)
+        self._opExportSlot.ExportMode.connect(self.ExportMode)
 
         self.ExportPath.connect(self._opExportSlot.ExportPath)
         self.TargetScales.connect(self._opExportSlot.TargetScales)
@@ -301,10 +303,21 @@ class OpFormattedDataExport(Operator):
     def run_export_to_array(self):
         return self._opExportSlot.run_export_to_array()
 
-    def run_distributed_export(self, block_roi: Slice5D):
-        from lazyflow.distributed.TaskOrchestrator import TaskOrchestrator
+    def run_distributed_export(self, block_roi: Slice5D, backend: str = "mpi", num_workers: Optional[int] = None):
+        """
+        backend: "mpi" if ilastik was launched via mpirun, or "local" to launch num_workers (default: one per core)
+        copies of this process on the local machine.
+        """
+        if backend == "mpi":
+            from lazyflow.distributed.TaskOrchestrator import TaskOrchestrator
 
-        orchestrator = TaskOrchestrator()
+            orchestrator = TaskOrchestrator()
+        elif backend == "local":
+            from lazyflow.distributed.LocalTaskOrchestrator import LocalTaskOrchestrator
+
+            orchestrator = LocalTaskOrchestrator(num_workers)
+        else:
+            raise ValueError(f"Unknown distributed backend: {backend}")
         n5_file_path = Path(self.OutputFilenameFormat.value).with_suffix(".n5")
         output_meta = self.ImageToExport.meta
         if orchestrator.rank == 0:
@@ -70,7 +70,7 @@ import re
 import logging
 from typing import Tuple, Optional
 
-from lazyflow.utility.io_util.multiprocessHdf5File import MultiProcessHdf5File
+from lazyflow.utility.io_util.multiprocessHdf5File import MultiProcessHdf5File, num_reader_processes_from_env
 
 
 class OpInputDataReader(Operator):
@@ -423,10 +423,9 @@ class OpInputDataReader(Operator):
             # If the h5 dataset is compressed, we'll have better performance
             #  with a multi-process hdf5 access object.
             # (Otherwise, single-process is faster.)
-            allow_multiprocess_hdf5 = (
-                "LAZYFLOW_MULTIPROCESS_HDF5" in os.environ and os.environ["LAZYFLOW_MULTIPROCESS_HDF5"] != ""
-            )
-            if isinstance(h5N5File, h5py.File) and allow_multiprocess_hdf5:
+            # LAZYFLOW_MULTIPROCESS_HDF5 sets the number of reader processes (see num_reader_processes_from_env)
+            num_reader_processes = num_reader_processes_from_env()
+            if isinstance(h5N5File, h5py.File) and num_reader_processes > 0:
                 try:
                     compression_setting = h5N5File[internalPath].compression
                 except Exception as e:
@@ -435,7 +434,7 @@ class OpInputDataReader(Operator):
                     raise OpInputDataReader.DatasetReadError(msg) from e
                 if compression_setting is not None:
                     h5N5File.close()
-                    h5N5File = MultiProcessHdf5File(externalPath, "r")
+                    h5N5File = MultiProcessHdf5File(externalPath, "r", num_processes=num_reader_processes)
 
         self._file = h5N5File
 
@@ -23,7 +23,7 @@ import numpy
 from lazyflow.graph import Operator, InputSlot
 
 from lazyflow.roi import roiToSlice, roiFromShape
-from lazyflow.utility import BigRequestStreamer, OrderedSignal
+from lazyflow.utility import BigRequestStreamer, OrderedSignal, find_prefetch_slot
 
 import logging
 
@@ -68,7 +68,9 @@ class OpNpyWriter(Operator):
             slicing = roiToSlice(*roi)
             final_data[slicing] = data
 
-        requester = BigRequestStreamer(self.Input, roiFromShape(self.Input.meta.shape))
+        requester = BigRequestStreamer(
+            self.Input, roiFromShape(self.Input.meta.shape), prefetchSlot=find_prefetch_slot(self.Input)
+        )
         requester.resultSignal.subscribe(handle_block_result)
         requester.progressSignal.subscribe(self.progressSignal)
         requester.execute()
@@ -44,6 +44,9 @@ class OpOMEZarrMultiscaleReader(Operator):
 
     Output = OutputSlot()
 
+    # Reads go through the store's chunk cache, so export streamers can read ahead (see find_prefetch_slot)
+    prefetchOutputs = ("Output",)
+
     def __init__(self, metadata_only_mode=False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._load_only_one_scale = metadata_only_mode
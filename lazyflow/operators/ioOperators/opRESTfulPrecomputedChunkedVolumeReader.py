@@ -26,7 +26,6 @@ import numpy
 import lazyflow.roi
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.operators.opBlockedArrayCache import OpBlockedArrayCache
-from lazyflow.utility.helpers import bigintprod
 from lazyflow.utility.io_util.RESTfulPrecomputedChunkedVolume import RESTfulPrecomputedChunkedVolume
 from lazyflow.utility.io_util.multiscaleStore import DEFAULT_SCALE_KEY
 
@@ -73,49 +72,6 @@ class OpRESTfulPrecomputedChunkedVolumeReaderNoCache(Operator):
         self.Output.meta.scales = self._volume_object.multiscales
         self.Output.meta.active_scale = active_scale  # Used by export to correlate export with input scale
 
-    @staticmethod
-    def get_intersecting_blocks(blockshape, roi, shape):
-        """Find block indices for given roi
-
-        Wraps around lazyflow.roi.getIntersectingBlocks
-        Idea is that only the required blocks are allocated using
-
-        Everything in 'czyx' - order
-
-        Args:
-            blockshape (iterable): block shape
-            roi (tuple): (start, stop), inclusive start of block, exclusive end
-
-        Difference is that it returns a dictionary consisting of
-          * 'array_of_blocks' the array of blocks
-          * 'subimage_shape' shape of the subimage
-          * 'block_offsets' array of offset for each of the blocks
-          * 'subimage_roi' the roi in the sub_image
-        """
-        blocks = lazyflow.roi.getIntersectingBlocks(blockshape, roi, asarray=True)
-
-        num_indexes = bigintprod(blocks.shape[0:-1])
-        axiscount = blocks.shape[-1]
-        blocks_array = numpy.reshape(blocks, (num_indexes, axiscount))
-
-        block_aligned_subimage_start = blocks_array.min(axis=0)
-        block_aligned_subimage_end = blocks_array.max(axis=0)
-
-        assert (block_aligned_subimage_start == blocks_array).all(axis=1).any(), "roi does not seem to be block aligned"
-        assert (block_aligned_subimage_end == blocks_array).all(axis=1).any(), "roi does not seem to be block aligned"
-
-        # get the real end of the image:
-        block_aligned_subimage_end += blockshape
-        # take care of image border
-        block_aligned_subimage_end = numpy.min([block_aligned_subimage_end, shape], axis=0)
-
-        subimage_shape = block_aligned_subimage_end - block_aligned_subimage_start
-        block_offsets = blocks_array - block_aligned_subimage_start
-        subimage_start = roi[0] - block_aligned_subimage_start
-        subimage_roi = ((subimage_start), (subimage_start + (roi[1] - roi[0])))
-
-        return blocks_array, block_offsets, subimage_roi, subimage_shape
-
     def execute(self, slot, subindex, roi, result):
         """
         Args:
@@ -125,25 +81,20 @@ class OpRESTfulPrecomputedChunkedVolumeReaderNoCache(Operator):
             result (ndarray): array in which the results are written in
 
         """
-        start, stop = roi.start, roi.stop
-        roi = (start, stop)
+        roi = (roi.start, roi.stop)
 
         scale = self.Scale.value
-        assert len(roi) == 2
         assert all(len(x) == len(self._volume_object.get_shape(scale)) for x in roi)
         block_shape = self._volume_object.get_chunk_size(scale)
-        image_shape = self._volume_object.get_shape(scale)
-        array_of_blocks, block_offsets, subimage_roi, subimage_shape = self.get_intersecting_blocks(
-            blockshape=block_shape, roi=roi, shape=image_shape
-        )
-        subimage = numpy.zeros((subimage_shape))
-        assert array_of_blocks.shape[-1] == 4
-
-        for block, offset in zip(array_of_blocks, block_offsets):
-            slicing = lazyflow.roi.roiToSlice(offset, offset + block_shape)
-            subimage[slicing] = self._volume_object.download_block(block, scale)
-        slicing = lazyflow.roi.roiToSlice(subimage_roi[0], subimage_roi[1])
-        result[...] = subimage[slicing]
+        block_starts = lazyflow.roi.getIntersectingBlocks(block_shape, roi)
+
+        # Start all downloads before waiting for any, so that they run concurrently
+        downloads = [self._volume_object.download_block_async(block_start, scale) for block_start in block_starts]
+        for block_start, download in zip(block_starts, downloads):
+            block = download.result()
+            start, stop = lazyflow.roi.getIntersection((block_start, block_start + block.shape), roi)
+            block_slicing = lazyflow.roi.roiToSlice(start - block_start, stop - block_start)
+            result[lazyflow.roi.roiToSlice(start - roi[0], stop - roi[0])] = block[block_slicing]
         return result
 
     def propagateDirty(self, slot, subindex, roi):
@@ -158,6 +109,9 @@ class OpRESTfulPrecomputedChunkedVolumeReader(Operator):
 
     Output = OutputSlot()
 
+    # Output is cached, so export streamers can read ahead (see find_prefetch_slot)
+    prefetchOutputs = ("Output",)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.RESTfulReader = OpRESTfulPrecomputedChunkedVolumeReaderNoCache(parent=self)
@@ -0,0 +1,61 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+from lazyflow.graph import InputSlot, Operator, OutputSlot
+from lazyflow.utility.io_util.slabPrefetcher import SlabPrefetcher
+
+
+class OpSlabPrefetcher(Operator):
+    """
+    Passes its input through, reading ahead along the Axis (key, e.g. "z")
+    when the output is requested slab by slab (see SlabPrefetcher).
+    """
+
+    Input = InputSlot()
+    Axis = InputSlot()
+    Output = OutputSlot()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefetcher = None
+
+    def setupOutputs(self):
+        self.Output.meta.assignFrom(self.Input.meta)
+        self._prefetcher = SlabPrefetcher(
+            self._read,
+            self.Input.meta.shape,
+            self.Input.meta.dtype,
+            self.Input.meta.getAxisKeys().index(self.Axis.value),
+        )
+
+    def execute(self, slot, subindex, roi, result):
+        self._prefetcher.read(roi.start, roi.stop, result)
+
+    def _read(self, start, stop, out):
+        return self.Input(start, stop).writeInto(out).wait()
+
+    def propagateDirty(self, slot, subindex, roi):
+        if self._prefetcher is not None:
+            self._prefetcher.reset()
+        if slot is self.Input:
+            self.Output.setDirty(roi.start, roi.stop)
+        else:
+            self.Output.setDirty()
@@ -23,6 +23,7 @@ import os
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.operators.generic import OpMultiArrayStacker
+from lazyflow.operators.ioOperators.opSlabPrefetcher import OpSlabPrefetcher
 from lazyflow.operators.ioOperators.opStreamingH5N5Reader import OpStreamingH5N5Reader
 from lazyflow.utility.pathHelpers import PathComponents, globH5N5
 
@@ -109,6 +110,9 @@ class OpStreamingH5N5SequenceReaderS(Operator):
         self._readers = []
         self._opStacker = OpMultiArrayStacker(parent=self)
         self._opStacker.AxisIndex.setValue(0)
+        # Read the next slab ahead when the stack is streamed along the sequence axis
+        self._opPrefetcher = OpSlabPrefetcher(parent=self)
+        self._opPrefetcher.Input.connect(self._opStacker.Output)
 
     def cleanUp(self):
         self._opStacker.Images.resize(0)
@@ -132,7 +136,7 @@ class OpStreamingH5N5SequenceReaderS(Operator):
             self.OutputImage.meta.NOTREADY = True
             return
 
-        self.OutputImage.connect(self._opStacker.Output)
+        self.OutputImage.connect(self._opPrefetcher.Output)
         # Get slice axes from first image
         try:
             opFirstImg = OpStreamingH5N5Reader(parent=self)
@@ -163,6 +167,7 @@ class OpStreamingH5N5SequenceReaderS(Operator):
         self._opStacker.Images.resize(0)
         self._opStacker.Images.resize(num_files)
         self._opStacker.AxisFlag.setValue(new_axis)
+        self._opPrefetcher.Axis.setValue(new_axis)
 
         for opReader in self._readers:
             opReader.cleanUp()
@@ -18,7 +18,9 @@
 # on the ilastik web site at:
 #          http://ilastik.org/license.html
 ###############################################################################
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from functools import partial
+import itertools
 import logging
 
 import numpy
@@ -26,8 +28,10 @@ import tifffile
 import vigra
 
 from lazyflow.graph import InputSlot, Operator, OutputSlot
+from lazyflow.request import Request, RequestPool
 from lazyflow.roi import roiToSlice
 from lazyflow.utility.helpers import get_default_axisordering
+from lazyflow.utility.io_util.fileHandleCache import FileHandleCache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,157 @@ class UnsupportedTiffError(Exception):
         super().__init__(f"Unable to open TIFF file: {filepath}. {details}")
 
 
+def _page_roi_to_shaped(page_shape, shaped, roi_within_page):
+    """
+    Translate a roi within a page (in axes of page.shape) to the page's 5D
+    (separate samples, depth, length, width, contiguous samples) layout,
+    of which page.shape is the squeezed version.
+
+    Returns None if the mapping is ambiguous (i.e. the page has singleton axes).
+    """
+    non_singleton = [i for i, s in enumerate(shaped) if s > 1]
+    if len(non_singleton) != len(page_shape) or any(shaped[i] != s for i, s in zip(non_singleton, page_shape)):
+        return None
+    start = [0] * len(shaped)
+    stop = [1] * len(shaped)
+    for i, a, b in zip(non_singleton, *roi_within_page):
+        start[i], stop[i] = int(a), int(b)
+    return start, stop
+
+
+def _read_page_region(filehandle, page, roi_within_page):
+    """
+    Decode only the tiles/strips of a page that intersect roi_within_page.
+
+    Returns None if the page's layout is not understood, callers should read the whole page then.
+    """
+    keyframe = page.keyframe
+    shaped = keyframe.shaped
+    shaped_roi = _page_roi_to_shaped(keyframe.shape, shaped, roi_within_page)
+    if shaped_roi is None:
+        return None
+    start, stop = shaped_roi
+    num_separate_samples, depth, length, width, _ = shaped
+
+    if keyframe.is_tiled:
+        segment_shape = (keyframe.tiledepth, keyframe.tilelength, keyframe.tilewidth)
+    else:
+        segment_shape = (1, min(keyframe.rowsperstrip, length), width)
+    grid = tuple(-(-s // seg) for s, seg in zip((depth, length, width), segment_shape))
+    if num_separate_samples * numpy.prod(grid) != len(page.dataoffsets):
+        return None
+
+    # Segments are numbered in C order of (separate sample, depth, length, width) positions
+    segment_ranges = [range(a // seg, (b - 1) // seg + 1) for a, b, seg in zip(start[1:4], stop[1:4], segment_shape)]
+    segment_indices = [
+        int(numpy.ravel_multi_index((sample,) + position, (num_separate_samples,) + grid))
+        for sample in range(start[0], stop[0])
+        for position in itertools.product(*segment_ranges)
+    ]
+    # Read in file order
+    segment_indices.sort(key=lambda index: page.dataoffsets[index])
+
+    region = numpy.empty(numpy.subtract(stop, start), dtype=keyframe.dtype)
+    for index in segment_indices:
+        offset = page.dataoffsets[index]
+        bytecount = page.databytecounts[index]
+        data = None
+        if offset and bytecount:
+            filehandle.seek(offset)
+            data = filehandle.read(bytecount)
+        segment, (s, d, h, w, _), decoded_shape = keyframe.decode(
+            data, index, jpegtables=keyframe.jpegtables, jpegheader=getattr(keyframe, "jpegheader", None)
+        )
+
+        # Intersection of the segment with the requested region, in page coordinates
+        segment_start = (d, h, w)
+        segment_stop = [min(p + n, b) for p, n, b in zip(segment_start, decoded_shape, stop[1:4])]
+        segment_start = [max(p, a) for p, a in zip(segment_start, start[1:4])]
+        target = (s - start[0],) + tuple(
+            slice(a - r, b - r) for a, b, r in zip(segment_start, segment_stop, start[1:4])
+        )
+        if segment is None:
+            # Sparse file: the segment was never written
+            region[target] = getattr(keyframe, "nodata", 0)
+            continue
+        segment = segment.reshape(decoded_shape)
+        source = tuple(slice(a - p, b - p) for a, b, p in zip(segment_start, segment_stop, (d, h, w)))
+        region[target] = segment[source + (slice(start[4], stop[4]),)]
+
+    return region.reshape(numpy.subtract(roi_within_page[1], roi_within_page[0]))
+
+
+TiffMetadata = namedtuple("TiffMetadata", ["shape", "axes", "dtype", "page_shape", "page_axes"])
+
+
+def open_tiff(filepath):
+    return tifffile.TiffFile(filepath, mode="r")
+
+
+def read_tiff_metadata(tiff_file, filepath):
+    """
+    Shape and axes of the (only) image series of a TIFF file, as OpTiffReader presents it.
+    """
+    series = tiff_file.series[0]
+    if len(tiff_file.series) > 1:
+        raise UnsupportedTiffError(
+            filepath=filepath,
+            details=f"Don't know how to read TIFF files with more than one image series (Your image has {len(tiff_file.series)} series",
+        )
+
+    axes = series.axes.lower()
+    shape = series.shape
+
+    # we treat "sample" axis as "channel"
+    # "i" ("sequence") can either be "time", "z", or "channel", in that order.
+    for old, new in ("sc", "it", "iz", "ic"):
+        axes = axes.replace(old, new)
+
+    # tifffile will add potentially multiple "q" axes to data when saving without specifying them
+    if "q" in axes:
+        axes = get_default_axisordering(shape)
+
+    axes_set = set(axes)
+    if len(shape) < 2 or len(shape) > 5 or len(axes_set) != len(axes) or axes_set.difference("tzyxc"):
+        raise UnsupportedTiffError(
+            filepath=filepath,
+            details=f"Only 2D-5D TIFFs with unique 'tzyxc' axes are allowed (got {len(shape)}D TIFF with {axes} axes)",
+        )
+
+    return TiffMetadata(
+        shape=shape,
+        axes=axes,
+        dtype=series.dtype,
+        page_shape=series.pages[0].shape,
+        page_axes=series.pages[0].axes.lower(),
+    )
+
+
+def read_tiff_page(tiff_file, metadata, page_ndindex, roi_within_page, out):
+    """
+    Read a roi of one page into out.
+
+    :param page_ndindex: position of the page along the non-page axes of the image
+    """
+    non_page_shape = metadata.shape[: -len(metadata.page_shape)]
+    key = None
+    if non_page_shape:
+        key = int(numpy.ravel_multi_index(page_ndindex, non_page_shape))
+
+    series = tiff_file.series[0]
+    page_data = None
+    if len(series.pages) > (key or 0):
+        page_data = _read_page_region(tiff_file.filehandle, series.pages[key or 0], roi_within_page)
+    if page_data is None:
+        page_data = series.asarray(key=key, maxworkers=1)
+        assert page_data.shape == metadata.page_shape, "Unexpected page shape: {} vs {}".format(
+            page_data.shape, metadata.page_shape
+        )
+        page_data = page_data[roiToSlice(*roi_within_page)]
+
+    out[...] = page_data
+
+
 class OpTiffReader(Operator):
     """
     Reads TIFF files as an ND array. We use two different libraries:
@@ -58,60 +213,47 @@ class OpTiffReader(Operator):
     def __init__(self, *args, **kwargs):
         super(OpTiffReader, self).__init__(*args, **kwargs)
         self._filepath = None
-        self._page_shape = None
-        self._non_page_shape = None
+        self._metadata = None
+        self._handles = None
+        self._memmap = None
 
     def setupOutputs(self):
+        self._closeFile()
         self._filepath = self.Filepath.value
-        with tifffile.TiffFile(self._filepath, mode="r") as tiff_file:
-            series = tiff_file.series[0]
-            if len(tiff_file.series) > 1:
-                raise UnsupportedTiffError(
-                    filepath=self._filepath,
-                    details=f"Don't know how to read TIFF files with more than one image series (Your image has {len(tiff_file.series)} series",
-                )
-
-            axes = series.axes.lower()
-            shape = series.shape
-            dtype_code = series.dtype
+        # tifffile handles are not thread-safe, so parallel requests each check out a handle of their own
+        self._handles = FileHandleCache(open_tiff)
+        with self._handles.handle(self._filepath) as tiff_file:
+            self._metadata = metadata = read_tiff_metadata(tiff_file, self._filepath)
 
-            # we treat "sample" axis as "channel"
-            # "i" ("sequence") can either be "time", "z", or "channel", in that order.
-            for old, new in ("sc", "it", "iz", "ic"):
-                axes = axes.replace(old, new)
-
-            # tifffile will add potentially multiple "q" axes to data when saving without specifying them
-            if "q" in axes:
-                axes = get_default_axisordering(shape)
-
-            axes_set = set(axes)
-            if len(shape) < 2 or len(shape) > 5 or len(axes_set) != len(axes) or axes_set.difference("tzyxc"):
-                raise UnsupportedTiffError(
-                    filepath=self._filepath,
-                    details=f"Only 2D-5D TIFFs with unique 'tzyxc' axes are allowed (got {len(shape)}D TIFF with {axes} axes)",
-                )
+        # Uncompressed, contiguous image data can be read without tifffile
+        try:
+            memmap = tifffile.memmap(self._filepath, series=0, mode="r")
+        except (ValueError, OSError):
+            memmap = None
+        if memmap is not None and memmap.shape == metadata.shape:
+            logger.debug(f"Reading {self._filepath} via memory map")
+            self._memmap = memmap
 
-            self._page_axes = series.pages[0].axes.lower()
-            self._page_shape = series.pages[0].shape
+        self.Output.meta.shape = metadata.shape
+        self.Output.meta.axistags = vigra.defaultAxistags(metadata.axes)
+        self.Output.meta.dtype = numpy.dtype(metadata.dtype).type
 
-            self._non_page_shape = shape[: -len(self._page_shape)]
-
-        self.Output.meta.shape = shape
-        self.Output.meta.axistags = vigra.defaultAxistags(axes)
-        self.Output.meta.dtype = numpy.dtype(dtype_code).type
-
-        blockshape = defaultdict(lambda: 1, zip(self._page_axes, self._page_shape))
+        blockshape = defaultdict(lambda: 1, zip(metadata.page_axes, metadata.page_shape))
         # optimization: reading bigger blockshapes in z means much smoother user experience
         # but don't change z if it's part of the page shape
         blockshape.setdefault("z", 32)
-        self.Output.meta.ideal_blockshape = tuple(blockshape[k] for k in axes)
+        self.Output.meta.ideal_blockshape = tuple(blockshape[k] for k in metadata.axes)
 
     def execute(self, slot, subindex, roi, result):
         """
         Use tifffile to read the result.
         This allows us to support JPEG-compressed TIFFs.
         """
-        num_page_axes = len(self._page_shape)
+        if self._memmap is not None:
+            result[...] = self._memmap[roiToSlice(roi.start, roi.stop)]
+            return
+
+        num_page_axes = len(self._metadata.page_shape)
         roi = numpy.array([roi.start, roi.stop])
         # page axes are assumed to be last in roi
         page_index_roi = roi[:, :-num_page_axes]
@@ -121,22 +263,32 @@ class OpTiffReader(Operator):
 
         # Read each page out individually
         page_index_roi_shape = page_index_roi[1] - page_index_roi[0]
+        page_ndindices = list(numpy.ndindex(*page_index_roi_shape))
+        if len(page_ndindices) == 1:
+            self._read_page(page_index_roi[0], roi_within_page, result[page_ndindices[0]])
+            return
 
-        with tifffile.TiffFile(self._filepath, mode="r") as f:
-            for roi_page_ndindex in numpy.ndindex(*page_index_roi_shape):
-                key = None
-                if self._non_page_shape:
-                    tiff_page_ndindex = page_index_roi[0] + roi_page_ndindex
-                    key = int(numpy.ravel_multi_index(tiff_page_ndindex, self._non_page_shape))
-                    logger.debug(...)
+        # Decode pages in parallel
+        with RequestPool() as pool:
+            for roi_page_ndindex in page_ndindices:
+                read_page = partial(
+                    self._read_page, page_index_roi[0] + roi_page_ndindex, roi_within_page, result[roi_page_ndindex]
+                )
+                pool.add(Request(read_page))
 
-                page_data = f.series[0].asarray(key=key, maxworkers=1)
+    def _read_page(self, page_ndindex, roi_within_page, out):
+        with self._handles.handle(self._filepath) as tiff_file:
+            read_tiff_page(tiff_file, self._metadata, page_ndindex, roi_within_page, out)
 
-                assert page_data.shape == self._page_shape, "Unexpected page shape: {} vs {}".format(
-                    page_data.shape, self._page_shape
-                )
+    def _closeFile(self):
+        if self._handles is not None:
+            self._handles.close()
+            self._handles = None
+        self._memmap = None
 
-                result[roi_page_ndindex] = page_data[roiToSlice(*roi_within_page)]
+    def cleanUp(self):
+        self._closeFile()
+        super(OpTiffReader, self).cleanUp()
 
     def propagateDirty(self, slot, subindex, roi):
         if slot == self.Filepath:
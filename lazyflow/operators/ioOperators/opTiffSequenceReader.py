@@ -1,11 +1,16 @@
-from builtins import zip
-
+from collections import defaultdict
+from functools import partial
 import os
 import glob
 
+import numpy
+import vigra
+
 from lazyflow.graph import Operator, InputSlot, OutputSlot
-from lazyflow.operators.generic import OpMultiArrayStacker
-from lazyflow.operators.ioOperators.opTiffReader import OpTiffReader
+from lazyflow.operators.ioOperators.opTiffReader import OpTiffReader, open_tiff, read_tiff_metadata, read_tiff_page
+from lazyflow.request import Request, RequestPool
+from lazyflow.utility.io_util.fileHandleCache import FileHandleCache
+from lazyflow.utility.io_util.slabPrefetcher import SlabPrefetcher
 
 import logging
 
@@ -22,6 +27,11 @@ class OpTiffSequenceReader(Operator):
           operator to a cache whose block size is large in the X-Y
           plane.
 
+    Files are only opened when they are read (at most MAX_OPEN_FILES are kept
+    open), the slices of a request are read in parallel, and when the volume
+    is streamed in order along the sequence axis, the next slab is read ahead.
+    All files must have the same shape and dtype as the first one.
+
     :param globstring: A glob string as defined by the glob module. We
         also support the following special extension to globstring
         syntax: A single string can hold a *list* of globstrings.
@@ -54,39 +64,55 @@ class OpTiffSequenceReader(Operator):
             self.msg = "Unable to open file: {}".format(filename)
             super(OpTiffSequenceReader.FileOpenError, self).__init__(self.msg)
 
+    class InconsistentShape(Exception):
+        def __init__(self, filename):
+            self.filename = filename
+            self.msg = f"Cannot stack {filename} because its shape or data type differs from the first file"
+            super(OpTiffSequenceReader.InconsistentShape, self).__init__(self.msg)
+
+    #: maximum number of idle files that are kept open
+    MAX_OPEN_FILES = 64
+
     def __init__(self, *args, **kwargs):
         super(OpTiffSequenceReader, self).__init__(*args, **kwargs)
-        self._readers = []
-        self._opStacker = OpMultiArrayStacker(parent=self)
-        self._opStacker.AxisIndex.setValue(0)
+        self._file_paths = []
+        self._metadata = None
+        self._handles = None
+        self._prefetcher = None
+        # index of the sequence axis in Output, and whether the files don't have it
+        self._sequence_axis_index = None
+        self._files_lack_sequence_axis = True
 
     def cleanUp(self):
-        self._opStacker.Images.resize(0)
-        for opReader in self._readers:
-            opReader.cleanUp()
+        self._closeFiles()
         super(OpTiffSequenceReader, self).cleanUp()
 
+    def _closeFiles(self):
+        if self._handles is not None:
+            self._handles.close()
+            self._handles = None
+        self._prefetcher = None
+
     def setupOutputs(self):
         file_paths = self.expandGlobStrings(self.GlobString.value)
         for filename in file_paths:
             if os.path.splitext(filename)[1].lower() not in OpTiffReader.TIFF_EXTS:
                 raise OpTiffSequenceReader.WrongFileTypeError(filename)
 
+        self._closeFiles()
         num_files = len(file_paths)
         if num_files == 0:
-            self.Output.disconnect()
             self.Output.meta.NOTREADY = True
             return
 
-        self.Output.connect(self._opStacker.Output)
+        self._handles = FileHandleCache(open_tiff, max_open=self.MAX_OPEN_FILES)
         try:
-            opFirstImg = OpTiffReader(parent=self)
-            opFirstImg.Filepath.setValue(file_paths[0])
-            slice_axes = opFirstImg.Output.meta.getAxisKeys()
-            opFirstImg.cleanUp()
+            with self._handles.handle(file_paths[0]) as tiff_file:
+                metadata = read_tiff_metadata(tiff_file, file_paths[0])
         except RuntimeError as e:
             logger.error(str(e))
             raise OpTiffSequenceReader.FileOpenError(file_paths[0])
+        slice_axes = metadata.axes
 
         if self.SequenceAxis.ready():
             new_axis = self.SequenceAxis.value
@@ -103,27 +129,92 @@ class OpTiffSequenceReader(Operator):
                 # Stack across first existing axis
                 new_axis = slice_axes[0]
 
-        self._opStacker.Images.resize(0)
-        self._opStacker.Images.resize(num_files)
-        self._opStacker.AxisFlag.setValue(new_axis)
-
-        for opReader in self._readers:
-            opReader.cleanUp()
-
-        self._readers = []
-        for filename, stacker_slot in zip(file_paths, self._opStacker.Images):
-            opReader = OpTiffReader(parent=self)
-            try:
-                opReader.Filepath.setValue(filename)
-            except RuntimeError as e:
-                logger.error(str(e))
-                raise OpTiffSequenceReader.FileOpenError(file_paths[0])
+        axes = slice_axes
+        shape = list(metadata.shape)
+        if new_axis in slice_axes:
+            # Concatenate the files along an existing axis
+            self._files_lack_sequence_axis = False
+            self._sequence_axis_index = axes.index(new_axis)
+            shape[self._sequence_axis_index] *= num_files
+        else:
+            # Stack along a new (first) axis
+            self._files_lack_sequence_axis = True
+            self._sequence_axis_index = 0
+            axes = new_axis + axes
+            shape.insert(0, num_files)
+
+        self._file_paths = file_paths
+        self._metadata = metadata
+
+        self.Output.meta.shape = tuple(shape)
+        self.Output.meta.axistags = vigra.defaultAxistags(axes)
+        self.Output.meta.dtype = numpy.dtype(metadata.dtype).type
+
+        blockshape = defaultdict(lambda: 1, zip(metadata.page_axes, metadata.page_shape))
+        # Slices are read in parallel, so prefer blocks of several slices (as OpTiffReader does for z)
+        blockshape.setdefault("z", 32)
+        self.Output.meta.ideal_blockshape = tuple(blockshape[k] for k in axes)
+
+        self._prefetcher = SlabPrefetcher(
+            self._readRoi, self.Output.meta.shape, metadata.dtype, self._sequence_axis_index
+        )
+
+    def execute(self, slot, subindex, roi, result):
+        self._prefetcher.read(roi.start, roi.stop, result)
+
+    def _readRoi(self, start, stop, out):
+        """
+        Read a roi of the output, reading the files it touches in parallel.
+        """
+        axis = self._sequence_axis_index
+        file_extent = 1 if self._files_lack_sequence_axis else self._metadata.shape[axis]
+
+        reads = []
+        for file_index in range(start[axis] // file_extent, (stop[axis] - 1) // file_extent + 1):
+            file_offset = file_index * file_extent
+            # Part of the roi in this file, along the sequence axis
+            a = max(start[axis], file_offset)
+            b = min(stop[axis], file_offset + file_extent)
+            out_key = [slice(None)] * len(start)
+            if self._files_lack_sequence_axis:
+                file_start = tuple(start[:axis]) + tuple(start[axis + 1 :])
+                file_stop = tuple(stop[:axis]) + tuple(stop[axis + 1 :])
+                out_key[axis] = file_index - start[axis]
             else:
-                stacker_slot.connect(opReader.Output)
-                self._readers.append(opReader)
+                file_start = tuple(start[:axis]) + (a - file_offset,) + tuple(start[axis + 1 :])
+                file_stop = tuple(stop[:axis]) + (b - file_offset,) + tuple(stop[axis + 1 :])
+                out_key[axis] = slice(a - start[axis], b - start[axis])
+            reads.append(partial(self._readFile, file_index, file_start, file_stop, out[tuple(out_key)]))
+
+        if len(reads) == 1:
+            reads[0]()
+            return out
+
+        with RequestPool() as pool:
+            for read in reads:
+                pool.add(Request(read))
+        return out
+
+    def _readFile(self, file_index, start, stop, out):
+        path = self._file_paths[file_index]
+        metadata = self._metadata
+        with self._handles.handle(path) as tiff_file:
+            series = tiff_file.series[0]
+            if series.shape != metadata.shape or series.dtype != metadata.dtype:
+                raise OpTiffSequenceReader.InconsistentShape(path)
+
+            num_page_axes = len(metadata.page_shape)
+            # page axes are last
+            page_index_start = numpy.array(start[:-num_page_axes], dtype=int)
+            page_index_shape = numpy.subtract(stop[:-num_page_axes], start[:-num_page_axes])
+            roi_within_page = numpy.array([start[-num_page_axes:], stop[-num_page_axes:]])
+            for page_ndindex in numpy.ndindex(*page_index_shape):
+                read_tiff_page(tiff_file, metadata, page_index_start + page_ndindex, roi_within_page, out[page_ndindex])
 
     def propagateDirty(self, slot, subindex, roi):
-        assert slot == self.GlobString
+        assert slot in (self.GlobString, self.SequenceAxis)
+        if self._prefetcher is not None:
+            self._prefetcher.reset()
         # Any change to the globstring means our entire output is dirty.
         self.Output.setDirty()
 
@@ -98,6 +98,9 @@ class OpBlockedArrayCache(Operator, ManagedBlockedCache):
 
     # ======= mimic cache interface for wrapping operators =======
 
+    # Blocks are reported to the memory manager by the inner cache, they must not be polled here as well
+    reportsBlockAccess = True
+
     def usedMemory(self):
         return self._opSimpleBlockedArrayCache.usedMemory()
 
@@ -117,6 +120,9 @@ class OpBlockedArrayCache(Operator, ManagedBlockedCache):
     def freeBlock(self, key):
         return self._opSimpleBlockedArrayCache.freeBlock(key)
 
+    def evictBlock(self, key):
+        return self._opSimpleBlockedArrayCache.evictBlock(key)
+
     def freeDirtyMemory(self):
         return self._opSimpleBlockedArrayCache.freeDirtyMemory()
 
@@ -124,4 +130,7 @@ class OpBlockedArrayCache(Operator, ManagedBlockedCache):
         self._opSimpleBlockedArrayCache.generateReport(report)
         child = copy.copy(report)
         super(OpBlockedArrayCache, self).generateReport(report)
+        # blocks are reported to the memory manager by the inner cache
+        report.recomputeCost = child.recomputeCost
+        report.evictions = child.evictions
         report.children.append(child)
@@ -167,8 +167,38 @@ class ManagedCache(ObservableCache):
 class ManagedBlockedCache(ManagedCache):
     """
     Interface for caches that can be managed in more detail
+
+    Caches with many blocks should set `reportsBlockAccess` and call the
+    notify* methods below whenever a block is accessed, stored or removed.
+    The memory manager then keeps track of their blocks incrementally
+    instead of polling getBlockAccessTimes() for all blocks on every cleanup.
+    Caches that also report the size and the time it took to compute a block
+    when storing it let the cost-aware eviction policy keep expensive blocks.
     """
 
+    reportsBlockAccess = False
+
+    def notifyBlockAccess(self, block_id, size=None, cost=None):
+        """
+        tell the memory manager that a block was accessed or (re-)stored
+
+        @param size size of the block in bytes (if known)
+        @param cost time in seconds it took to compute the block (if known)
+        """
+        cacheMemoryManager.blockAccessed(self, block_id, size=size, cost=cost)
+
+    def notifyBlockFreed(self, block_id):
+        """
+        tell the memory manager that a block was removed from the cache
+        """
+        cacheMemoryManager.blockFreed(self, block_id)
+
+    def notifyAllBlocksFreed(self):
+        """
+        tell the memory manager that all blocks were removed from the cache
+        """
+        cacheMemoryManager.allBlocksFreed(self)
+
     def lastAccessTime(self):
         """
         get the timestamp of the last access (python timestamp)
@@ -201,6 +231,24 @@ class ManagedBlockedCache(ManagedCache):
         """
         raise NotImplementedError("No default implementation for freeBlock()")
 
+    def evictBlock(self, block_id):
+        """
+        free memory in a specific block because the memory manager needs it
+
+        Unlike freeBlock(), which is also used for discarding dirty blocks,
+        this is only called for clean blocks. Caches that can keep evicted
+        blocks in the spill store (see cacheSpillStore.py) do so here.
+
+        @return amount of bytes freed (if applicable)
+        """
+        return self.freeBlock(block_id)
+
+    def generateReport(self, memInfoNode):
+        super(ManagedBlockedCache, self).generateReport(memInfoNode)
+        stats = cacheMemoryManager.getCacheStatistics(self)
+        memInfoNode.recomputeCost = stats["recomputeCost"]
+        memInfoNode.evictions = stats["evictions"]
+
 
 class MemInfoNode(object):
     """
@@ -229,6 +277,13 @@ class MemInfoNode(object):
     # python timestamp of last access
     lastAccessTime = None
 
+    # seconds it would take to recompute all blocks in the cache
+    # (for caches that report their block costs)
+    recomputeCost = None
+
+    # number of blocks (or whole caches) freed by the memory manager
+    evictions = None
+
     # operator name
     name = None
 
@@ -40,6 +40,8 @@ import h5py
 from lazyflow.request import Request, RequestPool, RequestLock
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.roi import TinyVector, getIntersectingBlocks, getBlockBounds, roiToSlice, getIntersection
+from lazyflow.rtype import SubRegion
+from lazyflow.operators import cacheSpillStore
 from lazyflow.operators.opCache import ManagedBlockedCache
 from lazyflow.utility.chunkHelpers import chooseChunkShape
 from lazyflow.utility.helpers import bigintprod
@@ -96,6 +98,8 @@ class OpUnmanagedCompressedCache(Operator):
     def __init__(self, *args, **kwargs):
         super(OpUnmanagedCompressedCache, self).__init__(*args, **kwargs)
         self._lock = RequestLock()
+        self._lazyLock = RequestLock()
+        self._spill_namespace = cacheSpillStore.newNamespace()
         self._init_cache(None)
         self._block_id_counter = itertools.count()  # Used to ensure unique in-memory file names
         self._ignore_ideal_blockshape = False
@@ -108,10 +112,17 @@ class OpUnmanagedCompressedCache(Operator):
             self._blockLocks = {}
             self._chunkshape = self._chooseChunkshape(self._blockshape)
             self._last_access_times = collections.defaultdict(float)
+            cacheSpillStore.clear(self._spill_namespace)
+            # Input data that is only read when its blocks are accessed, see setLazyInputs()
+            self._lazyInputs = {}
+            self._lazyIndex = None
 
     def cleanUp(self):
         logger.debug("Cleaning up")
         self._closeAllCacheFiles()
+        self._lazyInputs = {}
+        self._lazyIndex = None
+        cacheSpillStore.clear(self._spill_namespace)
         super(OpUnmanagedCompressedCache, self).cleanUp()
 
     def setupOutputs(self):
@@ -163,6 +174,7 @@ class OpUnmanagedCompressedCache(Operator):
         block_starts = list(map(tuple, block_starts))
 
         # Ensure all block cache files are up-to-date
+        self._loadLazyInputs(block_starts)
         self._waitForBlocks(block_starts)
         self._copyData(roi, destination, block_starts)
         return destination
@@ -217,6 +229,8 @@ class OpUnmanagedCompressedCache(Operator):
         """
         # Set difference: clean = existing - dirty
         clean_block_starts = set(self._cacheFiles.keys()) - self._dirtyBlocks
+        # Blocks with lazy input data are clean as well, they are loaded once their data is requested
+        clean_block_starts |= self._lazyBlockStarts()
 
         output_shape = self.Output.meta.shape
         clean_block_rois = list(map(partial(getBlockBounds, output_shape, self._blockshape), clean_block_starts))
@@ -239,6 +253,7 @@ class OpUnmanagedCompressedCache(Operator):
         ).all(), "OutputHdf5 slot requires roi to be exactly one block."
 
         block_roi = [roi.start, roi.stop]
+        self._loadLazyInputs([tuple(roi.start)])
         self._ensureCached(block_roi)
         dataset = self._getBlockDataset(block_roi)
         assert str(block_roi) not in destination, "destination hdf5 group already has a dataset with this block's name"
@@ -255,6 +270,8 @@ class OpUnmanagedCompressedCache(Operator):
 
                     for block_start in block_starts:
                         self._dirtyBlocks.add(block_start)
+                        cacheSpillStore.discard(self._spill_namespace, block_start)
+                self._discardLazyInputs(block_starts)
             # Forward to downstream connections
             self.Output.setDirty(roi)
         elif slot == self.BlockShape:
@@ -440,7 +457,12 @@ class OpUnmanagedCompressedCache(Operator):
                     # Can't write directly into the hdf5 dataset because
                     #  h5py.dataset.__getitem__ creates a copy, not a view.
                     # We must use a temporary numpy array to hold the data.
-                    data = self.Input(*entire_block_roi).wait()
+                    data = None
+                    if cacheSpillStore.isEnabled() and not self.Output.meta.has_mask:
+                        # Evicted earlier, but still clean
+                        data = cacheSpillStore.get(self._spill_namespace, block_start)
+                    if data is None:
+                        data = self.Input(*entire_block_roi).wait()
                     block_file["data"][...] = data
                     if self.Output.meta.has_mask:
                         block_file["mask"][...] = data.mask
@@ -472,6 +494,8 @@ class OpUnmanagedCompressedCache(Operator):
         """
         Overridden from Operator
         """
+        # New data is written on top of the lazy input data (if any)
+        self._loadLazyInputs(list(map(tuple, getIntersectingBlocks(self._blockshape, (roi.start, roi.stop)))))
         if slot == self.Input:
             self._setInSlotInput(slot, subindex, roi, value)
         elif slot == self.InputHdf5:
@@ -479,6 +503,76 @@ class OpUnmanagedCompressedCache(Operator):
         else:
             assert False, "Invalid input slot for setInSlot(): {}".format(slot.name)
 
+    def setLazyInputs(self, inputs):
+        """
+        Provide Input data that is only read when the blocks it touches are accessed for the first time,
+        instead of writing it into the cache via setInSlot() right away.
+        Replaces the lazy input data given before (if any).
+
+        The Output is set dirty for each roi right away (as if the data had been written), so that
+        downstream operators know where data is (e.g. OpFeatureMatrixCache learns the labeled blocks).
+        Loading the data later on does not send dirty notifications.
+        If the Input becomes dirty, the lazy data of the dirty blocks is discarded.
+
+        :param inputs: dict of {(start, stop): loader}, where loader() returns the data for that roi
+        """
+        assert self._blockshape is not None, "The cache must be configured before it can take lazy input data"
+        with self._lazyLock:
+            self._lazyInputs = {
+                (tuple(map(int, start)), tuple(map(int, stop))): loader for (start, stop), loader in inputs.items()
+            }
+            self._lazyIndex = None
+            rois = list(self._lazyInputs)
+
+        # Nothing is read for these notifications
+        for start, stop in rois:
+            self.Output.setDirty(start, stop)
+
+    def _lazyInputIndex(self):
+        """
+        The keys of the lazy inputs that touch each block, as {block_start: [key, ...]}.
+        (Keys that have been loaded in the meantime are not removed from the index.)
+        """
+        if self._lazyIndex is None:
+            index = collections.defaultdict(list)
+            for key in self._lazyInputs:
+                for block_start in getIntersectingBlocks(self._blockshape, key):
+                    index[tuple(block_start)].append(key)
+            self._lazyIndex = index
+        return self._lazyIndex
+
+    def _lazyBlockStarts(self):
+        if not self._lazyInputs:
+            return set()
+        with self._lazyLock:
+            index = self._lazyInputIndex()
+            return {block_start for block_start, keys in index.items() if any(key in self._lazyInputs for key in keys)}
+
+    def _loadLazyInputs(self, block_starts):
+        """
+        Read the lazy input data that touches any of the given blocks and write it into the cache.
+        """
+        if not self._lazyInputs:
+            return
+        with self._lazyLock:
+            index = self._lazyInputIndex()
+            keys = {key for block_start in block_starts for key in index.get(block_start, ())}
+            for key in sorted(keys):
+                loader = self._lazyInputs.pop(key, None)
+                if loader is None:
+                    continue
+                logger.debug("Loading lazy input data for roi {}".format(key))
+                OpUnmanagedCompressedCache._setInSlotInput(self, self.Input, (), SubRegion(self.Input, *key), loader())
+
+    def _discardLazyInputs(self, block_starts):
+        if not self._lazyInputs:
+            return
+        with self._lazyLock:
+            index = self._lazyInputIndex()
+            for block_start in block_starts:
+                for key in index.get(block_start, ()):
+                    self._lazyInputs.pop(key, None)
+
     def _setInSlotInput(self, slot, subindex, roi, value, store_zero_blocks=True):
         """
         Write the data in the array 'value' into the cache.
@@ -509,6 +603,7 @@ class OpUnmanagedCompressedCache(Operator):
             source_relative_intersection_slicing = roiToSlice(*source_relative_intersection)
             block_relative_intersection_slicing = roiToSlice(*block_relative_intersection)
 
+            cacheSpillStore.discard(self._spill_namespace, block_start)
             new_block_data = value[source_relative_intersection_slicing]
             new_block_sum = new_block_data.sum()
             if not store_zero_blocks and new_block_sum == 0 and block_start not in self._cacheFiles:
@@ -569,6 +664,7 @@ class OpUnmanagedCompressedCache(Operator):
         roi_is_exactly_one_block &= ((roi.start % self._blockshape) == 0).all()
         roi_is_exactly_one_block &= (block_roi == numpy.array((roi.start, roi.stop))).all()
         if roi_is_exactly_one_block:
+            cacheSpillStore.discard(self._spill_namespace, tuple(roi.start))
             cachefile = self._getCacheFile(block_roi)
             logger.debug("Copying HDF5 data directly into block {}".format(block_roi))
 
@@ -695,6 +791,17 @@ class OpCompressedCache(OpUnmanagedCompressedCache, ManagedBlockedCache):
                 del self._last_access_times[block_id]
             return mem
 
+    def evictBlock(self, block_id):
+        block_lock = self._blockLocks.get(block_id)
+        if cacheSpillStore.isEnabled() and not self.Output.meta.has_mask and block_lock is not None:
+            with block_lock:
+                # Hold the lock while spilling, so that the block can't become dirty in the meantime
+                with self._lock:
+                    f = self._cacheFiles.get(block_id)
+                    if f is not None and block_id not in self._dirtyBlocks and "data" in f:
+                        cacheSpillStore.put(self._spill_namespace, block_id, f["data"][...])
+        return self.freeBlock(block_id)
+
     def getBlockAccessTimes(self):
         with self._lock:
             # needs to be locked because dicts must not change size
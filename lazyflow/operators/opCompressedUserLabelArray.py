@@ -213,7 +213,8 @@ class OpCompressedUserLabelArray(OpUnmanagedCompressedCache):
             roi.stop, self.Output.meta.shape
         ).all(), "roi: {} is out-of-bounds for Output shape: {}".format(roi, self.Output.meta.shape)
 
-        block_starts = getIntersectingBlocks(self._blockshape, (roi.start, roi.stop))
+        block_starts = list(map(tuple, getIntersectingBlocks(self._blockshape, (roi.start, roi.stop))))
+        self._loadLazyInputs(block_starts)
         self._copyData(roi, destination, block_starts)
         return destination
 
@@ -272,6 +273,7 @@ class OpCompressedUserLabelArray(OpUnmanagedCompressedCache):
 
         # (Parallelism wouldn't help here: h5py will serialize these requests anyway)
         block_starts = list(map(tuple, block_starts))
+        self._loadLazyInputs(block_starts)
         for block_start in block_starts:
             if block_start not in self._cacheFiles:
                 # No label data in this block.  Move on.
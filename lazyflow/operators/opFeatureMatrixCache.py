@@ -34,6 +34,30 @@ from lazyflow.utility import OrderedSignal
 from lazyflow.roi import getBlockBounds, getIntersectingBlocks, determineBlockShape
 
 
+def unmatched_rows(a, b):
+    """
+    Boolean mask of the rows of matrix a that have no equal row in matrix b.
+    Duplicates are counted: if a row occurs n times in a and m times in b,
+    max(0, n - m) of its occurrences in a are unmatched.
+    """
+    if len(b) == 0:
+        return numpy.ones(len(a), dtype=bool)
+    a_keys = _row_keys(a)
+    b_keys = numpy.sort(_row_keys(b))
+    order = numpy.argsort(a_keys, kind="stable")
+    sorted_a_keys = a_keys[order]
+    # how many equal rows precede each row (in a)
+    occurrence = numpy.empty(len(a), dtype=numpy.intp)
+    occurrence[order] = numpy.arange(len(a)) - numpy.searchsorted(sorted_a_keys, sorted_a_keys, side="left")
+    count_in_b = numpy.searchsorted(b_keys, a_keys, side="right") - numpy.searchsorted(b_keys, a_keys, side="left")
+    return occurrence >= count_in_b
+
+
+def _row_keys(matrix):
+    matrix = numpy.ascontiguousarray(matrix)
+    return matrix.view(numpy.dtype((numpy.void, matrix.dtype.itemsize * matrix.shape[1]))).ravel()
+
+
 class OpFeatureMatrixCache(Operator):
     """
     - Request features and labels in blocks
@@ -41,6 +65,12 @@ class OpFeatureMatrixCache(Operator):
     - Cache the feature matrix for each block separately
     - Output the concatenation of all feature matrices
 
+    The rows of all blocks are kept in a single, growable matrix: when a block is
+    updated, only its new rows are appended and the rows that no longer exist are
+    dropped (compacting the matrix). Rows of a matrix that was output are never
+    changed, so successive outputs share memory as long as rows were only added:
+    the previous output is then a prefix of the new one.
+
     Note: This operator does not currently have "NonZeroLabelBlocks" input slot.
           Instead, it only requests labels for blocks that have been
           marked dirty via dirty notifications from the LabelImage slot.
@@ -71,9 +101,15 @@ class OpFeatureMatrixCache(Operator):
 
         self._blockshape = None
         self._dirty_blocks = set()
-        self._blockwise_feature_matrices = {}
+        self._block_rows = {}  # Row indices (in self._rows) of each block with labels
         self._block_locks = {}  # One lock per stored block
 
+        # Label and feature rows of all blocks, of which the first self._num_rows are used.
+        self._rows = numpy.zeros((0, 1), dtype=numpy.float32)
+        self._row_alive = numpy.zeros((0,), dtype=bool)
+        self._num_rows = 0
+        self._num_dead_rows = 0
+
         self._init_blocks(None, None)
 
     def _init_blocks(self, input_shape, new_blockshape):
@@ -82,7 +118,7 @@ class OpFeatureMatrixCache(Operator):
             # Nothing to do
             return
 
-        if len(self._dirty_blocks) != 0 or len(self._blockwise_feature_matrices) != 0:
+        if len(self._dirty_blocks) != 0 or len(self._block_rows) != 0:
             raise RuntimeError(
                 "It's too late to change the dimensionality of your data after you've already started training.\n"
                 "Delete all your labels and try again."
@@ -140,6 +176,17 @@ class OpFeatureMatrixCache(Operator):
         assert slot == self.LabelAndFeatureMatrix
         self.progressSignal(0.0)
 
+        num_feature_channels = self.FeatureImage.meta.shape[-1]
+        with self._lock:
+            if self._rows.shape[1] != 1 + num_feature_channels:
+                # The stored rows have the wrong number of features, recompute all blocks
+                self._dirty_blocks.update(self._block_rows.keys())
+                self._block_rows = {}
+                self._rows = numpy.zeros((0, 1 + num_feature_channels), dtype=numpy.float32)
+                self._row_alive = numpy.zeros((0,), dtype=bool)
+                self._num_rows = 0
+                self._num_dead_rows = 0
+
         # Technically, this could result in strange progress reporting if execute()
         #  is called by multiple threads in parallel.
         # This could be fixed with some fancier progress state, but
@@ -182,34 +229,74 @@ class OpFeatureMatrixCache(Operator):
                 if req.result is None:
                     # 'None' means the block wasn't dirty. No need to update.
                     continue
-                labels_and_features_matrix = req.result
                 self._dirty_blocks.remove(block_start)
+                self._update_block_rows(block_start, req.result)
 
-                if labels_and_features_matrix.shape[0] > 0:
-                    # Update the block entry with the new matrix.
-                    self._blockwise_feature_matrices[block_start] = labels_and_features_matrix
-                else:
-                    # All labels were removed from the block,
-                    # So the new feature matrix is empty.
-                    # Just delete its entry from our list.
-                    try:
-                        del self._blockwise_feature_matrices[block_start]
-                    except KeyError:
-                        pass
-
-        # Concatenate the all blockwise results
-        if self._blockwise_feature_matrices:
-            total_feature_matrix = numpy.concatenate(list(self._blockwise_feature_matrices.values()), axis=0)
-        else:
-            # No label points at all.
-            # Return an empty label&feature matrix (of the correct shape)
-            num_feature_channels = self.FeatureImage.meta.shape[-1]
-            total_feature_matrix = numpy.ndarray(shape=(0, 1 + num_feature_channels), dtype=numpy.float32)
+            total_feature_matrix = self._compacted_rows()
 
         self.progressSignal(100.0)
-        logger.debug("After update, there are {} clean blocks".format(len(self._blockwise_feature_matrices)))
+        logger.debug("After update, there are {} clean blocks".format(len(self._block_rows)))
         result[0] = total_feature_matrix
 
+    def _update_block_rows(self, block_start, labels_and_features_matrix):
+        """
+        Replace the rows of a block by the given ones: rows that are not in the matrix are dropped,
+        those that are new are appended. (Call with self._lock held.)
+        """
+        old_positions = self._block_rows.pop(block_start, numpy.zeros((0,), dtype=numpy.intp))
+        old_matrix = self._rows[old_positions]
+        dropped = unmatched_rows(old_matrix, labels_and_features_matrix)
+        added = unmatched_rows(labels_and_features_matrix, old_matrix)
+
+        self._row_alive[old_positions[dropped]] = False
+        self._num_dead_rows += int(dropped.sum())
+        positions = numpy.concatenate((old_positions[~dropped], self._append_rows(labels_and_features_matrix[added])))
+        if len(positions) > 0:
+            self._block_rows[block_start] = positions
+
+    def _append_rows(self, rows):
+        """
+        Append rows, growing the row matrix if necessary (call with self._lock held).
+        Returns the row indices of the appended rows.
+        """
+        new_num_rows = self._num_rows + len(rows)
+        if new_num_rows > len(self._rows):
+            # Reallocate rather than resize in place: rows that were output must not change.
+            self._reallocate(max(2 * len(self._rows), new_num_rows, 1024), numpy.ones(self._num_rows, dtype=bool))
+        positions = numpy.arange(self._num_rows, new_num_rows)
+        self._rows[positions] = rows
+        self._row_alive[positions] = True
+        self._num_rows = new_num_rows
+        return positions
+
+    def _compacted_rows(self):
+        """
+        The used rows, without dropped ones (call with self._lock held).
+        """
+        if self._num_dead_rows > 0:
+            alive = self._row_alive[: self._num_rows]
+            self._reallocate(len(self._rows), alive)
+        matrix = self._rows[: self._num_rows]
+        matrix.flags.writeable = False
+        return matrix
+
+    def _reallocate(self, capacity, keep):
+        """
+        Copy the rows selected by the boolean mask keep (over the used rows) to a new matrix.
+        """
+        num_kept = int(keep.sum())
+        rows = numpy.empty((capacity, self._rows.shape[1]), dtype=numpy.float32)
+        rows[:num_kept] = self._rows[: self._num_rows][keep]
+        new_positions = numpy.cumsum(keep) - 1
+        for block_start, positions in self._block_rows.items():
+            self._block_rows[block_start] = new_positions[positions]
+
+        self._rows = rows
+        self._row_alive = numpy.zeros(capacity, dtype=bool)
+        self._row_alive[:num_kept] = True
+        self._num_rows = num_kept
+        self._num_dead_rows = 0
+
     def propagateDirty(self, slot, subindex, roi):
         assert slot == self.FeatureImage or slot == self.LabelImage
 
@@ -228,7 +315,7 @@ class OpFeatureMatrixCache(Operator):
             # Technically, this would be inefficient if it's possible for the features
             # to become only partially dirty in a small ROI.
             # But currently, there is no known use-case for that.
-            block_starts = list(self._blockwise_feature_matrices.keys())
+            block_starts = list(self._block_rows.keys())
         else:
             block_starts = getIntersectingBlocks(self._blockshape, (roi.start, roi.stop))
             block_starts = list(map(tuple, block_starts))
@@ -22,6 +22,7 @@
 import copy
 import logging
 import math
+import time
 import numpy
 import vigra
 
@@ -34,6 +35,7 @@ from lazyflow.roi import sliceToRoi, roiToSlice
 from lazyflow.rtype import SubRegion
 
 from .operators import OpArrayPiper
+from .opPresmoothedTileCache import OpPresmoothedTileCache
 from .filterOperators import (
     OpGaussianSmoothing,
     OpDifferenceOfGaussians,
@@ -71,15 +73,28 @@ class OpPixelFeaturesPresmoothed(Operator):
         ]
     )
 
+    # If True, derive each pre-smoothed scale from the next smaller one (sigma_j^2 - sigma_{j-1}^2),
+    # for all time slices and channels at once, instead of smoothing the source separately for every scale.
+    # Results differ slightly from the default mode, because sampled gaussian kernels don't compose exactly.
+    CascadedPresmoothing = InputSlot(value=False)
+    # If True, pre-smoothed tiles are kept in a cache shared by all requests,
+    # so that overlapping halos of neighbouring requests are only smoothed once.
+    CachePresmoothing = InputSlot(value=False)
+
     Output = OutputSlot()  # The entire block of features as a single image (many channels)
     Features = OutputSlot(level=1)  # Each feature image listed separately, with feature name provided in metadata
 
     WINDOW_SIZE = 3.5
+    MIN_CASCADE_SIGMA = 1.0
+    # zyx shape of the tiles in the pre-smoothed scale space cache
+    PRESMOOTHED_TILE_SHAPE_2D = (1, 256, 256)
+    PRESMOOTHED_TILE_SHAPE_3D = (64, 64, 64)
 
     def __init__(self, *args, **kwargs):
         Operator.__init__(self, *args, **kwargs)
         self.source = OpArrayPiper(parent=self)
         self.source.Input.connect(self.Input)
+        self._tile_cache = OpPresmoothedTileCache(parent=self)
 
     def getInvalidScales(self):
         """
@@ -226,6 +241,14 @@ class OpPixelFeaturesPresmoothed(Operator):
             self.max_sigma = 0.7
 
         self.featureOps = oparray
+        self.cascade_chains = self._get_cascade_chains()
+
+        if self.Input.meta.shape[2] == 1:
+            self._tile_shape = self.PRESMOOTHED_TILE_SHAPE_2D
+        else:
+            self._tile_shape = self.PRESMOOTHED_TILE_SHAPE_3D
+        # scales, features or the input might have changed
+        self._tile_cache.reset()
 
         # Output meta is a modified copy of the input meta
         self.Output.meta.assignFrom(self.Input.meta)
@@ -235,11 +258,93 @@ class OpPixelFeaturesPresmoothed(Operator):
         self.Output.meta.channel_names = channel_names
         self.Output.meta.shape = self.Input.meta.shape[:1] + (channelCount,) + self.Input.meta.shape[2:]
         self.Output.meta.ideal_blockshape = self._get_ideal_blockshape()
+        # Context around a request that is read from Input, per axis key (see OpVectorwiseClassifierPredict)
+        self.Output.meta.halo = dict(zip("zyx", self._get_halo()))
 
         # FIXME: Features are float, so we need AT LEAST 4 bytes per output channel,
         #        but vigra functions may use internal RAM as well.
         self.Output.meta.ram_usage_per_requested_pixel = 4.0 * self.Output.meta.shape[1]
 
+    def _get_presmoothing_sigma(self, j):
+        # features are computed with (at most) scale 1.0 on the pre-smoothed source
+        if self.scales[j] > 1.0:
+            return math.sqrt(self.scales[j] ** 2 - 1.0)
+        else:
+            return self.scales[j]
+
+    def _get_cascade_chains(self):
+        """
+        Group the selected scales for cascaded pre-smoothing.
+
+        Scales computed in 2d and in 3d can't be derived from each other, so there is one chain for each.
+        Sampled gaussian kernels only compose well for sigma >= 1, smaller (and cheap) scales are smoothed
+        directly from the source, in a chain of their own.
+        Returns a list of (in2d, [(scale index, increment sigma), ...]) with increments in ascending scale order.
+        """
+        chains = []
+        for in2d in (False, True):
+            selected = [
+                j
+                for j in range(len(self.scales))
+                if self.matrix[:, j].any() and bool(self.ComputeIn2d.value[j]) == in2d
+            ]
+            selected.sort(key=self._get_presmoothing_sigma)
+            chain = []
+            previous_sigma = 0.0
+            for j in selected:
+                sigma = self._get_presmoothing_sigma(j)
+                if sigma < self.MIN_CASCADE_SIGMA:
+                    chains.append((in2d, [(j, sigma)]))
+                    continue
+                chain.append((j, math.sqrt(max(sigma**2 - previous_sigma**2, 0.0))))
+                previous_sigma = sigma
+            if chain:
+                chains.append((in2d, chain))
+        return chains
+
+    def _get_cascade_rois(self, chain, in2d, filter_start, filter_stop, shape, axes2enlarge):
+        """
+        Rois (input frame) each step of a cascade chain has to produce,
+        such that the last step covers the filter roi without border effects.
+        The first entry is the roi of the (unsmoothed) source the chain starts from.
+        """
+        enlarge_axes = (0, 1, 1) if in2d else axes2enlarge
+        rois = [(filter_start, filter_stop)]
+        for _, increment in reversed(chain):
+            start, stop = rois[0]
+            rois.insert(
+                0,
+                tuple(
+                    roi.enlargeRoiForHalo(start, stop, shape, increment, self.WINDOW_SIZE, enlarge_axes=enlarge_axes)
+                ),
+            )
+        return rois
+
+    def _get_halo(self):
+        """
+        Number of pixels (zyx) on each side of a requested roi that are read from Input to compute it,
+        away from the image borders.
+        """
+        if all(self.ComputeIn2d.value):
+            axes2enlarge = (0, 1, 1)
+        else:
+            axes2enlarge = (1, 1, 1)
+
+        # Measure the halo of a single pixel in the middle of an (unbounded) image
+        virtual_shape = numpy.array([2**40] * 3, dtype=numpy.int64)
+        output_start = virtual_shape // 2
+        output_stop = output_start + 1
+        input_filter_start, input_filter_stop = roi.enlargeRoiForHalo(
+            output_start, output_stop, virtual_shape, 0.7, self.WINDOW_SIZE, enlarge_axes=axes2enlarge
+        )
+        input_smooth_start, _, _ = self._get_smooth_roi(
+            input_filter_start, input_filter_stop, virtual_shape, axes2enlarge
+        )
+        halo = [int(h) for h in output_start - input_smooth_start]
+        if self.Input.meta.shape[2] == 1:
+            halo[0] = 0
+        return tuple(halo)
+
     def _get_ideal_blockshape(self):
         assert self.Output.meta.getAxisKeys() == list("tczyx")
 
@@ -261,6 +366,8 @@ class OpPixelFeaturesPresmoothed(Operator):
 
     def propagateDirty(self, inputSlot, subindex, roi):
         if inputSlot == self.Input:
+            self._tile_cache.invalidate((roi.start, roi.stop))
+
             numChannels = self.Input.meta.shape[1]
             dirtyChannels = roi.stop[1] - roi.start[1]
 
@@ -287,8 +394,12 @@ class OpPixelFeaturesPresmoothed(Operator):
             or inputSlot == self.Scales
             or inputSlot == self.FeatureIds
             or inputSlot == self.ComputeIn2d
+            or inputSlot == self.CascadedPresmoothing
         ):
+            self._tile_cache.reset()
             self.Output.setDirty(slice(None))
+        elif inputSlot == self.CachePresmoothing:
+            pass
         else:
             assert False, "Unknown dirty input slot."
 
@@ -350,98 +461,22 @@ class OpPixelFeaturesPresmoothed(Operator):
                 output_start, output_stop, output_shape, 0.7, self.WINDOW_SIZE, enlarge_axes=axes2enlarge
             )
 
-            # smooth roi in input frame
-            input_smooth_start, input_smooth_stop = roi.enlargeRoiForHalo(
-                input_filter_start,
-                input_filter_stop,
-                output_shape,
-                self.max_sigma,
-                self.WINDOW_SIZE,
-                enlarge_axes=axes2enlarge,
-            )
-
             # target roi in filter frame
             filter_target_start = roi.TinyVector(output_start - input_filter_start)
             filter_target_stop = roi.TinyVector(output_stop - input_filter_start)
-
-            # filter roi in smooth frame
-            smooth_filter_start = roi.TinyVector(input_filter_start - input_smooth_start)
-            smooth_filter_stop = roi.TinyVector(input_filter_stop - input_smooth_start)
-
             filter_target_slice = roi.roiToSlice(filter_target_start, filter_target_stop)
-            input_smooth_slice = roi.roiToSlice(input_smooth_start, input_smooth_stop)
-
-            # pre-smooth for all requested time slices and all channels
-            full_input_smooth_slice = (full_output_slice[0], slice(None), *input_smooth_slice)
-            req = self.Input[full_input_smooth_slice]
-            source = req.wait()
-            req.clean()
-            req.destination = None
-            if source.dtype != numpy.float32:
-                sourceF = source.astype(numpy.float32)
-                try:
-                    source.resize((1,), refcheck=False)
-                except Exception:
-                    pass
-                del source
-                source = sourceF
-
-            sourceV = source.view(vigra.VigraArray)
-            sourceV.axistags = copy.copy(self.Input.meta.axistags)
+
+            if self.CachePresmoothing.value:
+                presmooth = self._presmoothCached
+            else:
+                presmooth = self._presmooth
+            presmoothed_source = presmooth(
+                full_output_slice[0], input_filter_start, input_filter_stop, output_shape, axes2enlarge
+            )
 
             dimCol = len(self.scales)
             dimRow = self.matrix.shape[0]
 
-            presmoothed_source = [None] * dimCol
-
-            source_smooth_shape = tuple(smooth_filter_stop - smooth_filter_start)
-            full_source_smooth_shape = (
-                full_output_stop[0] - full_output_start[0],
-                self.Input.meta.shape[1],
-            ) + source_smooth_shape
-            try:
-                for j in range(dimCol):
-                    for i in range(dimRow):
-                        if self.matrix[i, j]:
-                            # There is at least one filter op with this scale
-                            break
-                    else:
-                        # There is no filter op at this scale
-                        continue
-
-                    if self.scales[j] > 1.0:
-                        tempSigma = math.sqrt(self.scales[j] ** 2 - 1.0)
-                    else:
-                        tempSigma = self.scales[j]
-
-                    presmoothed_source[j] = numpy.ndarray(full_source_smooth_shape, numpy.float32)
-
-                    droi = (
-                        (0, *tuple(smooth_filter_start._asint())),
-                        (sourceV.shape[1], *tuple(smooth_filter_stop._asint())),
-                    )
-                    for i, vsa in enumerate(sourceV.timeIter()):
-                        presmoothed_source[j][i, ...] = self._computeGaussianSmoothing(
-                            vsa, tempSigma, droi, in2d=self.ComputeIn2d.value[j]
-                        )
-
-            except RuntimeError as e:
-                if "kernel longer than line" in str(e):
-                    raise RuntimeError(
-                        "Feature computation error:\nYour image is too small to apply a filter with "
-                        f"sigma={self.scales[j]:.1f}. Please select features with smaller sigmas."
-                    )
-                else:
-                    raise e
-
-            del sourceV
-            try:
-                source.resize((1,), refcheck=False)
-            except ValueError:
-                # Sometimes this fails, but that's okay.
-                logger.debug("Failed to free array memory.")
-            del source
-
             cnt = 0
             written = 0
             closures = []
@@ -497,6 +532,245 @@ class OpPixelFeaturesPresmoothed(Operator):
                     except Exception:
                         presmoothed_source[i] = None
 
+    def _get_smooth_roi(self, input_filter_start, input_filter_stop, output_shape, axes2enlarge):
+        """
+        Input roi needed to pre-smooth the given filter roi (both in input frame, zyx).
+
+        Returns (start, stop, cascade_rois), the latter is None unless cascaded pre-smoothing is enabled.
+        """
+        if self.CascadedPresmoothing.value:
+            # The halos of all cascade steps add up, so the smooth roi is the union of the chains' source rois
+            cascade_rois = [
+                self._get_cascade_rois(chain, in2d, input_filter_start, input_filter_stop, output_shape, axes2enlarge)
+                for in2d, chain in self.cascade_chains
+            ]
+            input_smooth_start = numpy.min([rois[0][0] for rois in cascade_rois] + [input_filter_start], axis=0)
+            input_smooth_stop = numpy.max([rois[0][1] for rois in cascade_rois] + [input_filter_stop], axis=0)
+            input_smooth_start = roi.TinyVector(input_smooth_start.astype(numpy.int64))
+            input_smooth_stop = roi.TinyVector(input_smooth_stop.astype(numpy.int64))
+            return input_smooth_start, input_smooth_stop, cascade_rois
+
+        # smooth roi in input frame
+        input_smooth_start, input_smooth_stop = roi.enlargeRoiForHalo(
+            input_filter_start,
+            input_filter_stop,
+            output_shape,
+            self.max_sigma,
+            self.WINDOW_SIZE,
+            enlarge_axes=axes2enlarge,
+        )
+        return input_smooth_start, input_smooth_stop, None
+
+    def _presmoothCached(self, time_slice, input_filter_start, input_filter_stop, output_shape, axes2enlarge):
+        """
+        Like _presmooth, but assembles the result from tiles of the pre-smoothed scale space cache.
+
+        Missing tiles are computed together (over their bounding box) and added to the cache,
+        so that neighbouring requests don't have to smooth the same halo again.
+        """
+        selected = [j for j in range(len(self.scales)) if self.matrix[:, j].any()]
+        n_channels = self.Input.meta.shape[1]
+        tile_shape = numpy.asarray(self._tile_shape)
+        filter_roi = (numpy.asarray(input_filter_start), numpy.asarray(input_filter_stop))
+        filter_shape = tuple(filter_roi[1] - filter_roi[0])
+        tile_starts = [tuple(map(int, tile_start)) for tile_start in roi.getIntersectingBlocks(tile_shape, filter_roi)]
+
+        presmoothed_source = [None] * len(self.scales)
+        for j in selected:
+            presmoothed_source[j] = numpy.empty(
+                (time_slice.stop - time_slice.start, n_channels) + filter_shape, numpy.float32
+            )
+
+        def tile_roi(tile_start):
+            return numpy.asarray(tile_start), numpy.minimum(numpy.add(tile_start, tile_shape), output_shape)
+
+        def copy_tile(j, t, tile_start, tile):
+            start, stop = tile_roi(tile_start)
+            inner_start, inner_stop = roi.getIntersection((start, stop), filter_roi)
+            target_slicing = (t - time_slice.start, slice(None)) + roiToSlice(
+                inner_start - filter_roi[0], inner_stop - filter_roi[0]
+            )
+            presmoothed_source[j][target_slicing] = tile[
+                (slice(None),) + roiToSlice(inner_start - start, inner_stop - start)
+            ]
+
+        missing = set()
+        for t in range(time_slice.start, time_slice.stop):
+            for tile_start in tile_starts:
+                for j in selected:
+                    tile = self._tile_cache.get((j, t, tile_start))
+                    if tile is None:
+                        missing.add((t, tile_start))
+                    else:
+                        copy_tile(j, t, tile_start, tile)
+
+        if not missing:
+            return presmoothed_source
+
+        missing_times = [t for t, _ in missing]
+        missing_starts = numpy.array([tile_start for _, tile_start in missing])
+        computed_time_slice = slice(min(missing_times), max(missing_times) + 1)
+        computed_start = missing_starts.min(axis=0)
+        computed_stop = numpy.minimum(missing_starts.max(axis=0) + tile_shape, output_shape)
+        start_time = time.perf_counter()
+        computed = self._presmooth(computed_time_slice, computed_start, computed_stop, output_shape, axes2enlarge)
+        # attribute the computation evenly to all tiles it produced
+        tile_cost = (time.perf_counter() - start_time) / (len(missing) * len(selected))
+
+        for t, tile_start in missing:
+            start, stop = tile_roi(tile_start)
+            source_start, source_stop, _ = self._get_smooth_roi(start, stop, output_shape, axes2enlarge)
+            source_roi = ((t, 0, *source_start), (t + 1, n_channels, *source_stop))
+            tile_slicing = (t - computed_time_slice.start, slice(None)) + roiToSlice(
+                start - computed_start, stop - computed_start
+            )
+            for j in selected:
+                tile = computed[j][tile_slicing].copy()
+                self._tile_cache.put((j, t, tile_start), tile, source_roi, cost=tile_cost)
+                copy_tile(j, t, tile_start, tile)
+
+        return presmoothed_source
+
+    def _presmooth(self, time_slice, input_filter_start, input_filter_stop, output_shape, axes2enlarge):
+        """
+        Pre-smooth the input for all selected scales, all channels and the given time slices.
+
+        Returns a list with one array per scale (None for unselected scales),
+        each covering the filter roi (input frame, zyx) with shape (t, c, z, y, x).
+        """
+        cascaded = self.CascadedPresmoothing.value
+        input_smooth_start, input_smooth_stop, cascade_rois = self._get_smooth_roi(
+            input_filter_start, input_filter_stop, output_shape, axes2enlarge
+        )
+
+        # filter roi in smooth frame
+        smooth_filter_start = roi.TinyVector(input_filter_start - input_smooth_start)
+        smooth_filter_stop = roi.TinyVector(input_filter_stop - input_smooth_start)
+
+        input_smooth_slice = roi.roiToSlice(input_smooth_start, input_smooth_stop)
+
+        # pre-smooth for all requested time slices and all channels
+        full_input_smooth_slice = (time_slice, slice(None), *input_smooth_slice)
+        req = self.Input[full_input_smooth_slice]
+        source = req.wait()
+        req.clean()
+        req.destination = None
+        if source.dtype != numpy.float32:
+            sourceF = source.astype(numpy.float32)
+            try:
+                source.resize((1,), refcheck=False)
+            except Exception:
+                pass
+            del source
+            source = sourceF
+
+        sourceV = source.view(vigra.VigraArray)
+        sourceV.axistags = copy.copy(self.Input.meta.axistags)
+
+        dimCol = len(self.scales)
+        dimRow = self.matrix.shape[0]
+
+        presmoothed_source = [None] * dimCol
+
+        source_smooth_shape = tuple(smooth_filter_stop - smooth_filter_start)
+        full_source_smooth_shape = (
+            time_slice.stop - time_slice.start,
+            self.Input.meta.shape[1],
+        ) + source_smooth_shape
+        try:
+            if cascaded:
+                presmoothed_source = self._computeCascadedSmoothing(
+                    source, cascade_rois, input_smooth_start, smooth_filter_start, full_source_smooth_shape
+                )
+            else:
+                for j in range(dimCol):
+                    for i in range(dimRow):
+                        if self.matrix[i, j]:
+                            # There is at least one filter op with this scale
+                            break
+                    else:
+                        # There is no filter op at this scale
+                        continue
+
+                    tempSigma = self._get_presmoothing_sigma(j)
+
+                    presmoothed_source[j] = numpy.ndarray(full_source_smooth_shape, numpy.float32)
+
+                    droi = (
+                        (0, *tuple(smooth_filter_start._asint())),
+                        (sourceV.shape[1], *tuple(smooth_filter_stop._asint())),
+                    )
+                    for i, vsa in enumerate(sourceV.timeIter()):
+                        presmoothed_source[j][i, ...] = self._computeGaussianSmoothing(
+                            vsa, tempSigma, droi, in2d=self.ComputeIn2d.value[j]
+                        )
+
+        except RuntimeError as e:
+            if "kernel longer than line" in str(e):
+                max_scale = self.scales[j] if not cascaded else self.max_sigma
+                raise RuntimeError(
+                    "Feature computation error:\nYour image is too small to apply a filter with "
+                    f"sigma={max_scale:.1f}. Please select features with smaller sigmas."
+                )
+            else:
+                raise e
+
+        del sourceV
+        try:
+            source.resize((1,), refcheck=False)
+        except ValueError:
+            # Sometimes this fails, but that's okay.
+            logger.debug("Failed to free array memory.")
+        del source
+
+        return presmoothed_source
+
+    def _computeCascadedSmoothing(
+        self, source, cascade_rois, smooth_start, smooth_filter_start, full_source_smooth_shape
+    ):
+        """
+        Pre-smooth the source for all selected scales, deriving each scale from the previous one in its chain.
+
+        Time slices and channels are independent, so they are folded into a single channel axis
+        and every cascade step is a single filter call.
+        All scales are written to one preallocated buffer (one view per scale is returned).
+        """
+        filter_shape = numpy.asarray(full_source_smooth_shape[2:])
+        presmoothed_source = [None] * len(self.scales)
+        n_buffers = sum(len(chain) for _, chain in self.cascade_chains)
+        buffer = numpy.empty((n_buffers,) + full_source_smooth_shape, numpy.float32)
+
+        def fold(arr):
+            # (t, c, z, y, x) -> (t*c, z, y, x)
+            arr = numpy.ascontiguousarray(arr)
+            return vigra.taggedView(arr.reshape((-1,) + arr.shape[-3:]), "czyx")
+
+        buffer_index = 0
+        for (in2d, chain), rois in zip(self.cascade_chains, cascade_rois):
+            # input frame -> smooth frame
+            rois = [(numpy.asarray(start) - smooth_start, numpy.asarray(stop) - smooth_start) for start, stop in rois]
+            vol = fold(source[(slice(None), slice(None)) + roiToSlice(*rois[0])])
+            for step, (j, increment) in enumerate(chain):
+                vol_start = rois[step][0]
+                step_start, step_stop = rois[step + 1]
+                droi = (
+                    (0, *(int(x) for x in step_start - vol_start)),
+                    (vol.shape[0], *(int(x) for x in step_stop - vol_start)),
+                )
+                if increment > 0:
+                    vol = fold(self._computeGaussianSmoothing(vol, increment, droi, in2d=in2d))
+                else:
+                    vol = fold(vol[roiToSlice(*droi)])
+
+                # filter roi in the frame of this step's result
+                crop_start = numpy.asarray(smooth_filter_start) - step_start
+                crop = (slice(None),) + roiToSlice(crop_start, crop_start + filter_shape)
+                presmoothed_source[j] = buffer[buffer_index]
+                presmoothed_source[j][...] = numpy.asarray(vol[crop]).reshape(full_source_smooth_shape)
+                buffer_index += 1
+
+        return presmoothed_source
+
     def _computeGaussianSmoothing(self, vol, sigma, roi, in2d):
         if WITH_FAST_FILTERS:
             # Use fast filters (if available)
@@ -0,0 +1,156 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+#          http://ilastik.org/license/
+###############################################################################
+import logging
+import time
+
+import numpy
+
+from lazyflow.graph import Operator
+from lazyflow.request import RequestLock
+from lazyflow.roi import getIntersection
+
+from .opCache import ManagedBlockedCache
+
+logger = logging.getLogger(__name__)
+
+
+class OpPresmoothedTileCache(Operator, ManagedBlockedCache):
+    """
+    Cache for tiles of a pre-smoothed scale space, as computed by OpPixelFeaturesPresmoothed.
+
+    This operator has no slots, its parent stores and retrieves tiles directly.
+    Tiles are keyed by an arbitrary hashable key (e.g. (scale index, time index, tile start)).
+    Along with every tile, the roi of the input it was computed from (including the smoothing halo)
+    is stored, so that dirty input regions can invalidate all tiles depending on them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = RequestLock()
+        self._hits = 0
+        self._misses = 0
+        self.reset()
+
+        # Now that we're initialized, it's safe to register with the memory manager
+        self.registerWithMemoryManager()
+
+    def get(self, key):
+        """Return the cached tile for key, or None."""
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._last_access_times[key] = time.time()
+        self.notifyBlockAccess(key)
+        return tile
+
+    def put(self, key, tile, source_roi, cost=None):
+        """
+        Store a tile.
+
+        :param source_roi: (start, stop) of the input region the tile was computed from.
+        :param cost: seconds it took to compute the tile, for cost-aware eviction.
+        """
+        with self._lock:
+            old_tile = self._tiles.get(key)
+            if old_tile is not None:
+                self._used_memory -= old_tile.nbytes
+            self._tiles[key] = tile
+            self._source_rois[key] = (tuple(map(int, source_roi[0])), tuple(map(int, source_roi[1])))
+            self._last_access_times[key] = time.time()
+            self._used_memory += tile.nbytes
+        self.notifyBlockAccess(key, size=tile.nbytes, cost=cost)
+
+    def invalidate(self, dirty_roi):
+        """Drop all tiles computed from input that intersects the given (start, stop) roi."""
+        dirty_roi = (tuple(map(int, dirty_roi[0])), tuple(map(int, dirty_roi[1])))
+        with self._lock:
+            dirty_keys = [
+                key
+                for key, source_roi in self._source_rois.items()
+                if getIntersection(source_roi, dirty_roi, assertIntersect=False) is not None
+            ]
+        for key in dirty_keys:
+            self.freeBlock(key)
+
+    def reset(self):
+        with self._lock:
+            self._tiles = {}
+            self._source_rois = {}
+            self._last_access_times = {}
+            self._used_memory = 0
+        self.notifyAllBlocksFreed()
+
+    def setupOutputs(self):
+        pass
+
+    def propagateDirty(self, slot, subindex, roi):
+        pass
+
+    ##
+    ## ManagedBlockedCache interface implementation
+    ##
+    reportsBlockAccess = True
+
+    def usedMemory(self):
+        return self._used_memory
+
+    def fractionOfUsedMemoryDirty(self):
+        # dirty tiles are discarded immediately
+        return 0.0
+
+    def lastAccessTime(self):
+        return super().lastAccessTime()
+
+    def getBlockAccessTimes(self):
+        with self._lock:
+            return list(self._last_access_times.items())
+
+    def freeMemory(self):
+        used = self.usedMemory()
+        self.reset()
+        return used
+
+    def freeBlock(self, key):
+        with self._lock:
+            tile = self._tiles.pop(key, None)
+            if tile is None:
+                return 0
+            del self._source_rois[key]
+            del self._last_access_times[key]
+            self._used_memory -= tile.nbytes
+        self.notifyBlockFreed(key)
+        return tile.nbytes
+
+    def freeDirtyMemory(self):
+        return 0.0
+
+    def generateReport(self, report):
+        super().generateReport(report)
+        report.dtype = numpy.float32
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        hit_rate = 100.0 * hits / lookups if lookups else 0.0
+        report.info = f"Tiles: {len(self._tiles)}, hits: {hits}, misses: {misses} ({hit_rate:.1f}% hit rate)"
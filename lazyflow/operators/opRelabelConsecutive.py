@@ -22,7 +22,7 @@ import collections
 import logging
 import time
 from functools import partial
-from typing import Dict, Tuple, Union
+from typing import Dict, Optional, Tuple, Union
 
 import numpy
 import numpy.typing as npt
@@ -39,6 +39,7 @@ from lazyflow.rtype import SubRegion
 from lazyflow.slot import Slot
 from lazyflow.utility.data_semantics import ImageTypes
 from lazyflow.utility.helpers import get_ram_per_element
+from lazyflow.utility.roiIndex import RoiDict
 
 logger = logging.getLogger(__name__)
 
@@ -245,6 +246,7 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
                 # Data is already in the cache. Just extract it.
                 block_relative_roi = numpy.array(request_roi) - block_roi[0]
                 self.Output.stype.copy_data(result, self._block_data[block_roi][roiToSlice(*block_relative_roi)])
+                self._touch_block(block_roi)
                 return
 
         # Data isn't in the cache, so request it and cache it
@@ -297,6 +299,7 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
 
             # f(block_roi, out)
             # can relabelConsecutive can only handle up to 3D - so need to iterate after all
+            start_time = time.perf_counter()
             req = self.Input(*block_roi)
 
             block_data = vigra.taggedView(req.wait(), axistags=self.Input.meta.axistags)
@@ -308,7 +311,7 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
 
             img = img.withAxes(self.Output.meta.axistags).view(numpy.ndarray)
 
-            self._store_block_data(block_roi, img, relabel_dict)
+            self._store_block_data(block_roi, img, relabel_dict, cost=time.perf_counter() - start_time)
 
             if slot is self.Output:
                 # Extra [:] here is in case we are decompressing from a chunkedarray
@@ -319,13 +322,20 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
                 out[0] = relabel_dict
                 return
 
-    def _store_block_data(self, block_roi: RoiTuple, block_data: npt.NDArray, block_relabel_dict: Dict[int, int]):
+    def _store_block_data(
+        self,
+        block_roi: RoiTuple,
+        block_data: npt.NDArray,
+        block_relabel_dict: Dict[int, int],
+        cost: Optional[float] = None,
+    ):
         """
         Overridden from OpUnblockedArrayCache to ensure cache integrity
 
         Copy block_data and block_relabel_dict and store it into the cache.
         Both values are assumed to be produced at the same time (same function)
         so they should always both be present.
+        cost is the time in seconds it took to compute the block (if known).
         The block_lock is not obtained here, so lock it before you call this.
         """
         with self._lock:
@@ -347,21 +357,36 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
             # First double-check that the block wasn't removed from the
             #   cache while we were requesting it.
             # (Could have happened via propagateDirty() or eventually the arrayCacheMemoryMgr)
-            if block_roi in self._block_locks:
+            stored = block_roi in self._block_locks
+            if stored:
+                self._used_memory -= self._memory_for_block(block_roi)
                 self._block_data[block_roi] = block_storage_data
                 self._block_dicts[block_roi] = block_relabel_dict
+                block_memory = self._memory_for_block(block_roi)
+                self._used_memory += block_memory
 
-        self._last_access_times[block_roi] = time.perf_counter()
+        self._last_access_times[block_roi] = time.time()
+        if stored:
+            self.notifyBlockAccess(block_roi, size=block_memory, cost=cost)
+
+    def evictBlock(self, key):
+        """
+        Overridden from OpUnblockedArrayCache: blocks are not spilled to disk,
+        as the spill store can't hold the relabel dicts
+        """
+        return self.freeBlock(key)
 
     def _resetBlocks(self, *_):
         """
         Overridden from OpUnblockedArrayCache to ensure cache integrity
         """
         with self._lock:
-            self._block_data: Dict[RoiTuple, npt.ArrayLike] = {}
+            self._block_data: RoiDict = RoiDict()
             self._block_dicts: Dict[RoiTuple, Dict[int, int]] = {}
             self._block_locks: Dict[RoiTuple, RequestLock] = {}
             self._last_access_times: Dict[RoiTuple, float] = collections.defaultdict(float)
+            self._used_memory = 0.0
+        self.notifyAllBlocksFreed()
 
     def setInSlot(self, slot, subindex, roi, block_data: Tuple[npt.NDArray, Dict[int, int]]):
         """
@@ -397,7 +422,8 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
             clipped_block_roi = numpy.asarray(clipped_block_roi)
             output_roi = numpy.asarray(clipped_block_roi) - roi.start
 
-            block_roi = self._get_containing_block_roi(clipped_block_roi)
+            with self._lock:
+                block_roi = self._get_containing_block_roi(clipped_block_roi)
 
             if block_roi is not None or (full_block_roi == clipped_block_roi).all():
                 self._execute_Output_impl(clipped_block_roi, result[roiToSlice(*output_roi)])
@@ -462,15 +488,6 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
 
         return block_memory
 
-    def usedMemory(self):
-        """
-        Overridden from UnblockedArrayCache
-        """
-        total = 0.0
-        for k in list(self._block_data.keys()):
-            total += self._memory_for_block(k)
-        return total
-
     def freeBlock(self, key: RoiTuple):
         """
         Overridden from OpUnblockedArrayCache to ensure cache integrity
@@ -479,8 +496,10 @@ class OpRelabelConsecutive5D(OpUnblockedArrayCache):
             if key not in self._block_locks:
                 return 0
             block_mem = self._memory_for_block(key)
-            del self._block_data[key]
-            del self._block_dicts[key]
+            self._block_data.pop(key, None)
+            self._block_dicts.pop(key, None)
             del self._block_locks[key]
-            del self._last_access_times[key]
-            return block_mem
+            self._last_access_times.pop(key, None)
+            self._used_memory -= block_mem
+        self.notifyBlockFreed(key)
+        return block_mem
@@ -29,7 +29,6 @@ from scipy import ndimage as scipy_ndimage
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot, Slot
 from lazyflow.roi import enlargeRoiForHalo, roiToSlice
-from lazyflow.rtype import SubRegion
 from lazyflow.utility.data_semantics import ImageTypes
 
 logger = logging.getLogger(__name__)
@@ -147,31 +146,48 @@ class OpResize(Operator):
         - Use map_coordinates to interpolate values at those source coordinates
         """
         assert slot is self.ResizedImage, "Unknown output slot"
+        raw_roi = self.get_raw_roi(roi.start, roi.stop)
+        raw = self.RawImage[roiToSlice(*raw_roi)].wait()
+        self.resize(raw, raw_roi, roi.start, roi.stop, result)
 
-        factors = self.scaling_factors
-        antialiasing_sigmas = self.antialiasing_sigmas
-        interpolation_order = self.InterpolationOrder.value
+    def get_raw_roi(self, start, stop) -> NDArray:
+        """
+        The roi of RawImage (including halo) that is needed to compute roi (start, stop) of ResizedImage.
+        Returns roi as numpy.ndarray[start, stop] of ints.
+        """
         axes_to_pad = np.not_equal(self.scaling_factors, 1)
-        raw_roi = self._reverse_roi_scaling(roi, factors)
+        raw_roi = self._reverse_roi_scaling(start, stop, self.scaling_factors)
         raw_roi_antialiasing_halo = enlargeRoiForHalo(
             raw_roi[0],
             raw_roi[1],
             self.RawImage.meta.shape,
-            sigma=antialiasing_sigmas,
+            sigma=self.antialiasing_sigmas,
             enlarge_axes=axes_to_pad,
         )
         raw_roi_interpolation_halo = self._extend_halo_to_minimum(
-            raw_roi_antialiasing_halo, self.required_min_padding[interpolation_order], axes_to_pad, raw_roi
+            raw_roi_antialiasing_halo,
+            self.required_min_padding[self.InterpolationOrder.value],
+            axes_to_pad,
+            raw_roi,
         )
         raw_roi_final_halo = np.clip(
             expand_roi_to_nearest_integer(raw_roi_interpolation_halo), 0, self.RawImage.meta.shape
         )
+        return raw_roi_final_halo.astype(int)
 
-        raw = self.RawImage[roiToSlice(*raw_roi_final_halo)].wait().astype(np.float64)
-        filtered = scipy_ndimage.gaussian_filter(raw, antialiasing_sigmas, mode="mirror")
+    def resize(self, raw: NDArray, raw_roi: NDArray, start, stop, result: NDArray):
+        """
+        Compute roi (start, stop) of ResizedImage into result,
+        from raw data covering raw_roi of RawImage (as determined by get_raw_roi).
+        Allows resizing data that is already in memory, without requesting RawImage.
+        """
+        factors = self.scaling_factors
+        antialiasing_sigmas = self.antialiasing_sigmas
+        interpolation_order = self.InterpolationOrder.value
+        filtered = scipy_ndimage.gaussian_filter(raw.astype(np.float64), antialiasing_sigmas, mode="mirror")
 
-        roi_shape = roi.stop - roi.start
-        result_roi_within_filtered = raw_roi - raw_roi_final_halo[0]
+        roi_shape = np.subtract(stop, start)
+        result_roi_within_filtered = self._reverse_roi_scaling(start, stop, factors) - raw_roi[0]
         source_coords_starts = result_roi_within_filtered[0]
         # Convert roi's exclusive stop to meshgrid's inclusive stop.
         # Basically stop-1, but 1 scaled, hence stop-factor.
@@ -250,14 +266,14 @@ class OpResize(Operator):
         return s / 2 - 0.5
 
     @staticmethod
-    def _reverse_roi_scaling(roi: SubRegion, factors: NDArray) -> NDArray:
+    def _reverse_roi_scaling(start, stop, factors: NDArray) -> NDArray:
         """
-        Given the roi is requested at the target scale, compute the corresponding roi at the raw scale.
+        Given the roi (start, stop) is requested at the target scale, compute the corresponding roi at the raw scale.
         The scaled roi's bounds can be outside the raw image shape.
         Returns roi as numpy.ndarray[start, stop] instead of SubRegion to be independent of slot.
         """
-        assert len(factors) == len(roi.start) == len(roi.stop), "Dimensions must match"
-        raw_shape = np.multiply(roi.stop - roi.start, factors)
-        raw_start = np.multiply(roi.start, factors) + OpResize._get_first_pixel_shift(factors)
+        assert len(factors) == len(start) == len(stop), "Dimensions must match"
+        raw_shape = np.multiply(np.subtract(stop, start), factors)
+        raw_start = np.multiply(start, factors) + OpResize._get_first_pixel_shift(factors)
         raw_stop = raw_start + raw_shape
         return np.array([raw_start, raw_stop])
@@ -60,7 +60,8 @@ class OpSimpleBlockedArrayCache(OpUnblockedArrayCache):
             clipped_block_roi = numpy.asarray(clipped_block_roi)
             output_roi = numpy.asarray(clipped_block_roi) - roi.start
 
-            block_roi = self._get_containing_block_roi(clipped_block_roi)
+            with self._lock:
+                block_roi = self._get_containing_block_roi(clipped_block_roi)
 
             # Skip cache and copy full block directly
             if self.BypassModeEnabled.value:
@@ -30,9 +30,11 @@ import numpy.typing as npt
 import vigra
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
+from lazyflow.operators import cacheSpillStore
 from lazyflow.operators.opCache import ManagedBlockedCache
 from lazyflow.request import RequestLock
-from lazyflow.roi import getIntersection, roiFromShape, roiToSlice, containing_rois
+from lazyflow.roi import getIntersection, roiFromShape, roiToSlice
+from lazyflow.utility.roiIndex import RoiDict
 
 import logging
 
@@ -51,6 +53,8 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
         be stored multiple times, except for the special case where the new request happens
         to fall ENTIRELY within an existing block of data.
     - If any portion of a stored block is marked dirty, the entire block is discarded.
+    - Blocks evicted by the memory manager are moved to the spill store (if enabled),
+        and read back from there when they are requested again.
 
     Unlike other caches, this cache does not impose its own blocking on the data.
     Instead, it is assumed that the downstream operators have chosen some reasonable blocking.
@@ -67,6 +71,7 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
     def __init__(self, *args, **kwargs):
         super(OpUnblockedArrayCache, self).__init__(*args, **kwargs)
         self._lock = RequestLock()
+        self._spill_namespace = cacheSpillStore.newNamespace()
         self._resetBlocks()
 
         self.Input.notifyUnready(self._resetBlocks)
@@ -74,6 +79,10 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
         # Now that we're initialized, it's safe to register with the memory manager
         self.registerWithMemoryManager()
 
+    def cleanUp(self):
+        cacheSpillStore.clear(self._spill_namespace)
+        super(OpUnblockedArrayCache, self).cleanUp()
+
     def _standardize_roi(
         self, start: Union[npt.NDArray, Tuple[int, ...]], stop: Union[npt.NDArray, Tuple[int, ...]]
     ) -> RoiTuple:
@@ -108,6 +117,7 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
                 # Data is already in the cache. Just extract it.
                 block_relative_roi = numpy.array(request_roi) - block_roi[0]
                 self.Output.stype.copy_data(result, self._block_data[block_roi][roiToSlice(*block_relative_roi)])
+                self._touch_block(block_roi)
                 return
 
         if self.Input.meta.dontcache:
@@ -120,13 +130,9 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
 
     def _get_containing_block_roi(self, request_roi):
         # Does this roi happen to fit ENTIRELY within an existing stored block?
+        # (Callers must hold self._lock)
         request_roi = self._standardize_roi(*request_roi)
-        outer_rois = containing_rois(list(self._block_data.keys()), request_roi)
-        if len(outer_rois) > 0:
-            # Standardize roi for usage as dict key
-            block_roi = self._standardize_roi(*outer_rois[0])
-            return block_roi
-        return None
+        return self._block_data.find_containing(request_roi)
 
     def _fetch_and_store_block(self, block_roi, out):
         if out is not None:
@@ -151,17 +157,31 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
                     self.Output.stype.copy_data(out, self._block_data[block_roi][:])
                     return out
 
+            if cacheSpillStore.isEnabled():
+                block_data = cacheSpillStore.get(self._spill_namespace, block_roi)
+                with self._lock:
+                    spilled_cost = self._spilled_costs.pop(block_roi, None)
+                if block_data is not None:
+                    # Restoring is cheap, but recomputing after the next eviction is not
+                    self._store_block_data(block_roi, block_data, cost=spilled_cost)
+                    if out is None:
+                        return block_data
+                    self.Output.stype.copy_data(out, block_data)
+                    return out
+
             req = self.Input(*block_roi)
             if out is not None:
                 req.writeInto(out)
+            start_time = time.perf_counter()
             block_data = req.wait()
-            self._store_block_data(block_roi, block_data)
+            self._store_block_data(block_roi, block_data, cost=time.perf_counter() - start_time)
         return block_data
 
-    def _store_block_data(self, block_roi, block_data):
+    def _store_block_data(self, block_roi, block_data, cost=None):
         """
         Copy block_data and store it into the cache.
         The block_lock is not obtained here, so lock it before you call this.
+        cost is the time in seconds it took to compute the block (if known).
         """
         with self._lock:
             if self.CompressionEnabled.value and numpy.dtype(block_data.dtype) in [
@@ -181,10 +201,34 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             # First double-check that the block wasn't removed from the
             #   cache while we were requesting it.
             # (Could have happened via propagateDirty() or eventually the arrayCacheMemoryMgr)
-            if block_roi in self._block_locks:
+            stored = block_roi in self._block_locks
+            if stored:
+                self._used_memory -= self._memory_for_block(block_roi)
                 self._block_data[block_roi] = block_storage_data
+                block_memory = self._memory_for_block(block_roi)
+                self._used_memory += block_memory
+                if cost is not None:
+                    self._block_costs[block_roi] = cost
 
         self._last_access_times[block_roi] = time.time()
+        if stored:
+            self.notifyBlockAccess(block_roi, size=block_memory, cost=cost)
+
+    def _touch_block(self, block_roi):
+        self._last_access_times[block_roi] = time.time()
+        self.notifyBlockAccess(block_roi)
+
+    def _memory_for_block(self, block_roi):
+        try:
+            block = self._block_data[block_roi]
+            bytes_per_pixel = numpy.dtype(block.dtype).itemsize
+            return block.size * bytes_per_pixel
+        except (KeyError, AttributeError):
+            # what could have happened and why it's fine
+            #  * block was deleted (then it does not occupy memory)
+            #  * block is not array data (then we don't know how
+            #    much memory it ouccupies)
+            return 0.0
 
     def _execute_CleanBlocks(self, slot, subindex, roi, result):
         with self._lock:
@@ -202,6 +246,10 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             block_lock = self._block_locks[block_roi]
 
         with block_lock:
+            with self._lock:
+                cacheSpillStore.discard(self._spill_namespace, block_roi)
+                self._spilled_costs.pop(block_roi, None)
+                self._block_costs.pop(block_roi, None)
             self._store_block_data(block_roi, block_data)
 
     def propagateDirty(self, slot, subindex, roi):
@@ -217,32 +265,25 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             # Everything is dirty, so no need to loop
             self._resetBlocks()
         else:
-            # FIXME: This is O(N) for now.
-            #        We should speed this up by maintaining a bookkeeping data structure in execute().
-            for block_roi in list(self._block_data.keys()):
-                if getIntersection(block_roi, dirty_roi, assertIntersect=False):
-                    self.freeBlock(block_roi)
+            # Free the dirty blocks and their spilled copies at once, so that evictBlock can't spill them in between
+            with self._lock:
+                dirty_blocks = self._block_data.find_intersecting(dirty_roi)
+                for block_roi in dirty_blocks:
+                    self._removeBlock(block_roi)
+                self._discardSpilledBlocks(dirty_roi)
+            for block_roi in dirty_blocks:
+                self.notifyBlockFreed(block_roi)
 
         self.Output.setDirty(roi.start, roi.stop)
 
     ##
     ## OpManagedCache interface implementation
     ##
+    reportsBlockAccess = True
+
     def usedMemory(self):
-        total = 0.0
-        for k in list(self._block_data.keys()):
-            try:
-                block = self._block_data[k]
-                bytes_per_pixel = numpy.dtype(block.dtype).itemsize
-                portion = block.size * bytes_per_pixel
-            except (KeyError, AttributeError):
-                # what could have happened and why it's fine
-                #  * block was deleted (then it does not occupy memory)
-                #  * block is not array data (then we don't know how
-                #    much memory it ouccupies)
-                portion = 0.0
-            total += portion
-        return total
+        # Updated whenever blocks are stored or freed, so the memory manager doesn't need to walk all blocks
+        return self._used_memory
 
     def fractionOfUsedMemoryDirty(self):
         # dirty memory is discarded immediately
@@ -265,21 +306,63 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
 
     def freeBlock(self, key):
         with self._lock:
-            if key not in self._block_locks:
-                return 0
-            block = self._block_data[key]
-            bytes_per_pixel = numpy.dtype(block.dtype).itemsize
-            mem = block.size * bytes_per_pixel
-            del self._block_data[key]
-            del self._block_locks[key]
-            del self._last_access_times[key]
-            return mem
+            mem = self._removeBlock(key)
+        if mem is None:
+            return 0
+        self.notifyBlockFreed(key)
+        return mem
+
+    def evictBlock(self, key):
+        # Hold the lock while spilling and freeing, so that the block can't become dirty in the meantime
+        with self._lock:
+            if cacheSpillStore.isEnabled():
+                block = self._block_data.get(key)
+                if block is not None:
+                    # Extra [:] here is in case we are decompressing from a chunkedarray
+                    block = block[:]
+                    if isinstance(block, numpy.ndarray):
+                        cacheSpillStore.put(self._spill_namespace, key, block)
+                        self._spilled_costs[key] = self._block_costs.get(key)
+            mem = self._removeBlock(key)
+        if mem is None:
+            return 0
+        self.notifyBlockFreed(key)
+        return mem
+
+    def _removeBlock(self, key):
+        """
+        Remove a block from memory and return the memory it occupied, None if it wasn't stored.
+        (Callers must hold self._lock, and notify the memory manager afterwards)
+        """
+        if key not in self._block_locks:
+            return None
+        mem = self._memory_for_block(key)
+        self._block_data.pop(key, None)
+        del self._block_locks[key]
+        self._last_access_times.pop(key, None)
+        self._block_costs.pop(key, None)
+        self._used_memory -= mem
+        return mem
 
     def freeDirtyMemory(self):
         return 0.0
 
+    def _discardSpilledBlocks(self, dirty_roi):
+        # (Callers must hold self._lock)
+        for key in cacheSpillStore.keys(self._spill_namespace):
+            if getIntersection(key, dirty_roi, assertIntersect=False) is not None:
+                cacheSpillStore.discard(self._spill_namespace, key)
+                self._spilled_costs.pop(key, None)
+
     def _resetBlocks(self, *_):
         with self._lock:
-            self._block_data = {}
+            # Spatially indexed, so that finding blocks containing or intersecting a roi is fast
+            self._block_data = RoiDict()
             self._block_locks = {}
             self._last_access_times = collections.defaultdict(float)
+            self._used_memory = 0.0
+            # Recompute costs (seconds) of the blocks in memory and in the spill store
+            self._block_costs = {}
+            self._spilled_costs = {}
+            cacheSpillStore.clear(self._spill_namespace)
+        self.notifyAllBlocksFreed()
@@ -44,6 +44,7 @@ import greenlet
 
 # lazyflow
 from . import threadPool
+from . import topology
 
 # This module's code needs to be sanitized if you're not using CPython.
 # In particular, check that set operations like remove() are still atomic.
@@ -136,12 +137,17 @@ class Request(object):
     # See initialization after this class definition (below)
     global_thread_pool = None
 
+    # Name of the scheduler used by the global thread pool, see threadPool.SCHEDULERS
+    thread_pool_scheduler = threadPool.DEFAULT_SCHEDULER
+    # How the workers of the global thread pool are pinned to cpus, see topology.AFFINITY_MODES
+    thread_pool_affinity = "none"
+
     # For protecting class variables
     class_lock = threading.Lock()
     active_count = 0
 
     @classmethod
-    def reset_thread_pool(cls, num_workers=min(multiprocessing.cpu_count(), 8)):
+    def reset_thread_pool(cls, num_workers=min(multiprocessing.cpu_count(), 8), scheduler=None, affinity=None):
         """
         Change the number of threads allocated to the request system.
 
@@ -150,6 +156,14 @@ class Request(object):
                             workers, even on machines with many CPUs.
                             For more details, see:
                             https://github.com/ilastik/ilastik/issues/1458
+        :param scheduler: Name of the scheduling strategy of the pool, one of ``threadPool.SCHEDULERS``
+                          ("global-queue" or "work-stealing").
+                          If None, the previously configured scheduler is kept.
+        :param affinity: How to pin workers to cpus, one of ``topology.AFFINITY_MODES``
+                         ("none", "core" or "numa").
+                         If None, the previously configured affinity is kept.
+                         ``num_workers="auto"`` picks the number of workers with a short startup
+                         probe (see ``topology.probe_worker_count``), not limited to 8.
 
         As a special case, you may set ``num_workers`` to 0.
         In that case, the normal thread pool is not used at all.
@@ -163,9 +177,22 @@ class Request(object):
         with cls.class_lock:
             active_count = 0
 
+            if scheduler is None:
+                scheduler = cls.thread_pool_scheduler
+            if scheduler not in threadPool.SCHEDULERS:
+                raise ValueError(f"Unknown thread pool scheduler {scheduler!r}")
+            if affinity is None:
+                affinity = cls.thread_pool_affinity
+            if affinity not in topology.AFFINITY_MODES:
+                raise ValueError(f"Unknown thread pool affinity {affinity!r}")
+
             if cls.global_thread_pool is not None:
                 cls.global_thread_pool.stop()
-            cls.global_thread_pool = threadPool.ThreadPool(num_workers)
+            if num_workers == "auto":
+                num_workers = topology.probe_worker_count()
+            cls.global_thread_pool = threadPool.create_thread_pool(num_workers, scheduler, affinity)
+            cls.thread_pool_scheduler = scheduler
+            cls.thread_pool_affinity = affinity
 
     class CancellationException(Exception):
         """
@@ -266,9 +293,15 @@ class Request(object):
         current_request = Request._current_request()
         self.parent_request = current_request
         self._max_child_priority = 0
+
+        #: Preferred NUMA node of the worker that starts this request (see ``route_to_block``).
+        #: Child requests inherit the node of their parent.
+        self.numa_node = None
+
         if current_request is None:
             self._priority = root_priority + [next(Request._root_request_counter)]
         else:
+            self.numa_node = current_request.numa_node
             with current_request._lock:
                 current_request.child_requests.add(self)
                 # We must ensure that we get the same cancelled status as our parent.
@@ -340,6 +373,15 @@ class Request(object):
             self._cleaned = True
             self._result = None
 
+    def route_to_block(self, block_start):
+        """
+        Prefer starting this request on a worker of the NUMA node associated with the given block.
+        Has no effect unless the thread pool's workers are pinned to more than one node.
+        Must be called before ``submit()``.
+        """
+        self.numa_node = topology.node_for_block(block_start, getattr(Request.global_thread_pool, "num_nodes", 1))
+        return self
+
     @property
     def assigned_worker(self):
         """
@@ -21,10 +21,14 @@
 ###############################################################################
 
 import atexit
+import heapq
+import itertools
 import logging
 import queue
 import threading
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional, Type
+
+from . import topology
 
 logger = logging.getLogger(__name__)
 
@@ -36,11 +40,16 @@ class ThreadPool:
         num_workers: The number of worker threads.
     """
 
-    def __init__(self, num_workers: int):
-        """Start all workers."""
+    def __init__(self, num_workers: int, affinity: str = "none"):
+        """Start all workers.
+
+        :param affinity: how to pin workers to cpus, one of ``topology.AFFINITY_MODES``.
+        """
         self.unassigned_tasks = queue.PriorityQueue()
 
-        self.workers = {_Worker(self, i) for i in range(num_workers)}
+        placement = topology.get_topology().worker_placement(num_workers, affinity)
+        self.workers = {_Worker(self, i, cpus, node) for i, (cpus, node) in enumerate(placement)}
+        self.num_nodes = max((w.numa_node + 1 for w in self.workers), default=1)
         for w in self.workers:
             w.start()
 
@@ -84,16 +93,20 @@ class _Worker(threading.Thread):
     The loop pops one task from the threadpool and executes it.
     """
 
-    def __init__(self, thread_pool, index):
+    def __init__(self, thread_pool, index, cpus=None, numa_node=0):
         super().__init__(name=f"Worker #{index}", daemon=True)
         self.thread_pool = thread_pool
         self.stopped = False
         self.job_queue_condition = threading.Condition()
         self.job_queue = queue.PriorityQueue()
         self.state = "initialized"
+        self.cpus = cpus
+        self.numa_node = numa_node
 
     def run(self):
         """Keep executing available tasks until we're stopped."""
+        topology.pin_current_thread(self.cpus)
+
         # Try to get some work.
         self.state = "waiting"
         next_task = self._get_next_job()
@@ -182,3 +195,271 @@ class _Worker(threading.Thread):
                 # You may have to wrap it in a custom class first.
                 task.assigned_worker = self
                 return task
+
+
+class WorkStealingThreadPool:
+    """Thread pool with per-worker ready queues and work stealing.
+
+    Unassigned tasks are pushed onto the ready queue of the submitting worker
+    (or of a worker chosen round-robin if submitted from a foreign thread),
+    and only a single idle worker is woken up per task.
+    Idle workers steal from the queue whose head has the highest priority,
+    so the ordering given by ``__lt__`` of the tasks (e.g. ``Request.__lt__``)
+    is preserved across workers.
+
+    If workers are pinned to NUMA nodes, tasks with a ``numa_node`` attribute are queued
+    on a worker of that node, and workers steal from their own node first.
+
+    Tasks that already have an ``assigned_worker`` (i.e. suspended requests)
+    are never stolen, they always resume on their own worker.
+
+    Attributes:
+        num_workers: The number of worker threads.
+    """
+
+    def __init__(self, num_workers: int, affinity: str = "none"):
+        """Start all workers.
+
+        :param affinity: how to pin workers to cpus, one of ``topology.AFFINITY_MODES``.
+        """
+        self._idle_lock = threading.Lock()
+        self._idle_workers: List["_StealingWorker"] = []
+        self._round_robin = itertools.count()
+
+        placement = topology.get_topology().worker_placement(num_workers, affinity)
+        self._ordered_workers = [_StealingWorker(self, i, cpus, node) for i, (cpus, node) in enumerate(placement)]
+        self.num_nodes = max((w.numa_node + 1 for w in self._ordered_workers), default=1)
+        self._workers_by_node = [[w for w in self._ordered_workers if w.numa_node == n] for n in range(self.num_nodes)]
+        self._workers_by_thread_id: Dict[int, "_StealingWorker"] = {}
+        self.workers = set(self._ordered_workers)
+        for w in self._ordered_workers:
+            w.start()
+            self._workers_by_thread_id[w.ident] = w
+
+        atexit.register(self.stop)
+
+    @property
+    def num_workers(self):
+        return len(self.workers)
+
+    def wake_up(self, task: Callable[[], None]) -> None:
+        """Schedule the given task on the worker that is assigned to it.
+
+        If it has no assigned worker yet, push it to a worker's ready queue and wake up one idle worker.
+        """
+        if hasattr(task, "assigned_worker") and task.assigned_worker is not None:
+            task.assigned_worker.wake_up(task)
+            return
+
+        if not self._ordered_workers:
+            raise RuntimeError("Cannot schedule tasks on a thread pool without workers.")
+
+        candidates = self._ordered_workers
+        node = getattr(task, "numa_node", None)
+        if node is not None and self.num_nodes > 1:
+            candidates = self._workers_by_node[node % self.num_nodes] or candidates
+
+        target = self._workers_by_thread_id.get(threading.get_ident())
+        if target is None or target not in candidates:
+            target = candidates[next(self._round_robin) % len(candidates)]
+
+        target.push_ready(task)
+        self._wake_one_idle(preferred=target)
+
+    def stop(self) -> None:
+        """Stop all threads in the pool, and block for them to complete.
+
+        Postcondition: All worker threads have stopped, unfinished tasks are simply dropped.
+        """
+        for w in self.workers:
+            w.stop()
+
+        for w in self.workers:
+            w.join()
+
+    def get_states(self) -> List[str]:
+        return [w.state for w in self.workers]
+
+    def _wake_one_idle(self, preferred: Optional["_StealingWorker"] = None) -> None:
+        """Wake up exactly one idle worker, if any, preferring the given one or one on the same node."""
+        with self._idle_lock:
+            if not self._idle_workers:
+                return
+            if preferred is not None and preferred in self._idle_workers:
+                worker = preferred
+            else:
+                # Most recently idle worker first, its caches are likely still warm
+                worker = self._idle_workers[-1]
+                if preferred is not None:
+                    same_node = [w for w in self._idle_workers if w.numa_node == preferred.numa_node]
+                    if same_node:
+                        worker = same_node[-1]
+            self._idle_workers.remove(worker)
+        worker.notify()
+
+    def _set_idle(self, worker: "_StealingWorker") -> None:
+        with self._idle_lock:
+            if worker not in self._idle_workers:
+                self._idle_workers.append(worker)
+
+    def _set_busy(self, worker: "_StealingWorker") -> bool:
+        """Remove worker from the idle list.
+
+        Returns False if the worker had already been claimed by a wakeup.
+        """
+        with self._idle_lock:
+            try:
+                self._idle_workers.remove(worker)
+            except ValueError:
+                return False
+            return True
+
+    def _steal(self, thief: "_StealingWorker"):
+        """Take the highest priority ready task from another worker's queue.
+
+        Return None if no other worker has ready tasks.
+
+        Non-blocking.
+        """
+        while True:
+            victim = self._find_victim(thief, self._workers_by_node[thief.numa_node])
+            if victim is None and self.num_nodes > 1:
+                victim = self._find_victim(thief, self._ordered_workers)
+            if victim is None:
+                return None
+
+            task = victim.pop_ready()
+            if task is not None:
+                task.assigned_worker = thief
+                return task
+            # Somebody else was faster, look again
+
+    @staticmethod
+    def _find_victim(thief, workers):
+        """Return the worker whose ready queue has the highest priority head."""
+        victim = None
+        best = None
+        for worker in workers:
+            if worker is thief:
+                continue
+            head = worker.peek_ready()
+            if head is not None and (best is None or head < best):
+                victim, best = worker, head
+        return victim
+
+
+class _StealingWorker(_Worker):
+    """Worker of the WorkStealingThreadPool.
+
+    Besides the queue of tasks assigned to it, every worker owns a heap of ready (unassigned) tasks,
+    that other workers may steal from.
+    """
+
+    def __init__(self, thread_pool, index, cpus=None, numa_node=0):
+        super().__init__(thread_pool, index, cpus, numa_node)
+        self.ready_tasks = []
+        self._signaled = False
+
+    def stop(self):
+        self.stopped = True
+        self.notify()
+
+    def notify(self):
+        with self.job_queue_condition:
+            self._signaled = True
+            self.job_queue_condition.notify()
+
+    def wake_up(self, task):
+        assert task.assigned_worker is self
+        with self.job_queue_condition:
+            self.job_queue.put_nowait(task)
+            self._signaled = True
+            self.job_queue_condition.notify()
+
+    def push_ready(self, task):
+        with self.job_queue_condition:
+            heapq.heappush(self.ready_tasks, task)
+
+    def peek_ready(self):
+        # Lock-free peek, heap[0] is read atomically in CPython
+        try:
+            return self.ready_tasks[0]
+        except IndexError:
+            return None
+
+    def pop_ready(self):
+        with self.job_queue_condition:
+            if not self.ready_tasks:
+                return None
+            return heapq.heappop(self.ready_tasks)
+
+    def _get_next_job(self):
+        """Get the next available job to perform.
+
+        Look at our own queues first, then try to steal from other workers.
+        If nothing is available, register as idle and block until woken up.
+        """
+        pool = self.thread_pool
+        while not self.stopped:
+            next_task = self._pop_job()
+            if next_task is None:
+                next_task = pool._steal(self)
+            if next_task is not None:
+                return next_task
+
+            # Advertise as idle before checking once more, so no task submitted from now on is missed.
+            pool._set_idle(self)
+            next_task = self._pop_job()
+            if next_task is None:
+                next_task = pool._steal(self)
+            if next_task is not None:
+                if not pool._set_busy(self):
+                    # We consumed a wakeup that was meant for another ready task, pass it on.
+                    pool._wake_one_idle()
+                return next_task
+
+            with self.job_queue_condition:
+                while not self._signaled and not self.stopped:
+                    self.job_queue_condition.wait()
+                self._signaled = False
+            pool._set_busy(self)
+
+        return None
+
+    def _pop_job(self):
+        """Get a job from our own assigned queue, or else from our own ready tasks.
+
+        Return None if neither has work to do.
+
+        Non-blocking.
+        """
+        with self.job_queue_condition:
+            try:
+                return self.job_queue.get_nowait()
+            except queue.Empty:
+                pass
+            if not self.ready_tasks:
+                return None
+            task = heapq.heappop(self.ready_tasks)
+        task.assigned_worker = self
+        return task
+
+
+SCHEDULERS: Dict[str, Type] = {
+    "global-queue": ThreadPool,
+    "work-stealing": WorkStealingThreadPool,
+}
+
+DEFAULT_SCHEDULER = "global-queue"
+
+
+def create_thread_pool(num_workers: int, scheduler: str = DEFAULT_SCHEDULER, affinity: str = "none"):
+    """Create a thread pool using one of the available ``SCHEDULERS``.
+
+    :param affinity: how to pin workers to cpus, one of ``topology.AFFINITY_MODES``.
+    """
+    try:
+        pool_class = SCHEDULERS[scheduler]
+    except KeyError:
+        raise ValueError(f"Unknown thread pool scheduler {scheduler!r}, expected one of {sorted(SCHEDULERS)}") from None
+    return pool_class(num_workers, affinity)
@@ -0,0 +1,226 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""CPU/NUMA topology helpers for the request thread pool.
+
+Like the ThreadPool, this module does not depend on the rest of lazyflow.
+Pinning is only supported on platforms that provide ``os.sched_setaffinity`` (i.e. Linux),
+everywhere else all threads may run on any CPU and the whole machine is treated as a single node.
+"""
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+AFFINITY_MODES = ("none", "core", "numa")
+
+_NODE_CPULIST_GLOB = "/sys/devices/system/node/node[0-9]*/cpulist"
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """Parse a linux cpulist string like ``0-3,8,10-11``.
+
+    >>> parse_cpulist("0-3,8,10-11")
+    [0, 1, 2, 3, 8, 10, 11]
+    >>> parse_cpulist("")
+    []
+    """
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, stop = part.split("-")
+            cpus.extend(range(int(start), int(stop) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass(frozen=True)
+class CpuTopology:
+    """CPUs usable by this process, grouped by NUMA node."""
+
+    nodes: Tuple[Tuple[int, ...], ...]
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def cpus(self) -> Tuple[int, ...]:
+        return tuple(cpu for node in self.nodes for cpu in node)
+
+    @classmethod
+    def detect(cls) -> "CpuTopology":
+        available = set(_available_cpus())
+        nodes = []
+
+        def _node_index(path):
+            return int(re.search(r"node(\d+)", path).group(1))
+
+        for path in sorted(glob.glob(_NODE_CPULIST_GLOB), key=_node_index):
+            try:
+                with open(path) as f:
+                    node_cpus = tuple(cpu for cpu in parse_cpulist(f.read()) if cpu in available)
+            except (OSError, ValueError):
+                logger.debug("Could not read NUMA node cpulist %s", path, exc_info=True)
+                continue
+            if node_cpus:
+                nodes.append(node_cpus)
+
+        if not nodes:
+            nodes = [tuple(sorted(available))]
+        return cls(tuple(nodes))
+
+    def worker_placement(self, num_workers: int, affinity: str) -> List[Tuple[Optional[FrozenSet[int]], int]]:
+        """Decide on which cpus each worker may run, and which node it belongs to.
+
+        :param affinity: "none": no pinning, all workers belong to node 0;
+                         "core": every worker is pinned to a single core, cores are handed out alternating between nodes;
+                         "numa": workers are distributed round-robin over the nodes and may run on any core of their node.
+        :returns: one ``(cpus, node)`` tuple per worker, ``cpus`` is None if the worker is not pinned.
+        """
+        if affinity not in AFFINITY_MODES:
+            raise ValueError(f"Unknown affinity mode {affinity!r}, expected one of {AFFINITY_MODES}")
+
+        if affinity == "none" or not hasattr(os, "sched_setaffinity"):
+            return [(None, 0)] * num_workers
+
+        if affinity == "numa":
+            return [(frozenset(self.nodes[i % self.num_nodes]), i % self.num_nodes) for i in range(num_workers)]
+
+        # Interleave cores of all nodes, so that few workers still use the memory bandwidth of every node
+        interleaved = []
+        for i in range(max(len(node) for node in self.nodes)):
+            for node_index, node in enumerate(self.nodes):
+                if i < len(node):
+                    interleaved.append((node[i], node_index))
+        return [
+            (frozenset([cpu]), node) for cpu, node in (interleaved[i % len(interleaved)] for i in range(num_workers))
+        ]
+
+
+_topology = None
+_topology_lock = threading.Lock()
+
+
+def get_topology() -> CpuTopology:
+    """Detect the topology once and cache it."""
+    global _topology
+    with _topology_lock:
+        if _topology is None:
+            _topology = CpuTopology.detect()
+        return _topology
+
+
+def pin_current_thread(cpus: Optional[FrozenSet[int]]) -> bool:
+    """Restrict the calling thread to the given cpus.
+
+    Returns False if pinning is not supported or failed.
+    """
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        # On linux, pid 0 refers to the calling thread, not the whole process
+        os.sched_setaffinity(0, cpus)
+    except OSError:
+        logger.debug("Could not pin thread to cpus %s", sorted(cpus), exc_info=True)
+        return False
+    return True
+
+
+def node_for_block(block_start: Sequence[int], num_nodes: int) -> Optional[int]:
+    """Deterministically map a block to a NUMA node.
+
+    Block buffers are first touched by the worker computing them, so consistently routing
+    the same block to the same node keeps its memory local to the workers processing it.
+
+    >>> node_for_block((0, 64, 128), 1) is None
+    True
+    >>> node_for_block((0, 64, 128), 2) == node_for_block([0, 64, 128], 2)
+    True
+    """
+    if num_nodes <= 1:
+        return None
+    return hash(tuple(int(x) for x in block_start)) % num_nodes
+
+
+def _probe_workload(stop_time: float, counter: List[int], index: int) -> None:
+    import numpy
+
+    # numpy releases the GIL for sorting and elementwise ops on large arrays,
+    # similar to the vigra filters that dominate most lazyflow workloads.
+    data = numpy.random.default_rng(index).random(1 << 16, dtype=numpy.float32)
+    done = 0
+    while time.perf_counter() < stop_time:
+        numpy.sort(data)
+        numpy.multiply(data, 1.0001, out=data)
+        done += 1
+    counter[index] = done
+
+
+def _measure_throughput(num_threads: int, duration: float) -> float:
+    counters = [0] * num_threads
+    stop_time = time.perf_counter() + duration
+    threads = [threading.Thread(target=_probe_workload, args=(stop_time, counters, i)) for i in range(num_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counters) / duration
+
+
+def probe_worker_count(max_workers: Optional[int] = None, step_duration: float = 0.05, min_gain: float = 1.1) -> int:
+    """Pick a worker count by measuring how throughput scales with the number of threads.
+
+    Thread counts are doubled as long as each doubling increases throughput by at least ``min_gain``.
+    Takes roughly ``step_duration * log2(max_workers)`` seconds.
+
+    :param max_workers: upper limit, defaults to the number of usable cpus.
+    """
+    max_workers = max_workers or len(get_topology().cpus)
+    best_count = 1
+    best_throughput = _measure_throughput(1, step_duration)
+
+    count = 1
+    while count < max_workers:
+        count = min(count * 2, max_workers)
+        throughput = _measure_throughput(count, step_duration)
+        logger.debug("Worker count probe: %d threads -> %.1f ops/s", count, throughput)
+        if throughput < best_throughput * min_gain:
+            break
+        best_count, best_throughput = count, throughput
+
+    logger.info(f"Worker count probe picked {best_count} workers (of {max_workers} usable cpus).")
+    return best_count
@@ -35,6 +35,7 @@ from .pathHelpers import PathComponents, getPathVariants, isUrl, make_absolute,
 
 from .roiRequestBatch import RoiRequestBatch, RoiRequestBatchException
 from .roiRequestBuffer import RoiRequestBufferIter
+from .readAhead import ReadAhead, find_prefetch_slot
 from .bigRequestStreamer import BigRequestStreamer
 from . import io_util
 from .format_known_keys import format_known_keys
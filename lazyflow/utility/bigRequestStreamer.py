@@ -43,6 +43,94 @@ from .memory import Memory
 logger = logging.getLogger(__name__)
 
 
+def determine_request_blockshape(outputSlot, num_threads):
+    """
+    Choose a blockshape using the slot metadata (if available) or an arbitrary guess otherwise.
+
+    The blockshape is chosen such that ``num_threads`` blocks can be processed in parallel
+    without exceeding the RAM available for computation.
+    """
+    input_shape = outputSlot.meta.shape
+    ideal_blockshape = outputSlot.meta.ideal_blockshape
+    ram_usage_per_requested_pixel = outputSlot.meta.ram_usage_per_requested_pixel
+    max_blockshape = outputSlot.meta.max_blockshape or input_shape
+
+    num_channels = 1
+    tagged_shape = outputSlot.meta.getTaggedShape()
+
+    available_ram = Memory.getAvailableRamComputation()
+
+    # Generally, we don't want to split requests across channels.
+    if "c" in list(tagged_shape.keys()):
+        num_channels = tagged_shape["c"]
+        channel_index = list(tagged_shape.keys()).index("c")
+        input_shape = input_shape[:channel_index] + input_shape[channel_index + 1 :]
+        max_blockshape = max_blockshape[:channel_index] + max_blockshape[channel_index + 1 :]
+        if ideal_blockshape:
+            # Never enlarge 'ideal' in the channel dimension.
+            num_channels = ideal_blockshape[channel_index]
+            ideal_blockshape = ideal_blockshape[:channel_index] + ideal_blockshape[channel_index + 1 :]
+        del tagged_shape["c"]
+
+    # Generally, we don't want to join time slices
+    if "t" in tagged_shape.keys():
+        blockshape_time_steps = 1
+        time_index = list(tagged_shape.keys()).index("t")
+        input_shape = input_shape[:time_index] + input_shape[time_index + 1 :]
+        max_blockshape = max_blockshape[:time_index] + max_blockshape[time_index + 1 :]
+        if ideal_blockshape:
+            # Never enlarge 'ideal' in the time dimension.
+            blockshape_time_steps = ideal_blockshape[time_index]
+            ideal_blockshape = ideal_blockshape[:time_index] + ideal_blockshape[time_index + 1 :]
+            available_ram /= blockshape_time_steps
+        del tagged_shape["t"]
+
+    if ram_usage_per_requested_pixel is None:
+        # Make a conservative guess: 2*(bytes for dtype) * (num channels) + (fudge factor=4)
+        ram_usage_per_requested_pixel = 2 * outputSlot.meta.dtype().nbytes * num_channels + 4
+        warnings.warn("Unknown per-pixel RAM requirement.  Making a guess.")
+
+    # Safety factor (fudge factor): Double the estimated RAM usage per pixel
+    safety_factor = 2.0
+    logger.info(
+        "Estimated RAM usage per pixel is {} * safety factor ({})".format(
+            Memory.format(ram_usage_per_requested_pixel), safety_factor
+        )
+    )
+    ram_usage_per_requested_pixel *= safety_factor
+
+    if ideal_blockshape is None:
+        blockshape = determineBlockShape(input_shape, (available_ram // (num_threads * ram_usage_per_requested_pixel)))
+        blockshape = tuple(numpy.minimum(max_blockshape, blockshape))
+        warnings.warn("Chose an arbitrary request blockshape")
+    else:
+        logger.info(
+            "determining blockshape assuming available_ram is {}"
+            ", split between {} threads".format(Memory.format(available_ram), num_threads)
+        )
+
+        # By convention, ram_usage_per_requested_pixel refers to the ram used when requesting ALL channels of a 'pixel'
+        # Therefore, we do not include the channel dimension in the blockshapes here.
+        #
+        # Also, it rarely makes sense to request more than one time slice, so we omit that, too. (See above.)
+        blockshape = determine_optimal_request_blockshape(
+            max_blockshape, ideal_blockshape, ram_usage_per_requested_pixel, num_threads, available_ram
+        )
+    # compute the RAM size of the block before adding back t anc c dimensions
+    fmt = Memory.format(ram_usage_per_requested_pixel * bigintprod(blockshape))
+    # If we removed time and channel from consideration, add them back now before returning
+    if "t" in outputSlot.meta.getAxisKeys():
+        blockshape = blockshape[:time_index] + (blockshape_time_steps,) + blockshape[time_index:]
+
+    if "c" in outputSlot.meta.getAxisKeys():
+        blockshape = blockshape[:channel_index] + (num_channels,) + blockshape[channel_index:]
+
+    logger.info("Chose blockshape: {}".format(blockshape))
+    logger.info("Estimated RAM usage per block is {}".format(fmt))
+
+    return blockshape
+
+
 class BigRequestStreamer(object):
     """
     Execute a big request by breaking it up into smaller requests.
@@ -95,7 +183,14 @@ class BigRequestStreamer(object):
     """
 
     def __init__(
-        self, outputSlot, roi, blockshape=None, batchSize=None, blockAlignment="absolute", allowParallelResults=False
+        self,
+        outputSlot,
+        roi,
+        blockshape=None,
+        batchSize=None,
+        blockAlignment="absolute",
+        allowParallelResults=False,
+        prefetchSlot=None,
     ):
         """
         Constructor.
@@ -107,6 +202,9 @@ class BigRequestStreamer(object):
         :param blockAlignment: Determines how block the requests. Choices are 'absolute' or 'relative'.
         :param allowParallelResults: If False, The resultSignal will not be called in parallel.
                                      In that case, your handler function has no need for locks.
+        :param prefetchSlot: Optional source slot (e.g. a reader of remote data) that the output is computed from.
+                             If given, the source data of upcoming blocks is read ahead while the current ones are
+                             processed (see :py:class:`ReadAhead<lazyflow.utility.readAhead.ReadAhead>`).
         """
         self._outputSlot = outputSlot
         self._bigRoi = roi
@@ -174,93 +272,15 @@ class BigRequestStreamer(object):
                         logger.debug("Requesting Roi: {}".format(block_bounds))
                         yield block_intersecting_portion
 
-        self._requestBatch = RoiRequestBatch(self._outputSlot, roiGen(), totalVolume, batchSize, allowParallelResults)
+        self._requestBatch = RoiRequestBatch(
+            self._outputSlot, roiGen(), totalVolume, batchSize, allowParallelResults, prefetchSlot
+        )
 
     def _determine_blockshape(self, outputSlot):
         """
         Choose a blockshape using the slot metadata (if available) or an arbitrary guess otherwise.
         """
-        input_shape = outputSlot.meta.shape
-        ideal_blockshape = outputSlot.meta.ideal_blockshape
-        ram_usage_per_requested_pixel = outputSlot.meta.ram_usage_per_requested_pixel
-        max_blockshape = outputSlot.meta.max_blockshape or input_shape
-
-        num_channels = 1
-        tagged_shape = outputSlot.meta.getTaggedShape()
-
-        available_ram = Memory.getAvailableRamComputation()
-
-        # Generally, we don't want to split requests across channels.
-        if "c" in list(tagged_shape.keys()):
-            num_channels = tagged_shape["c"]
-            channel_index = list(tagged_shape.keys()).index("c")
-            input_shape = input_shape[:channel_index] + input_shape[channel_index + 1 :]
-            max_blockshape = max_blockshape[:channel_index] + max_blockshape[channel_index + 1 :]
-            if ideal_blockshape:
-                # Never enlarge 'ideal' in the channel dimension.
-                num_channels = ideal_blockshape[channel_index]
-                ideal_blockshape = ideal_blockshape[:channel_index] + ideal_blockshape[channel_index + 1 :]
-            del tagged_shape["c"]
-
-        # Generally, we don't want to join time slices
-        if "t" in tagged_shape.keys():
-            blockshape_time_steps = 1
-            time_index = list(tagged_shape.keys()).index("t")
-            input_shape = input_shape[:time_index] + input_shape[time_index + 1 :]
-            max_blockshape = max_blockshape[:time_index] + max_blockshape[time_index + 1 :]
-            if ideal_blockshape:
-                # Never enlarge 'ideal' in the time dimension.
-                blockshape_time_steps = ideal_blockshape[time_index]
-                ideal_blockshape = ideal_blockshape[:time_index] + ideal_blockshape[time_index + 1 :]
-                available_ram /= blockshape_time_steps
-            del tagged_shape["t"]
-
-        if ram_usage_per_requested_pixel is None:
-            # Make a conservative guess: 2*(bytes for dtype) * (num channels) + (fudge factor=4)
-            ram_usage_per_requested_pixel = 2 * outputSlot.meta.dtype().nbytes * num_channels + 4
-            warnings.warn("Unknown per-pixel RAM requirement.  Making a guess.")
-
-        # Safety factor (fudge factor): Double the estimated RAM usage per pixel
-        safety_factor = 2.0
-        logger.info(
-            "Estimated RAM usage per pixel is {} * safety factor ({})".format(
-                Memory.format(ram_usage_per_requested_pixel), safety_factor
-            )
-        )
-        ram_usage_per_requested_pixel *= safety_factor
-
-        if ideal_blockshape is None:
-            blockshape = determineBlockShape(
-                input_shape, (available_ram // (self._num_threads * ram_usage_per_requested_pixel))
-            )
-            blockshape = tuple(numpy.minimum(max_blockshape, blockshape))
-            warnings.warn("Chose an arbitrary request blockshape")
-        else:
-            logger.info(
-                "determining blockshape assuming available_ram is {}"
-                ", split between {} threads".format(Memory.format(available_ram), self._num_threads)
-            )
-
-            # By convention, ram_usage_per_requested_pixel refers to the ram used when requesting ALL channels of a 'pixel'
-            # Therefore, we do not include the channel dimension in the blockshapes here.
-            #
-            # Also, it rarely makes sense to request more than one time slice, so we omit that, too. (See above.)
-            blockshape = determine_optimal_request_blockshape(
-                max_blockshape, ideal_blockshape, ram_usage_per_requested_pixel, self._num_threads, available_ram
-            )
-        # compute the RAM size of the block before adding back t anc c dimensions
-        fmt = Memory.format(ram_usage_per_requested_pixel * bigintprod(blockshape))
-        # If we removed time and channel from consideration, add them back now before returning
-        if "t" in outputSlot.meta.getAxisKeys():
-            blockshape = blockshape[:time_index] + (blockshape_time_steps,) + blockshape[time_index:]
-
-        if "c" in outputSlot.meta.getAxisKeys():
-            blockshape = blockshape[:channel_index] + (num_channels,) + blockshape[channel_index:]
-
-        logger.info("Chose blockshape: {}".format(blockshape))
-        logger.info("Estimated RAM usage per block is {}".format(fmt))
-
-        return blockshape
+        return determine_request_blockshape(outputSlot, self._num_threads)
 
     @property
     def resultSignal(self):
@@ -21,7 +21,6 @@
 from dataclasses import dataclass
 import json
 import logging
-import math
 import os
 from collections import OrderedDict
 from typing import Dict, List, Optional, Union, Literal, Tuple, Any
@@ -34,10 +33,11 @@ from aiohttp import ClientConnectorError, ClientResponseError
 from botocore.exceptions import NoCredentialsError, EndpointConnectionError
 from zarr.core import Array as ZarrArray
 from zarr.errors import ArrayNotFoundError
-from zarr.storage import FSStore, LRUStoreCache
+from zarr.storage import FSStore
 
 from lazyflow import rtype
 from lazyflow.utility import Timer, Memory
+from lazyflow.utility.io_util.managedStoreCache import ManagedStoreCache
 from lazyflow.utility.io_util.multiscaleStore import MultiscaleStore, DEFAULT_SCALE_KEY
 
 logger = logging.getLogger(__name__)
@@ -249,15 +249,6 @@ def _get_multiscale_for_dataset(ome_spec: OME_ZARR_SPEC, dataset_subpath: str) -
     raise KeyError(f"Could not find metadata entry for sub-path {dataset_subpath}.")
 
 
-def _get_zarr_cache_max_size() -> int:
-    caches_max = Memory.getAvailableRamCaches()
-    # Given that the only benefit of this cache is to prevent downloading the same file repeatedly for multiple
-    # blocks, it shouldn't need to be huge. 1/8 might be a reasonable default for now.
-    # Should see if we can implement a managed cache on top of this and use cacheMemoryManager to share the global pool.
-    permissible_fraction_max = 0.125
-    return math.floor(caches_max * permissible_fraction_max)
-
-
 def _try_authenticated_aws_s3(uri, kwargs, mode, test_path) -> Optional[FSStore]:
     authenticated_store = FSStore(uri, mode=mode, anon=False, **kwargs)
     try:
@@ -552,7 +543,7 @@ class OMEZarrStore(MultiscaleStore):
         # the user scrolls across z back and forth, this does not trigger requests to the store.
         # But blocks can be misaligned with file size in the store. This cache can prevent downloading
         # the same file repeatedly for multiple blocks.
-        self._store = LRUStoreCache(uncached_store, max_size=_get_zarr_cache_max_size())
+        self._store = ManagedStoreCache(uncached_store, name=f"OMEZarrStore({self.base_uri})")
         dtype = None
         scale_metadata = OrderedDict()  # Becomes slot metadata -> must be serializable (no ZarrArray allowed)
         self._scale_data = {}
@@ -21,12 +21,16 @@
 ###############################################################################
 import json
 import logging
+import threading
 from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
 
 import jsonschema
 import numpy
 import requests
 import vigra
+from urllib3.util.retry import Retry
 
 from lazyflow.utility.io_util.multiscaleStore import MultiscaleStore, DEFAULT_SCALE_KEY
 
@@ -76,7 +80,12 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
         "required": ["type", "data_type", "num_channels", "scales"],
     }
 
-    def __init__(self, volume_url: str, n_threads=4):
+    # Connect and read timeouts for every request, in seconds
+    TIMEOUT = (3.0, 20.0)
+    # Transient server errors that are retried (with exponential backoff) before giving up on a chunk
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, volume_url: str, n_threads=4, max_retries=3):
         """
         Args:
             volume_url (string): base url of the precomputed volume.
@@ -84,6 +93,8 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
               description of the volume. Will be validated against
               `self.info_schema`.
             n_threads (int, optional): number of concurrent downloads
+            max_retries (int, optional): how often to retry a request that failed
+              due to a connection problem or a transient server error
         """
         axistags = vigra.defaultAxistags("czyx")  # neuroglancer axes are always czyx; channel might be singleton
         self._json_info = {}
@@ -91,6 +102,13 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
         self.base_url = volume_url.lstrip("precomputed://")
         self.n_channels = None
 
+        self._session = self._create_session(n_threads, max_retries)
+        self._executor = ThreadPoolExecutor(max_workers=n_threads, thread_name_prefix="precomputed-download")
+        # Downloads that are in progress, by url. Requesting a block again while it is being downloaded
+        # returns the same future instead of downloading it twice.
+        self._pending_downloads: Dict[str, Future] = {}
+        self._pending_downloads_lock = threading.Lock()
+
         self.download_info()
         jsonschema.validate(self._json_info, self.info_schema)
 
@@ -140,9 +158,30 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
         shape = numpy.array([n_channels] + self._scales[scale]["size"][::-1])
         return shape
 
+    @classmethod
+    def _create_session(cls, n_threads, max_retries):
+        """
+        Using a session allows us to benefit from a connection pool
+          instead of establishing a new connection for every request.
+        """
+        session = requests.Session()
+        retries = Retry(
+            total=max_retries,
+            backoff_factor=0.2,
+            status_forcelist=cls.RETRY_STATUS_CODES,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        for prefix in ("http://", "https://"):
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=n_threads, pool_maxsize=n_threads, max_retries=retries
+            )
+            session.mount(prefix, adapter)
+        return session
+
     def download_info(self):
         logger.debug(f"getting volume from {self.base_url}/info")
-        r = requests.get(f"{self.base_url}/info")
+        r = self._session.get(f"{self.base_url}/info", timeout=self.TIMEOUT)
 
         # check if success:
         if r.status_code != 200:
@@ -153,6 +192,19 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
     def download_block(self, block_coordinates, scale=DEFAULT_SCALE_KEY):
         """downloads a single block at a given scale
 
+        Args:
+            block_coordinates (iterable): start of the block, 'czyx' axistags
+              assumed
+            scale (int): index of the scale to be used
+        """
+        return self.download_block_async(block_coordinates, scale).result()
+
+    def download_block_async(self, block_coordinates, scale=DEFAULT_SCALE_KEY) -> Future:
+        """starts downloading a single block at a given scale
+
+        At most n_threads blocks are downloaded concurrently. The returned future's
+        result is the decoded (read-only) block, in the volume's dtype.
+
         Args:
             block_coordinates (iterable): start of the block, 'czyx' axistags
               assumed
@@ -160,12 +212,33 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
         """
         scale = scale if scale != DEFAULT_SCALE_KEY else self.lowest_resolution_key
         url, block_shape = self.generate_url(block_coordinates, scale)
+        with self._pending_downloads_lock:
+            future = self._pending_downloads.get(url)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._download_and_decode, url, self.get_encoding(scale), block_shape)
+            self._pending_downloads[url] = future
+        # Outside the lock, since the callback runs right away if the download finished already
+        future.add_done_callback(lambda _: self._forget_download(url, future))
+        return future
+
+    def _forget_download(self, url, future):
+        with self._pending_downloads_lock:
+            if self._pending_downloads.get(url) is future:
+                del self._pending_downloads[url]
+
+    def _download_and_decode(self, url, encoding, block_shape):
+        logger.debug(f"requesting {url}")
         try:
-            content = self.downloading(url)
+            r = self._session.get(url, timeout=self.TIMEOUT)
         except requests.exceptions.ConnectionError:
             logger.warning(f"Could not download block from {url}. Returning empty image instead.")
             return numpy.zeros(shape=block_shape, dtype=self.dtype)
-        return self.decode_content(content, encoding=self.get_encoding(scale), shape=block_shape, dtype=self.dtype)
+        if r.status_code == requests.codes.not_found:
+            logger.warning(f"Block not found at {url}. Returning empty image instead.")
+            return numpy.zeros(shape=block_shape, dtype=self.dtype)
+        r.raise_for_status()
+        return self.decode_content(r.content, encoding=encoding, shape=block_shape, dtype=self.dtype)
 
     @classmethod
     def decode_content(cls, content, encoding, shape, dtype):
@@ -178,17 +251,11 @@ class RESTfulPrecomputedChunkedVolume(MultiscaleStore):
         logger.debug(f"decoding encoding {encoding}; dtype {dtype}")
         if encoding == "raw":
             raw = content
-            arr = numpy.fromstring(raw, dtype=dtype).reshape(shape)
+            arr = numpy.frombuffer(raw, dtype=dtype).reshape(shape)
             return arr
         else:
             raise NotImplementedError(f"encoding {encoding} not supported :(")
 
-    @staticmethod
-    def downloading(url):
-        logger.debug(f"requesting {url}")
-        r = requests.get(url)
-        return r.content
-
     def generate_url(self, block_coordinates, scale=DEFAULT_SCALE_KEY):
         """Generate url to access a specific block
 
@@ -0,0 +1,219 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import json
+import logging
+import os
+import threading
+import zlib
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy
+
+from lazyflow.request import Request, RequestPool
+from lazyflow.roi import getBlockBounds, getIntersectingBlocks, roiFromShape
+from lazyflow.utility.helpers import bigintprod
+from lazyflow.utility.pathHelpers import PathComponents
+from lazyflow.utility.readAhead import find_prefetch_slot
+from lazyflow.utility.roiRequestBatch import RoiRequestBatch
+
+logger = logging.getLogger(__name__)
+
+#: How to treat an existing export target (see OpExportSlot.ExportMode):
+#: "new" - replace it (HDF5/N5) or refuse to touch it (OME-Zarr)
+#: "resume" - continue an interrupted export, skipping blocks that were written completely
+#: "append time"/"append channels" - add the exported image to the existing data along t/c
+EXPORT_MODES = ("new", "resume", "append time", "append channels")
+APPEND_AXES = {"append time": "t", "append channels": "c"}
+
+Roi = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+
+def get_manifest_path(external_path: str, internal_path: str = "") -> str:
+    """
+    The manifest lives inside directory-based containers (OME-Zarr, N5),
+    and next to single-file containers (HDF5).
+    """
+    name = ".ilastik_export"
+    if internal_path.strip("/"):
+        name += "_" + internal_path.strip("/").replace("/", "_")
+    name += ".jsonl"
+    if PathComponents(external_path).extension in PathComponents.HDF5_EXTS:
+        return external_path + name
+    return os.path.join(external_path, name)
+
+
+def block_checksum(data: numpy.ndarray) -> int:
+    return zlib.crc32(numpy.ascontiguousarray(data))
+
+
+def _to_roi(roi) -> Roi:
+    return tuple(map(int, roi[0])), tuple(map(int, roi[1]))
+
+
+class ExportManifest:
+    """
+    Records the progress of an export, so that an interrupted export can be resumed
+    without recomputing the blocks it has written already.
+
+    The manifest file exists exactly while the export is unfinished: it is created right before anything
+    is written to the target, and removed once the export has completed.
+    It consists of JSON lines. The first one is a header describing the export (shapes, dtype,
+    blocking, and where in the target the data goes). Each following line records a block that
+    was written completely: the part of the export it belongs to (e.g. a scale of an OME-Zarr),
+    its roi, and checksums of the data written for it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict = {}
+        self._blocks: Dict[Tuple[str, Roi], Dict[str, int]] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def create(self, header: Dict):
+        """Start a new manifest, replacing any existing one. Call this right before writing to the target."""
+        self.close()
+        self.header = header
+        self._blocks = {}
+        self._file = open(self.path, "w")
+        self._write_line(header)
+
+    def load(self) -> Optional[Dict]:
+        """
+        Read an existing manifest, to continue recording into it.
+        A truncated last line (if the export was killed while writing it) is ignored.
+        Returns None if the header is empty or truncated: the export was killed while creating the manifest,
+        before writing anything, so it has to start afresh.
+        """
+        self._blocks = {}
+        with open(self.path, "r") as f:
+            lines = f.read().split("\n")
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            logger.warning(f"Ignoring export manifest {self.path} without a valid header")
+            return None
+        self.header = header
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            self._blocks[(entry["part"], _to_roi(entry["roi"]))] = entry["checksums"]
+        return self.header
+
+    def check_header(self, **expected):
+        """Raise if the export that is being resumed had different settings."""
+        for key, value in expected.items():
+            recorded = self.header.get(key)
+            if recorded != json.loads(json.dumps(value)):
+                raise ValueError(
+                    f"Cannot resume the interrupted export recorded in {self.path}: "
+                    f"{key} was {recorded} and is now {value}."
+                )
+
+    def verify(self, read_block: Callable[[str, Roi, str], numpy.ndarray]):
+        """
+        Check the recorded blocks against the data in the target, read via read_block(part, roi, key).
+        Blocks whose data doesn't match (anymore) are forgotten, so they are written again.
+        """
+        failed = []
+
+        def verify_block(part, roi, checksums):
+            if any(block_checksum(read_block(part, roi, key)) != checksum for key, checksum in checksums.items()):
+                failed.append((part, roi))
+
+        pool = RequestPool()
+        for (part, roi), checksums in self._blocks.items():
+            pool.add(Request(partial(verify_block, part, roi, checksums)))
+        pool.wait()
+        for block in failed:
+            del self._blocks[block]
+        logger.info(f"Resuming export: {len(self._blocks)} blocks done, {len(failed)} failed verification")
+
+    def is_done(self, part: str, roi) -> bool:
+        return (part, _to_roi(roi)) in self._blocks
+
+    def record(self, part: str, roi, checksums: Dict[str, int]):
+        roi = _to_roi(roi)
+        with self._lock:
+            self._blocks[(part, roi)] = checksums
+            self._write_line({"part": part, "roi": roi, "checksums": checksums})
+
+    def close(self):
+        """Stop recording, keeping the manifest (e.g. if the export failed)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """The export is complete: the manifest isn't needed anymore."""
+        self.close()
+        os.remove(self.path)
+
+    def _write_line(self, entry: Dict):
+        if self._file is None:
+            # Continue a loaded manifest
+            self._file = open(self.path, "a")
+        # Flushed per line, so the manifest survives the process being killed
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+
+def write_blocks_resumable(
+    slot,
+    write_block: Callable[[Roi, numpy.ndarray], None],
+    manifest: ExportManifest,
+    part: str,
+    blockshape,
+    progress_signal: Optional[Callable[[int], None]] = None,
+    batch_size: Optional[int] = None,
+):
+    """
+    Like BigRequestStreamer with absolute block alignment, but blocks that the manifest lists as done are
+    not requested. All other blocks are passed to write_block(roi, data), and then recorded in the manifest.
+    The blockshape must be the same when resuming, so that the blocks match the recorded ones.
+    """
+    shape = slot.meta.shape
+    blockshape = numpy.minimum(blockshape, shape)
+    block_rois = [
+        getBlockBounds(shape, blockshape, start) for start in getIntersectingBlocks(blockshape, roiFromShape(shape))
+    ]
+    todo = [roi for roi in block_rois if not manifest.is_done(part, roi)]
+    if len(todo) < len(block_rois):
+        logger.info(f"Skipping {len(block_rois) - len(todo)} of {len(block_rois)} blocks that were exported already")
+
+    def handle_block_result(roi, data):
+        write_block(roi, data)
+        manifest.record(part, roi, {part: block_checksum(data)})
+
+    total_volume = sum(bigintprod(numpy.subtract(roi[1], roi[0])) for roi in todo)
+    batch_size = batch_size or max(1, Request.global_thread_pool.num_workers)
+    requester = RoiRequestBatch(slot, iter(todo), total_volume, batch_size, prefetchSlot=find_prefetch_slot(slot))
+    requester.resultSignal.subscribe(handle_block_result)
+    if progress_signal is not None:
+        requester.progressSignal.subscribe(progress_signal)
+    requester.execute()
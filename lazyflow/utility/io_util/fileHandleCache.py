@@ -0,0 +1,107 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections
+import threading
+from contextlib import contextmanager
+
+
+class FileHandleCache:
+    """
+    Keeps open file handles for reuse, closing the least recently used ones
+    when more than `max_open` are idle.
+
+    Handles are checked out exclusively (most file libraries' handles are not
+    thread-safe), so concurrent readers of the same file each get a handle of
+    their own. Files are only opened when they are read, which matters for
+    sequences of many thousands of files.
+
+    >>> handles = FileHandleCache(open, max_open=2)
+    >>> with handles.handle(__file__) as f:  # doctest: +SKIP
+    ...     header = f.read(100)
+    """
+
+    DEFAULT_MAX_OPEN = 64
+
+    def __init__(self, open_file, close_file=None, max_open=DEFAULT_MAX_OPEN):
+        """
+        :param open_file: function(path) -> handle
+        :param close_file: function(handle), default: handle.close()
+        """
+        self._open_file = open_file
+        self._close_file = close_file or (lambda handle: handle.close())
+        self._max_open = max_open
+        self._lock = threading.Lock()
+        # handle id -> (path, handle) in LRU order, for all idle handles
+        self._idle = collections.OrderedDict()
+        # path -> ids of its idle handles
+        self._idle_by_path = collections.defaultdict(list)
+        self._closed = False
+
+    @contextmanager
+    def handle(self, path):
+        with self._lock:
+            assert not self._closed, f"Reading {path} via a closed FileHandleCache"
+            idle_ids = self._idle_by_path.get(path)
+            handle = None
+            if idle_ids:
+                _, handle = self._idle.pop(idle_ids.pop())
+                if not idle_ids:
+                    del self._idle_by_path[path]
+        if handle is None:
+            handle = self._open_file(path)
+
+        try:
+            yield handle
+        finally:
+            self._release(path, handle)
+
+    def _release(self, path, handle):
+        to_close = []
+        with self._lock:
+            if self._closed:
+                to_close.append(handle)
+            else:
+                self._idle[id(handle)] = (path, handle)
+                self._idle_by_path[path].append(id(handle))
+                while len(self._idle) > self._max_open:
+                    handle_id, (old_path, old_handle) = self._idle.popitem(last=False)
+                    self._idle_by_path[old_path].remove(handle_id)
+                    if not self._idle_by_path[old_path]:
+                        del self._idle_by_path[old_path]
+                    to_close.append(old_handle)
+        for old_handle in to_close:
+            self._close_file(old_handle)
+
+    def num_idle(self):
+        return len(self._idle)
+
+    def close(self):
+        """
+        Close all idle handles, handles that are in use are closed when they are returned.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [handle for _, handle in self._idle.values()]
+            self._idle.clear()
+            self._idle_by_path.clear()
+        for handle in idle:
+            self._close_file(handle)
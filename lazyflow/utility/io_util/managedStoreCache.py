@@ -0,0 +1,238 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import logging
+import time
+from functools import partial
+from typing import Dict, Mapping, Sequence
+
+from zarr.storage import BaseStore, Store, getsize, listdir
+from zarr.util import buffer_size
+
+from lazyflow.operators.opCache import ManagedBlockedCache
+from lazyflow.request import Request, RequestLock
+
+logger = logging.getLogger(__name__)
+
+
+class ManagedStoreCache(Store, ManagedBlockedCache):
+    """
+    Caches the values (i.e. the encoded chunks and metadata files) of a zarr store in memory.
+
+    Like zarr's LRUStoreCache, but the cached values are managed by the cacheMemoryManager,
+    sharing the global cache budget with the operator caches and showing up in memory reports.
+
+    Values requested at the same time as one batch (e.g. all chunks intersecting a roi that zarr
+    reads via getitems) are fetched from the underlying store as one batch too, so that stores that
+    can fetch concurrently (like FSStore) do so. If a value is requested while it is being fetched
+    already, the request waits for the ongoing fetch instead of fetching it again.
+    """
+
+    # Not an operator, but the Cache interface expects these
+    parent = None
+    children = ()
+
+    def __init__(self, store, name="ManagedStoreCache"):
+        self._store: BaseStore = BaseStore._ensure_store(store)
+        self.name = name
+        self._lock = RequestLock()
+        self._keys_cache = None
+        self._contains_cache = {}
+        self._listdir_cache = {}
+        self._values = {}
+        self._last_access_times = {}
+        self._pending_fetches: Dict[str, Request] = {}
+        self._used_memory = 0
+        self.hits = self.misses = 0
+
+        # Now that we're initialized, it's safe to register with the memory manager
+        self.registerWithMemoryManager()
+
+    # Mappings compare by content, but the memory manager needs to tell caches apart
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __getitem__(self, key):
+        return self._get_values([key], {})[key]
+
+    def getitems(self, keys: Sequence[str], *, contexts: Mapping) -> Mapping:
+        return self._get_values(keys, contexts)
+
+    def _get_values(self, keys, contexts):
+        values = {}
+        to_fetch = []
+        pending_fetches = {}  # fetches that are ongoing already, by key
+        with self._lock:
+            for key in keys:
+                if key in self._values:
+                    values[key] = self._values[key]
+                    self._last_access_times[key] = time.time()
+                    self.hits += 1
+                elif key in self._pending_fetches:
+                    pending_fetches[key] = self._pending_fetches[key]
+                    self.hits += 1
+                else:
+                    to_fetch.append(key)
+                    self.misses += 1
+            if to_fetch:
+                fetch = Request(partial(self._fetch, to_fetch, contexts))
+                for key in to_fetch:
+                    self._pending_fetches[key] = fetch
+
+        for key in values:
+            self.notifyBlockAccess(key)
+        if to_fetch:
+            # Our own fetch first: the ongoing ones might take longer
+            values.update(fetch.wait())
+        for key, fetch in pending_fetches.items():
+            fetched = fetch.wait()
+            # Keys that don't exist in the store are skipped, as in BaseStore.getitems
+            if key in fetched:
+                values[key] = fetched[key]
+        return values
+
+    def _fetch(self, keys, contexts):
+        try:
+            start = time.perf_counter()
+            fetched = self._store.getitems(keys, contexts=contexts)
+            cost = (time.perf_counter() - start) / len(keys)
+            with self._lock:
+                for key, value in fetched.items():
+                    self._insert(key, value)
+        finally:
+            with self._lock:
+                for key in keys:
+                    del self._pending_fetches[key]
+        for key, value in fetched.items():
+            self.notifyBlockAccess(key, size=buffer_size(value), cost=cost)
+        return fetched
+
+    def _insert(self, key, value):
+        # (Callers must hold self._lock)
+        self._discard(key)
+        self._values[key] = value
+        self._last_access_times[key] = time.time()
+        self._used_memory += buffer_size(value)
+
+    def _discard(self, key):
+        # (Callers must hold self._lock)
+        value = self._values.pop(key, None)
+        if value is None:
+            return 0
+        del self._last_access_times[key]
+        size = buffer_size(value)
+        self._used_memory -= size
+        return size
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+        with self._lock:
+            self._invalidate_keys()
+            self._insert(key, value)
+        self.notifyBlockAccess(key, size=buffer_size(value))
+
+    def __delitem__(self, key):
+        del self._store[key]
+        with self._lock:
+            self._invalidate_keys()
+            self._discard(key)
+        self.notifyBlockFreed(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._contains_cache:
+                self._contains_cache[key] = key in self._store
+            return self._contains_cache[key]
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        return iter(self._keys())
+
+    def _keys(self):
+        with self._lock:
+            if self._keys_cache is None:
+                self._keys_cache = list(self._store.keys())
+            return self._keys_cache
+
+    def listdir(self, path=None):
+        with self._lock:
+            if path not in self._listdir_cache:
+                self._listdir_cache[path] = listdir(self._store, path)
+            return self._listdir_cache[path]
+
+    def getsize(self, path=None) -> int:
+        return getsize(self._store, path=path)
+
+    def _invalidate_keys(self):
+        # (Callers must hold self._lock)
+        self._keys_cache = None
+        self._contains_cache.clear()
+        self._listdir_cache.clear()
+
+    ##
+    ## ManagedBlockedCache interface implementation
+    ##
+    reportsBlockAccess = True
+
+    def usedMemory(self):
+        return self._used_memory
+
+    def fractionOfUsedMemoryDirty(self):
+        # the store is never written to behind our back
+        return 0.0
+
+    def lastAccessTime(self):
+        return super().lastAccessTime()
+
+    def getBlockAccessTimes(self):
+        with self._lock:
+            return list(self._last_access_times.items())
+
+    def freeMemory(self):
+        with self._lock:
+            used = self._used_memory
+            self._values = {}
+            self._last_access_times = {}
+            self._used_memory = 0
+        self.notifyAllBlocksFreed()
+        return used
+
+    def freeBlock(self, key):
+        with self._lock:
+            freed = self._discard(key)
+        self.notifyBlockFreed(key)
+        return freed
+
+    def freeDirtyMemory(self):
+        return 0.0
+
+    def generateReport(self, report):
+        super().generateReport(report)
+        with self._lock:
+            hits, misses, num_values = self.hits, self.misses, len(self._values)
+        lookups = hits + misses
+        hit_rate = 100.0 * hits / lookups if lookups else 0.0
+        report.info = f"Values: {num_values}, hits: {hits}, misses: {misses} ({hit_rate:.1f}% hit rate)"
@@ -1,163 +1,410 @@
-from __future__ import print_function
-from future import standard_library
-
-standard_library.install_aliases()
-from builtins import zip
-from builtins import range
-from builtins import object
-import os
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Read hdf5 datasets with a pool of helper processes.
+
+h5py serializes all calls into the hdf5 library with a global lock, so
+parallel requests for (compressed) hdf5 data are effectively processed one
+after the other. MultiProcessHdf5File is a read-only stand-in for h5py.File
+that sends reads to a pool of reader processes, each with its own handle of
+the file, instead.
+
+Requests are split into chunk-aligned pieces, which are spread over the
+processes (every chunk is always read by the same process, so each process'
+hdf5 chunk cache stays useful). Each process decompresses its pieces directly
+into a shared memory buffer, from which they are copied into the caller's
+array, i.e. the data is never pickled or sent through a pipe.
+
+Multi-process reading only pays off for compressed datasets, OpInputDataReader
+uses it for those if the environment variable LAZYFLOW_MULTIPROCESS_HDF5 is set
+(see `num_reader_processes_from_env`).
+"""
+import collections
 import copy
-import h5py
-import threading
-import warnings
+import logging
+import math
 import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import weakref
+from multiprocessing import shared_memory
+
+import h5py
 import numpy
 
 from lazyflow.utility.helpers import bigintprod
 
-# This code uses multiprocessing to read hdf5 datasets faster
-# I'm still experimenting with implementation details,
-#  and switching between implementation variants via the METHOD setting below.
-#
-# NOTES:
-# - So far, this code is:
-#  -- faster for compressed datasets
-#  -- somewhat slower for chunked uncompressed datasets
-#  -- *much slower* for unchunked datasets
-#
-# THINGS TO TRY:
-#  -- Right now we launch the process only once, which means it must serve requests of varying sizes
-#     Instead, we might try launching a new throwaway process for every request.
-#     Overhead would be increased, but it would allow us to pass a shared-memory Array to the process,
-#         since we know the request size in advance.
-#  -- Could memory-sharing be achieved instead via memory-mapped files and/or mem-mapped arrays?
-#  -- Create a pool of processes instead of creating a processes for every thread and volume combo.
-
-# DEBUG: In this file (including the __main__ section), we are experimenting with various implementations.
-#        The METHOD setting switches between each.
-# METHOD = 'plain-h5py' # 4.6 seconds
-# METHOD = 'pipe-array' # 3.8 - 4.5 (inconsistent...)
-METHOD = "pipe-bytes"  # 2.5 seconds
-# METHOD = 'shared-array' # 4.3 (2.0 without copy...)
-
-
-class ReaderProcess(multiprocessing.Process):
-    # This class is not threadsafe.
-    # The reader process is not supposed to be shared by multiple threads.
-    # Each thread should create its own reader process.
-
-    def __init__(self, filepath):
-        name = "ilastik_helper-" + os.path.split(filepath)[1]
-        super(ReaderProcess, self).__init__(name=name)
-        self._filepath = filepath
-        self._request_queue_recv, self._request_queue_send = multiprocessing.Pipe(duplex=False)
-        self._result_queue_recv, self._result_queue_send = multiprocessing.Pipe(duplex=False)
-        self.daemon = True
-
-        if METHOD == "shared-array":
-            self.available_bytes = 100 * 1024 ** 2
-            self.transfer_buffer = multiprocessing.RawArray("b", self.available_bytes)
-
-    def run(self):
-        with h5py.File(self._filepath, "r") as h5_file:
-            (internal_path, slicing) = self._request_queue_recv.recv()
-            # 'None' means stop the process.
-            while internal_path is not None:
+logger = logging.getLogger(__name__)
+
+#: size of the shared memory buffer of each reader process, larger pieces are split further
+DEFAULT_TRANSFER_BUFFER_BYTES = 64 * 1024**2
+#: maximum number of reader processes per file if LAZYFLOW_MULTIPROCESS_HDF5 doesn't specify it
+MAX_DEFAULT_READER_PROCESSES = 8
+
+
+def num_reader_processes_from_env():
+    """
+    Number of reader processes to use, according to the LAZYFLOW_MULTIPROCESS_HDF5 environment variable
+
+    An integer value gives the number of processes (0 disables multi-process reading),
+    any other non-empty value selects one process per core (at most MAX_DEFAULT_READER_PROCESSES).
+    """
+    setting = os.environ.get("LAZYFLOW_MULTIPROCESS_HDF5", "")
+    if not setting:
+        return 0
+    try:
+        return max(0, int(setting))
+    except ValueError:
+        return min(multiprocessing.cpu_count(), MAX_DEFAULT_READER_PROCESSES)
+
+
+def _attach_shared_memory(name):
+    try:
+        # Python >= 3.13: the creating process is responsible for unlinking
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Reader processes share the resource tracker of the parent, which unlinks the buffer
+        return shared_memory.SharedMemory(name=name)
+
+
+def _reader_main(filepath, buffer_name, conn):
+    """
+    Main function of a reader process.
+
+    Requests are (internal_path, start, stop), the data is written into the transfer buffer
+    in C order. Every request is answered with None, or the exception raised when reading.
+    A request of None stops the process.
+    """
+    transfer_buffer = _attach_shared_memory(buffer_name)
+    try:
+        with h5py.File(filepath, "r") as h5_file:
+            while True:
+                request = conn.recv()
+                if request is None:
+                    break
+                internal_path, start, stop = request
                 try:
-                    if METHOD == "shared-array":
-                        read_roi = slice_to_roi(slicing, h5_file[internal_path].shape)
-                        read_roi = numpy.array(read_roi)
-                        read_shape = read_roi[1] - read_roi[0]
-                        num_bytes = h5_file[internal_path].dtype.itemsize * bigintprod(read_shape)
-                        assert num_bytes <= self.available_bytes, "I don't yet support really big slicings"
-                        read_array = numpy.frombuffer(self.transfer_buffer, dtype=numpy.uint8, count=num_bytes)
-                        read_array.setflags(write=True)
-                        read_array = read_array.view(h5_file[internal_path].dtype).reshape(read_shape)
-
-                        h5_file[internal_path].read_direct(read_array, slicing)
-
-                    if METHOD == "pipe-bytes" or METHOD == "pipe-array":
-                        read_array = h5_file[internal_path][slicing]
+                    dataset = h5_file[internal_path]
+                    shape = tuple(b - a for a, b in zip(start, stop))
+                    out = numpy.ndarray(shape, dtype=dataset.dtype, buffer=transfer_buffer.buf)
+                    dataset.read_direct(out, tuple(slice(a, b) for a, b in zip(start, stop)))
+                    del out
                 except Exception as ex:
-                    self._result_queue_send.send(ex)
-                    raise
+                    try:
+                        conn.send(ex)
+                    except Exception:
+                        # not picklable
+                        conn.send(RuntimeError(repr(ex)))
                 else:
-                    self._result_queue_send.send((read_array.shape, read_array.dtype))
+                    conn.send(None)
+    except (EOFError, KeyboardInterrupt):
+        # parent went away
+        pass
+    finally:
+        transfer_buffer.close()
+        conn.close()
+
+
+class ReaderProcess(object):
+    """
+    A helper process with its own handle of the hdf5 file and a shared memory transfer buffer.
 
-                    if METHOD == "pipe-array":
-                        self._result_queue_send.send(read_array)
+    Only one request can be outstanding at a time, hold `lock` while using the process.
+    """
 
-                    if METHOD == "pipe-bytes":
-                        self._result_queue_send.send_bytes(numpy.getbuffer(read_array))
+    def __init__(self, context, filepath, buffer_bytes):
+        self.lock = threading.Lock()
+        self.buffer_bytes = buffer_bytes
+        self.transfer_buffer = shared_memory.SharedMemory(create=True, size=buffer_bytes)
+        self.conn, child_conn = context.Pipe()
+        name = "ilastik_helper-" + os.path.split(filepath)[1]
+        self._process = context.Process(
+            target=_reader_main, args=(filepath, self.transfer_buffer.name, child_conn), name=name, daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+
+    def submit(self, internal_path, start, stop):
+        self.conn.send((internal_path, tuple(map(int, start)), tuple(map(int, stop))))
+
+    def receive(self):
+        """
+        wait for the answer to the last request, raising the reader's exception (if any)
+        """
+        try:
+            error = self.conn.recv()
+        except (EOFError, OSError):
+            # The pipe is closed (EOFError) or was reset (ConnectionResetError) when the reader died
+            raise RuntimeError(f"hdf5 reader process {self._process.name} died (exit code {self._process.exitcode})")
+        if error is not None:
+            raise error
+
+    def view(self, shape, dtype):
+        """
+        the result of the last request
+        """
+        return numpy.ndarray(shape, dtype=dtype, buffer=self.transfer_buffer.buf)
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def close(self, timeout=5.0):
+        with self.lock:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self._process.join(timeout)
+            if self._process.is_alive():
+                logger.warning(f"hdf5 reader process {self._process.name} did not stop, terminating it.")
+                self._process.terminate()
+                self._process.join()
+            self.conn.close()
+            self.transfer_buffer.close()
+            self.transfer_buffer.unlink()
+
+
+def _close_readers(readers):
+    for reader in readers:
+        reader.close()
+
+
+def split_roi(start, stop, chunks, max_items, min_pieces=1):
+    """
+    Split a roi into pieces along chunk boundaries.
 
-                # Wait for the next request
-                (internal_path, slicing) = self._request_queue_recv.recv()
+    Axes are split in order, until there are at least `min_pieces` pieces (if possible)
+    and no piece has more than `max_items` elements. Pieces are only split off
+    chunk boundaries if a single chunk is larger than `max_items`.
 
-    def read_subvolume(self, internal_path, slicing):
-        self._request_queue_send.send((internal_path, slicing))
-        response_info = self._result_queue_recv.recv()
-        if isinstance(response_info, Exception):
-            raise response_info
-        shape, dtype = response_info
+    >>> split_roi((0, 0), (10, 10), chunks=(4, 4), max_items=100, min_pieces=2)
+    [((0, 0), (8, 10)), ((8, 0), (10, 10))]
+    """
+    assert max_items > 0
+    start = tuple(map(int, start))
+    stop = tuple(map(int, stop))
+    pieces = [(start, stop)]
+
+    def largest(pieces):
+        return max(bigintprod(numpy.subtract(p_stop, p_start)) for p_start, p_stop in pieces)
+
+    for axis, chunk in enumerate(chunks):
+        max_piece_items = largest(pieces)
+        if len(pieces) >= min_pieces and max_piece_items <= max_items:
+            return pieces
+        parts = max(math.ceil(min_pieces / len(pieces)), math.ceil(max_piece_items / max_items))
+        new_pieces = []
+        for p_start, p_stop in pieces:
+            first_chunk = p_start[axis] // chunk
+            num_chunks = (p_stop[axis] - 1) // chunk - first_chunk + 1
+            chunks_per_part = max(1, math.ceil(num_chunks / parts))
+            bounds = [p_start[axis]]
+            bounds += range((first_chunk + chunks_per_part) * chunk, p_stop[axis], chunks_per_part * chunk)
+            bounds.append(p_stop[axis])
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                new_pieces.append(
+                    (p_start[:axis] + (a,) + p_start[axis + 1 :], p_stop[:axis] + (b,) + p_stop[axis + 1 :])
+                )
+        pieces = new_pieces
+
+    # Chunks larger than max_items: split further, off chunk boundaries
+    return [small for piece in pieces for small in _split_unaligned(*piece, max_items)]
+
+
+def _split_unaligned(start, stop, max_items, axis=0):
+    shape = tuple(b - a for a, b in zip(start, stop))
+    if bigintprod(shape) <= max_items:
+        return [(start, stop)]
+    slab_items = bigintprod(shape[axis + 1 :])
+    thickness = max(1, max_items // slab_items)
+    pieces = []
+    for a in range(start[axis], stop[axis], thickness):
+        b = min(a + thickness, stop[axis])
+        pieces += _split_unaligned(
+            start[:axis] + (a,) + start[axis + 1 :], stop[:axis] + (b,) + stop[axis + 1 :], max_items, axis + 1
+        )
+    return pieces
+
+
+class Hdf5ReaderPool(object):
+    """
+    Pool of reader processes for one hdf5 file. Thread-safe.
+    """
 
-        if METHOD == "pipe-array":
-            result = self._result_queue_recv.recv()
+    def __init__(self, filepath, num_processes, buffer_bytes=DEFAULT_TRANSFER_BUFFER_BYTES):
+        assert num_processes > 0
+        # Forking a process with running lazyflow worker threads (and hdf5 state) is not safe
+        context = multiprocessing.get_context("spawn")
+        self._readers = []
+        try:
+            for _ in range(num_processes):
+                self._readers.append(ReaderProcess(context, filepath, buffer_bytes))
+        except Exception:
+            _close_readers(self._readers)
+            raise
+        self._finalizer = weakref.finalize(self, _close_readers, self._readers)
+
+    @property
+    def num_processes(self):
+        return len(self._readers)
+
+    def read_direct(self, internal_path, out, start, stop, dtype, chunks=None):
+        """
+        Read the roi (start, stop) of a dataset into the array `out`, which must have the roi's shape.
+
+        @param chunks chunk shape of the dataset, requests are split and distributed along chunk boundaries
+        """
+        if not self._finalizer.alive:
+            raise ValueError("Reading from a closed Hdf5ReaderPool")
+        shape = tuple(b - a for a, b in zip(start, stop))
+        assert out.shape == shape, f"Shape mismatch: {out.shape} != {shape}"
+        if bigintprod(shape) == 0:
+            return out
+        if not chunks:
+            chunks = (1,) + shape[1:]
+
+        dtype = numpy.dtype(dtype)
+        max_items = min(reader.buffer_bytes for reader in self._readers) // dtype.itemsize
+        pieces = split_roi(start, stop, chunks, max_items, min_pieces=len(self._readers))
+
+        # Route all pieces of a chunk to the same process, so that its chunk cache is useful
+        assignments = collections.defaultdict(collections.deque)
+        for piece in pieces:
+            chunk_index = tuple(a // c for a, c in zip(piece[0], chunks))
+            assignments[hash(chunk_index) % len(self._readers)].append(piece)
+
+        # Lock in a consistent order to avoid deadlocks between concurrent reads
+        readers = [self._readers[i] for i in sorted(assignments)]
+        queues = [assignments[i] for i in sorted(assignments)]
+        for reader in readers:
+            reader.lock.acquire()
+        try:
+            self._read_pieces(internal_path, out, start, dtype, readers, queues)
+        finally:
+            for reader in readers:
+                reader.lock.release()
+        return out
+
+    def _read_pieces(self, internal_path, out, start, dtype, readers, queues):
+        in_flight = {}
+        for reader, queue in zip(readers, queues):
+            piece = queue.popleft()
+            reader.submit(internal_path, *piece)
+            in_flight[reader.conn] = (reader, queue, piece)
+
+        error = None
+        while in_flight:
+            for conn in multiprocessing.connection.wait(list(in_flight)):
+                reader, queue, piece = in_flight.pop(conn)
+                try:
+                    reader.receive()
+                except Exception as ex:
+                    # Let the other readers finish their current piece, so they are ready for the next request
+                    error = error or ex
+                    continue
+                if error is not None:
+                    continue
+
+                p_start, p_stop = piece
+                p_shape = tuple(b - a for a, b in zip(p_start, p_stop))
+                out_slicing = tuple(slice(a - s, b - s) for a, b, s in zip(p_start, p_stop, start))
+                out[out_slicing] = reader.view(p_shape, dtype)
+
+                if queue:
+                    piece = queue.popleft()
+                    reader.submit(internal_path, *piece)
+                    in_flight[reader.conn] = (reader, queue, piece)
+        if error is not None:
+            raise error
 
-        if METHOD == "pipe-bytes":
-            raw_buffer = self._result_queue_recv.recv_bytes()
-            result = numpy.frombuffer(raw_buffer, dtype=dtype).reshape(shape)
-            result.setflags(write=True)
+    def close(self):
+        self._finalizer()
 
-        if METHOD == "shared-array":
-            result = numpy.frombuffer(self.transfer_buffer, dtype=dtype, count=bigintprod(shape)).copy()
-            result = result.reshape(shape)
-        return result
 
-    def join(self):
-        self._request_queue_send.send((None, None))
-        super(ReaderProcess, self).join()
+_DatasetInfo = collections.namedtuple("_DatasetInfo", ["shape", "dtype", "chunks", "compression", "attrs"])
 
 
 class _Dataset(object):
     """
     Stand-in proxy object for a h5py.Dataset object.
-    For __getitem__, we retrieve the requested data from our helper process.
-    For all other attributes, we *open* the file temporarily and read the attribute.
+    Data is read via the reader processes of the file.
+    Shape, dtype, chunks, compression and attrs are read once and cached,
+    for all other attributes, we *open* the file temporarily and read the attribute.
     (This makes attribute access very slow.)
     """
 
-    def __init__(self, mp_file, reader_process, internal_path):
+    def __init__(self, mp_file, internal_path, info):
         self._internal_path = internal_path
-        self._reader_process = reader_process
         self.mp_file = mp_file
-
-        if self.compression is None:
-            warnings.warn(
-                "MultiProcessHdf5File does not improve performance for non-compressed datasets! "
-                "Your dataset '{}' is not compressed.".format(self.mp_file._filepath + internal_path)
-            )
+        self.name = internal_path
+        self.shape = info.shape
+        self.dtype = info.dtype
+        self.chunks = info.chunks
+        self.compression = info.compression
+        self.attrs = info.attrs
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return bigintprod(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read(self, slicing, out=None):
+        roi = slice_to_roi(slicing, self.shape)
+        read_shape = tuple(roi[1] - roi[0])
+        if out is None:
+            out = numpy.empty(read_shape, dtype=self.dtype)
+        self.mp_file._pool.read_direct(self._internal_path, out, roi[0], roi[1], self.dtype, self.chunks)
+        return out
 
     def __getitem__(self, slicing):
-        return self._reader_process.read_subvolume(self._internal_path, slicing)
-
-    def __getattribute__(self, name):
-        try:
-            # If we have this attr, use it.
-            # (e.g. self.mp_file, self._internal_path, etc.)
-            return object.__getattribute__(self, name)
-        except:
-            # Briefly open the file and read the attribute directly from h5py
-            with h5py.File(self.mp_file._filepath, "r") as f:
-                val = getattr(f[self._internal_path], name)
-                assert not callable(val), "MultiprocessingHdf5File Datasets cannot provide access to callable items."
-
-                # Special case: copy hdf5 dataset attrs into a dict
-                if name == "attrs":
-                    val = dict(list(val.items()))
-                return val
-
-    def read_direct(self, out_array, slicing):
-        out_array[:] = self[slicing]
+        slicing = expandSlicing(slicing, self.shape)
+        result = self._read(slicing)
+        # Integer indices drop their axis, as in h5py
+        return result[tuple(0 if isinstance(s, (int, numpy.integer)) else slice(None) for s in slicing)]
+
+    def read_direct(self, out_array, source_sel=None, dest_sel=None):
+        if source_sel is None:
+            source_sel = numpy.s_[...]
+        target = out_array if dest_sel is None else out_array[dest_sel]
+        source_sel = expandSlicing(source_sel, self.shape)
+        roi = slice_to_roi(source_sel, self.shape)
+        if target.shape != tuple(roi[1] - roi[0]):
+            # Integer indices drop their axis, add it back (as a view, so that we write into out_array)
+            target = target[tuple(None if isinstance(s, (int, numpy.integer)) else slice(None) for s in source_sel)]
+        self._read(source_sel, out=target)
+
+    def __getattr__(self, name):
+        # Briefly open the file and read the attribute directly from h5py
+        with h5py.File(self.mp_file._filepath, "r") as f:
+            val = getattr(f[self._internal_path], name)
+            assert not callable(val), "MultiprocessingHdf5File Datasets cannot provide access to callable items."
+            return copy.copy(val)
 
 
 class _Group(object):
@@ -176,6 +423,7 @@ class _Group(object):
         if internal_path != "/" and internal_path[-1] == "/":
             internal_path = internal_path[:-1]
         self._internal_path = internal_path
+        self.name = internal_path
 
     def __contains__(self, key):
         try:
@@ -186,10 +434,10 @@ class _Group(object):
             return True
 
     def __iter__(self):
-        return iter(self.keys())
+        return self.iterkeys()
 
     def keys(self):
-        return list(self.keys())
+        return list(self.iterkeys())
 
     def iterkeys(self):
         internal_path = self._internal_path
@@ -211,11 +459,7 @@ class _Group(object):
         else:
             full_internal_path = sub_path
 
-        try:
-            object_type = self.mp_file._all_paths[full_internal_path]
-        except KeyError:
-            raise
-
+        object_type = self.mp_file._all_paths[full_internal_path]
         if object_type is h5py.Dataset:
             return self.mp_file._get_dataset(full_internal_path)
         elif object_type is h5py.Group:
@@ -223,62 +467,71 @@ class _Group(object):
         else:
             assert False, "Don't know how to access object: {}".format(object_type)
 
-    def __getattribute__(self, name):
-        try:
-            # If we have this attr, use it.
-            # (e.g. self.mp_file, self._internal_path, etc.)
-            return object.__getattribute__(self, name)
-        except:
-            # Briefly open the file and read the attribute directly from h5py
-            with h5py.File(self.mp_file._filepath, "r") as f:
-                val = getattr(f[self._internal_path], name)
-                assert not callable(val), "MultiprocessingHdf5File Groups cannot provide access to callable items."
-                return copy.copy(val)
+    def __getattr__(self, name):
+        # Briefly open the file and read the attribute directly from h5py
+        with h5py.File(self.mp_file._filepath, "r") as f:
+            val = getattr(f[self._internal_path], name)
+            assert not callable(val), "MultiprocessingHdf5File Groups cannot provide access to callable items."
+            return copy.copy(val)
 
 
 class MultiProcessHdf5File(_Group):
     """
-    Stand-in proxy object for an h5py.File object.
-    Users requesting a group or
+    Stand-in proxy object for an h5py.File object (read-only),
+    reading datasets with a pool of helper processes.
+
+    >>> with MultiProcessHdf5File("/path/to/file.h5", num_processes=4) as f:  # doctest: +SKIP
+    ...     data = f["volume/data"][0:100, 0:100]
     """
 
-    def __init__(self, filepath, mode="r"):
-        super(MultiProcessHdf5File, self).__init__(self, "")
+    def __init__(self, filepath, mode="r", num_processes=None, buffer_bytes=DEFAULT_TRANSFER_BUFFER_BYTES):
         assert mode == "r", "Only read-only access is permitted when using MultiProcessHdf5File objects."
         self._filepath = filepath
-        self._reader_processes = {}
+        self.filename = filepath
         self._lock = threading.Lock()
-
+        self._dataset_infos = {}
         self._all_paths = {}
 
         def add_path(key, val):
             # Store just the type for now.
-            # All attributes will be read with high overhead (i.e. temporarily opening the file...)
+            # Dataset properties are read on first access, other attributes with high overhead
+            # (i.e. temporarily opening the file...)
             if key[0] != "/":
                 key = "/" + key
-            self._all_paths[key] = type(val)
+            self._all_paths[key] = h5py.Dataset if isinstance(val, h5py.Dataset) else h5py.Group
 
         with h5py.File(filepath, "r") as f:
             f.visititems(add_path)
 
+        if num_processes is None:
+            num_processes = num_reader_processes_from_env() or min(
+                multiprocessing.cpu_count(), MAX_DEFAULT_READER_PROCESSES
+            )
+        self._pool = Hdf5ReaderPool(filepath, num_processes, buffer_bytes)
+        super(MultiProcessHdf5File, self).__init__(self, "")
+
     def _get_dataset(self, internal_path):
-        thread_id = threading.current_thread().ident
-        if thread_id not in self._reader_processes:
-            with self._lock:
-                if thread_id not in self._reader_processes:
-                    self._reader_processes[thread_id] = ReaderProcess(self._filepath)
-                    self._reader_processes[thread_id].start()
-        return _Dataset(self, self._reader_processes[thread_id], internal_path)
+        with self._lock:
+            info = self._dataset_infos.get(internal_path)
+            if info is None:
+                with h5py.File(self._filepath, "r") as f:
+                    dataset = f[internal_path]
+                    info = _DatasetInfo(
+                        dataset.shape, dataset.dtype, dataset.chunks, dataset.compression, dict(dataset.attrs.items())
+                    )
+                self._dataset_infos[internal_path] = info
+        if info.compression is None:
+            logger.info(
+                f"MultiProcessHdf5File does not improve performance for non-compressed datasets! "
+                f"Your dataset '{self._filepath}{internal_path}' is not compressed."
+            )
+        return _Dataset(self, internal_path, info)
 
     def __setitem__(self, *args):
         raise NotImplementedError("Not permitted to write to a file via MultiProcessHdf5File")
 
     def close(self):
-        with self._lock:
-            readers = list(self._reader_processes.values())
-            self._reader_processes.clear()
-            for reader in readers:
-                reader.join()
+        self._pool.close()
 
     def __enter__(self):
         return self
@@ -302,12 +555,9 @@ def slice_to_roi(slicing, shape):
     for sl, sh in zip(slicing, shape):
         if isinstance(sl, slice):
             assert sl.step is None, "Can't handle slices with steps."
-            start, stop = sl.start, sl.stop
-            if sl.start is None:
-                start = 0
-            if sl.stop is None:
-                stop = sh
-            full_slicing.append(slice(start, stop))
+            # Clip to the bounds of shape, as numpy does
+            start, stop, _ = sl.indices(sh)
+            full_slicing.append(slice(start, max(start, stop)))
         else:
             full_slicing.append(slice(sl, sl + 1))
 
@@ -362,111 +612,3 @@ def expandSlicing(s, shape):
         s = ()
 
     return s
-
-
-#
-# Miscellaneous tests below.
-# TODO: Write some proper unit tests...
-#
-if __name__ == "__main__":
-    import numpy
-    from functools import partial
-
-    filepath = "/tmp/testfile.h5"
-    datapath = "mygroup/bigdata"
-
-    # Switch File type
-    if METHOD == "plain-h5py":
-        fileclass = h5py.File
-    else:
-        fileclass = MultiProcessHdf5File
-
-    testvol = numpy.indices((100, 100, 100)).astype(numpy.uint32).sum(0)
-    with h5py.File(filepath, "w") as f:
-        f.create_dataset(datapath, data=testvol, chunks=True)
-        f.create_dataset("mygroup/mybla/bla/somedata", data=1)
-        f.create_dataset("othergroup/otherbla/bla/somedata", data=1)
-        f.create_dataset("othergroup/otherbla2/bla/somedata", data=1)
-
-    with fileclass(filepath) as mphf:
-        whole_vol = mphf[datapath][:]
-        assert (whole_vol == testvol).all()
-
-        print(mphf["mygroup"].name)
-        print(list(mphf[datapath].attrs.keys()))
-        print(mphf[datapath].shape)
-        print(mphf[datapath].dtype)
-        print("mygroup" in mphf)
-        print("/mygroup/bigdata" in mphf)
-        print("bigdata" in mphf["mygroup"])
-
-        print("root keys are: ", list(mphf.keys()))
-        print("mygroup keys are: ", list(mphf["mygroup"].keys()))
-        print("othergroup keys are: ", list(mphf["othergroup"].keys()))
-
-        mphf[datapath].read_direct(whole_vol[0], numpy.s_[0])
-
-        def test_subvol(slicing):
-            expected_vol = testvol[slicing]
-            read_vol = mphf[datapath][slicing]
-            assert (read_vol == expected_vol).all()
-
-        threads = []
-        for i in range(40):
-            threads.append(threading.Thread(target=partial(test_subvol, (numpy.s_[i : i + 1],))))
-
-        for thread in threads:
-            thread.start()
-
-        for thread in threads:
-            thread.join()
-
-    bigfile_path = "/tmp/big_testfile7.h5"
-    if not os.path.exists(bigfile_path):
-        print("generating test file:", bigfile_path)
-        with h5py.File(bigfile_path, "w") as f:
-            f.create_dataset(
-                "data",
-                data=numpy.random.randint(0, 255, (100, 10000, 1000)).astype(numpy.uint8),
-                chunks=True,
-                compression="gzip",
-                compression_opts=4,
-            )
-
-    with h5py.File(bigfile_path, "r") as f:
-        bigvol = f["data"][:]
-
-    import time
-
-    with fileclass(bigfile_path, "r") as bf:
-
-        def test_subvol(slicings):
-            for slicing in slicings:
-                # Just read, don't check:
-                # We want the time for this test to be dominated by reading the data, not checking it.
-                read_vol = bf["data"][slicing]
-                # expected_vol = bigvol[slicing]
-                # assert (read_vol == expected_vol).all()
-
-        threads = []
-        for i in range(8):
-            slicings = [
-                numpy.s_[i : i + 5],
-                numpy.s_[i + 1 : i + 6],
-                numpy.s_[i + 2 : i + 7],
-                numpy.s_[i + 3 : i + 8],
-                numpy.s_[i + 4 : i + 9],
-            ]
-            threads.append(threading.Thread(target=partial(test_subvol, slicings)))
-
-        start_time = time.time()
-
-        for thread in threads:
-            thread.start()
-
-        for thread in threads:
-            thread.join()
-
-        stop_time = time.time()
-
-        print("Time: {} seconds".format(stop_time - start_time))
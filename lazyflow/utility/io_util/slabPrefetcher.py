@@ -0,0 +1,134 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections
+import logging
+import threading
+from functools import partial
+
+import numpy
+
+from lazyflow.request import Request
+
+logger = logging.getLogger(__name__)
+
+
+class SlabPrefetcher:
+    """
+    Reads ahead along one axis when a volume is walked slab by slab.
+
+    When BigRequestStreamer (or a cache filling its blocks in order) streams
+    through a stack, every request is followed by one for the adjacent slab
+    along the stacking axis. Once a request directly follows an earlier one
+    (same roi, shifted by its own extent along `axis`), the next slab is read
+    in the background, so the file access overlaps with the caller's processing
+    of the current one.
+
+    :param read: function(start, stop, out) that reads a roi into `out`
+    :param max_pending: maximum number of slabs that are read ahead (and held in memory)
+    """
+
+    #: number of recent requests considered when detecting sequential access
+    HISTORY_LENGTH = 64
+
+    def __init__(self, read, shape, dtype, axis, max_pending=4):
+        self._read = read
+        self._shape = tuple(shape)
+        self._dtype = dtype
+        self._axis = axis
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        # recent request rois (ordered set)
+        self._history = collections.OrderedDict()
+        # roi -> Request producing the slab
+        self._pending = collections.OrderedDict()
+        self._hits = 0
+
+    def read(self, start, stop, out):
+        roi = (tuple(map(int, start)), tuple(map(int, stop)))
+        with self._lock:
+            pending = self._pending.pop(roi, None)
+            self._remember(roi)
+            next_roi = self._shifted(roi, 1)
+            if (
+                self._shifted(roi, -1) in self._history
+                and next_roi is not None
+                and next_roi not in self._history
+                and next_roi not in self._pending
+            ):
+                self._prefetch(next_roi)
+
+        if pending is not None:
+            try:
+                out[...] = pending.wait()
+                self._hits += 1
+                return out
+            except Exception:
+                # (already logged) try again, in case the error was transient
+                pass
+        self._read(roi[0], roi[1], out)
+        return out
+
+    def reset(self):
+        """
+        Forget all prefetched data, e.g. because it became dirty.
+        """
+        with self._lock:
+            self._history.clear()
+            self._pending.clear()
+
+    def hits(self):
+        return self._hits
+
+    def _shifted(self, roi, direction):
+        start, stop = roi
+        extent = stop[self._axis] - start[self._axis]
+        offset = direction * extent
+        new_start = start[self._axis] + offset
+        new_stop = stop[self._axis] + offset
+        if new_start < 0 or new_start >= self._shape[self._axis]:
+            return None
+        new_stop = min(new_stop, self._shape[self._axis])
+        return (
+            start[: self._axis] + (new_start,) + start[self._axis + 1 :],
+            stop[: self._axis] + (new_stop,) + stop[self._axis + 1 :],
+        )
+
+    def _remember(self, roi):
+        # (call with _lock held)
+        self._history.pop(roi, None)
+        self._history[roi] = None
+        while len(self._history) > self.HISTORY_LENGTH:
+            self._history.popitem(last=False)
+
+    def _prefetch(self, roi):
+        # (call with _lock held)
+        while len(self._pending) >= self._max_pending:
+            self._pending.popitem(last=False)
+        request = Request(partial(self._read_slab, roi))
+        # Errors are raised when (and if) the slab is requested, don't report them as unhandled
+        request.notify_failed(lambda exc, exc_info: logger.debug(f"Prefetching {roi} failed: {exc}"))
+        self._pending[roi] = request
+        request.submit()
+
+    def _read_slab(self, roi):
+        out = numpy.empty(numpy.subtract(roi[1], roi[0]), dtype=self._dtype)
+        return self._read(roi[0], roi[1], out)
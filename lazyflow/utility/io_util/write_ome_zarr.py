@@ -20,10 +20,11 @@
 # 		   http://ilastik.org/license/
 ###############################################################################
 import logging
+import os
 from collections import OrderedDict as ODict
 from functools import partial
 from pathlib import Path
-from typing import List, Tuple, Dict, OrderedDict, Optional, Literal, Iterable, Any, Union
+from typing import Callable, List, Tuple, Dict, OrderedDict, Optional, Literal, Iterable, Any, Union
 
 import numpy
 import zarr
@@ -32,17 +33,26 @@ from zarr.storage import FSStore
 from ilastik import __version__ as ilastik_version
 from lazyflow import USER_LOGLEVEL
 from lazyflow.operators import OpReorderAxes
-from lazyflow.operators.opBlockedArrayCache import OpBlockedArrayCache
 from lazyflow.operators.opResize import OpResize
-from lazyflow.roi import determineBlockShape, roiFromShape, roiToSlice
+from lazyflow.request import Request, RequestPool
+from lazyflow.roi import determineBlockShape, getIntersectingBlocks, getIntersectingRois, roiFromShape, roiToSlice
 from lazyflow.slot import Slot
-from lazyflow.utility import OrderedSignal, PathComponents, BigRequestStreamer
+from lazyflow.utility import OrderedSignal, PathComponents, BigRequestStreamer, Memory, find_prefetch_slot
+from lazyflow.utility.bigRequestStreamer import determine_request_blockshape
+from lazyflow.utility.helpers import bigintprod
 from lazyflow.utility.data_semantics import ImageTypes
 from lazyflow.utility.io_util.OMEZarrStore import (
     OME_ZARR_V_0_4_KWARGS,
     OMEZarrMultiscaleMeta,
     InvalidTransformationError,
 )
+from lazyflow.utility.io_util.exportManifest import (
+    APPEND_AXES,
+    ExportManifest,
+    block_checksum,
+    get_manifest_path,
+    write_blocks_resumable,
+)
 from lazyflow.utility.io_util.multiscaleStore import Multiscales
 
 logger = logging.getLogger(__name__)
@@ -56,6 +66,11 @@ ScalingsByScaleKey = OrderedDict[str, OrderedScaling]  # { scale_key: { axis: sc
 OME_ZARR_AXES: List[Axiskey] = ["t", "c", "z", "y", "x"]
 SPATIAL_AXES: List[Axiskey] = ["z", "y", "x"]
 SINGE_SCALE_DEFAULT_KEY = "s0"
+# Share of the available RAM that one tile of the pyramid export may use (see _get_pyramid_passes)
+PYRAMID_TILE_RAM_FRACTION = 0.25
+# Prefix of the export manifest parts recording the tiles of each pass of the pyramid export
+PYRAMID_MANIFEST_PART = "pyramid"
+PyramidPass = Tuple[int, int, Shape]  # (first scale, last scale, tile shape at the last scale)
 
 
 def match_target_scales_to_input_excluding_upscales(
@@ -181,16 +196,288 @@ def _create_empty_zarray(
     """Creates folders and zarr-internal (not OME) metadata files."""
     assert len(chunk_shape) == len(scale_shape), "chunk and image shape must have same dimensions"
     store = FSStore(abs_export_path, mode="w", **OME_ZARR_V_0_4_KWARGS)
-    zarray = zarr.creation.zeros(scale_shape, store=store, path=scale_key, chunks=chunk_shape, dtype=export_dtype)
+    zarray = zarr.creation.zeros(
+        scale_shape, store=store, path=scale_key, chunks=chunk_shape, dtype=export_dtype, overwrite=True
+    )
     return zarray
 
 
+def _open_zarray(abs_export_path: str, scale_key: str) -> zarr.Array:
+    store = FSStore(abs_export_path, mode="a", **OME_ZARR_V_0_4_KWARGS)
+    return zarr.open_array(store, mode="r+", path=scale_key)
+
+
+def _get_append_offset(zarrays: Dict[str, zarr.Array], scale_shapes: Dict[str, Shape], axis: Axiskey) -> List[int]:
+    """Offset at which to write the export into the existing zarrays, to append it along axis."""
+    axis_index = OME_ZARR_AXES.index(axis)
+    existing_sizes = set()
+    for key, shape in scale_shapes.items():
+        existing_shape = zarrays[key].shape
+        if len(existing_shape) != len(shape) or any(
+            existing != size for i, (existing, size) in enumerate(zip(existing_shape, shape)) if i != axis_index
+        ):
+            raise ValueError(
+                f"Cannot append along '{axis}': scale '{key}' in the existing store has shape {existing_shape}, "
+                f"which doesn't match the exported image's shape {shape} apart from the '{axis}' axis."
+            )
+        existing_sizes.add(existing_shape[axis_index])
+    if len(existing_sizes) != 1:
+        raise ValueError(f"Cannot append along '{axis}': the scales in the existing store differ in size along it.")
+    offset = [0] * len(OME_ZARR_AXES)
+    offset[axis_index] = int(existing_sizes.pop())
+    return offset
+
+
+def _resize_to_fit(zarray: zarr.Array, offset: Shape, shape: Shape):
+    required_shape = numpy.add(offset, shape)
+    if any(numpy.greater(required_shape, zarray.shape)):
+        zarray.resize(*(int(size) for size in numpy.maximum(required_shape, zarray.shape)))
+
+
 def _write_block(zarray: zarr.Array, roi, data):
     slicing = roiToSlice(*roi)
     logger.debug(f"Writing data with shape={data.shape} to {slicing=}")
     zarray[slicing] = data
 
 
+def _is_empty(roi) -> bool:
+    return bool(numpy.any(numpy.less_equal(roi[1], roi[0])))
+
+
+def _align_roi_to_blocks(roi, block_shape: Shape, shape: Shape) -> numpy.ndarray:
+    start = numpy.asarray(roi[0]) // block_shape * block_shape
+    stop = numpy.minimum(-(-numpy.asarray(roi[1]) // block_shape) * block_shape, shape)
+    return numpy.array([start, stop])
+
+
+def _request_roi(slot: Slot, roi, prefetch_slot: Optional[Slot] = None) -> numpy.ndarray:
+    """Request a (big) roi of slot block by block, into one array, reading ahead of prefetch_slot if given."""
+    data = numpy.empty(tuple(numpy.subtract(roi[1], roi[0])), dtype=slot.meta.dtype)
+
+    def store_block(block_roi, block):
+        data[roiToSlice(*numpy.subtract(block_roi, roi[0]))] = block
+
+    requester = BigRequestStreamer(slot, roi, prefetchSlot=prefetch_slot)
+    requester.resultSignal.subscribe(store_block)
+    requester.execute()
+    return data
+
+
+def _downscale(op_scale: OpResize, raw: numpy.ndarray, raw_roi, roi, block_shape: Shape) -> numpy.ndarray:
+    """
+    Compute roi of op_scale.ResizedImage from raw, which holds raw_roi of op_scale.RawImage.
+    Resizes block by block (blocks aligned to block_shape), in parallel.
+    """
+    result = numpy.empty(tuple(numpy.subtract(roi[1], roi[0])), dtype=raw.dtype)
+
+    def resize_block(block_roi):
+        block_raw_roi = op_scale.get_raw_roi(*block_roi)
+        op_scale.resize(
+            raw[roiToSlice(*(block_raw_roi - raw_roi[0]))],
+            block_raw_roi,
+            block_roi[0],
+            block_roi[1],
+            result[roiToSlice(*numpy.subtract(block_roi, roi[0]))],
+        )
+
+    pool = RequestPool()
+    for block_roi in getIntersectingRois(op_scale.ResizedImage.meta.shape, block_shape, roi):
+        pool.add(Request(partial(resize_block, numpy.array(block_roi))))
+    pool.wait()
+    return result
+
+
+def _get_pyramid_manifest_part(last_scale: int) -> str:
+    """Part of the export manifest recording the tiles of the pyramid pass that ends at last_scale."""
+    return f"{PYRAMID_MANIFEST_PART}/{last_scale}"
+
+
+def _get_tile_write_rois(tile_roi, shapes: List[Shape], level: int, chunk_shape: Shape) -> List[numpy.ndarray]:
+    """
+    The roi to write at each scale for a tile of the pyramid export, given as a chunk-aligned roi of scale level.
+    The tile boundaries are scaled to each scale and snapped to its chunks, so every scale is partitioned into
+    whole chunks, and each chunk belongs to exactly one tile.
+    """
+    tile_roi = numpy.asarray(tile_roi)
+    level_shape = numpy.array(shapes[level])
+    chunk_shape = numpy.array(chunk_shape)
+
+    def scale_boundary(boundary, shape):
+        scaled = numpy.round(boundary * numpy.array(shape) / level_shape / chunk_shape).astype(int) * chunk_shape
+        return numpy.where(boundary >= level_shape, shape, numpy.minimum(scaled, shape))
+
+    return [numpy.array([scale_boundary(tile_roi[0], shape), scale_boundary(tile_roi[1], shape)]) for shape in shapes]
+
+
+def _get_pass_write_rois(tile_roi, shapes: List[Shape], pyramid_pass: PyramidPass, chunk_shape: Shape):
+    """The rois that a tile of pyramid_pass writes, or None for the scales that the pass doesn't write."""
+    first, last, _ = pyramid_pass
+    write_rois = _get_tile_write_rois(tile_roi, shapes, last, chunk_shape)
+    # Later passes start from a scale that was written before
+    return [roi if (first == 0 or first < i) and i <= last else None for i, roi in enumerate(write_rois)]
+
+
+def _get_needed_rois(
+    ops_scale: List[OpResize],
+    shapes: List[Shape],
+    written: List[Optional[numpy.ndarray]],
+    first: int,
+    chunk_shape: Shape,
+) -> List[Optional[numpy.ndarray]]:
+    """
+    Top-down: the region each scale (from first on) has to provide for a tile, i.e. what it writes and what the
+    next scale needs from it. None for the scales that aren't needed.
+    """
+    needed = [None] * len(shapes)
+    needed_by_next = None
+    for i in reversed(range(first, len(shapes))):
+        regions = [roi for roi in (needed_by_next, written[i]) if roi is not None and not _is_empty(roi)]
+        if not regions:
+            needed_by_next = None
+            continue
+        needed[i] = numpy.array([numpy.min([roi[0] for roi in regions], 0), numpy.max([roi[1] for roi in regions], 0)])
+        if i > first:
+            # Downscales are computed in whole chunk-aligned blocks, so that the result doesn't depend on the tiling.
+            needed[i] = _align_roi_to_blocks(needed[i], chunk_shape, shapes[i])
+            needed_by_next = ops_scale[i - 1].get_raw_roi(*needed[i])
+    return needed
+
+
+def _get_pyramid_passes(shapes: List[Shape], ops_scale: List[OpResize], chunk_shape: Shape, dtype) -> List[PyramidPass]:
+    """
+    Split the pyramid export into passes (first, last, tile_shape), each computing scales first + 1 to last
+    from scale first (and writing scale first, too, if it is the source).
+    A pass is processed in tiles of whole chunks of its last scale, covering one time point and all channels.
+    What a tile needs from scale first (including the halo of the downscaling cascade) has to fit into a share
+    of the available RAM. So a pass covers as many scales as possible such that a tile of one chunk fits, and its
+    tile shape is halved along its longest axis (relative to the chunk shape) until it fits.
+    """
+    chunk_shape = numpy.array(chunk_shape)
+    # The data read for a tile, plus float64 working copies while downscaling
+    bytes_per_pixel = numpy.dtype(dtype).itemsize + 2 * numpy.dtype(numpy.float64).itemsize
+    max_tile_pixels = Memory.getAvailableRamComputation() * PYRAMID_TILE_RAM_FRACTION / bytes_per_pixel
+
+    def tile_pixels(first, last, tile_shape):
+        # Measured on a tile in the middle, which needs a halo on all sides
+        level_shape = numpy.array(shapes[last])
+        tile_start = level_shape // 2 // tile_shape * tile_shape
+        tile_roi = numpy.array([tile_start, numpy.minimum(tile_start + tile_shape, level_shape)])
+        written = _get_pass_write_rois(tile_roi, shapes, (first, last, tuple(tile_shape)), chunk_shape)
+        needed = _get_needed_rois(ops_scale, shapes, written, first, chunk_shape)[first]
+        return bigintprod(needed[1] - needed[0])
+
+    def initial_tile_shape(last, num_chunks):
+        tile_shape = numpy.minimum(num_chunks, -(-numpy.array(shapes[last]) // chunk_shape)) * chunk_shape
+        tile_shape[0] = 1
+        tile_shape[1] = shapes[last][1]
+        return tile_shape
+
+    passes = []
+    first = 0
+    while first < len(shapes) - 1:
+        last = first + 1
+        while (
+            last + 1 < len(shapes) and tile_pixels(first, last + 1, initial_tile_shape(last + 1, 1)) <= max_tile_pixels
+        ):
+            last += 1
+        tile_shape = initial_tile_shape(last, numpy.iinfo(numpy.int64).max)
+        while tile_pixels(first, last, tile_shape) > max_tile_pixels:
+            axis = 2 + numpy.argmax(tile_shape[2:] / chunk_shape[2:])
+            if tile_shape[axis] <= chunk_shape[axis]:
+                break
+            tile_shape[axis] = max(tile_shape[axis] // chunk_shape[axis] // 2, 1) * chunk_shape[axis]
+        passes.append((first, last, tuple(int(size) for size in tile_shape)))
+        first = last
+    return passes
+
+
+def _write_pyramid_tile(
+    read_first_scale: Callable[[numpy.ndarray], numpy.ndarray],
+    ops_scale: List[OpResize],
+    zarrays: List[Optional[zarr.Array]],
+    shapes: List[Shape],
+    tile_roi,
+    pyramid_pass: PyramidPass,
+    chunk_shape: Shape,
+    offset: Shape,
+) -> Dict[str, int]:
+    """
+    Write a tile (a roi of the last scale) of pyramid_pass. read_first_scale(roi) reads a roi of its first scale.
+    Returns checksums of the data written to each zarray.
+    """
+    first, last, _ = pyramid_pass
+    written = _get_pass_write_rois(tile_roi, shapes, pyramid_pass, chunk_shape)
+    written = [roi if zarray is not None else None for roi, zarray in zip(written, zarrays)]
+    needed = _get_needed_rois(ops_scale, shapes, written, first, chunk_shape)
+    if needed[first] is None:
+        return {}
+
+    # Bottom-up: read the tile (with the halo all scales need) once, then downscale in memory.
+    checksums = {}
+    data = read_first_scale(needed[first])
+    for i in range(first, last + 1):
+        if needed[i] is None:
+            break
+        if i > first:
+            data = _downscale(ops_scale[i - 1], data, needed[i - 1], needed[i], chunk_shape)
+        if written[i] is not None and not _is_empty(written[i]):
+            written_data = data[roiToSlice(*(written[i] - needed[i][0]))]
+            _write_block(zarrays[i], written[i] + offset, written_data)
+            checksums[zarrays[i].path] = block_checksum(written_data)
+    return checksums
+
+
+def _write_pyramid(
+    source: Slot,
+    ops_scale: List[OpResize],
+    zarrays: List[Optional[zarr.Array]],
+    chunk_shape: Shape,
+    passes: List[PyramidPass],
+    offset: Shape,
+    manifest: ExportManifest,
+    progress_signal: OrderedSignal,
+):
+    """
+    Write the source and its downscales, usually in a single pass over the source.
+    ops_scale[i] resizes scale i to scale i + 1, where scale 0 is the source.
+    zarrays[i] is the array to write scale i to (at offset), or None if that scale isn't exported.
+
+    Each pass (see _get_pyramid_passes) computes its scales from its first scale: the source, or the scale that
+    an earlier pass has written already. It goes tile by tile. Each tile requests its region of the first scale
+    once, including the halo that the downscaling cascade needs, and downscales it from scale to scale in memory.
+    Tiles consist of whole chunks of the last scale, so that every chunk of every scale is computed by one tile
+    only, and memory is bounded by the tile size.
+    Written tiles are recorded in the manifest, and tiles it lists as done already are skipped.
+    """
+    shapes = [tuple(source.meta.shape)] + [tuple(op.ResizedImage.meta.shape) for op in ops_scale]
+    logger.debug(f"Exporting {len(shapes)} scales in passes {passes}")
+
+    def read_written_scale(zarray, roi):
+        return zarray[roiToSlice(*numpy.add(roi, offset))]
+
+    prefetch_slot = find_prefetch_slot(source)
+    tiles = [
+        (pyramid_pass, tile_start)
+        for pyramid_pass in passes
+        for tile_start in getIntersectingBlocks(pyramid_pass[2], roiFromShape(shapes[pyramid_pass[1]]))
+    ]
+    progress_signal(0)
+    for i, (pyramid_pass, tile_start) in enumerate(tiles):
+        first, last, tile_shape = pyramid_pass
+        tile_roi = (tile_start, numpy.minimum(tile_start + tile_shape, shapes[last]))
+        part = _get_pyramid_manifest_part(last)
+        if not manifest.is_done(part, tile_roi):
+            if first == 0:
+                read_first_scale = partial(_request_roi, source, prefetch_slot=prefetch_slot)
+            else:
+                read_first_scale = partial(read_written_scale, zarrays[first])
+            checksums = _write_pyramid_tile(
+                read_first_scale, ops_scale, zarrays, shapes, tile_roi, pyramid_pass, chunk_shape, offset
+            )
+            manifest.record(part, tile_roi, checksums)
+        progress_signal(100 * (i + 1) // len(tiles))
+
+
 def _write_to_dataset_attrs(ilastik_meta: Dict, za: zarr.Array):
     za.attrs["axistags"] = ilastik_meta["axistags"].toJSON()
     if ilastik_meta["display_mode"]:
@@ -429,19 +716,31 @@ def write_ome_zarr(
     progress_signal: OrderedSignal,
     export_offset: Union[Shape, None],
     target_scales: Optional[Multiscales] = None,
+    export_mode: str = "new",
 ):
+    """
+    :param export_mode: One of exportManifest.EXPORT_MODES. "new" refuses to touch an existing store.
+        "resume" continues an interrupted export into the store (if there is one), skipping what was written already.
+        "append time"/"append channels" add the image to the existing store along t/c; the store's metadata is kept.
+        Progress is recorded in a manifest in the store while the export is running.
+    """
     pc = PathComponents(export_path)
     if pc.internalPath:
         raise ValueError(
             f'Internal paths are not supported by OME-Zarr export. Received internal path: "{pc.internalPath}"'
         )
     abs_export_path = pc.externalPath
-    if Path(abs_export_path).exists():
+    manifest = ExportManifest(get_manifest_path(abs_export_path))
+    store_exists = Path(abs_export_path).exists()
+    if store_exists and export_mode == "new":
         raise FileExistsError(
-            "Aborting because export path already exists. Please delete it manually if you intended to overwrite it. "
-            "Appending to an existing OME-Zarr store is not yet implemented."
+            "Aborting because export path already exists. Please delete it manually if you intended to overwrite it, "
+            'or use export mode "resume" or "append time"/"append channels" to continue or extend the existing export.'
             f"\nPath: {abs_export_path}."
         )
+    if store_exists and export_mode == "resume" and not manifest.exists():
+        logger.log(USER_LOGLEVEL, f"Export to {abs_export_path} is complete already, nothing to resume.")
+        return
     export_offset: TaggedShape = (
         ODict(zip(image_source_slot.meta.getAxisKeys(), export_offset)) if export_offset else None
     )
@@ -464,76 +763,151 @@ def write_ome_zarr(
         if target_scales is None:  # single-scale export
             single_target_key = input_scale_key if input_scale_key else SINGE_SCALE_DEFAULT_KEY
             target_scales = Multiscales({single_target_key: export_shape})
+        scale_shapes = {key: tuple(int(size) for size in shape.values()) for key, shape in target_scales.items()}
 
         chunk_shape = _get_chunk_shape(export_shape, export_dtype)
 
         export_scalings = _multiscales_to_scalings(target_scales, export_shape, export_shape.keys())
         combined_scaling_mag = {key: numpy.prod(list(scale.values())) for key, scale in export_scalings.items()}
 
-        # Upscales/raw - uncached (maybe this helps keep unscaled computation cache warm)
-        # Also covers single-scale export
-        upscale_mags = {k: v for k, v in combined_scaling_mag.items() if v <= 1.0}
-        for upscale_key, v in reversed(sorted(upscale_mags.items(), key=lambda x: x[1])):
-            scale_type = "upscaled data" if v < 1.0 else "unscaled data"
-            logger.log(USER_LOGLEVEL, f"Exporting {scale_type} to scale path '{upscale_key}'")
-            target_shape = tuple(target_scales[upscale_key].values())
-            try:
-                op_scale = OpResize(
-                    parent=image_source_slot.operator,
-                    RawImage=reordered_source,
-                    TargetShape=target_shape,
-                    InterpolationOrder=interpolation_order,
-                )
-                requester = BigRequestStreamer(op_scale.ResizedImage, roiFromShape(op_scale.ResizedImage.meta.shape))
-                zarray = _create_empty_zarray(abs_export_path, upscale_key, target_shape, chunk_shape, export_dtype)
-                requester.resultSignal.subscribe(partial(_write_block, zarray))
-                requester.progressSignal.subscribe(progress_signal)
-                requester.execute()
-            finally:
-                op_scale.cleanUp()
-
-        # Downscales - cached to avoid recomputation (noop for single-scale export)
         downscale_mags = {k: v for k, v in combined_scaling_mag.items() if v > 1.0}
+        downscale_keys = sorted(downscale_mags, key=downscale_mags.get)
+        unscaled_keys = [k for k, v in combined_scaling_mag.items() if v == 1.0]
+        # Upscales - uncached. Also covers single-scale export.
+        # The unscaled data is exported together with the downscales, if there are any.
+        direct_mags = {k: v for k, v in combined_scaling_mag.items() if v < 1.0 or (v == 1.0 and not downscale_mags)}
+        direct_keys = [k for k, _ in reversed(sorted(direct_mags.items(), key=lambda x: x[1]))]
+        ops_direct = {}
+        for direct_key in direct_keys:
+            ops_direct[direct_key] = OpResize(
+                parent=image_source_slot.operator,
+                RawImage=reordered_source,
+                TargetShape=scale_shapes[direct_key],
+                InterpolationOrder=interpolation_order,
+            )
+            ops_to_clean.append(ops_direct[direct_key])
+        # Unscaled data and downscales - usually in a single pass over the source (noop for single-scale export)
+        pyramid_keys = unscaled_keys[:1] + downscale_keys if downscale_mags else []
+        ops_scale = []
         prev_slot = reordered_source
-        for downscale_key, _ in sorted(downscale_mags.items(), key=lambda x: x[1]):
-            target_shape = tuple(target_scales[downscale_key].values())
-            logger.log(USER_LOGLEVEL, f"Exporting downscale to scale path '{downscale_key}'")
+        for downscale_key in downscale_keys:
             op_scale = OpResize(
                 parent=image_source_slot.operator,
                 RawImage=prev_slot,
-                TargetShape=target_shape,
+                TargetShape=scale_shapes[downscale_key],
                 InterpolationOrder=interpolation_order,
             )
             ops_to_clean.append(op_scale)
-            op_cache = OpBlockedArrayCache(parent=image_source_slot.operator)
-            ops_to_clean.append(op_cache)
-            op_cache.Input.connect(op_scale.ResizedImage)
-            op_cache.BlockShape.setValue(chunk_shape)
-            requester = BigRequestStreamer(
-                op_cache.Output, roiFromShape(op_cache.Output.meta.shape), blockshape=chunk_shape
+            ops_scale.append(op_scale)
+            prev_slot = op_scale.ResizedImage
+
+        # Blockings must be recorded, so that a resumed export writes the same blocks
+        num_threads = max(1, Request.global_thread_pool.num_workers)
+        pyramid_shapes = [tuple(export_shape.values())] + [scale_shapes[key] for key in downscale_keys]
+        new_header = {
+            "shapes": scale_shapes,
+            "dtype": numpy.dtype(export_dtype).name,
+            "chunks": [int(size) for size in chunk_shape],
+            "offset": [0] * len(OME_ZARR_AXES),
+            "append": False,
+            "blockshapes": {
+                key: [int(size) for size in determine_request_blockshape(op.ResizedImage, num_threads)]
+                for key, op in ops_direct.items()
+            },
+            "pyramid_passes": [
+                [first, last, list(tile_shape)]
+                for first, last, tile_shape in _get_pyramid_passes(pyramid_shapes, ops_scale, chunk_shape, export_dtype)
+            ],
+        }
+        manifest_exists = store_exists and manifest.exists()
+        header = manifest.load() if manifest_exists else None
+        if header is not None and export_mode != "resume":
+            raise ValueError(
+                f"Cannot {export_mode}: the export to {abs_export_path} was interrupted. "
+                'Finish it with export mode "resume" first, or delete its manifest to discard it.'
+                f"\nManifest: {manifest.path}."
+            )
+        if not store_exists or (header is None and manifest_exists and export_mode == "resume"):
+            # New export, or one that was interrupted before writing anything
+            os.makedirs(abs_export_path, exist_ok=True)
+            manifest.create(new_header)
+            zarrays = {
+                key: _create_empty_zarray(abs_export_path, key, scale_shapes[key], chunk_shape, export_dtype)
+                for key in direct_keys + pyramid_keys
+            }
+            header = new_header
+        elif header is not None:
+            logger.log(USER_LOGLEVEL, f"Resuming interrupted export to {abs_export_path}")
+            manifest.check_header(shapes=scale_shapes, dtype=new_header["dtype"], chunks=new_header["chunks"])
+            zarrays = {key: _open_zarray(abs_export_path, key) for key in direct_keys + pyramid_keys}
+            for key, zarray in zarrays.items():
+                _resize_to_fit(zarray, header["offset"], scale_shapes[key])
+        else:
+            axis = APPEND_AXES[export_mode]
+            logger.log(USER_LOGLEVEL, f"Appending along '{axis}' to {abs_export_path}")
+            zarrays = {key: _open_zarray(abs_export_path, key) for key in direct_keys + pyramid_keys}
+            header = dict(new_header, offset=_get_append_offset(zarrays, scale_shapes, axis), append=True)
+            manifest.create(header)
+            for key, zarray in zarrays.items():
+                _resize_to_fit(zarray, header["offset"], scale_shapes[key])
+        offset = tuple(header["offset"])
+
+        def read_recorded_block(part, roi, key):
+            if part.startswith(f"{PYRAMID_MANIFEST_PART}/"):
+                level = 1 + downscale_keys.index(key) if key in downscale_keys else 0
+                last_scale = int(part.rsplit("/", 1)[1])
+                roi = _get_tile_write_rois(roi, pyramid_shapes, last_scale, chunk_shape)[level]
+            return zarrays[key][roiToSlice(*numpy.add(roi, offset))]
+
+        manifest.verify(read_recorded_block)
+
+        for direct_key in direct_keys:
+            scale_type = "upscaled data" if direct_mags[direct_key] < 1.0 else "unscaled data"
+            logger.log(USER_LOGLEVEL, f"Exporting {scale_type} to scale path '{direct_key}'")
+            write_blocks_resumable(
+                ops_direct[direct_key].ResizedImage,
+                lambda roi, data, zarray=zarrays[direct_key]: _write_block(zarray, numpy.add(roi, offset), data),
+                manifest,
+                direct_key,
+                header["blockshapes"][direct_key],
+                progress_signal,
+            )
+
+        if pyramid_keys:
+            logger.log(USER_LOGLEVEL, f"Exporting scales {pyramid_keys} from the source")
+            pyramid_zarrays = [zarrays[unscaled_keys[0]] if unscaled_keys else None]
+            pyramid_zarrays += [zarrays[key] for key in downscale_keys]
+            _write_pyramid(
+                reordered_source,
+                ops_scale,
+                pyramid_zarrays,
+                chunk_shape,
+                [(first, last, tuple(tile_shape)) for first, last, tile_shape in header["pyramid_passes"]],
+                offset,
+                manifest,
+                progress_signal,
             )
-            zarray = _create_empty_zarray(abs_export_path, downscale_key, target_shape, chunk_shape, export_dtype)
-            requester.resultSignal.subscribe(partial(_write_block, zarray))
-            requester.progressSignal.subscribe(progress_signal)
-            requester.execute()
-            prev_slot = op_cache.Output
 
         progress_signal(95)
-        _write_ome_zarr_and_ilastik_metadata(
-            abs_export_path,
-            export_scalings,
-            interpolation_order,
-            export_offset,
-            input_scales,
-            input_scale_key,
-            input_ome_meta,
-            {
-                "axistags": reordered_source.meta.axistags,
-                "display_mode": reordered_source.meta.get("display_mode"),
-                "drange": reordered_source.meta.get("drange"),
-            },
-        )
+        if not header["append"]:
+            # When appending, the existing store's metadata stays valid
+            _write_ome_zarr_and_ilastik_metadata(
+                abs_export_path,
+                export_scalings,
+                interpolation_order,
+                export_offset,
+                input_scales,
+                input_scale_key,
+                input_ome_meta,
+                {
+                    "axistags": reordered_source.meta.axistags,
+                    "display_mode": reordered_source.meta.get("display_mode"),
+                    "drange": reordered_source.meta.get("drange"),
+                },
+            )
+        manifest.finish()
     finally:
+        manifest.close()
         for op in reversed(ops_to_clean):
             op.cleanUp()
         logger.log(USER_LOGLEVEL, "")
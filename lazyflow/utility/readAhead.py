@@ -0,0 +1,235 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections
+import logging
+import math
+import threading
+import time
+from functools import partial
+
+import numpy
+
+from lazyflow.request import Request
+from lazyflow.utility.helpers import bigintprod
+from lazyflow.utility.memory import Memory
+
+logger = logging.getLogger(__name__)
+
+
+class ReadAhead:
+    """
+    Reads the source data of upcoming blocks while a block iteration (RoiRequestBatch, BigRequestStreamer)
+    is processing the current ones.
+
+    The blocks are requested in a known order, so the reads of the next few blocks from the source slot
+    (e.g. a reader of a remote or multiscale dataset) can be issued early, instead of each processing
+    request waiting for its input when it starts.
+    The data that is read ahead isn't kept here, it ends up in the caches the source slot reads through
+    (e.g. the cache of OpRESTfulPrecomputedChunkedVolumeReader, or OMEZarrStore's ManagedStoreCache),
+    where the processing request finds it. So the source slot must read through a cache, otherwise every block
+    is fetched twice (see find_prefetch_slot).
+
+    The number of blocks read ahead adapts to the measured read latency and the rate at which blocks are
+    completed: to hide a latency of L seconds with a block completed every T seconds, the reads have to
+    start L/T blocks in advance. It is bounded by max_depth, and by the share of the cache memory that the
+    outstanding reads may take up, so data that is read ahead isn't evicted before it is used.
+
+    :param slot: the slot to read ahead from
+    :param reference_slot: the slot whose rois are iterated. Rois are translated to the source slot
+        by axis key, reading all channels (and the full extent of axes the reference slot doesn't have).
+    :param max_depth: maximum number of blocks that are read ahead
+    """
+
+    #: weight of the newest measurement in the running averages of read latency and block interval
+    SMOOTHING = 0.3
+
+    #: fraction of the cache memory that the outstanding reads may take up
+    MAX_CACHE_FRACTION = 0.25
+
+    def __init__(self, slot, reference_slot, max_depth=8):
+        self._slot = slot
+        self._reference_slot = reference_slot
+        self._max_depth = max_depth
+        self._itemsize = numpy.dtype(slot.meta.dtype).itemsize
+        self._lock = threading.Lock()
+        # source roi -> Request reading it
+        self._pending = {}
+        self._read_latency = None
+        self._block_interval = None
+        self._last_block_time = None
+        self._depth = 1
+        self._block_bytes = 0
+
+    def depth(self):
+        """The number of blocks that are currently read ahead."""
+        return self._depth
+
+    def iterate(self, rois, skip=0):
+        """
+        Yield the given rois, reading ahead of the one that was yielded last.
+
+        :param skip: number of leading rois that are not read ahead, e.g. because the caller
+            requests that many blocks right away
+        """
+        rois = iter(rois)
+        upcoming = collections.deque()
+        exhausted = False
+        pulled = 0
+        while True:
+            while not exhausted and len(upcoming) <= self._depth:
+                try:
+                    roi = next(rois)
+                except StopIteration:
+                    exhausted = True
+                    break
+                upcoming.append(roi)
+                if pulled >= skip:
+                    self._read(roi)
+                pulled += 1
+            if not upcoming:
+                return
+            yield upcoming.popleft()
+
+    def block_done(self):
+        """Report that a block was completed, to measure the rate at which blocks are consumed."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_block_time is not None:
+                self._block_interval = self._smoothed(self._block_interval, now - self._last_block_time)
+                self._update_depth()
+            self._last_block_time = now
+
+    def cancel(self):
+        """Cancel the reads that haven't finished (e.g. because the iteration was aborted)."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for request in pending:
+            request.cancel()
+
+    def _read(self, roi):
+        source_roi = self._source_roi(roi)
+        if source_roi is None:
+            return
+        with self._lock:
+            if source_roi in self._pending:
+                return
+            self._block_bytes = bigintprod(numpy.subtract(source_roi[1], source_roi[0])) * self._itemsize
+            request = Request(partial(self._read_block, source_roi))
+            self._pending[source_roi] = request
+        request.notify_finished(lambda _: self._forget(source_roi, request))
+        request.notify_cancelled(partial(self._forget, source_roi, request))
+        # Errors are raised when (and if) the block is processed, don't report them as unhandled
+        request.notify_failed(partial(self._handle_failed_read, source_roi, request))
+        request.submit()
+
+    def _read_block(self, roi):
+        start = time.perf_counter()
+        self._slot(*roi).wait()
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._read_latency = self._smoothed(self._read_latency, latency)
+            self._update_depth()
+
+    def _handle_failed_read(self, roi, request, exc, exc_info):
+        logger.debug(f"Reading ahead {roi} failed: {exc}")
+        self._forget(roi, request)
+
+    def _forget(self, roi, request):
+        with self._lock:
+            if self._pending.get(roi) is request:
+                del self._pending[roi]
+
+    def _update_depth(self):
+        # (call with _lock held)
+        if not self._read_latency or not self._block_interval:
+            return
+        depth = min(math.ceil(self._read_latency / self._block_interval), self._max_depth, self._memory_limit())
+        depth = max(1, depth)
+        if depth != self._depth:
+            logger.debug(
+                f"Reading ahead {depth} blocks (read latency {self._read_latency:.3f}s, "
+                f"block interval {self._block_interval:.3f}s)"
+            )
+            self._depth = depth
+
+    def _memory_limit(self):
+        # (call with _lock held)
+        return int(self.MAX_CACHE_FRACTION * Memory.getAvailableRamCaches() // max(1, self._block_bytes))
+
+    def _smoothed(self, average, value):
+        if average is None:
+            return value
+        return (1 - self.SMOOTHING) * average + self.SMOOTHING * value
+
+    def _source_roi(self, roi):
+        """Translate a roi of the reference slot to the source slot (None if it's empty there)."""
+        shape = self._slot.meta.shape
+        reference_keys = self._reference_slot.meta.getAxisKeys()
+        start, stop = [], []
+        for i, key in enumerate(self._slot.meta.getAxisKeys()):
+            if key == "c" or key not in reference_keys:
+                start.append(0)
+                stop.append(shape[i])
+            else:
+                j = reference_keys.index(key)
+                start.append(min(int(roi[0][j]), shape[i]))
+                stop.append(min(int(roi[1][j]), shape[i]))
+        if any(a >= b for a, b in zip(start, stop)):
+            return None
+        return tuple(start), tuple(stop)
+
+
+def find_prefetch_slot(slot):
+    """
+    Find the slot that a block iteration over slot should read ahead from (see ReadAhead), or None.
+
+    That is the nearest slot upstream of slot that its operator lists in prefetchOutputs: outputs of slow sources
+    (e.g. remote readers) that read through a cache. Sources without a cache (e.g. OpTiledVolumeReader, or
+    OpCachedTiledVolumeReader with cache_tiles disabled) don't list their outputs, as the data read ahead from them
+    would be fetched again when the block is processed.
+    The source must have the same extent as slot in all axes they share (except channels), so that rois carry over.
+    A subregion or a rescaled version of it isn't read ahead.
+    """
+    visited = set()
+    pending = collections.deque([slot])
+    while pending:
+        current = pending.popleft()
+        if id(current) in visited:
+            continue
+        visited.add(id(current))
+        operator = current.operator
+        if current.level == 0 and current.name in getattr(operator, "prefetchOutputs", ()):
+            return current if _has_same_extent(current, slot) else None
+        if current.upstream_slot is not None:
+            pending.append(current.upstream_slot)
+        elif getattr(operator, "outputs", {}).get(current.name) is current:
+            # An output computed by its operator, continue with the operator's inputs
+            pending.extend(input_slot for input_slot in operator.inputs.values() if input_slot.level == 0)
+    return None
+
+
+def _has_same_extent(source, slot):
+    source_shape = dict(zip(source.meta.getAxisKeys(), source.meta.shape))
+    return all(
+        source_shape.get(key, size) == size for key, size in zip(slot.meta.getAxisKeys(), slot.meta.shape) if key != "c"
+    )
@@ -0,0 +1,207 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections.abc
+import itertools
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+RoiTuple = Tuple[Tuple[int, ...], Tuple[int, ...]]
+Cell = Tuple[int, ...]
+
+
+def _contains(outer: RoiTuple, inner: RoiTuple) -> bool:
+    return all(o <= i for o, i in zip(outer[0], inner[0])) and all(o >= i for o, i in zip(outer[1], inner[1]))
+
+
+def _intersects(a: RoiTuple, b: RoiTuple) -> bool:
+    return all(a_start < b_stop and b_start < a_stop for a_start, a_stop, b_start, b_stop in zip(*a, *b))
+
+
+class RoiIndex:
+    """
+    Spatial index over a set of rois, for finding rois that contain or intersect a query roi.
+
+    Space is divided into a regular grid, and every roi is registered with all grid cells it overlaps.
+    The grid's cell shape is taken from the first roi that is added, so the index works best when rois
+    have roughly similar shapes, which is the case for caches that store the blocks they are requested with.
+    Rois that would span many cells are kept in a separate list that is always scanned.
+
+    >>> index = RoiIndex()
+    >>> index.add(((0, 0), (10, 10)))
+    >>> index.add(((10, 0), (20, 10)))
+    >>> index.find_containing(((12, 3), (15, 5)))
+    ((10, 0), (20, 10))
+    >>> sorted(index.find_intersecting(((5, 5), (15, 6))))
+    [((0, 0), (10, 10)), ((10, 0), (20, 10))]
+    """
+
+    #: rois spanning more grid cells than this are not registered with the grid
+    MAX_CELLS_PER_ROI = 64
+
+    def __init__(self):
+        self._cell_shape: Optional[Tuple[int, ...]] = None
+        self._cells: Dict[Cell, Set[RoiTuple]] = {}
+        self._large: Set[RoiTuple] = set()
+        self._rois: Set[RoiTuple] = set()
+
+    def __len__(self) -> int:
+        return len(self._rois)
+
+    def __contains__(self, roi) -> bool:
+        return roi in self._rois
+
+    def __iter__(self) -> Iterator[RoiTuple]:
+        return iter(self._rois)
+
+    def _cell_range(self, roi: RoiTuple) -> Tuple[Cell, Cell]:
+        first = tuple(start // c for start, c in zip(roi[0], self._cell_shape))
+        last = tuple(max(start, stop - 1) // c for start, stop, c in zip(*roi, self._cell_shape))
+        return first, last
+
+    @staticmethod
+    def _num_cells(first: Cell, last: Cell) -> int:
+        num_cells = 1
+        for f, l in zip(first, last):
+            num_cells *= l - f + 1
+        return num_cells
+
+    @staticmethod
+    def _cells_between(first: Cell, last: Cell) -> Iterator[Cell]:
+        return itertools.product(*(range(f, l + 1) for f, l in zip(first, last)))
+
+    def add(self, roi: RoiTuple) -> None:
+        if roi in self._rois:
+            return
+        if self._cell_shape is None:
+            self._cell_shape = tuple(max(1, stop - start) for start, stop in zip(*roi))
+
+        self._rois.add(roi)
+        first, last = self._cell_range(roi)
+        if self._num_cells(first, last) > self.MAX_CELLS_PER_ROI:
+            self._large.add(roi)
+            return
+        for cell in self._cells_between(first, last):
+            self._cells.setdefault(cell, set()).add(roi)
+
+    def discard(self, roi: RoiTuple) -> None:
+        if roi not in self._rois:
+            return
+
+        self._rois.remove(roi)
+        if roi in self._large:
+            self._large.remove(roi)
+            return
+        for cell in self._cells_between(*self._cell_range(roi)):
+            cell_rois = self._cells[cell]
+            cell_rois.remove(roi)
+            if not cell_rois:
+                del self._cells[cell]
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def find_containing(self, roi: RoiTuple) -> Optional[RoiTuple]:
+        """Return a roi that entirely contains the given roi, or None"""
+        if not self._rois:
+            return None
+
+        # Any containing roi must overlap the cell of the query's start corner
+        first, _ = self._cell_range(roi)
+        for candidate in itertools.chain(self._cells.get(first, ()), self._large):
+            if _contains(candidate, roi):
+                return candidate
+        return None
+
+    def find_intersecting(self, roi: RoiTuple) -> List[RoiTuple]:
+        """Return all rois that overlap the given roi"""
+        if not self._rois:
+            return []
+
+        first, last = self._cell_range(roi)
+        if self._num_cells(first, last) > len(self._cells):
+            # Large query, cheaper to check every roi
+            candidates = self._rois
+        else:
+            candidates = set(self._large)
+            for cell in self._cells_between(first, last):
+                candidates.update(self._cells.get(cell, ()))
+        return [candidate for candidate in candidates if _intersects(candidate, roi)]
+
+
+class RoiDict(collections.abc.MutableMapping):
+    """
+    Dict with rois (tuples of tuples of int) as keys, that keeps a RoiIndex of its keys up to date.
+
+    >>> blocks = RoiDict()
+    >>> blocks[((0, 0), (10, 10))] = "a"
+    >>> blocks[((10, 0), (20, 10))] = "b"
+    >>> blocks.find_containing(((2, 2), (3, 3)))
+    ((0, 0), (10, 10))
+    >>> del blocks[((0, 0), (10, 10))]
+    >>> blocks.find_containing(((2, 2), (3, 3))) is None
+    True
+    """
+
+    def __init__(self):
+        self._data: Dict[RoiTuple, Any] = {}
+        self._index = RoiIndex()
+
+    def __getitem__(self, roi: RoiTuple) -> Any:
+        return self._data[roi]
+
+    def __setitem__(self, roi: RoiTuple, value: Any) -> None:
+        self._data[roi] = value
+        self._index.add(roi)
+
+    def __delitem__(self, roi: RoiTuple) -> None:
+        del self._data[roi]
+        self._index.discard(roi)
+
+    def __iter__(self) -> Iterator[RoiTuple]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, roi) -> bool:
+        return roi in self._data
+
+    # Views of the underlying dict, so that e.g. list(keys()) is as atomic as it is for a plain dict
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._index.clear()
+
+    def find_containing(self, roi: RoiTuple) -> Optional[RoiTuple]:
+        """Return a key that entirely contains the given roi, or None"""
+        return self._index.find_containing(roi)
+
+    def find_intersecting(self, roi: RoiTuple) -> List[RoiTuple]:
+        """Return all keys that overlap the given roi"""
+        return self._index.find_intersecting(roi)
@@ -27,6 +27,7 @@ import numpy
 import lazyflow.stype
 from lazyflow.utility import OrderedSignal
 from lazyflow.utility.helpers import bigintprod
+from lazyflow.utility.readAhead import ReadAhead
 from lazyflow.request import Request, SimpleRequestCondition, log_exception
 
 
@@ -97,7 +98,9 @@ class RoiRequestBatch:
     Processed 5 result blocks with a total sum of: 14500
     """
 
-    def __init__(self, outputSlot, roiIterator, totalVolume=None, batchSize=2, allowParallelResults=False):
+    def __init__(
+        self, outputSlot, roiIterator, totalVolume=None, batchSize=2, allowParallelResults=False, prefetchSlot=None
+    ):
         """
         Constructor.
 
@@ -109,6 +112,8 @@ class RoiRequestBatch:
         :param batchSize: The maximum number of requests to launch in parallel.
         :param allowParallelResults: If False, The resultSignal will not be called in parallel.
                                      In that case, your handler function has no need for locks.
+        :param prefetchSlot: Optional source slot (e.g. a reader of remote data) that the output is computed from.
+                             If given, the source data of upcoming rois is read ahead (see ReadAhead).
         """
         self._resultSignal = OrderedSignal()
         self._progressSignal = OrderedSignal()
@@ -117,10 +122,16 @@ class RoiRequestBatch:
             outputSlot.stype, lazyflow.stype.ArrayLike
         ), "Only Array-like slots supported."  # Because progress reporting depends on the roi shape
         self._outputSlot = outputSlot
-        self._roiIter = roiIterator
         self._batchSize = batchSize
         self._allowParallelResults = allowParallelResults
 
+        self._readAhead = None
+        if prefetchSlot is not None:
+            self._readAhead = ReadAhead(prefetchSlot, outputSlot)
+            # The first batch is requested right away, there's nothing to gain from reading it ahead
+            roiIterator = self._readAhead.iterate(roiIterator, skip=batchSize)
+        self._roiIter = roiIterator
+
         self._condition = SimpleRequestCondition()
 
         self._activated_count = 0
@@ -204,6 +215,9 @@ class RoiRequestBatch:
             if self._failure_excinfo:
                 exc_type, exc_value, exc_tb = self._failure_excinfo
                 raise RoiRequestBatchException() from exc_value
+        finally:
+            if self._readAhead is not None:
+                self._readAhead.cancel()
 
         self.progressSignal(100)
 
@@ -221,6 +235,7 @@ class RoiRequestBatch:
         # (This can happen if array data was given to a slot via setValue().)
         assert isinstance(req, Request), "Can't use RoiRequestBatch with non-standard requests.  See comment above."
 
+        req.route_to_block(roi[0])
         req.notify_finished(partial(self._handleCompletedRequest, roi))
         req.notify_failed(partial(self._handleFailedRequest, roi))
         req.notify_cancelled(partial(self._handleCancelledRequest, roi))
@@ -252,6 +267,8 @@ class RoiRequestBatch:
 
                 logger.debug("Request completed for roi: {}".format(roi))
                 self._completed_count += 1
+                if self._readAhead is not None:
+                    self._readAhead.block_done()
             finally:
                 # Always notify in this finally section,
                 #  even if the client result/progress handler raised.
@@ -49,11 +49,14 @@ from ilastik.applets.base.appletSerializer import (
     jsonSerializerRegistry,
 )
 from ilastik.applets.base.appletSerializer.slotSerializer import SerialClassifierFactorySlot
+from ilastik.config import cfg as ilastik_config
 from lazyflow.classifiers.parallelVigraRfLazyflowClassifier import ParallelVigraRfLazyflowClassifierFactory
 from lazyflow.classifiers.sklearnLazyflowClassifier import SklearnLazyflowClassifierFactory
 from lazyflow.classifiers.vigraRfLazyflowClassifier import VigraRfLazyflowClassifierFactory
 from lazyflow.graph import Graph, InputSlot, Operator, OperatorWrapper, Slot
 from lazyflow.operators import OpCompressedUserLabelArray
+from lazyflow.operators.classifierOperators import OpTrainClassifierFromFeatureVectors
+from lazyflow.operators.opFeatureMatrixCache import OpFeatureMatrixCache
 from lazyflow.operators.opRelabelConsecutive import OpRelabelConsecutive
 from lazyflow.rtype import List
 from lazyflow.slot import OutputSlot
@@ -543,6 +546,142 @@ def testCompression(tmpdir, opLabelArray):
     assert h5_filepath_compressed.exists()
 
 
+def _label_array_with_serializer(shape=(256, 256, 256, 1)):
+    # Create the serializer before the lane is inserted, as in a workflow, so that it is notified of changes
+    opLabelArrays = OperatorWrapper(OpCompressedUserLabelArray, graph=Graph())
+    slotSerializer = SerialBlockSlot(opLabelArrays.Output, opLabelArrays.Input, opLabelArrays.nonzeroBlocks)
+    raw_data = vigra.taggedView(numpy.zeros(shape, dtype=numpy.uint32), "zyxc")
+    opLabelArrays.Input.resize(1)
+    opLabelArrays.Input[0].setValue(raw_data)
+    opLabelArrays.shape.setValue(raw_data.shape)
+    opLabelArrays.eraser.setValue(255)
+    opLabelArrays.deleteLabel.setValue(-1)
+    opLabelArrays.blockShape.setValue((64, 64, 64, 1))
+    return opLabelArrays, slotSerializer
+
+
+def testIncrementalSave(tmpdir):
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    opLabelArray.Input[0][0:1, 0:1, 0:1, 0:1] = numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+    opLabelArray.Input[0][100:101, 0:1, 0:1, 0:1] = 2 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+    opLabelArray.Input[0][200:201, 0:1, 0:1, 0:1] = 3 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+
+    with h5py.File(tmpdir / "incremental.h5", "w") as f:
+        label_group = f.create_group("label_data")
+        slotSerializer.serialize(label_group)
+        lane_group = label_group["Output/0000"]
+        assert len(lane_group) == 3
+        for block in lane_group.values():
+            block.attrs["written_before"] = True
+
+        # Change the second block, erase the third
+        opLabelArray.Input[0][101:102, 0:1, 0:1, 0:1] = 2 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+        opLabelArray.Input[0][200:201, 0:1, 0:1, 0:1] = 255 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+        assert slotSerializer.shouldSerialize(label_group)
+        slotSerializer.serialize(label_group)
+
+        written_before = {
+            block.attrs["sourceBlockSlice"]: "written_before" in block.attrs for block in lane_group.values()
+        }
+        assert written_before == {"[0:64,0:64,0:64,0:1]": True, "[64:128,0:64,0:64,0:1]": False}
+
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    with h5py.File(tmpdir / "incremental.h5", "r") as f:
+        slotSerializer.deserialize(f["label_data"])
+    labels = opLabelArray.Output[0][:, 0:1, 0:1, 0:1].wait()
+    assert (labels[[0, 100, 101], 0, 0, 0] == [1, 2, 2]).all()
+    assert labels[200, 0, 0, 0] == 0
+
+
+def testBloscCompression(tmpdir, monkeypatch):
+    pytest.importorskip("hdf5plugin")
+    monkeypatch.setitem(ilastik_config["ilastik"], "project_compression", "blosc")
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    opLabelArray.Input[0][10:20, 10:20, 10:20, 0:1] = numpy.ones((10, 10, 10, 1), dtype=numpy.uint8)
+
+    with h5py.File(tmpdir / "blosc.h5", "w") as f:
+        slotSerializer.serialize(f.create_group("label_data"))
+        (block,) = f["label_data/Output/0000"].values()
+        assert block.compression is not None
+
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    with h5py.File(tmpdir / "blosc.h5", "r") as f:
+        slotSerializer.deserialize(f["label_data"])
+    assert (opLabelArray.Output[0][10:20, 10:20, 10:20, 0:1].wait() == 1).all()
+
+
+def testLazyLoad(tmpdir):
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    opLabelArray.Input[0][0:1, 0:1, 0:1, 0:1] = numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+    opLabelArray.Input[0][100:101, 0:1, 0:1, 0:1] = 2 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+    with h5py.File(tmpdir / "lazy.h5", "w") as f:
+        slotSerializer.serialize(f.create_group("label_data"))
+        for block in f["label_data/Output/0000"].values():
+            block.attrs["written_before"] = True
+
+    opLabelArray, slotSerializer = _label_array_with_serializer()
+    with h5py.File(tmpdir / "lazy.h5", "a") as f:
+        label_group = f["label_data"]
+        slotSerializer.ignoreDirty = True
+        slotSerializer.lazyLoad = True
+        slotSerializer.deserialize(label_group)
+        slotSerializer.lazyLoad = False
+        slotSerializer.ignoreDirty = False
+
+        # The blocks are known, but only read when they are accessed
+        lazy_inputs = opLabelArray.innerOperators[0]._lazyInputs
+        assert len(lazy_inputs) == 2
+        assert len(opLabelArray.nonzeroBlocks[0].value) == 2
+        assert opLabelArray.Output[0][0:1, 0:1, 0:1, 0:1].wait()[0, 0, 0, 0] == 1
+        assert len(lazy_inputs) == 1
+        assert not slotSerializer.dirty
+        assert not slotSerializer.shouldSerialize(label_group)
+
+        # Labels drawn on top of a block that hasn't been read yet
+        opLabelArray.Input[0][101:102, 0:1, 0:1, 0:1] = 3 * numpy.ones((1, 1, 1, 1), dtype=numpy.uint8)
+        assert len(lazy_inputs) == 0
+        labels = opLabelArray.Output[0][:, 0:1, 0:1, 0:1].wait()
+        assert (labels[[0, 100, 101], 0, 0, 0] == [1, 2, 3]).all()
+
+        slotSerializer.serialize(label_group)
+        written_before = {
+            block.attrs["sourceBlockSlice"]: "written_before" in block.attrs
+            for block in label_group["Output/0000"].values()
+        }
+        assert written_before == {"[0:64,0:64,0:64,0:1]": True, "[64:128,0:64,0:64,0:1]": False}
+
+
+def testTrainAfterLazyLoad(tmpdir):
+    shape = (128, 32, 32, 1)
+    opLabelArray, slotSerializer = _label_array_with_serializer(shape)
+    opLabelArray.Input[0][0:1, 0:2, 0:1, 0:1] = numpy.ones((1, 2, 1, 1), dtype=numpy.uint8)
+    opLabelArray.Input[0][100:101, 0:2, 0:1, 0:1] = 2 * numpy.ones((1, 2, 1, 1), dtype=numpy.uint8)
+    with h5py.File(tmpdir / "lazy.h5", "w") as f:
+        slotSerializer.serialize(f.create_group("label_data"))
+
+    opLabelArray, slotSerializer = _label_array_with_serializer(shape)
+    features = vigra.taggedView(numpy.random.random(shape[:-1] + (2,)).astype(numpy.float32), "zyxc")
+    opFeatureMatrixCache = OpFeatureMatrixCache(graph=opLabelArray.graph)
+    opFeatureMatrixCache.LabelImage.connect(opLabelArray.Output[0])
+    opFeatureMatrixCache.FeatureImage.setValue(features)
+    opTrain = OpTrainClassifierFromFeatureVectors(graph=opLabelArray.graph)
+    opTrain.ClassifierFactory.setValue(VigraRfLazyflowClassifierFactory(10))
+    opTrain.LabelAndFeatureMatrix.connect(opFeatureMatrixCache.LabelAndFeatureMatrix)
+    opTrain.MaxLabel.setValue(2)
+
+    with h5py.File(tmpdir / "lazy.h5", "r") as f:
+        slotSerializer.ignoreDirty = True
+        slotSerializer.lazyLoad = True
+        slotSerializer.deserialize(f["label_data"])
+        slotSerializer.lazyLoad = False
+        slotSerializer.ignoreDirty = False
+
+        # All saved labels are used for training, although they weren't read on load
+        labels_and_features = opFeatureMatrixCache.LabelAndFeatureMatrix.value
+        assert sorted(labels_and_features[:, 0]) == [1, 1, 2, 2]
+        assert list(opTrain.Classifier.value.known_classes) == [1, 2]
+
+
 class TestSerialBlockSlot2(unittest.TestCase):
     def _init_objects(self):
         raw_data = numpy.zeros((100, 100, 100, 1), dtype=numpy.uint32)
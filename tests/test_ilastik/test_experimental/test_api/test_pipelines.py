@@ -128,6 +128,47 @@ class TestIlastikApiPixelClassification:
         with pytest.raises(ValueError):
             pipeline.get_probabilities(_load_as_xarray(input_dataset))
 
+    @pytest.mark.parametrize(
+        "input_, proj",
+        [
+            (TestData.DATA_1_CHANNEL, TestProjects.PIXEL_CLASS_1_CHANNEL_XY),
+            (TestData.DATA_1_CHANNEL_3D, TestProjects.PIXEL_CLASS_3D),
+        ],
+    )
+    def test_predict_blockwise(self, test_data_lookup: ApiTestDataLookup, input_, proj):
+        project_path = test_data_lookup.find_project(proj)
+        input_data = _load_as_xarray(test_data_lookup.find_dataset(input_))
+
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path)
+        expected_prediction = pipeline.get_probabilities(input_data)
+
+        # plain numpy input without axistags, read lazily
+        shape = pipeline.get_probabilities_shape(input_data.data, axes="".join(input_data.dims))
+        assert tuple(shape.keys()) == expected_prediction.dims
+        assert tuple(shape.values()) == expected_prediction.shape
+
+        block_shape = [s if k == "c" else 17 for k, s in shape.items()]
+        out = np.zeros(expected_prediction.shape, dtype=np.float32)
+        pipeline.write_probabilities(input_data.data, out, axes="".join(input_data.dims), block_shape=block_shape)
+        np.testing.assert_array_almost_equal(out, expected_prediction, decimal=5)
+
+        blocks = list(pipeline.iter_probabilities(input_data, block_shape=block_shape))
+        assert len(blocks) > 1
+        for slicing, block in blocks:
+            assert block.dims == expected_prediction.dims
+            np.testing.assert_array_almost_equal(block, expected_prediction[slicing], decimal=5)
+
+    def test_predict_blockwise_invalid_args(self, test_data_lookup: ApiTestDataLookup):
+        project_path = test_data_lookup.find_project(TestProjects.PIXEL_CLASS_1_CHANNEL_XY)
+        input_data = _load_as_xarray(test_data_lookup.find_dataset(TestData.DATA_1_CHANNEL))
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path)
+
+        with pytest.raises(ValueError):
+            pipeline.get_probabilities_shape(input_data.data)
+
+        with pytest.raises(ValueError):
+            pipeline.write_probabilities(input_data, np.zeros((1, 1, 1), dtype=np.float32))
+
     @pytest.mark.parametrize(
         "proj",
         [
@@ -191,6 +232,25 @@ class TestIlastikApiAutocontext:
         assert prediction_stage_2.shape == expected_prediction_stage_2.shape
         assert_predictions_equal_ilastik_cross(prediction_stage_2, expected_prediction_stage_2)
 
+    @pytest.mark.parametrize("stage", [1, 2])
+    def test_predict_blockwise(self, test_data_lookup: ApiTestDataLookup, stage):
+        project_path = test_data_lookup.find_project(TestProjects.AUTOCONTEXT_2D)
+        input_data = _load_as_xarray(test_data_lookup.find_dataset(TestData.DATA_1_CHANNEL))
+
+        pipeline = AutocontextPipeline.from_ilp_file(project_path)
+        if stage == 1:
+            expected_prediction = pipeline.get_probabilities_stage_1(input_data)
+        else:
+            expected_prediction = pipeline.get_probabilities_stage_2(input_data)
+
+        shape = pipeline.get_probabilities_shape(input_data, stage=stage)
+        assert tuple(shape.values()) == expected_prediction.shape
+
+        block_shape = [s if k == "c" else 23 for k, s in shape.items()]
+        out = np.zeros(expected_prediction.shape, dtype=np.float32)
+        pipeline.write_probabilities(input_data, out, block_shape=block_shape, stage=stage)
+        np.testing.assert_array_almost_equal(out, expected_prediction, decimal=5)
+
     @pytest.mark.parametrize(
         "input_, proj",
         [
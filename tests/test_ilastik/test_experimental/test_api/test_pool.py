@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from ilastik.experimental.api import AutocontextPipeline, PipelinePool, PixelClassificationPipeline
+
+from ..types import ApiTestDataLookup, TestData, TestProjects
+from .test_pipelines import _load_as_xarray
+
+
+@pytest.mark.parametrize(
+    "pipeline_type, proj, kwargs",
+    [
+        (PixelClassificationPipeline, TestProjects.PIXEL_CLASS_1_CHANNEL_XY, {}),
+        (AutocontextPipeline, TestProjects.AUTOCONTEXT_2D, {"stage": 1}),
+    ],
+)
+def test_concurrent_get_probabilities(test_data_lookup: ApiTestDataLookup, pipeline_type, proj, kwargs):
+    project_path = test_data_lookup.find_project(proj)
+    input_data = _load_as_xarray(test_data_lookup.find_dataset(TestData.DATA_1_CHANNEL))
+    # different images per call, so that mixed up inputs would be noticed
+    images = [input_data[i * 5 :, i * 3 :] for i in range(6)]
+
+    expected = [pipeline_type.from_ilp_file(project_path).get_probabilities(img, **kwargs) for img in images]
+
+    pool = PipelinePool.from_ilp_file(pipeline_type, project_path, size=3)
+    assert pool.size == 3
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda img: pool.get_probabilities(img, **kwargs), images))
+
+    for result, exp in zip(results, expected):
+        assert result.dims == exp.dims
+        np.testing.assert_array_almost_equal(result, exp, decimal=5)
+
+
+def test_classifier_is_shared(test_data_lookup: ApiTestDataLookup):
+    project_path = test_data_lookup.find_project(TestProjects.PIXEL_CLASS_1_CHANNEL_XY)
+    pool = PipelinePool.from_ilp_file(PixelClassificationPipeline, project_path, size=2)
+
+    with pool.acquire() as first:
+        with pool.acquire() as second:
+            assert first is not second
+            assert first._predict_op.Classifier.value is second._predict_op.Classifier.value
+
+
+def test_invalid_size(test_data_lookup: ApiTestDataLookup):
+    project_path = test_data_lookup.find_project(TestProjects.PIXEL_CLASS_1_CHANNEL_XY)
+    with pytest.raises(ValueError):
+        PipelinePool.from_ilp_file(PixelClassificationPipeline, project_path, size=0)
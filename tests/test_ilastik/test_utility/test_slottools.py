@@ -52,3 +52,17 @@ def test_eq(dtype_a, dtype_b, expected):
     fn_b = DtypeConvertFunction(dtype_b)
 
     assert (fn_a == fn_b) == expected
+
+
+@pytest.mark.parametrize(
+    "input_array,dtype,expected",
+    [
+        (numpy.array((0, 51, 255), dtype="uint8"), "uint8", numpy.array((0, 51, 255), dtype="uint8")),
+        (numpy.array((0, 51, 255), dtype="uint8"), "float32", numpy.array((0.0, 0.2, 1.0), dtype="float32")),
+    ],
+)
+def test_rescaling_quantized_source(input_array, dtype, expected):
+    result = DtypeConvertFunction(dtype, source_max=255)(input_array)
+    assert result.dtype == expected.dtype
+    numpy.testing.assert_array_equal(result, expected)
+    assert DtypeConvertFunction(dtype, source_max=255) != DtypeConvertFunction(dtype)
@@ -53,6 +53,7 @@ def run_headless_pixel_classification(
     testdir,
     *,
     num_distributed_workers: int = 0,
+    distributed_backend: str = "mpi",
     distributed_block_roi: Optional[Dict[str, slice]] = None,
     project: Path,
     raw_data: Union[Path, str],
@@ -90,7 +91,15 @@ def run_headless_pixel_classification(
     if export_dtype:
         subprocess_args.append(f"--export_dtype={export_dtype}")
 
-    if num_distributed_workers:
+    if num_distributed_workers and distributed_backend == "local":
+        subprocess_args += [
+            "--distributed",
+            "--distributed-backend=local",
+            f"--distributed-workers={num_distributed_workers}",
+        ]
+        if distributed_block_roi:
+            subprocess_args += ["--distributed-block-roi", str(distributed_block_roi)]
+    elif num_distributed_workers:
         os.environ["OMPI_ALLOW_RUN_AS_ROOT"] = "1"
         os.environ["OMPI_ALLOW_RUN_AS_ROOT_CONFIRM"] = "1"
         subprocess_args = ["mpiexec", "-n", str(num_distributed_workers)] + subprocess_args + ["--distributed"]
@@ -223,6 +232,40 @@ def test_distributed_results_are_identical_to_single_process_results(
     assert (single_process_out_data == distributed_50x50block_data).all()
 
 
+def test_local_distributed_results_are_identical_to_single_process_results(
+    testdir, pixel_classification_ilp_2d3c: Path, tmp_path: Path
+):
+    raw_100x100y3c: Path = create_h5(numpy.random.rand(100, 100, 3), axiskeys="yxc")
+
+    single_process_output_path = tmp_path / "single_process_out_100x100y3c.h5"
+    run_headless_pixel_classification(
+        testdir,
+        project=pixel_classification_ilp_2d3c,
+        raw_data=raw_100x100y3c,
+        output_filename_format=str(single_process_output_path),
+    )
+
+    with h5py.File(single_process_output_path, "r") as f:
+        single_process_out_data = f["exported_data"][()]
+
+    distributed_output_path = tmp_path / "distributed_out_100x100y3c.n5"
+    run_headless_pixel_classification(
+        testdir,
+        num_distributed_workers=2,
+        distributed_backend="local",
+        distributed_block_roi={"x": 50, "y": 50},
+        output_format="n5",
+        project=pixel_classification_ilp_2d3c,
+        raw_data=raw_100x100y3c,
+        output_filename_format=str(distributed_output_path),
+    )
+
+    with z5py.File(distributed_output_path, "r") as f:
+        distributed_out_data = f["exported_data"][()]
+
+    assert (single_process_out_data == distributed_out_data).all()
+
+
 @pytest.fixture
 def ome_zarr_store_on_disc(tmp_path) -> str:
     """Sets up a zarr store of a random image at raw scale and a downscale.
@@ -0,0 +1,61 @@
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+import lazyflow
+from lazyflow.distributed.LocalTaskOrchestrator import LocalTaskOrchestrator
+
+# Processes every unit of work by writing a file named after it. Crashes the first time it gets unit 3.
+WORKER_SCRIPT = textwrap.dedent(
+    """
+    import os
+    import sys
+    from pathlib import Path
+
+    from lazyflow.distributed.LocalTaskOrchestrator import LocalTaskOrchestrator
+
+    out_dir = Path(sys.argv[1])
+
+    def process(unit_of_work, rank):
+        if unit_of_work == 3 and not (out_dir / "crashed").exists():
+            (out_dir / "crashed").touch()
+            os._exit(1)
+        (out_dir / f"{sys.argv[2]}_{unit_of_work}").write_text(str(rank))
+
+    LocalTaskOrchestrator().start_as_worker(process)
+    """
+)
+
+
+@pytest.fixture
+def worker_command(tmp_path, monkeypatch):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER_SCRIPT)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    monkeypatch.setenv("PYTHONPATH", str(Path(lazyflow.__file__).parent.parent))
+    return [sys.executable, str(script), str(out_dir)]
+
+
+def test_all_units_of_work_are_processed_despite_crash(worker_command):
+    out_dir = Path(worker_command[-1])
+    orchestrator = LocalTaskOrchestrator(num_workers=3, worker_command=worker_command + ["first"])
+    try:
+        orchestrator.orchestrate(iter(range(10)))
+    finally:
+        orchestrator.shutdown()
+
+    assert (out_dir / "crashed").exists()
+    assert {p.name for p in out_dir.glob("first_*")} == {f"first_{i}" for i in range(10)}
+    assert {int(p.read_text()) for p in out_dir.glob("first_*")} <= {1, 2, 3}
+
+
+def test_all_workers_dead_raises():
+    orchestrator = LocalTaskOrchestrator(num_workers=2, worker_command=[sys.executable, "-c", "raise SystemExit(1)"])
+    try:
+        with pytest.raises(RuntimeError, match="workers died"):
+            orchestrator.orchestrate(range(3))
+    finally:
+        orchestrator.shutdown()
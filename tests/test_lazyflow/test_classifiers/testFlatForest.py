@@ -0,0 +1,67 @@
+import h5py
+import numpy
+import pytest
+
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifier, ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.classifiers.flatForest import FlatForest
+
+
+@pytest.fixture
+def training_data():
+    rng = numpy.random.default_rng(42)
+    X = rng.normal(size=(2000, 6)).astype(numpy.float32)
+    # three classes, depending on a few of the features
+    y = 1 + (X[:, 0] > 0.3) + (X[:, 1] * X[:, 2] > 0)
+    return X, y.astype(numpy.uint32)
+
+
+@pytest.fixture
+def unseen_data():
+    rng = numpy.random.default_rng(7)
+    X = rng.normal(size=(5000, 6)).astype(numpy.float32)
+    X[[3, 100], [1, 5]] = numpy.nan
+    return X
+
+
+def bitwise_equal(a, b):
+    return a.dtype == b.dtype and a.shape == b.shape and (a.view(numpy.uint32) == b.view(numpy.uint32)).all()
+
+
+@pytest.mark.parametrize("num_forests", [1, 2])
+def test_same_as_vigra(training_data, unseen_data, num_forests):
+    factory = ParallelVigraRfLazyflowClassifierFactory(20, num_forests=num_forests)
+    classifier = factory.create_and_train(*training_data)
+
+    flat_forest = FlatForest.from_vigra_forests(classifier._forests)
+    assert flat_forest.tree_count == 20
+    assert flat_forest.class_count == 3
+
+    expected = classifier._predict_probabilities_vigra(unseen_data)
+    assert bitwise_equal(flat_forest.predict_probabilities(unseen_data), expected)
+    assert bitwise_equal(classifier.predict_probabilities(unseen_data), expected)
+    assert (expected[[3, 100]] == 0).all()
+
+
+def test_batches(training_data, unseen_data):
+    classifier = ParallelVigraRfLazyflowClassifierFactory(10, num_forests=1).create_and_train(*training_data)
+    flat_forest = FlatForest.from_vigra_forests(classifier._forests)
+    expected = flat_forest.predict_probabilities(unseen_data)
+
+    flat_forest.MAX_BATCH_ITEMS = 10 * 333
+    assert bitwise_equal(flat_forest.predict_probabilities(unseen_data), expected)
+    assert flat_forest.predict_probabilities(unseen_data[:0]).shape == (0, 3)
+
+
+def test_from_serialized_classifier(training_data, unseen_data, tmp_path):
+    classifier = ParallelVigraRfLazyflowClassifierFactory(10, num_forests=3).create_and_train(*training_data)
+    with h5py.File(tmp_path / "classifier.h5", "w") as f:
+        classifier.serialize_hdf5(f.create_group("classifier"))
+        groups = [group for name, group in sorted(f["classifier"].items()) if name.startswith("Forest")]
+        flat_forest = FlatForest.from_hdf5(groups)
+        assert flat_forest.forest_tree_counts == tuple(forest.treeCount() for forest in classifier._forests)
+
+        deserialized = ParallelVigraRfLazyflowClassifier.deserialize_hdf5(f["classifier"])
+
+    expected = classifier.predict_probabilities(unseen_data)
+    assert bitwise_equal(flat_forest.predict_probabilities(unseen_data), expected)
+    assert bitwise_equal(deserialized.predict_probabilities(unseen_data), expected)
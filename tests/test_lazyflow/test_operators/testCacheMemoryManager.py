@@ -40,7 +40,7 @@ from lazyflow.utility import BigRequestStreamer
 from lazyflow.operators.cacheMemoryManager import _CacheMemoryManager
 from lazyflow.utility import Memory
 from lazyflow.operators.cacheMemoryManager import default_refresh_interval
-from lazyflow.operators.opCache import Cache
+from lazyflow.operators.opCache import Cache, ManagedBlockedCache
 from lazyflow.operators.opBlockedArrayCache import OpBlockedArrayCache
 from lazyflow.operators.opSplitRequestsBlockwise import OpSplitRequestsBlockwise
 from lazyflow.operators.filterOperators import OpGaussianSmoothing
@@ -63,6 +63,49 @@ Cache.register(NonRegisteredCache)
 assert issubclass(NonRegisteredCache, Cache)
 
 
+class FakeBlockedCache(ManagedBlockedCache):
+    """Blocks of 10 bytes, reported to the given manager instead of the global one"""
+
+    reportsBlockAccess = True
+    parent = None
+    children = ()
+
+    def __init__(self, mgr, name):
+        self.mgr = mgr
+        self.name = name
+        self.blocks = {}
+        self.getBlockAccessTimesCalls = 0
+
+    def add(self, key, cost=None):
+        self.blocks[key] = time.time()
+        self.mgr.blockAccessed(self, key, size=10, cost=cost)
+
+    def usedMemory(self):
+        return 10 * len(self.blocks)
+
+    def fractionOfUsedMemoryDirty(self):
+        return 0.0
+
+    def getBlockAccessTimes(self):
+        self.getBlockAccessTimesCalls += 1
+        return list(self.blocks.items())
+
+    def freeMemory(self):
+        mem = self.usedMemory()
+        self.blocks = {}
+        self.mgr.allBlocksFreed(self)
+        return mem
+
+    def freeBlock(self, key):
+        if self.blocks.pop(key, None) is None:
+            return 0
+        self.mgr.blockFreed(self, key)
+        return 10
+
+    def freeDirtyMemory(self):
+        return 0.0
+
+
 class TestCacheMemoryManager:
     def teardown_method(self, method):
         # reset cleanup frequency to sane value
@@ -193,6 +236,80 @@ class TestCacheMemoryManager:
         c = pipe.accessCount
         assert c > b, "did not clean up"
 
+    def testIncrementalEviction(self):
+        mgr = _CacheMemoryManager()
+        # dont clean up in the background while we are testing
+        mgr.disable()
+
+        cache = FakeBlockedCache(mgr, "fake")
+        other = FakeBlockedCache(mgr, "other")
+        mgr.addFirstClassCache(cache)
+        mgr.addFirstClassCache(other)
+        for i in range(6):
+            cache.add(i)
+            other.add(i)
+        cache.add(0)
+
+        # 120 bytes in total, target is 90% of 80 bytes
+        Memory.setAvailableRamCaches(80)
+        mgr._cleanup()
+
+        assert cache.getBlockAccessTimesCalls == 0, "reporting caches must not be polled"
+        assert sorted(cache.blocks) == [0, 3, 4, 5]
+        assert sorted(other.blocks) == [3, 4, 5]
+
+        # blocks freed by the cache itself are no longer considered
+        cache.freeMemory()
+        Memory.setAvailableRamCaches(25)
+        mgr._cleanup()
+        assert sorted(other.blocks) == [4, 5]
+        mgr.stop()
+
+    def testCostAwareEviction(self):
+        mgr = _CacheMemoryManager()
+        mgr.disable()
+        with pytest.raises(ValueError):
+            mgr.setEvictionPolicy("random")
+        mgr.setEvictionPolicy("cost-aware")
+
+        expensive = FakeBlockedCache(mgr, "expensive")
+        cheap = FakeBlockedCache(mgr, "cheap")
+        mgr.addFirstClassCache(expensive)
+        mgr.addFirstClassCache(cheap)
+        for i in range(6):
+            expensive.add(i, cost=1.0)
+        for i in range(6):
+            cheap.add(i, cost=0.001)
+
+        # 120 bytes in total, target is 90% of 80 bytes
+        Memory.setAvailableRamCaches(80)
+        mgr._cleanup()
+
+        # the least recently used blocks are the expensive ones, but the cheap ones are evicted
+        assert sorted(expensive.blocks) == list(range(6))
+        assert sorted(cheap.blocks) == [5]
+        assert mgr.getCacheStatistics(cheap) == {"recomputeCost": pytest.approx(0.001), "evictions": 5}
+        assert mgr.getCacheStatistics(expensive) == {"recomputeCost": pytest.approx(6.0), "evictions": 0}
+
+        # with lru, the oldest blocks go first
+        mgr.setEvictionPolicy("lru")
+        Memory.setAvailableRamCaches(50)
+        mgr._cleanup()
+        assert sorted(expensive.blocks) == [3, 4, 5]
+        assert sorted(cheap.blocks) == [5]
+        mgr.stop()
+
+    def testBlockHeapStaysBounded(self):
+        mgr = _CacheMemoryManager()
+        mgr.disable()
+
+        cache = FakeBlockedCache(mgr, "fake")
+        for _ in range(100):
+            for i in range(100):
+                cache.add(i)
+        assert len(mgr._block_heap) <= 2 * 100 + 1024 + 1
+        mgr.stop()
+
     def testBadMemoryConditions(self):
         """
         TestCacheMemoryManager.testBadMemoryConditions
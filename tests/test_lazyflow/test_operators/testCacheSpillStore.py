@@ -0,0 +1,232 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import builtins
+import os
+import threading
+
+import numpy
+import pytest
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators import cacheMemoryManager, cacheSpillStore
+from lazyflow.operators.cacheSpillStore import _CacheSpillStore
+from lazyflow.operators.opCompressedCache import OpCompressedCache
+from lazyflow.operators.opUnblockedArrayCache import OpUnblockedArrayCache
+from lazyflow.roi import roiToSlice
+from lazyflow.utility.testing import OpArrayPiperWithAccessCount
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = _CacheSpillStore()
+    store.configure(1024**2, str(tmp_path))
+    yield store
+    store.configure(0)
+
+
+@pytest.fixture
+def spilling(tmp_path):
+    cacheSpillStore.configure(64 * 1024**2, str(tmp_path))
+    yield
+    cacheSpillStore.configure(0)
+
+
+def testRoundTrip(store):
+    ns = store.newNamespace()
+    data = numpy.random.random((20, 30)).astype(numpy.float32)
+    assert store.put(ns, "a", data)
+    assert store.usedSpace() > 0
+    assert store.keys(ns) == ["a"]
+    assert store.keys(store.newNamespace()) == []
+
+    restored = store.get(ns, "a")
+    assert restored.dtype == data.dtype
+    assert (restored == data).all()
+
+    # reading a block back moves it out of the store
+    assert store.get(ns, "a") is None
+    assert store.usedSpace() == 0
+    assert store.statistics()["hits"] == 1
+
+
+def testDisabled():
+    store = _CacheSpillStore()
+    assert not store.isEnabled()
+    assert not store.put(store.newNamespace(), "a", numpy.zeros(10))
+
+
+def testUnsupportedData(store):
+    ns = store.newNamespace()
+    assert not store.put(ns, "masked", numpy.ma.masked_array(numpy.zeros(10), mask=False))
+    assert not store.put(ns, "objects", numpy.array([None, {}], dtype=object))
+
+
+def testCapacity(tmp_path):
+    store = _CacheSpillStore()
+    rng = numpy.random.default_rng(0)
+    # incompressible blocks of 8000 bytes
+    blocks = [rng.integers(0, 256, 8000, dtype=numpy.uint8) for _ in range(5)]
+    store.configure(3 * 8100, str(tmp_path))
+
+    ns = store.newNamespace()
+    for i, block in enumerate(blocks):
+        assert store.put(ns, i, block)
+        assert store.usedSpace() <= store.capacity()
+
+    # the oldest blocks were deleted to make room
+    assert sorted(store.keys(ns)) == [2, 3, 4]
+    assert store.get(ns, 0) is None
+    assert (store.get(ns, 4) == blocks[4]).all()
+    store.configure(0)
+    assert not os.listdir(tmp_path)
+
+
+def testPutWhileReading(tmp_path, monkeypatch):
+    store = _CacheSpillStore()
+    rng = numpy.random.default_rng(0)
+    # incompressible blocks of 8000 bytes, only one of them fits
+    blocks = [rng.integers(0, 256, 8000, dtype=numpy.uint8) for _ in range(2)]
+    store.configure(8100, str(tmp_path))
+    ns = store.newNamespace()
+    assert store.put(ns, 0, blocks[0])
+
+    reading = threading.Event()
+    resume = threading.Event()
+
+    def slow_open(path, mode="r", *args, **kwargs):
+        if mode == "rb":
+            reading.set()
+            assert resume.wait(10)
+        return builtins.open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(cacheSpillStore, "open", slow_open, raising=False)
+
+    restored = []
+    reader = threading.Thread(target=lambda: restored.append(store.get(ns, 0)))
+    reader.start()
+    try:
+        assert reading.wait(10)
+        # The block that is being read back no longer takes up space
+        assert store.usedSpace() == 0
+        assert store.put(ns, 1, blocks[1])
+        assert store.keys(ns) == [1]
+    finally:
+        resume.set()
+        reader.join()
+
+    assert (restored[0] == blocks[0]).all()
+    assert (store.get(ns, 1) == blocks[1]).all()
+    assert store.usedSpace() == 0
+    store.configure(0)
+
+
+def testDiscardAndClear(store):
+    ns = store.newNamespace()
+    other = store.newNamespace()
+    for key in range(3):
+        store.put(ns, key, numpy.arange(100))
+    store.put(other, 0, numpy.arange(100))
+
+    store.discard(ns, 1)
+    assert sorted(store.keys(ns)) == [0, 2]
+    store.clear(ns)
+    assert store.keys(ns) == []
+    assert store.keys(other) == [0]
+
+
+def testUnblockedArrayCacheSpilling(spilling):
+    graph = Graph()
+    opDataProvider = OpArrayPiperWithAccessCount(graph=graph)
+    opCache = OpUnblockedArrayCache(graph=graph)
+
+    data = numpy.random.random((100, 100, 100)).astype(numpy.float32)
+    opDataProvider.Input.setValue(vigra.taggedView(data, "zyx"))
+    opCache.Input.connect(opDataProvider.Output)
+
+    roi = ((30, 30, 30), (50, 50, 50))
+    other_roi = ((60, 60, 60), (70, 70, 70))
+    opCache.Output(*roi).wait()
+    opCache.Output(*other_roi).wait()
+    assert opDataProvider.accessCount == 2
+
+    # evicted blocks are read back from disk instead of being recomputed
+    assert opCache.evictBlock(roi) > 0
+    assert opCache.evictBlock(other_roi) > 0
+    assert opCache.usedMemory() == 0
+    assert (opCache.Output(*roi).wait() == data[roiToSlice(*roi)]).all()
+    assert opDataProvider.accessCount == 2
+
+    # dirty blocks are discarded from disk, too
+    opDataProvider.Input.setDirty((65, 65, 65), (66, 66, 66))
+    assert (opCache.Output(*other_roi).wait() == data[roiToSlice(*other_roi)]).all()
+    assert opDataProvider.accessCount == 3
+
+    # blocks freed for other reasons are not spilled
+    opCache.freeBlock(roi)
+    opCache.Output(*roi).wait()
+    assert opDataProvider.accessCount == 4
+
+
+def testUnblockedArrayCacheSpillingKeepsCost(spilling):
+    graph = Graph()
+    opDataProvider = OpArrayPiperWithAccessCount(graph=graph)
+    opCache = OpUnblockedArrayCache(graph=graph)
+    opDataProvider.Input.setValue(vigra.taggedView(numpy.zeros((100, 100), dtype=numpy.float32), "yx"))
+    opCache.Input.connect(opDataProvider.Output)
+
+    roi = ((0, 0), (50, 50))
+    opCache.Output(*roi).wait()
+    cost = cacheMemoryManager.getCacheStatistics(opCache)["recomputeCost"]
+    assert cost > 0
+
+    opCache.evictBlock(roi)
+    assert cacheMemoryManager.getCacheStatistics(opCache)["recomputeCost"] == 0
+    # a block read back from disk is as expensive to recompute as before
+    opCache.Output(*roi).wait()
+    assert opDataProvider.accessCount == 1
+    assert cacheMemoryManager.getCacheStatistics(opCache)["recomputeCost"] == cost
+
+
+def testCompressedCacheSpilling(spilling):
+    graph = Graph()
+    opDataProvider = OpArrayPiperWithAccessCount(graph=graph)
+    opCache = OpCompressedCache(graph=graph)
+
+    data = numpy.random.random((100, 100)).astype(numpy.float32)
+    opDataProvider.Input.setValue(vigra.taggedView(data, "yx"))
+    opCache.Input.connect(opDataProvider.Output)
+    opCache.BlockShape.setValue((50, 50))
+
+    assert (opCache.Output[:].wait() == data).all()
+    assert opDataProvider.accessCount == 4
+
+    for block_id, _ in opCache.getBlockAccessTimes():
+        opCache.evictBlock(block_id)
+    assert (opCache.Output[:].wait() == data).all()
+    assert opDataProvider.accessCount == 4
+
+    for block_id, _ in opCache.getBlockAccessTimes():
+        opCache.evictBlock(block_id)
+    opDataProvider.Input.setDirty((0, 0), (10, 10))
+    assert (opCache.Output[:].wait() == data).all()
+    assert opDataProvider.accessCount == 5
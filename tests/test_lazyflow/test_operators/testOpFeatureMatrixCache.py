@@ -51,3 +51,38 @@ class TestOpFeatureMatrixCache(object):
         # Just check that all features are present, regardless of order.
         for feature_vec in [[10.5, 10.5], [10.5, 11.5], [20.5, 20.5], [20.5, 21.5]]:
             assert feature_vec in labels_and_features[:, 1:]
+
+    def testUpdates(self):
+        features = numpy.indices((100, 100)).astype(numpy.float32) + 0.5
+        features = numpy.rollaxis(features, 0, 3)
+        features = vigra.taggedView(features, "xyc")
+
+        labels = numpy.zeros((100, 100, 1), dtype=numpy.uint8)
+        labels = vigra.taggedView(labels, "xyc")
+        labels[10, 10] = 1
+        labels[10, 11] = 1
+
+        graph = Graph()
+        opFeatureMatrixCache = OpFeatureMatrixCache(graph=graph)
+        opFeatureMatrixCache.FeatureImage.setValue(features)
+        opFeatureMatrixCache.LabelImage.setValue(labels)
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[10:11, 10:12])
+        first = opFeatureMatrixCache.LabelAndFeatureMatrix.value
+        assert first.shape == (2, 3)
+
+        # Adding labels (to the same block) appends their rows, the previous matrix stays valid
+        labels[12, 12] = 1
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[12:13, 12:13])
+        second = opFeatureMatrixCache.LabelAndFeatureMatrix.value
+        assert second.shape == (3, 3)
+        assert (second[:2] == first).all()
+        assert (second[2] == [1, 12.5, 12.5]).all()
+
+        # Relabeling replaces the old rows
+        labels[10, 10] = 2
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[10:11, 10:11])
+        third = opFeatureMatrixCache.LabelAndFeatureMatrix.value
+        assert third.shape == (3, 3)
+        assert [2, 10.5, 10.5] in third.tolist()
+        assert [1, 10.5, 10.5] not in third.tolist()
+        assert first.shape == (2, 3) and [1, 10.5, 10.5] in first.tolist()
@@ -3,6 +3,7 @@ import vigra
 
 from lazyflow.graph import Graph
 from lazyflow.operators import OpPixelFeaturesPresmoothed
+from lazyflow.operators.opCache import MemInfoNode
 
 DEBUG = False
 
@@ -75,3 +76,65 @@ class TestOpPixelFeaturesPresmoothed(object):
 
         assert computed_whole.shape == computed_per_slice.shape
         assert numpy.allclose(computed_whole, computed_per_slice), abs(computed_whole - computed_per_slice).max()
+
+    def test_cascaded_presmoothing(self):
+        data = numpy.random.rand(2, 2, 24, 40, 41).astype(numpy.float32).view(vigra.VigraArray)
+        data.axistags = vigra.defaultAxistags("tczyx")
+
+        op = OpPixelFeaturesPresmoothed(graph=Graph())
+        op.Scales.setValue([0.7, 1.0, 1.6, 2.5, 3.0])
+        op.FeatureIds.setValue(["GaussianSmoothing", "LaplacianOfGaussian", "HessianOfGaussianEigenvalues"])
+        op.SelectionMatrix.setValue(
+            numpy.array(
+                [
+                    [True, True, False, True, True],
+                    [False, True, True, False, True],
+                    [True, False, True, True, False],
+                ]
+            )
+        )
+        op.ComputeIn2d.setValue([False, False, True, False, False])
+        op.Input.setValue(data)
+
+        for roi in [slice(None), numpy.s_[1:2, :, 5:15, 10:30, 7:20]]:
+            op.CascadedPresmoothing.setValue(False)
+            independent = op.Output[roi].wait()
+            op.CascadedPresmoothing.setValue(True)
+            cascaded = op.Output[roi].wait()
+
+            assert cascaded.shape == independent.shape
+            assert numpy.allclose(cascaded, independent, atol=1e-3), abs(cascaded - independent).max()
+
+    def test_cached_presmoothing(self):
+        data = numpy.random.rand(2, 1, 30, 70, 80).astype(numpy.float32).view(vigra.VigraArray)
+        data.axistags = vigra.defaultAxistags("tczyx")
+
+        op = OpPixelFeaturesPresmoothed(graph=Graph())
+        op.PRESMOOTHED_TILE_SHAPE_3D = (16, 32, 32)
+        op.Scales.setValue([0.7, 1.6, 3.0])
+        op.FeatureIds.setValue(["GaussianSmoothing", "GaussianGradientMagnitude"])
+        op.SelectionMatrix.setValue(numpy.array([[True, False, True], [False, True, True]]))
+        op.ComputeIn2d.setValue([False, False, False])
+        op.Input.setValue(data)
+
+        tiles = [numpy.s_[0:1, :, 0:15, 0:35, 0:40], numpy.s_[0:1, :, 0:15, 35:70, 0:40], numpy.s_[:, :, 10:30, 20:50]]
+        expected = [op.Output[tile].wait() for tile in tiles]
+
+        op.CachePresmoothing.setValue(True)
+        for tile, exp in zip(tiles, expected):
+            assert numpy.allclose(op.Output[tile].wait(), exp, atol=1e-5)
+
+        report = MemInfoNode()
+        op._tile_cache.generateReport(report)
+        assert report.usedMemory > 0
+        assert op._tile_cache._hits > 0, "neighbouring tiles should share pre-smoothed halos"
+
+        # requesting the same tile again is served from the cache only
+        misses = op._tile_cache._misses
+        assert numpy.allclose(op.Output[tiles[0]].wait(), expected[0], atol=1e-5)
+        assert op._tile_cache._misses == misses
+
+        # dirty input invalidates the tiles depending on it
+        n_tiles = len(op._tile_cache.getBlockAccessTimes())
+        op._tile_cache.invalidate(((0, 0, 5, 5, 5), (1, 1, 6, 6, 6)))
+        assert 0 < len(op._tile_cache.getBlockAccessTimes()) < n_tiles
@@ -5,7 +5,11 @@ import vigra
 from lazyflow.graph import Graph
 from lazyflow.operators.opFeatureMatrixCache import OpFeatureMatrixCache
 from lazyflow.operators.classifierOperators import OpTrainClassifierFromFeatureVectors
-from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory, ParallelVigraRfLazyflowClassifier
+from lazyflow.classifiers import (
+    IncrementalTrainingSettings,
+    ParallelVigraRfLazyflowClassifierFactory,
+    ParallelVigraRfLazyflowClassifier,
+)
 
 
 class TestOpTrainClassifierFromFeatureVectors(object):
@@ -43,3 +47,48 @@ class TestOpTrainClassifierFromFeatureVectors(object):
         assert isinstance(
             trained_classifier, ParallelVigraRfLazyflowClassifier
         ), "classifier is of the wrong type: {}".format(type(trained_classifier))
+
+    def testIncremental(self):
+        rng = numpy.random.default_rng(0)
+        features = vigra.taggedView(rng.random((100, 100, 2)).astype(numpy.float32), "xyc")
+        labels = vigra.taggedView(numpy.zeros((100, 100, 1), dtype=numpy.uint8), "xyc")
+        labels[:50, :20] = 1
+        labels[50:, :20] = 2
+
+        graph = Graph()
+        opFeatureMatrixCache = OpFeatureMatrixCache(graph=graph)
+        opFeatureMatrixCache.FeatureImage.setValue(features)
+        opFeatureMatrixCache.LabelImage.setValue(labels)
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[:, :20])
+
+        opTrain = OpTrainClassifierFromFeatureVectors(graph=graph)
+        opTrain.ClassifierFactory.setValue(ParallelVigraRfLazyflowClassifierFactory(10, num_forests=5))
+        opTrain.MaxLabel.setValue(2)
+        opTrain.IncrementalTraining.setValue(IncrementalTrainingSettings(replaced_fraction=0.2, max_staleness=0.05))
+        opTrain.LabelAndFeatureMatrix.connect(opFeatureMatrixCache.LabelAndFeatureMatrix)
+        first = opTrain.Classifier.value
+
+        # A few new labels: one of the five forests is retrained
+        labels[:10, 20] = 1
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[:10, 20:21])
+        second = opTrain.Classifier.value
+        assert second is not first
+        assert second.tree_count == 10
+        assert len(set(second.forests) & set(first.forests)) == 4
+
+        # Too many new labels: retrained from scratch
+        labels[:, 30:40] = 1
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[:, 30:40])
+        third = opTrain.Classifier.value
+        assert not set(third.forests) & set(second.forests)
+
+        # Switching incremental training off does not invalidate the classifier, the next training starts from scratch
+        dirty_notifications = []
+        opTrain.Classifier.notifyDirty(lambda *args: dirty_notifications.append(args))
+        opTrain.IncrementalTraining.disconnect()
+        assert not dirty_notifications
+
+        labels[:10, 21] = 2
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[:10, 21:22])
+        fourth = opTrain.Classifier.value
+        assert not set(fourth.forests) & set(third.forests)
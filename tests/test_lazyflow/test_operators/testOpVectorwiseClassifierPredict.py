@@ -0,0 +1,126 @@
+import numpy
+import vigra
+
+from lazyflow.graph import Graph, InputSlot
+from lazyflow.operators import OpArrayPiper
+from lazyflow.operators.opFeatureMatrixCache import OpFeatureMatrixCache
+from lazyflow.operators.classifierOperators import (
+    OpTrainClassifierFromFeatureVectors,
+    OpVectorwiseClassifierPredict,
+)
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
+
+
+class OpCountingPiper(OpArrayPiper):
+    """Records the number of pixels requested from the input"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_pixels = 0
+
+    def execute(self, slot, subindex, roi, result):
+        self.requested_pixels += numpy.prod(roi.stop[:-1] - roi.start[:-1])
+        return super().execute(slot, subindex, roi, result)
+
+
+class OpCountingHaloPiper(OpCountingPiper):
+    """Claims to read a halo around each request (like a feature operator)"""
+
+    Halo = InputSlot(value={})
+
+    def setupOutputs(self):
+        super().setupOutputs()
+        self.Output.meta.halo = self.Halo.value
+
+
+class TestOpVectorwiseClassifierPredict(object):
+    def setup_method(self, method):
+        rng = numpy.random.default_rng(0)
+        features = vigra.taggedView(rng.random((200, 200, 3)).astype(numpy.float32), "yxc")
+        labels = vigra.taggedView(numpy.zeros((200, 200, 1), dtype=numpy.uint8), "yxc")
+        labels[:20, :20] = 1
+        labels[-20:, -20:] = 2
+
+        graph = Graph()
+        self.opFeatureMatrixCache = OpFeatureMatrixCache(graph=graph)
+        self.opFeatureMatrixCache.FeatureImage.setValue(features)
+        self.opFeatureMatrixCache.LabelImage.setValue(labels)
+        self.opFeatureMatrixCache.LabelImage.setDirty()
+
+        self.opTrain = OpTrainClassifierFromFeatureVectors(graph=graph)
+        self.opTrain.ClassifierFactory.setValue(ParallelVigraRfLazyflowClassifierFactory(10))
+        self.opTrain.MaxLabel.setValue(2)
+        self.opTrain.LabelAndFeatureMatrix.connect(self.opFeatureMatrixCache.LabelAndFeatureMatrix)
+
+        self.opFeatures = OpCountingHaloPiper(graph=graph)
+        self.opFeatures.Input.setValue(features)
+
+        self.opPredict = OpVectorwiseClassifierPredict(graph=graph)
+        self.opPredict.Image.connect(self.opFeatures.Output)
+        self.opPredict.LabelsCount.setValue(2)
+        self.opPredict.Classifier.connect(self.opTrain.Classifier)
+
+        self.expected = self.opPredict.PMaps[:].wait()
+        self.opFeatures.requested_pixels = 0
+
+    def testSparseMask(self):
+        mask = vigra.taggedView(numpy.zeros((200, 200, 1), dtype=numpy.uint8), "yxc")
+        mask[10:30, 150:160] = 1
+        mask[120, 20] = 1
+        self.opPredict.PredictionMask.setValue(mask)
+
+        predictions = self.opPredict.PMaps[:].wait()
+        assert (predictions == self.expected * (mask > 0)).all()
+        # features were only computed for the (two) sub-blocks containing masked pixels
+        assert self.opFeatures.requested_pixels == 2 * 64 * 64
+
+    def testSparseMaskWithHalo(self):
+        self.opFeatures.Halo.setValue({"y": 20, "x": 20})
+        assert self.opPredict.Image.meta.halo == {"y": 20, "x": 20}
+
+        mask = vigra.taggedView(numpy.zeros((200, 200, 1), dtype=numpy.uint8), "yxc")
+        mask[10, 10] = mask[10, 70] = mask[10, 130] = 1
+        self.opPredict.PredictionMask.setValue(mask)
+        self.opFeatures.requested_pixels = 0
+
+        predictions = self.opPredict.PMaps[:].wait()
+        assert (predictions == self.expected * (mask > 0)).all()
+        # the adjacent sub-blocks are requested at once, so that their halos are only computed once
+        assert self.opFeatures.requested_pixels == 64 * 192
+
+    def testSparseMaskWithLargeHalo(self):
+        self.opFeatures.Halo.setValue({"y": 40, "x": 40})
+
+        mask = vigra.taggedView(numpy.zeros((200, 200, 1), dtype=numpy.uint8), "yxc")
+        mask[10, 10] = mask[120, 150] = 1
+        self.opPredict.PredictionMask.setValue(mask)
+        self.opFeatures.requested_pixels = 0
+
+        predictions = self.opPredict.PMaps[:].wait()
+        assert (predictions == self.expected * (mask > 0)).all()
+        # with their halos, the two sub-blocks would cost more than the block, the bounding box is requested instead
+        assert self.opFeatures.requested_pixels == 111 * 141
+
+    def testDenseMask(self):
+        mask = vigra.taggedView(numpy.ones((200, 200, 1), dtype=numpy.uint8), "yxc")
+        mask[:10, :10] = 0
+        mask[150:, :] = 0
+        self.opPredict.PredictionMask.setValue(mask)
+
+        predictions = self.opPredict.PMaps[:].wait()
+        assert (predictions == self.expected * (mask > 0)).all()
+        # the bounding box of the mask is requested at once
+        assert self.opFeatures.requested_pixels == 150 * 200
+
+    def testQuantizedPMaps(self):
+        self.opPredict.PMapsDtype.setValue("uint8")
+        assert self.opPredict.PMaps.meta.dtype == numpy.uint8
+        assert self.opPredict.PMaps.meta.drange == (0, 255)
+        predictions = self.opPredict.PMaps[:].wait()
+        assert predictions.dtype == numpy.uint8
+        assert (numpy.abs(predictions / 255.0 - self.expected) <= 0.5 / 255 + 1e-6).all()
+
+        self.opPredict.PMapsDtype.setValue("float16")
+        predictions = self.opPredict.PMaps[:].wait()
+        assert predictions.dtype == numpy.float16
+        assert (predictions == self.expected.astype(numpy.float16)).all()
@@ -19,6 +19,7 @@
 # This information is also available on the ilastik web site at:
 # 		   http://ilastik.org/license/
 ###############################################################################
+import os
 from typing import Union
 
 import h5py
@@ -160,3 +161,137 @@ def test_write_to_group_with_extra_meta(tmp_path, graph, test_data_default_order
         numpy.testing.assert_array_equal(dataset[...], test_data_default_order.view(numpy.ndarray)[...])
     finally:
         file.close()
+
+
+class OpFailingPiper(OpArrayPiper):
+    """Fails after serving a number of requests (None: never), and counts the requested pixels"""
+
+    def __init__(self, *args, fail_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+        self.requested_pixels = 0
+
+    def execute(self, slot, subindex, roi, result):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise RuntimeError("Export interrupted")
+            self.fail_after -= 1
+        self.requested_pixels += numpy.prod(roi.stop - roi.start)
+        return super().execute(slot, subindex, roi, result)
+
+
+@pytest.mark.parametrize(
+    "file_ext, file_class",
+    [
+        ("h5", h5py.File),
+        ("n5", z5py.N5File),
+    ],
+)
+def test_resume_interrupted_export(tmp_path, graph, test_data_order_c, file_ext, file_class):
+    file_path = tmp_path / f"test.{file_ext}"
+    manifest_path = str(tmp_path / "manifest.jsonl")
+
+    def export(export_mode, fail_after=None):
+        opPiper = OpFailingPiper(graph=graph, fail_after=fail_after)
+        opPiper.Input.setValue(test_data_order_c)
+        # Force 16 blocks
+        opPiper.Output.meta.max_blockshape = (1, 10, 32, 32, 1)
+        with file_class(file_path, "a") as file:
+            opWriter = setup_writer(graph, file, "volume/data", opPiper.Output)
+            opWriter.BatchSize.setValue(1)
+            opWriter.ExportMode.setValue(export_mode)
+            opWriter.ManifestPath.setValue(manifest_path)
+            try:
+                assert opWriter.WriteImage.value  # Trigger write
+            finally:
+                opWriter.cleanUp()
+        return opPiper.requested_pixels
+
+    with pytest.raises(Exception):
+        export("new", fail_after=5)
+    assert os.path.exists(manifest_path)
+
+    requested_pixels = export("resume")
+    assert 0 < requested_pixels < test_data_order_c.size
+    assert not os.path.exists(manifest_path)
+    with file_class(file_path, "r") as file:
+        numpy.testing.assert_array_equal(file["volume/data"][...], test_data_order_c.view(numpy.ndarray))
+
+    # Nothing left to do
+    assert export("resume") == 0
+
+
+def test_append_time(tmp_path, graph, test_data_order_c):
+    file_path = tmp_path / "test.h5"
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    more_data = test_data_order_c + 1000
+
+    for data, export_mode in [(test_data_order_c, "new"), (more_data, "append time")]:
+        opPiper = OpArrayPiper(graph=graph)
+        opPiper.Input.setValue(data)
+        with h5py.File(file_path, "a") as file:
+            opWriter = setup_writer(graph, file, "data", opPiper.Output)
+            opWriter.ExportMode.setValue(export_mode)
+            opWriter.ManifestPath.setValue(manifest_path)
+            assert opWriter.WriteImage.value  # Trigger write
+            opWriter.cleanUp()
+
+    with h5py.File(file_path, "r") as file:
+        expected = numpy.concatenate([test_data_order_c.view(numpy.ndarray), more_data.view(numpy.ndarray)], axis=0)
+        numpy.testing.assert_array_equal(file["data"][...], expected)
+
+
+def test_manifest_created_on_first_write(tmp_path, graph, test_data_order_c):
+    manifest_path = tmp_path / "manifest.jsonl"
+    opPiper = OpArrayPiper(graph=graph)
+    opPiper.Input.setValue(test_data_order_c)
+    with h5py.File(tmp_path / "test.h5", "a") as file:
+        opWriter = setup_writer(graph, file, "data", opPiper.Output)
+        opWriter.ManifestPath.setValue(str(manifest_path))
+        # Configuring the writer doesn't touch the target
+        assert not manifest_path.exists()
+        assert "data" not in file
+        opWriter.cleanUp()
+
+
+def test_append_with_interrupted_export(tmp_path, graph, test_data_order_c):
+    file_path = tmp_path / "test.h5"
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    opPiper = OpFailingPiper(graph=graph, fail_after=5)
+    opPiper.Input.setValue(test_data_order_c)
+    opPiper.Output.meta.max_blockshape = (1, 10, 32, 32, 1)
+    with h5py.File(file_path, "a") as file:
+        opWriter = setup_writer(graph, file, "data", opPiper.Output)
+        opWriter.BatchSize.setValue(1)
+        opWriter.ManifestPath.setValue(manifest_path)
+        with pytest.raises(Exception):
+            opWriter.WriteImage.value
+        opWriter.cleanUp()
+
+        opWriter = setup_writer(graph, file, "data", opPiper.Output)
+        opWriter.ManifestPath.setValue(manifest_path)
+        with pytest.raises(ValueError, match="interrupted"):
+            opWriter.ExportMode.setValue("append time")
+        opWriter.cleanUp()
+
+
+def test_resume_with_truncated_manifest_header(tmp_path, graph, test_data_order_c):
+    file_path = tmp_path / "test.h5"
+    manifest_path = tmp_path / "manifest.jsonl"
+    with h5py.File(file_path, "a") as file:
+        file.create_dataset("data", data=numpy.zeros(test_data_order_c.shape, dtype=test_data_order_c.dtype))
+    # Killed while writing the header
+    manifest_path.write_text('{"shape": [1, 10')
+
+    opPiper = OpArrayPiper(graph=graph)
+    opPiper.Input.setValue(test_data_order_c)
+    with h5py.File(file_path, "a") as file:
+        opWriter = setup_writer(graph, file, "data", opPiper.Output)
+        opWriter.ManifestPath.setValue(str(manifest_path))
+        opWriter.ExportMode.setValue("resume")
+        assert opWriter.WriteImage.value
+        opWriter.cleanUp()
+
+    assert not manifest_path.exists()
+    with h5py.File(file_path, "r") as file:
+        numpy.testing.assert_array_equal(file["data"][...], test_data_order_c.view(numpy.ndarray))
@@ -112,3 +112,42 @@ class TestOpTiffReader:
         op.cleanUp()
 
         numpy.testing.assert_array_equal(output_data, data)
+
+    def test_tiled_compressed_regions(self, tmp_path):
+        data = numpy.random.randint(0, 255, (5, 300, 260), dtype="uint8")
+        tiff_path = str(tmp_path / "tiled.tiff")
+        tifffile.imwrite(tiff_path, data, tile=(64, 32), compression="zlib", metadata={"axes": "ZYX"})
+
+        op = OpTiffReader(graph=Graph())
+        op.Filepath.setValue(tiff_path)
+        assert op._memmap is None
+        # single page, and several pages read in parallel
+        assert_array_equal(op.Output[2:3, 70:140, 33:200].wait(), data[2:3, 70:140, 33:200])
+        assert_array_equal(op.Output[1:5, 10:11, 250:260].wait(), data[1:5, 10:11, 250:260])
+        assert_array_equal(op.Output[:].wait(), data)
+        op.cleanUp()
+
+    def test_planar_rgb_strips(self, tmp_path):
+        data = numpy.random.randint(0, 2**16, (3, 100, 90), dtype="uint16")
+        tiff_path = str(tmp_path / "planar.tiff")
+        tifffile.imwrite(
+            tiff_path, data, photometric="rgb", planarconfig="separate", rowsperstrip=7, compression="zlib"
+        )
+
+        op = OpTiffReader(graph=Graph())
+        op.Filepath.setValue(tiff_path)
+        assert op.Output.meta.getAxisKeys() == list("cyx")
+        assert_array_equal(op.Output[1:3, 20:51, 5:6].wait(), data[1:3, 20:51, 5:6])
+        op.cleanUp()
+
+    def test_uncompressed_memmap(self, tmp_path):
+        data = numpy.random.random((6, 50, 40)).astype(numpy.float32)
+        tiff_path = str(tmp_path / "plain.tiff")
+        tifffile.imwrite(tiff_path, data, metadata={"axes": "ZYX"})
+
+        op = OpTiffReader(graph=Graph())
+        op.Filepath.setValue(tiff_path)
+        assert op._memmap is not None
+        assert_array_equal(op.Output[1:4, 10:20, 5:40].wait(), data[1:4, 10:20, 5:40])
+        op.cleanUp()
+        assert op._memmap is None
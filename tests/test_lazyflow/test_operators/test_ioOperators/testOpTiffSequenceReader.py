@@ -3,6 +3,8 @@ import tempfile
 import shutil
 
 import numpy
+import pytest
+import tifffile
 
 from lazyflow.graph import Graph
 from lazyflow.operators.ioOperators import OpTiffSequenceReader
@@ -74,3 +76,38 @@ class TestOpTiffReader(object):
             assert op.Output.ready()
             assert op.Output.meta.axistags == expected_axistags
             assert (op.Output[5:10, 50:100, 100:150].wait() == data[5:10, 50:100, 100:150]).all()
+
+    def test_streaming_along_z(self):
+        data = numpy.random.randint(0, 255, (40, 30, 20)).astype(numpy.uint8)
+
+        with tempdir() as d:
+            for slice_index, z_slice in enumerate(data):
+                tifffile.imwrite(d + f"/slice-{slice_index:02d}.tiff", z_slice, tile=(16, 16), compression="zlib")
+
+            op = OpTiffSequenceReader(graph=Graph())
+            op.MAX_OPEN_FILES = 8
+            op.SequenceAxis.setValue("z")
+            op.GlobString.setValue(d + "/slice-*.tiff")
+            assert op.Output.meta.shape == data.shape
+
+            # No file is opened until it is read, and only a few are kept open
+            assert op._handles.num_idle() == 1
+            for z in range(0, 40, 5):
+                assert (op.Output[z : z + 5, 3:17, :].wait() == data[z : z + 5, 3:17, :]).all()
+                assert op._handles.num_idle() <= op.MAX_OPEN_FILES
+
+            # Streaming in order reads the following slabs ahead
+            assert op._prefetcher.hits() > 0
+            op.cleanUp()
+
+    def test_inconsistent_shape(self):
+        with tempdir() as d:
+            tifffile.imwrite(d + "/slice-0.tiff", numpy.zeros((10, 10), dtype=numpy.uint8))
+            tifffile.imwrite(d + "/slice-1.tiff", numpy.zeros((10, 11), dtype=numpy.uint8))
+
+            op = OpTiffSequenceReader(graph=Graph())
+            op.GlobString.setValue(d + "/slice-*.tiff")
+            assert op.Output.meta.shape == (2, 10, 10)
+            with pytest.raises(OpTiffSequenceReader.InconsistentShape):
+                op.Output[:].wait()
+            op.cleanUp()
@@ -5,7 +5,7 @@ import itertools
 
 import pytest
 
-from lazyflow.request.threadPool import ThreadPool
+from lazyflow.request.threadPool import ThreadPool, WorkStealingThreadPool, create_thread_pool
 
 
 NUM_WORKERS = 4
@@ -119,3 +119,121 @@ def test_exception_in_task_logged(caplog, pool):
     record = caplog.records[0]
 
     assert issubclass(record.exc_info[0], MyExc)
+
+
+@pytest.fixture
+def stealing_pool():
+    pool = WorkStealingThreadPool(NUM_WORKERS)
+    yield pool
+    pool.stop()
+
+
+def test_create_thread_pool_selects_scheduler():
+    pool = create_thread_pool(2, "work-stealing")
+    try:
+        assert isinstance(pool, WorkStealingThreadPool)
+        assert pool.num_workers == 2
+    finally:
+        pool.stop()
+
+    with pytest.raises(ValueError):
+        create_thread_pool(2, "no-such-scheduler")
+
+
+def test_work_stealing_executes_all_tasks(stealing_pool: WorkStealingThreadPool):
+    num_tasks = 200
+    done = threading.Semaphore(0)
+    workers = set()
+
+    def task():
+        workers.add(threading.current_thread())
+        time.sleep(0.001)
+        done.release()
+
+    for _ in range(num_tasks):
+        stealing_pool.wake_up(Task(task))
+
+    for _ in range(num_tasks):
+        assert done.acquire(timeout=5)
+
+    assert workers <= stealing_pool.workers
+    assert len(workers) > 1
+
+
+def test_work_stealing_tasks_submitted_from_worker_are_stolen(stealing_pool: WorkStealingThreadPool):
+    num_children = NUM_WORKERS * 4
+    done = threading.Semaphore(0)
+    release = threading.Event()
+    workers = set()
+
+    def child():
+        workers.add(threading.current_thread())
+        release.wait(timeout=1)
+        done.release()
+
+    def parent():
+        # All children end up in the ready queue of the parent's worker
+        for _ in range(num_children):
+            stealing_pool.wake_up(Task(child))
+        time.sleep(0.2)
+        release.set()
+
+    stealing_pool.wake_up(Task(parent))
+
+    for _ in range(num_children):
+        assert done.acquire(timeout=5)
+
+    assert len(workers) > 1
+
+
+def test_work_stealing_wake_task_executes_task_on_assigned_worker(stealing_pool: WorkStealingThreadPool):
+    stop = threading.Event()
+    worker = None
+
+    def task():
+        nonlocal worker
+        worker = threading.current_thread()
+        stop.set()
+
+    task.assigned_worker = random.choice(list(stealing_pool.workers))
+    stealing_pool.wake_up(task)
+    assert stop.wait(timeout=1)
+    assert worker == task.assigned_worker
+
+
+def test_work_stealing_respects_priority():
+    pool = WorkStealingThreadPool(1)
+    blocker_started = threading.Event()
+    release = threading.Event()
+    order = []
+    done = threading.Event()
+
+    class PrioTask:
+        def __init__(self, prio, fn):
+            self.prio = prio
+            self.fn = fn
+            self.assigned_worker = None
+
+        def __lt__(self, other):
+            return self.prio < other.prio
+
+        def __call__(self):
+            self.fn()
+
+    def blocker():
+        blocker_started.set()
+        release.wait(timeout=1)
+
+    try:
+        pool.wake_up(PrioTask(-1, blocker))
+        assert blocker_started.wait(timeout=1)
+
+        for prio in [3, 1, 2]:
+            pool.wake_up(PrioTask(prio, lambda prio=prio: order.append(prio)))
+        pool.wake_up(PrioTask(4, done.set))
+        release.set()
+
+        assert done.wait(timeout=1)
+        assert order == [1, 2, 3]
+    finally:
+        pool.stop()
@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from lazyflow.request import topology
+from lazyflow.request.threadPool import WorkStealingThreadPool
+from lazyflow.request.topology import CpuTopology
+
+
+needs_affinity = pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="cpu pinning is linux only")
+
+
+@pytest.fixture
+def two_nodes():
+    return CpuTopology(((0, 1, 2, 3), (4, 5, 6, 7)))
+
+
+def test_detect_returns_usable_cpus():
+    topo = CpuTopology.detect()
+    assert topo.num_nodes >= 1
+    assert len(topo.cpus) >= 1
+    if hasattr(os, "sched_getaffinity"):
+        assert set(topo.cpus) <= os.sched_getaffinity(0)
+
+
+def test_placement_without_affinity(two_nodes):
+    assert two_nodes.worker_placement(3, "none") == [(None, 0)] * 3
+
+
+@needs_affinity
+def test_placement_numa(two_nodes):
+    placement = two_nodes.worker_placement(3, "numa")
+    assert placement == [
+        (frozenset([0, 1, 2, 3]), 0),
+        (frozenset([4, 5, 6, 7]), 1),
+        (frozenset([0, 1, 2, 3]), 0),
+    ]
+
+
+@needs_affinity
+def test_placement_core_interleaves_nodes(two_nodes):
+    placement = two_nodes.worker_placement(4, "core")
+    assert placement == [(frozenset([0]), 0), (frozenset([4]), 1), (frozenset([1]), 0), (frozenset([5]), 1)]
+
+
+def test_placement_invalid_mode(two_nodes):
+    with pytest.raises(ValueError):
+        two_nodes.worker_placement(2, "socket")
+
+
+def test_node_for_block_is_stable():
+    assert topology.node_for_block((0, 10, 20), 1) is None
+    nodes = {topology.node_for_block((i, 0, 0), 4) for i in range(0, 1000, 64)}
+    assert nodes <= {0, 1, 2, 3}
+    assert topology.node_for_block((64, 0, 0), 4) == topology.node_for_block((64, 0, 0), 4)
+
+
+def test_probe_worker_count_within_limits():
+    count = topology.probe_worker_count(max_workers=2, step_duration=0.01)
+    assert 1 <= count <= 2
+
+
+@needs_affinity
+def test_pinned_pool_workers_run_on_their_cpus():
+    cpus = sorted(os.sched_getaffinity(0))
+    pool = WorkStealingThreadPool(2, affinity="core")
+    try:
+        # workers pin themselves before they start waiting for tasks
+        deadline = time.time() + 1
+        while pool.get_states() != ["waiting"] * 2 and time.time() < deadline:
+            time.sleep(0.01)
+        for worker in pool.workers:
+            assert len(worker.cpus) == 1
+            assert worker.cpus <= set(cpus)
+            assert os.sched_getaffinity(worker.native_id) == worker.cpus
+    finally:
+        pool.stop()
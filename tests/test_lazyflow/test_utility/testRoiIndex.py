@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from lazyflow.utility.roiIndex import RoiDict, RoiIndex
+
+
+def _random_roi(rng, max_extent):
+    start = tuple(rng.randrange(0, 100) for _ in range(3))
+    stop = tuple(s + rng.randrange(1, max_extent) for s in start)
+    return start, stop
+
+
+def _contains(outer, inner):
+    return all(o <= i for o, i in zip(outer[0], inner[0])) and all(o >= i for o, i in zip(outer[1], inner[1]))
+
+
+def _intersects(a, b):
+    return all(max(a0, b0) < min(a1, b1) for a0, a1, b0, b1 in zip(*a, *b))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_queries_match_linear_scan(seed):
+    rng = random.Random(seed)
+    index = RoiIndex()
+    rois = set()
+    for _ in range(300):
+        if rois and rng.random() < 0.2:
+            roi = rng.choice(sorted(rois))
+            rois.remove(roi)
+            index.discard(roi)
+        else:
+            # mostly similar sizes, with a few rois much larger than the grid cells
+            roi = _random_roi(rng, rng.choice([10, 10, 10, 100]))
+            rois.add(roi)
+            index.add(roi)
+
+    assert len(index) == len(rois)
+    for _ in range(200):
+        query = _random_roi(rng, rng.choice([3, 20, 150]))
+
+        containing = index.find_containing(query)
+        expected_containing = [roi for roi in rois if _contains(roi, query)]
+        if expected_containing:
+            assert containing in expected_containing
+        else:
+            assert containing is None
+
+        expected_intersecting = sorted(roi for roi in rois if _intersects(roi, query))
+        assert sorted(index.find_intersecting(query)) == expected_intersecting
+
+
+def test_touching_rois_dont_intersect():
+    index = RoiIndex()
+    index.add(((0, 0), (10, 10)))
+    assert index.find_intersecting(((10, 0), (20, 10))) == []
+    assert index.find_containing(((5, 5), (10, 11))) is None
+
+
+def test_roi_dict():
+    blocks = RoiDict()
+    blocks[((0, 0), (10, 10))] = 1
+    blocks[((0, 10), (10, 20))] = 2
+    blocks[((0, 10), (10, 20))] = 3
+    assert len(blocks) == 2
+    assert blocks[((0, 10), (10, 20))] == 3
+    assert blocks.find_containing(((1, 11), (2, 12))) == ((0, 10), (10, 20))
+
+    del blocks[((0, 10), (10, 20))]
+    assert blocks.find_containing(((1, 11), (2, 12))) is None
+    assert blocks.find_intersecting(((0, 0), (10, 20))) == [((0, 0), (10, 10))]
+
+    blocks.clear()
+    assert len(blocks) == 0
+    assert blocks.find_intersecting(((0, 0), (10, 20))) == []
@@ -23,12 +23,14 @@ import pytest
 
 import numpy
 import threading
+import time
+import vigra
 from lazyflow.graph import Graph
 from lazyflow.utility import is_root_cause
 from lazyflow.roi import getIntersectingBlocks, getBlockBounds, roiToSlice
-from lazyflow.operators import OpArrayPiper
+from lazyflow.operators import OpArrayPiper, OpBlockedArrayCache, OpSubRegion
 
-from lazyflow.utility import RoiRequestBatch, RoiRequestBatchException
+from lazyflow.utility import RoiRequestBatch, RoiRequestBatchException, find_prefetch_slot
 
 from .conftest import ProcessingException
 
@@ -127,3 +129,63 @@ class TestRoiRequestBatch(object):
             batch.execute()
 
         assert is_root_cause(ProcessingException, exc_info.value)
+
+    def testReadAhead(self):
+        graph = Graph()
+        source = OpSlowSource(graph=graph)
+        inputData = vigra.taggedView(numpy.indices((100, 100)).sum(0), "yx")
+        source.Input.setValue(inputData)
+        cache = OpBlockedArrayCache(graph=graph)
+        cache.BlockShape.setValue((10, 100))
+        cache.Input.connect(source.Output)
+        op = OpArrayPiper(graph=graph)
+        op.Input.connect(cache.Output)
+
+        roiList = [((y, 0), (y + 10, 100)) for y in range(0, 100, 10)]
+        results = numpy.zeros((100, 100), dtype=inputData.dtype)
+
+        def handleResult(roi, result):
+            results[roiToSlice(*roi)] = result
+
+        batch = RoiRequestBatch(op.Output, iter(roiList), batchSize=2, prefetchSlot=cache.Output)
+        batch.resultSignal.subscribe(handleResult)
+        batch.execute()
+
+        assert (results == inputData).all()
+        # Blocks that were read ahead were taken from the cache, not read again
+        assert sorted(source.requested) == roiList
+
+    def testFindPrefetchSlot(self):
+        graph = Graph()
+        source = OpCachedSource(graph=graph)
+        source.Input.setValue(vigra.taggedView(numpy.zeros((100, 100)), "yx"))
+        source.BlockShape.setValue((10, 100))
+        op = OpArrayPiper(graph=graph)
+        op.Input.connect(source.Output)
+        assert find_prefetch_slot(op.Output) is source.Output
+
+        # Rois of a subregion don't carry over to the source
+        subregion = OpSubRegion(graph=graph)
+        subregion.Input.connect(op.Output)
+        subregion.Roi.setValue(((0, 0), (50, 100)))
+        assert find_prefetch_slot(subregion.Output) is None
+
+        # Sources that don't read through a cache aren't read ahead
+        uncached = OpArrayPiper(graph=graph)
+        uncached.Input.setValue(vigra.taggedView(numpy.zeros((100, 100)), "yx"))
+        assert find_prefetch_slot(uncached.Output) is None
+
+
+class OpSlowSource(OpArrayPiper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested = []
+
+    def execute(self, slot, subindex, roi, result):
+        time.sleep(0.01)
+        self.requested.append((tuple(roi.start), tuple(roi.stop)))
+        super().execute(slot, subindex, roi, result)
+
+
+class OpCachedSource(OpBlockedArrayCache):
+    prefetchOutputs = ("Output",)
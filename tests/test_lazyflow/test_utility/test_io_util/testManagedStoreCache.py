@@ -0,0 +1,114 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import threading
+
+import numpy
+import zarr
+from zarr.storage import KVStore
+
+from lazyflow.operators import cacheMemoryManager
+from lazyflow.utility.io_util.managedStoreCache import ManagedStoreCache
+
+
+class CountingStore(KVStore):
+    """Records the keys of every getitems call, optionally blocking until released"""
+
+    def __init__(self):
+        super().__init__({})
+        self.fetched = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def getitems(self, keys, *, contexts):
+        self.fetched.append(sorted(keys))
+        self.release.wait()
+        return super().getitems(keys, contexts=contexts)
+
+
+def create_array(store):
+    data = numpy.arange(40 * 40, dtype=numpy.uint16).reshape(40, 40)
+    zarr.array(data, chunks=(16, 16), store=store)
+    return data
+
+
+def test_roi_reads_are_batched_and_cached():
+    store = CountingStore()
+    data = create_array(store)
+    cache = ManagedStoreCache(store)
+    array = zarr.open_array(cache, mode="r")
+    store.fetched.clear()
+
+    numpy.testing.assert_array_equal(array[10:20, 10:20], data[10:20, 10:20])
+    assert store.fetched == [["0.0", "0.1", "1.0", "1.1"]]
+
+    numpy.testing.assert_array_equal(array[10:40, 10:20], data[10:40, 10:20])
+    assert store.fetched[1:] == [["2.0", "2.1"]]
+    assert cache.hits > 0
+
+
+def test_cache_is_managed():
+    store = CountingStore()
+    create_array(store)
+    cache = ManagedStoreCache(store)
+    assert cache in cacheMemoryManager.getFirstClassCaches()
+
+    cache.getitems(["0.0", "0.1"], contexts={})
+    expected_memory = len(store["0.0"]) + len(store["0.1"])
+    assert cache.usedMemory() == expected_memory
+    assert {key for key, _ in cache.getBlockAccessTimes()} == {"0.0", "0.1"}
+
+    assert cache.freeBlock("0.0") == len(store["0.0"])
+    assert cache.freeMemory() == len(store["0.1"])
+    assert cache.usedMemory() == 0
+
+    store.fetched.clear()
+    cache["0.0"]
+    assert store.fetched == [["0.0"]]
+
+
+def test_concurrent_fetches_of_same_key_are_coalesced():
+    store = CountingStore()
+    create_array(store)
+    cache = ManagedStoreCache(store)
+    store.fetched.clear()
+    store.release.clear()
+
+    results = {}
+
+    def read(name, keys):
+        results[name] = cache.getitems(keys, contexts={})
+
+    first = threading.Thread(target=read, args=("first", ["0.0", "0.1"]))
+    first.start()
+    while not store.fetched:
+        threading.Event().wait(0.01)
+    second = threading.Thread(target=read, args=("second", ["0.1", "1.1"]))
+    second.start()
+    while len(store.fetched) < 2:
+        threading.Event().wait(0.01)
+    store.release.set()
+    first.join()
+    second.join()
+
+    # "0.1" was only fetched by the first reader
+    assert store.fetched == [["0.0", "0.1"], ["1.1"]]
+    assert results["first"]["0.1"] == results["second"]["0.1"] == store["0.1"]
@@ -0,0 +1,165 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import threading
+from unittest import mock
+
+import h5py
+import numpy
+import pytest
+
+from lazyflow.utility.io_util.multiprocessHdf5File import MultiProcessHdf5File, ReaderProcess, split_roi
+
+
+@pytest.fixture(scope="module")
+def data():
+    return numpy.random.default_rng(0).integers(0, 1000, (50, 60, 70), dtype=numpy.uint16)
+
+
+@pytest.fixture(scope="module")
+def mp_file(tmp_path_factory, data):
+    path = str(tmp_path_factory.mktemp("mp_hdf5") / "data.h5")
+    with h5py.File(path, "w") as f:
+        dataset = f.create_dataset("volume/data", data=data, chunks=(7, 16, 5), compression="gzip")
+        dataset.attrs["axistags"] = "zyx"
+    # Small transfer buffers, so that reads are split into many pieces
+    mp_file = MultiProcessHdf5File(path, "r", num_processes=3, buffer_bytes=4096)
+    yield mp_file
+    mp_file.close()
+
+
+def testGroupsAndAttributes(mp_file, data):
+    assert mp_file.keys() == ["volume"]
+    assert "volume/data" in mp_file
+    assert "volume/nothing" not in mp_file
+
+    dataset = mp_file["volume"]["data"]
+    assert dataset.shape == data.shape
+    assert dataset.dtype == data.dtype
+    assert dataset.chunks == (7, 16, 5)
+    assert dataset.compression == "gzip"
+    assert dataset.attrs["axistags"] == "zyx"
+
+
+@pytest.mark.parametrize(
+    "slicing",
+    [
+        numpy.s_[:],
+        numpy.s_[3:40, 5:50, 7:8],
+        numpy.s_[4, 10:20],
+        numpy.s_[..., 9],
+        numpy.s_[45:60, 50:100],
+        numpy.s_[-10:, :-50],
+    ],
+)
+def testRead(mp_file, data, slicing):
+    assert (mp_file["volume/data"][slicing] == data[slicing]).all()
+
+
+def testReadDirect(mp_file, data):
+    dataset = mp_file["volume/data"]
+
+    # non-contiguous target
+    out = numpy.zeros(data.shape[::-1], dtype=data.dtype).transpose()
+    dataset.read_direct(out, numpy.s_[:])
+    assert (out == data).all()
+
+    out = numpy.zeros((10, 60), dtype=data.dtype)
+    dataset.read_direct(out, numpy.s_[20:30, :, 3])
+    assert (out == data[20:30, :, 3]).all()
+
+
+def testConcurrentReads(mp_file, data):
+    dataset = mp_file["volume/data"]
+    errors = []
+
+    def read(offset):
+        try:
+            for i in range(5):
+                slicing = numpy.s_[offset : offset + 20, i : i + 30, :]
+                assert (dataset[slicing] == data[slicing]).all()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(offset,)) for offset in range(0, 40, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def testReadError(mp_file, data):
+    with pytest.raises(KeyError):
+        mp_file._pool.read_direct("/missing", numpy.zeros((2, 2, 2)), (0, 0, 0), (2, 2, 2), numpy.float64)
+    # The readers are still usable
+    assert (mp_file["volume/data"][0:5] == data[0:5]).all()
+
+
+@pytest.mark.parametrize("error", [EOFError(), ConnectionResetError()])
+def testReaderDied(error):
+    reader = ReaderProcess.__new__(ReaderProcess)
+    reader.conn = mock.Mock(recv=mock.Mock(side_effect=error))
+    reader._process = mock.Mock(exitcode=-9)
+    reader._process.name = "ilastik_helper-data.h5"
+    with pytest.raises(RuntimeError, match="died"):
+        reader.receive()
+
+
+@pytest.mark.parametrize(
+    "start,stop,chunks,max_items,min_pieces",
+    [
+        ((0, 0), (10, 10), (4, 4), 100, 2),
+        ((3, 5, 1), (40, 33, 9), (7, 16, 5), 1000, 4),
+        ((2, 1, 18), (9, 10, 20), (5, 3, 4), 4, 1),
+        ((0,), (1,), (1,), 10, 8),
+    ],
+)
+def testSplitRoi(start, stop, chunks, max_items, min_pieces):
+    pieces = split_roi(start, stop, chunks, max_items, min_pieces)
+    coverage = numpy.zeros(numpy.subtract(stop, start), dtype=int)
+    for piece_start, piece_stop in pieces:
+        shape = numpy.subtract(piece_stop, piece_start)
+        assert numpy.prod(shape) <= max_items
+        coverage[tuple(slice(a - s, b - s) for a, b, s in zip(piece_start, piece_stop, start))] += 1
+    assert (coverage == 1).all()
+
+
+def testSplitRoiAlignment():
+    pieces = split_roi((3, 0), (40, 32), chunks=(8, 8), max_items=256, min_pieces=3)
+    assert len(pieces) >= 3
+    for piece_start, piece_stop in pieces:
+        assert piece_start[0] == 3 or piece_start[0] % 8 == 0
+        assert piece_stop[0] == 40 or piece_stop[0] % 8 == 0
+
+
+def testClose(tmp_path, data):
+    path = str(tmp_path / "data.h5")
+    with h5py.File(path, "w") as f:
+        f.create_dataset("data", data=data, chunks=True, compression="gzip")
+
+    with MultiProcessHdf5File(path, "r", num_processes=2) as f:
+        assert (f["data"][:] == data).all()
+        readers = f._pool._readers
+        assert all(reader.is_alive() for reader in readers)
+    assert not any(reader.is_alive() for reader in readers)
+    with pytest.raises(ValueError):
+        f["data"][:]
@@ -0,0 +1,140 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections
+import http.server
+import json
+import threading
+
+import numpy
+import pytest
+
+from lazyflow.graph import Graph
+from lazyflow.operators.ioOperators.opRESTfulPrecomputedChunkedVolumeReader import (
+    OpRESTfulPrecomputedChunkedVolumeReaderNoCache,
+)
+from lazyflow.utility.io_util.RESTfulPrecomputedChunkedVolume import RESTfulPrecomputedChunkedVolume
+
+DATA_CZYX = numpy.random.default_rng(0).integers(0, 2**16, (1, 3, 40, 50), dtype=numpy.uint16)
+CHUNK_XYZ = (16, 16, 2)
+INFO = {
+    "@type": "neuroglancer_multiscale_volume",
+    "type": "image",
+    "data_type": "uint16",
+    "num_channels": 1,
+    "scales": [
+        {
+            "key": "s0",
+            "size": list(DATA_CZYX.shape[:0:-1]),
+            "resolution": [1, 1, 1],
+            "voxel_offset": [0, 0, 0],
+            "chunk_sizes": [list(CHUNK_XYZ)],
+            "encoding": "raw",
+        }
+    ],
+}
+
+
+class PrecomputedServer(http.server.ThreadingHTTPServer):
+    """Serves DATA_CZYX as a precomputed volume. Fails the first request to urls listed in fail_once"""
+
+    def __init__(self):
+        super().__init__(("localhost", 0), PrecomputedHandler)
+        self.requests = collections.Counter()
+        self.fail_once = set()
+        self.release = threading.Event()
+        self.release.set()
+
+    @property
+    def url(self):
+        return f"precomputed://http://localhost:{self.server_address[1]}/volume"
+
+
+class PrecomputedHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path[len("/volume/") :]
+        self.server.requests[path] += 1
+        if path in self.server.fail_once:
+            self.server.fail_once.remove(path)
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.server.release.wait()
+        if path == "info":
+            content = json.dumps(INFO).encode()
+        else:
+            x, y, z = (tuple(map(int, r.split("-"))) for r in path.split("/")[1].split("_"))
+            content = DATA_CZYX[:, z[0] : z[1], y[0] : y[1], x[0] : x[1]].tobytes()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = PrecomputedServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_read_volume(server):
+    op = OpRESTfulPrecomputedChunkedVolumeReaderNoCache(graph=Graph())
+    op.BaseUrl.setValue(server.url)
+    assert op.Output.meta.dtype == numpy.uint16
+
+    data = op.Output[:].wait()
+    assert data.dtype == numpy.uint16
+    numpy.testing.assert_array_equal(data, DATA_CZYX)
+
+    roi_data = op.Output[:, 1:3, 10:35, 5:47].wait()
+    numpy.testing.assert_array_equal(roi_data, DATA_CZYX[:, 1:3, 10:35, 5:47])
+
+
+def test_transient_errors_are_retried(server):
+    volume = RESTfulPrecomputedChunkedVolume(server.url)
+    server.fail_once.add("s0/16-32_0-16_0-2")
+
+    block = volume.download_block(numpy.array([0, 0, 0, 16]))
+    numpy.testing.assert_array_equal(block, DATA_CZYX[:, 0:2, 0:16, 16:32])
+    assert server.requests["s0/16-32_0-16_0-2"] == 2
+
+
+def test_concurrent_requests_for_same_block_are_downloaded_once(server):
+    volume = RESTfulPrecomputedChunkedVolume(server.url)
+    server.release.clear()  # keep downloads in flight
+
+    block_start = numpy.array([0, 2, 16, 32])
+    first = volume.download_block_async(block_start)
+    second = volume.download_block_async(block_start)
+    assert first is second
+
+    server.release.set()
+    numpy.testing.assert_array_equal(first.result(), DATA_CZYX[:, 2:3, 16:32, 32:48])
+    assert server.requests["s0/32-48_16-32_2-3"] == 1
@@ -0,0 +1,108 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2026, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import numpy
+
+from lazyflow.roi import roiToSlice
+from lazyflow.utility.io_util.fileHandleCache import FileHandleCache
+from lazyflow.utility.io_util.slabPrefetcher import SlabPrefetcher
+
+
+class CountingReader:
+    def __init__(self, data, fail_at=None):
+        self.data = data
+        self.reads = []
+        self.fail_at = fail_at
+
+    def __call__(self, start, stop, out):
+        self.reads.append((tuple(start), tuple(stop)))
+        if start[0] == self.fail_at:
+            self.fail_at = None
+            raise IOError("Transient error")
+        out[...] = self.data[roiToSlice(start, stop)]
+        return out
+
+
+def read(prefetcher, start, stop):
+    out = numpy.empty(numpy.subtract(stop, start))
+    return prefetcher.read(start, stop, out)
+
+
+def testSequentialSlabsAreReadAhead():
+    data = numpy.random.random((100, 20, 30))
+    reader = CountingReader(data)
+    prefetcher = SlabPrefetcher(reader, data.shape, data.dtype, axis=0)
+
+    # two interleaved streams of tiles, walking along z
+    for z in range(0, 100, 10):
+        for y in (0, 10):
+            assert (read(prefetcher, (z, y, 0), (z + 10, y + 10, 30)) == data[z : z + 10, y : y + 10]).all()
+
+    # every slab is read exactly once, most of them ahead of time
+    assert len(reader.reads) == 20
+    assert prefetcher.hits() >= 14
+
+
+def testRandomAccessIsNotPrefetched():
+    data = numpy.random.random((100, 20))
+    reader = CountingReader(data)
+    prefetcher = SlabPrefetcher(reader, data.shape, data.dtype, axis=0)
+    for z in (50, 10, 80, 30):
+        read(prefetcher, (z, 0), (z + 10, 20))
+    assert len(reader.reads) == 4
+    assert prefetcher.hits() == 0
+
+
+def testFailedPrefetchIsRetried():
+    data = numpy.random.random((40, 20))
+    reader = CountingReader(data, fail_at=20)
+    prefetcher = SlabPrefetcher(reader, data.shape, data.dtype, axis=0)
+    for z in range(0, 40, 10):
+        assert (read(prefetcher, (z, 0), (z + 10, 20)) == data[z : z + 10]).all()
+
+
+def testFileHandleCache():
+    opened = []
+    closed = []
+
+    class Handle:
+        def __init__(self, path):
+            self.path = path
+            opened.append(self)
+
+        def close(self):
+            closed.append(self)
+
+    handles = FileHandleCache(Handle, max_open=3)
+    for i in range(10):
+        with handles.handle(i % 5) as handle:
+            assert handle.path == i % 5
+    assert handles.num_idle() == 3
+    assert len(opened) - len(closed) == 3
+
+    # concurrent readers of one file get separate handles
+    with handles.handle(4) as a:
+        with handles.handle(4) as b:
+            assert a is not b
+
+    handles.close()
+    assert handles.num_idle() == 0
+    assert len(opened) == len(closed)
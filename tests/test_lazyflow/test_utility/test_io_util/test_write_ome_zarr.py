@@ -7,10 +7,13 @@ import pytest
 import vigra
 import zarr
 
-from lazyflow.operators import OpArrayPiper
+from lazyflow.operators import OpArrayPiper, OpBlockedArrayCache
+from lazyflow.operators.opResize import OpResize
+from lazyflow.roi import getIntersectingBlocks, roiFromShape, roiToSlice
 from lazyflow.utility.data_semantics import ImageTypes
 from lazyflow.utility.io_util import multiscaleStore
 from lazyflow.utility.io_util.OMEZarrStore import OMEZarrMultiscaleMeta
+from lazyflow.utility.io_util import write_ome_zarr as write_ome_zarr_module
 from lazyflow.utility.io_util.write_ome_zarr import (
     write_ome_zarr,
     generate_default_target_scales,
@@ -481,6 +484,148 @@ def test_respects_interpolation_order(tmp_path, tiny_5d_vigra_array_piper):
     assert numpy.all(diff < 1), "all data points in NN-interpolation should be within 1 of linear interpolation"
 
 
+@pytest.mark.parametrize("tile_ram_fraction", [write_ome_zarr_module.PYRAMID_TILE_RAM_FRACTION, 0.0])
+def test_pyramid_matches_cascaded_downscales(tmp_path, graph, tile_ram_fraction):
+    """
+    All scales are written in a single pass over the source, tile by tile (at RAM fraction 0, in one pass per scale,
+    one tile per chunk).
+    The result must be the same as downscaling each scale from the full previous one, chunk by chunk.
+    """
+    chunk_shape = (1, 1, 1, 16, 16)
+    data_array = vigra.taggedView(numpy.random.default_rng(0).random((70, 61), dtype="float32"), "yx")
+    source_op = OpArrayPiper(graph=graph)
+    source_op.Input.setValue(data_array)
+    target_scales = OrderedDict(
+        [
+            ("s0", tagged_shape("tczyx", (1, 1, 1, 70, 61))),
+            ("s1", tagged_shape("tczyx", (1, 1, 1, 35, 30))),
+            ("s2", tagged_shape("tczyx", (1, 1, 1, 17, 15))),
+            ("s3", tagged_shape("tczyx", (1, 1, 1, 8, 7))),
+        ]
+    )
+    export_path = tmp_path / "test.zarr"
+
+    with mock.patch.object(write_ome_zarr_module, "_get_chunk_shape", return_value=chunk_shape), mock.patch.object(
+        write_ome_zarr_module, "PYRAMID_TILE_RAM_FRACTION", tile_ram_fraction
+    ):
+        write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, target_scales)
+
+    group = zarr.open(str(export_path))
+    numpy.testing.assert_array_equal(group["s0"][0, 0, 0], data_array)
+    prev_slot = source_op.Output
+    for key in ["s1", "s2", "s3"]:
+        op_resize = OpResize(graph=graph, RawImage=prev_slot, TargetShape=tuple(target_scales[key].values())[3:])
+        op_cache = OpBlockedArrayCache(graph=graph)
+        op_cache.Input.connect(op_resize.ResizedImage)
+        op_cache.BlockShape.setValue(chunk_shape[3:])
+        numpy.testing.assert_array_equal(group[key][0, 0, 0], op_cache.Output[:].wait())
+        prev_slot = op_cache.Output
+
+
+def test_pyramid_tiles_partition_chunks():
+    """Each chunk of each scale must be written by exactly one tile, and only once per export."""
+    shapes = [(1, 1, 1, 70, 61), (1, 1, 1, 35, 30), (1, 1, 1, 17, 15), (1, 1, 1, 8, 7)]
+    chunk_shape = (1, 1, 1, 8, 8)
+    tile_shape = (1, 1, 1, 16, 8)
+    written = [numpy.zeros(shape, dtype=int) for shape in shapes]
+    for tile_start in getIntersectingBlocks(tile_shape, roiFromShape(shapes[2])):
+        tile_roi = (tile_start, numpy.minimum(tile_start + tile_shape, shapes[2]))
+        write_rois = write_ome_zarr_module._get_tile_write_rois(tile_roi, shapes, 2, chunk_shape)
+        for scale, roi in enumerate(write_rois):
+            assert numpy.all(roi[0] % chunk_shape == 0)
+            written[scale][roiToSlice(*roi)] += 1
+    for scale_written in written:
+        assert numpy.all(scale_written == 1)
+
+
+def test_resume_interrupted_export(tmp_path, graph):
+    data_array = vigra.taggedView(numpy.random.default_rng(0).random((70, 61), dtype="float32"), "yx")
+    source_op = OpArrayPiper(graph=graph)
+    source_op.Input.setValue(data_array)
+    target_scales = OrderedDict(
+        [
+            ("s0", tagged_shape("tczyx", (1, 1, 1, 70, 61))),
+            ("s1", tagged_shape("tczyx", (1, 1, 1, 35, 30))),
+        ]
+    )
+    reference_path = tmp_path / "reference.zarr"
+    export_path = tmp_path / "test.zarr"
+    write_pyramid_tile = write_ome_zarr_module._write_pyramid_tile
+    written_tiles = []
+
+    def interrupt_after_three_tiles(*args):
+        if len(written_tiles) == 3:
+            raise RuntimeError("Export interrupted")
+        written_tiles.append(args[4])
+        return write_pyramid_tile(*args)
+
+    with mock.patch.object(
+        write_ome_zarr_module, "_get_chunk_shape", return_value=(1, 1, 1, 16, 16)
+    ), mock.patch.object(write_ome_zarr_module, "PYRAMID_TILE_RAM_FRACTION", 0.0):
+        write_ome_zarr(str(reference_path), source_op.Output, mock.Mock(), None, target_scales)
+        with mock.patch.object(write_ome_zarr_module, "_write_pyramid_tile", side_effect=interrupt_after_three_tiles):
+            with pytest.raises(RuntimeError):
+                write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, target_scales)
+        assert (export_path / ".ilastik_export.jsonl").exists()
+        with pytest.raises(FileExistsError):
+            write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, target_scales)
+
+        with mock.patch.object(write_ome_zarr_module, "_write_pyramid_tile", wraps=write_pyramid_tile) as resumed:
+            write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, target_scales, export_mode="resume")
+        resumed_tiles = [call.args[4] for call in resumed.call_args_list]
+        assert not any(numpy.array_equal(tile, written) for tile in resumed_tiles for written in written_tiles)
+
+    assert not (export_path / ".ilastik_export.jsonl").exists()
+    reference = zarr.open(str(reference_path))
+    resumed = zarr.open(str(export_path))
+    assert resumed.attrs.asdict() == reference.attrs.asdict()
+    for key in target_scales:
+        numpy.testing.assert_array_equal(resumed[key][:], reference[key][:])
+
+
+def test_append_time_points(tmp_path, graph):
+    data = numpy.random.default_rng(0).integers(0, 255, (3, 20, 21), dtype="uint8")
+    export_path = tmp_path / "test.zarr"
+    for t_range, offset in [(slice(0, 2), None), (slice(2, 3), (2, 0, 0))]:
+        source_op = OpArrayPiper(graph=graph)
+        source_op.Input.setValue(vigra.taggedView(data[t_range], "tyx"))
+        write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), offset, None, export_mode="append time")
+
+    group = zarr.open(str(export_path))
+    numpy.testing.assert_array_equal(group["s0"][:, 0, 0], data)
+    # Metadata of the store isn't changed by appending
+    assert "translation" not in str(group.attrs["multiscales"])
+
+
+def test_append_to_interrupted_export(tmp_path, graph):
+    data = numpy.random.default_rng(0).integers(0, 255, (3, 20, 21), dtype="uint8")
+    export_path = tmp_path / "test.zarr"
+    source_op = OpArrayPiper(graph=graph)
+    source_op.Input.setValue(vigra.taggedView(data, "tyx"))
+    with mock.patch.object(write_ome_zarr_module, "write_blocks_resumable", side_effect=RuntimeError("Interrupted")):
+        with pytest.raises(RuntimeError):
+            write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, None)
+
+    with pytest.raises(ValueError, match="interrupted"):
+        write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, None, export_mode="append time")
+    write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, None, export_mode="resume")
+    numpy.testing.assert_array_equal(zarr.open(str(export_path))["s0"][:, 0, 0], data)
+
+
+def test_resume_with_truncated_manifest_header(tmp_path, graph):
+    data = numpy.random.default_rng(0).integers(0, 255, (20, 21), dtype="uint8")
+    export_path = tmp_path / "test.zarr"
+    export_path.mkdir()
+    # Killed while writing the header
+    (export_path / ".ilastik_export.jsonl").write_text('{"shapes": {"s0"')
+    source_op = OpArrayPiper(graph=graph)
+    source_op.Input.setValue(vigra.taggedView(data, "yx"))
+
+    write_ome_zarr(str(export_path), source_op.Output, mock.Mock(), None, None, export_mode="resume")
+    assert not (export_path / ".ilastik_export.jsonl").exists()
+    numpy.testing.assert_array_equal(zarr.open(str(export_path))["s0"][0, 0, 0], data)
+
+
 @pytest.mark.parametrize(
     "shape,expected_shapes",
     [